@@ -5,6 +5,9 @@ import pytest
 import pytest_socket
 import tiktoken
 
+# Tests type-check every call. Set before importing taskmates: the policy is applied when modules are imported.
+os.environ.setdefault("TASKMATES_TYPECHECK", "full")
+
 from taskmates.config.load_participant_config import load_cache
 from taskmates.core.workflow_engine.run_context import RunContext
 from taskmates.core.workflow_engine.transactions.transaction import Transaction
@@ -100,6 +103,12 @@ def transaction(request, taskmates_runtime, context, daemons) -> Transaction:
                        context=context)
 
 
+@pytest.fixture(params=["pyparsing", "scanner"])
+def parser_backend(request, monkeypatch):
+    monkeypatch.setenv("TASKMATES_PARSER_BACKEND", request.param)
+    return request.param
+
+
 @pytest.fixture(scope="function", autouse=True)
 async def teardown_after_all_tests(taskmates_runtime):
     yield
@@ -3,7 +3,6 @@ import json
 import sys
 from io import StringIO
 
-from typeguard import typechecked
 
 from taskmates.cli.commands.base import Command
 from taskmates.core.workflow_engine.run_context import RunContext
@@ -12,6 +11,9 @@ from taskmates.core.workflow_engine.objective import ObjectiveKey, Objective
 from taskmates.core.workflows.markdown_completion.build_completion_request import build_completion_request
 from taskmates.core.workflows.markdown_completion.completions.llm_completion.request.build_llm_args import \
     build_llm_args
+from taskmates.core.workflows.markdown_completion.completions.llm_completion.request.tool_schema_registry import \
+    tool_schema_registry
+from taskmates.lib.typeguard_.typechecked import typechecked
 from taskmates.runtimes.cli.cli_context_builder import CliContextBuilder
 
 
@@ -81,8 +83,7 @@ class ParseCommand(Command):
                             {
                                 'name': tool.name,
                                 'description': tool.description,
-                                'args_schema': tool.args_schema.schema() if hasattr(tool.args_schema,
-                                                                                    'schema') else str(tool.args_schema)
+                                'args_schema': tool_schema_registry.get(tool).args_schema
                             } for tool in llm_args['tools']
                         ],
                         'model_params': llm_args['model_params']
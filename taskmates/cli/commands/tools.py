@@ -1,11 +1,13 @@
 import argparse
 import json
 
-from typeguard import typechecked
 
 from taskmates.cli.commands.base import Command
 from taskmates.core.tools_registry import tools_registry
+from taskmates.core.workflows.markdown_completion.completions.llm_completion.request.tool_schema_registry import \
+    tool_schema_registry
 from taskmates.lib.inspect_.get_qualified_function_name import get_qualified_function_name
+from taskmates.lib.typeguard_.typechecked import typechecked
 from taskmates.taskmates_runtime import TASKMATES_RUNTIME
 
 
@@ -16,6 +18,9 @@ class ToolsCommand(Command):
         # Subparser for the 'list' command
         subparsers.add_parser('list', help='List all functions as JSON')
 
+        # Subparser for the 'schemas' command
+        subparsers.add_parser('schemas', help='List the JSON schemas of all functions, as sent to the LLM')
+
         # Subparser for the 'invoke' command
         invoke_parser = subparsers.add_parser('invoke', help='Invoke a function by name with arguments')
         invoke_parser.add_argument('--name', required=True, help='Name of the function to invoke')
@@ -28,11 +33,14 @@ class ToolsCommand(Command):
         if args.subcommand == 'list':
             result = await cli_list_functions()
             print(result)
+        elif args.subcommand == 'schemas':
+            result = await cli_list_function_schemas()
+            print(result)
         elif args.subcommand == 'invoke':
             arguments = json.loads(args.arguments)
             await cli_invoke_function(args.name, arguments)
         else:
-            print("Invalid subcommand. Use 'list' or 'invoke'.")
+            print("Invalid subcommand. Use 'list', 'schemas' or 'invoke'.")
 
 
 async def cli_list_functions():
@@ -43,6 +51,10 @@ async def cli_list_functions():
     return json.dumps(function_full_names, indent=2, ensure_ascii=False)
 
 
+async def cli_list_function_schemas():
+    return json.dumps(tool_schema_registry.schemas(tools_registry), indent=2, ensure_ascii=False)
+
+
 @typechecked
 async def cli_invoke_function(name: str, arguments: dict):
     if name not in tools_registry:
@@ -59,3 +71,14 @@ async def cli_invoke_function(name: str, arguments: dict):
         print(result)
     else:
         print(json.dumps(result, indent=2, ensure_ascii=False))
+
+
+async def test_cli_list_function_schemas():
+    schemas = json.loads(await cli_list_function_schemas())
+
+    assert schemas["get_weather"] == {"type": "function",
+                                      "function": {"name": "get_weather",
+                                                   "description": "Get the weather for a location.",
+                                                   "parameters": {"properties": {"location": {"type": "string"}},
+                                                                  "required": ["location"],
+                                                                  "type": "object"}}}
@@ -0,0 +1,71 @@
+import argparse
+import asyncio
+import multiprocessing
+import os
+from pathlib import Path
+
+import pytest
+
+from taskmates.cli.commands.base import Command
+from taskmates.core.workflow_engine.queue_worker import QueueWorker, run_worker, DEFAULT_LEASE_TTL, \
+    DEFAULT_MAX_ATTEMPTS
+from taskmates.core.workflow_engine.transaction_scheduler import DEFAULT_MAX_CONCURRENCY
+
+
+class WorkerCommand(Command):
+    def add_arguments(self, parser: argparse.ArgumentParser):
+        parser.add_argument('cache_dir', help='Cache directory of the TransactionManager that queued the operations')
+        parser.add_argument('--processes', type=int, default=os.cpu_count() or 1,
+                            help='Number of worker processes (default: one per core)')
+        parser.add_argument('--concurrency', type=int, default=DEFAULT_MAX_CONCURRENCY,
+                            help='Operations run at once by each worker process')
+        parser.add_argument('--lease-ttl', type=float, default=DEFAULT_LEASE_TTL,
+                            help='Seconds after which the operations of an unresponsive worker are claimed again')
+        parser.add_argument('--max-attempts', type=int, default=DEFAULT_MAX_ATTEMPTS,
+                            help='Number of times an operation is claimed before giving up on it')
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help='Seconds between scans of the queue')
+        parser.add_argument('--exit-when-empty', action='store_true',
+                            help='Exit once every queued operation has a result, instead of waiting for more')
+
+    async def execute(self, args: argparse.Namespace):
+        options = dict(concurrency=args.concurrency, lease_ttl=args.lease_ttl, max_attempts=args.max_attempts,
+                       poll_interval=args.poll_interval)
+
+        if args.processes <= 1:
+            await QueueWorker(Path(args.cache_dir), **options).run(exit_when_empty=args.exit_when_empty)
+            return
+
+        # Spawned rather than forked: the workers must not inherit the event loop and threads of this process
+        context = multiprocessing.get_context("spawn")
+        processes = [context.Process(target=run_worker, args=(args.cache_dir, args.exit_when_empty), kwargs=options)
+                     for _ in range(args.processes)]
+        for process in processes:
+            process.start()
+        try:
+            for process in processes:
+                await asyncio.to_thread(process.join)
+        finally:
+            for process in processes:
+                if process.is_alive():
+                    process.terminate()
+
+        failed = [process.exitcode for process in processes if process.exitcode]
+        if failed:
+            raise RuntimeError(f"{len(failed)} of {len(processes)} worker processes failed: exit codes {failed}")
+
+
+@pytest.mark.timeout(120)
+async def test_worker_command_processes_the_queue_in_several_processes(tmp_path):
+    from taskmates.core.workflow_engine.queue_worker import double
+    from taskmates.core.workflow_engine.transaction_manager import TransactionManager
+
+    manager = TransactionManager(cache_dir=str(tmp_path))
+    handles = [manager.queue(double, {"value": value}) for value in range(8)]
+
+    parser = argparse.ArgumentParser()
+    WorkerCommand().add_arguments(parser)
+    await WorkerCommand().execute(parser.parse_args([str(tmp_path), "--processes", "2", "--poll-interval", "0.05",
+                                                     "--exit-when-empty"]))
+
+    assert manager.get_results(handles) == [value * 2 for value in range(8)]
@@ -8,6 +8,7 @@ from taskmates.cli.commands.parse import ParseCommand
 from taskmates.cli.commands.screenshot import ScreenshotCommand
 from taskmates.cli.commands.server import ServerCommand
 from taskmates.cli.commands.tools import ToolsCommand
+from taskmates.cli.commands.worker import WorkerCommand
 from taskmates.logging import logger
 from taskmates.taskmates_runtime import TASKMATES_RUNTIME
 
@@ -25,6 +26,7 @@ def main():
         'complete': CompleteCommand(),
         'server': ServerCommand(),
         'tools': ToolsCommand(),
+        'worker': WorkerCommand(),
     }
 
     for name, command in commands.items():
@@ -1,9 +1,9 @@
 import pytest
 from typing import Union
-from typeguard import typechecked
 
 from taskmates.config.find_config_file import find_config_file
 from taskmates.config.load_yaml_config import load_yaml_config
+from taskmates.lib.typeguard_.typechecked import typechecked
 
 
 @typechecked
@@ -3,12 +3,12 @@ import time
 from pathlib import Path
 
 import pytest
-from typeguard import typechecked
 
 from taskmates.config.find_config_file import find_config_file
 from taskmates.config.get_file_mtime import get_file_mtime
 from taskmates.core.markdown_chat.parse_front_matter_and_messages import parse_front_matter_and_messages
 from taskmates.defaults.settings import Settings
+from taskmates.lib.typeguard_.typechecked import typechecked
 
 load_cache = {}
 
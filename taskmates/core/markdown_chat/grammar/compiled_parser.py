@@ -0,0 +1,70 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+import pyparsing as pp
+
+from taskmates.core.markdown_chat.grammar.parsers.markdown_chat_parser import markdown_chat_parser
+
+# Packrat memoization is deliberately not enabled: the grammar is mostly regex based and rarely backtracks,
+# so the memo bookkeeping made parsing a transcript 2-4x slower (and it is process-wide in pyparsing).
+compiled_parsers: dict[tuple, pp.ParserElement] = {}
+compiled_parsers_lock = threading.Lock()
+
+
+def compiled_parser(factory: Callable[..., pp.ParserElement], **kwargs) -> pp.ParserElement:
+    """
+    Returns the grammar built by `factory(**kwargs)`, built and streamlined only once per process.
+
+    The grammars are stateless, so the same instance is shared between threads. Parse actions must take
+    `(s, l, t)` explicitly: pyparsing's arity detection for shorter signatures is not thread-safe.
+    Don't mutate or instrument (e.g. with `profile_parser`) the parser returned; build a fresh one with
+    `factory` instead.
+    """
+    key = (factory, tuple(sorted(kwargs.items())))
+    parser = compiled_parsers.get(key)
+    if parser is None:
+        with compiled_parsers_lock:
+            parser = compiled_parsers.get(key)
+            if parser is None:
+                parser = factory(**kwargs).streamline()
+                compiled_parsers[key] = parser
+    return parser
+
+
+def test_compiled_parser_is_built_once_per_implicit_role():
+    user_parser = compiled_parser(markdown_chat_parser, implicit_role="user")
+    system_parser = compiled_parser(markdown_chat_parser, implicit_role="system")
+
+    assert compiled_parser(markdown_chat_parser, implicit_role="user") is user_parser
+    assert system_parser is not user_parser
+    assert user_parser.streamlined
+
+
+def test_compiled_parser_parses_like_a_fresh_parser():
+    content = "Implicit message\n\n**assistant>** Hi\n"
+
+    for implicit_role in ["user", "system"]:
+        parser = compiled_parser(markdown_chat_parser, implicit_role=implicit_role)
+        expected = markdown_chat_parser(implicit_role=implicit_role).parse_string(content)[0].as_dict()
+
+        assert parser.parse_string(content)[0].as_dict() == expected
+        assert parser.parse_string(content)[0].as_dict() == expected
+
+
+def test_compiled_parser_is_shared_between_threads():
+    compiled_parsers.pop((markdown_chat_parser, (("implicit_role", "assistant"),)), None)
+
+    def parse(i: int):
+        parser = compiled_parser(markdown_chat_parser, implicit_role="assistant")
+        return parser, parser.parse_string(f"Message {i}\n\n**user>** Hello {i}\n")[0].as_dict()
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(parse, range(64)))
+
+    assert len({id(parser) for parser, _ in results}) == 1
+    for i, (_, parsed) in enumerate(results):
+        assert parsed["messages"] == [
+            {'name': 'assistant', 'content': f'Message {i}\n\n'},
+            {'name': 'user', 'content': f'Hello {i}\n'},
+        ]
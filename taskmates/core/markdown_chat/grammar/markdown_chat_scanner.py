@@ -0,0 +1,470 @@
+import json
+import random
+import re
+import textwrap
+
+import pyparsing as pp
+import pytest
+
+from taskmates.core.markdown_chat.grammar.actions.snake_case import snake_case
+from taskmates.core.markdown_chat.grammar.compiled_parser import compiled_parser
+from taskmates.core.markdown_chat.grammar.parsers.front_matter_parser import located_front_matter_parser
+from taskmates.core.markdown_chat.grammar.parsers.markdown_chat_parser import ChatNode, markdown_chat_parser, \
+    located_markdown_chat_parser
+from taskmates.core.markdown_chat.grammar.parsers.message.code_cell_parser import CodeCellNode
+from taskmates.core.markdown_chat.grammar.parsers.message.meta_tag_parser import MetaTagNode
+from taskmates.core.markdown_chat.grammar.parsers.message.pre_tag_parser import PreBlockNode
+from taskmates.core.markdown_chat.grammar.parsers.message.tool_calls_parser import build_tool_call
+from taskmates.core.markdown_chat.grammar.parsers.messages_parser import BEGINNING_OF_SECTION, MessageNode, \
+    TextContentNode, CommentNode, MetaNode
+from taskmates.lib.typeguard_.typechecked import typechecked
+
+# The regexes below mirror the pyparsing elements of the grammar, see the `*_parser.py` modules
+SECTION_START = re.compile(BEGINNING_OF_SECTION, re.MULTILINE)
+
+CHAT_HEADER_NAME = re.compile("[" + "".join(re.escape(c) for c in pp.printables if c not in " {*>") + "]+")
+CHAT_HEADER_ATTRIBUTES = re.compile(r"\{(?:(?:\\.)|(?:[^}\n\r\\]))*\}")
+TOOL_NAME = re.compile(f"[{pp.alphas} ]+")
+TOOL_CALL_ID = re.compile(f"[{pp.nums}]+")
+CODE_CELL_OUTPUT_NAME = re.compile(f"[{pp.alphanums}. <>]+(?= \\[)")
+CODE_CELL_ID = re.compile(f"[{pp.identchars}][{pp.identbodychars}]*")
+
+TOOL_CALL = re.compile(f"-([{pp.alphas} ]+)\\[([{pp.nums}]+)\\] (`(?:(?:\\\\.)|(?:[^`\\\\]))*`)", re.DOTALL)
+
+# `pp.line_end` at the end of the code cell header skips (and drops) the default whitespace
+CODE_CELL_HEADER = re.compile(r"```([a-zA-Z0-9]+)?( )?(\.eval)?([ \t\r]*)(\n|\Z)")
+CODE_CELL_FENCE = re.compile(r"^```", re.MULTILINE)
+CODE_CELL_END = re.compile(r"^```(`*)(\n|\Z)", re.MULTILINE)
+PRE_TAG_END = re.compile(r"</pre>(\n|\Z)")
+
+
+@typechecked
+class MarkdownChatScanner:
+    """
+    Single pass, line oriented alternative to `markdown_chat_parser`.
+
+    Produces the same `ChatNode`/`MessageNode` trees (and raises the same errors) as the pyparsing
+    grammar, but jumps from one section start to the next with regexes instead of trying every grammar
+    alternative at every position. Selected with `TASKMATES_PARSER_BACKEND=scanner`, see `parser_backend`.
+
+    Positions past the end of the content (`len(content) + 1`) mean that a line end was matched at the
+    end of the content, just like in pyparsing.
+    """
+
+    def __init__(self, implicit_role: str = "user", front_matter: bool = True, string_end: bool = True):
+        self.implicit_role = implicit_role
+        self.front_matter = front_matter
+        self.string_end = string_end
+
+    def parse_string(self, content: str) -> list[ChatNode]:
+        front_matter, located_messages = self.scan(content)
+        if isinstance(front_matter, pp.ParseResults):
+            front_matter = front_matter.as_list()
+        chat = {**({"front_matter": front_matter} if front_matter is not None else {}),
+                "messages": [message for _, message in located_messages]}
+        return [ChatNode(**chat)]
+
+    parseString = parse_string
+
+    def scan(self, content: str) -> tuple[object, list[tuple[int, MessageNode]]]:
+        """
+        Returns the front matter (None if absent) and the messages together with their offsets.
+        """
+        # pyparsing expands tabs before parsing, so do the messages and offsets
+        content = content.expandtabs()
+        loc = 0
+        front_matter = None
+        if self.front_matter and content.startswith("---"):
+            try:
+                located = compiled_parser(located_front_matter_parser).parse_string(content)
+            except pp.ParseException:
+                pass
+            else:
+                front_matter = located.value.get("front_matter")
+                loc = located.locn_end
+
+        located_messages = []
+
+        start = loc
+        header = scan_header(content, loc)
+        if header is None:
+            if not is_line_start(content, loc):
+                raise pp.ParseException(content, loc, "Expected first_message")
+            header = {"name": self.implicit_role}, loc
+        message, loc = scan_message(content, *header)
+        located_messages.append((start, message))
+
+        while (header := scan_header(content, loc)) is not None:
+            start = loc
+            message, loc = scan_message(content, *header)
+            located_messages.append((start, message))
+
+        if self.string_end and loc < len(content):
+            raise pp.ParseException(content, loc, "Expected end of text")
+
+        return front_matter, located_messages
+
+
+def is_line_start(content: str, loc: int) -> bool:
+    return loc == 0 or (loc <= len(content) and content[loc - 1] == "\n")
+
+
+def line_end(content: str, loc: int) -> int | None:
+    if loc < len(content):
+        return loc + 1 if content[loc] == "\n" else None
+    return loc + 1 if loc == len(content) else None
+
+
+def scan_message(content: str, fields: dict, loc: int) -> tuple[MessageNode, int]:
+    child_nodes, loc = scan_message_content(content, loc)
+    fields = {**fields, "child_nodes": child_nodes}
+
+    tool_calls = scan_tool_calls(content, loc)
+    if tool_calls is not None:
+        fields["tool_calls"], loc = tool_calls
+
+    return MessageNode.from_fields(fields), loc
+
+
+def scan_header(content: str, loc: int) -> tuple[dict, int] | None:
+    if not is_line_start(content, loc):
+        return None
+
+    if content.startswith("**", loc):
+        header = scan_chat_message_header(content, loc)
+        if header is not None:
+            return header
+
+    if content.startswith("###### Execution: ", loc):
+        return scan_tool_execution_header(content, loc)
+
+    if content.startswith("###### Cell Output: ", loc):
+        return scan_code_cell_execution_header(content, loc)
+
+    return None
+
+
+def scan_chat_message_header(content: str, loc: int) -> tuple[dict, int] | None:
+    name = CHAT_HEADER_NAME.match(content, loc + 2)
+    if name is None:
+        return None
+    fields = {"name": name.group()}
+    loc = name.end()
+
+    if content.startswith(" ", loc):
+        attributes = CHAT_HEADER_ATTRIBUTES.match(content, loc + 1)
+        if attributes is not None:
+            fields["attributes"] = json.loads(attributes.group())
+            loc = attributes.end()
+
+    if not content.startswith(">**", loc) or content[loc + 3:loc + 4] not in (" ", "\n"):
+        return None
+    return fields, loc + 4
+
+
+def scan_tool_execution_header(content: str, loc: int) -> tuple[dict, int]:
+    loc += len("###### Execution: ")
+
+    name = expect(TOOL_NAME, content, loc, "tool name")
+    loc = expect_literal("[", content, name.end())
+    tool_call_id = expect(TOOL_CALL_ID, content, loc, "tool call id")
+    loc = expect_line_end(content, expect_literal("]", content, tool_call_id.end()))
+
+    return {"name": snake_case(name.group()), "tool_call_id": tool_call_id.group(), "role": "tool"}, loc
+
+
+def scan_code_cell_execution_header(content: str, loc: int) -> tuple[dict, int]:
+    loc += len("###### Cell Output: ")
+
+    name = expect(CODE_CELL_OUTPUT_NAME, content, loc, "code cell output name")
+    loc = expect_literal("[", content, expect_literal(" ", content, name.end()))
+    code_cell_id = expect(CODE_CELL_ID, content, loc, "code cell id")
+    loc = expect_line_end(content, expect_literal("]", content, code_cell_id.end()))
+
+    return {"name": name.group(), "code_cell_id": code_cell_id.group(), "role": "cell_output"}, loc
+
+
+def expect(pattern: re.Pattern, content: str, loc: int, name: str) -> re.Match:
+    match = pattern.match(content, loc) if loc <= len(content) else None
+    if match is None:
+        raise pp.ParseSyntaxException(content, loc, f"Expected {name}")
+    return match
+
+
+def expect_literal(literal: str, content: str, loc: int) -> int:
+    if not content.startswith(literal, loc):
+        raise pp.ParseSyntaxException(content, loc, f"Expected {literal!r}")
+    return loc + len(literal)
+
+
+def expect_line_end(content: str, loc: int) -> int:
+    end = line_end(content, loc)
+    if end is None:
+        raise pp.ParseSyntaxException(content, loc, "Expected end of line")
+    return end
+
+
+def scan_message_content(content: str, loc: int) -> tuple[list, int]:
+    child_nodes = []
+
+    while loc < len(content):
+        section_start = SECTION_START.search(content, loc)
+        text_end = section_start.start() if section_start is not None else len(content)
+        if text_end > loc:
+            child_nodes.append(TextContentNode(source=content[loc:text_end]))
+            loc = text_end
+            continue
+
+        section = scan_section(content, loc)
+        if section is None:
+            break
+        node, loc = section
+        child_nodes.append(node)
+
+    return child_nodes, loc
+
+
+def scan_section(content: str, loc: int) -> tuple[object, int] | None:
+    if content.startswith("<meta", loc):
+        return scan_meta_tag(content, loc)
+    if content.startswith("[//]: #", loc):
+        return scan_comment_or_meta(content, loc)
+    if content.startswith("```", loc):
+        return scan_code_cell(content, loc)
+    if content.startswith("<pre", loc):
+        return scan_pre_tag(content, loc)
+    return None
+
+
+def scan_meta_tag(content: str, loc: int) -> tuple[MetaTagNode, int] | None:
+    tag_end = content.find(">", loc + len("<meta"))
+    if tag_end == -1:
+        return None
+    end = line_end(content, tag_end + 1)
+    if end is None:
+        return None
+    return MetaTagNode.from_source(content[loc:tag_end + 1]), end
+
+
+def scan_comment_or_meta(content: str, loc: int) -> tuple[object, int]:
+    meta_start = loc + len("[//]: # (meta:")
+    if content.startswith("[//]: # (meta:", loc):
+        meta_end = content.find(")", meta_start)
+        if meta_end > meta_start:
+            end = line_end(content, meta_end + 1)
+            if end is not None:
+                return MetaNode.from_meta_str(content[meta_start:meta_end]), end
+
+    end = content.find("\n", loc)
+    return CommentNode(source="[//]: #"), end + 1 if end != -1 else len(content) + 1
+
+
+def scan_code_cell(content: str, loc: int) -> tuple[CodeCellNode, int] | None:
+    header = CODE_CELL_HEADER.match(content, loc)
+    if header is None:
+        return None
+    if not header.group(5):
+        # the header ends the content, so there are no content lines
+        raise pp.ParseSyntaxException(content, len(content) + 1, "Expected code_cell_content")
+
+    # the content is joined from its lines, nested code cells contribute their (normalized) source
+    content_parts = []
+    content_start = part_start = line = header.end()
+    while True:
+        fence = CODE_CELL_FENCE.search(content, line)
+        if fence is None:
+            line = len(content) + 1
+            break
+        if CODE_CELL_END.match(content, fence.start()):
+            if fence.start() == content_start:
+                raise pp.ParseSyntaxException(content, content_start, "Expected code_cell_content")
+            line = fence.start()
+            break
+        nested_code_cell = scan_code_cell(content, fence.start())
+        if nested_code_cell is not None:
+            nested_node, line = nested_code_cell
+            content_parts += [content[part_start:fence.start()], nested_node.source]
+            part_start = min(line, len(content))
+        else:
+            line_break = content.find("\n", fence.start())
+            line = line_break + 1 if line_break != -1 else len(content) + 1
+        if line > len(content):
+            break
+    content_parts.append(content[part_start:min(line, len(content))])
+
+    end = CODE_CELL_END.match(content, line) if line <= len(content) else None
+    loc_end = end.end() if end is not None else line
+
+    fields = {}
+    if header.group(1):
+        fields["language"] = header.group(1)
+    if header.group(3):
+        fields["eval"] = True
+    if end is None:
+        fields["truncated"] = True
+
+    code_cell_content = "".join(content_parts)
+    source = (content[loc:header.start(4)] + content[header.end(4):content_start]
+              + code_cell_content + (end.group() if end is not None else ""))
+    code_cell = CodeCellNode(source=source, content=code_cell_content, **fields)
+    return code_cell, loc_end
+
+
+def scan_pre_tag(content: str, loc: int) -> tuple[PreBlockNode, int] | None:
+    tag_end = content.find(">", loc + len("<pre"))
+    if tag_end == -1:
+        return None
+    end = PRE_TAG_END.search(content, tag_end + 1)
+    loc_end = end.end() if end is not None else len(content)
+    return PreBlockNode.from_source(content[loc:loc_end]), loc_end
+
+
+def scan_tool_calls(content: str, loc: int) -> tuple[list[dict], int] | None:
+    if not is_line_start(content, loc) or not content.startswith("###### Steps", loc):
+        return None
+
+    loc, line_ends = skip_line_ends(content, loc + len("###### Steps"))
+    if not line_ends:
+        return None
+
+    tool_calls = []
+    while (tool_call := TOOL_CALL.match(content, loc) if loc <= len(content) else None) is not None:
+        tool_calls.append(build_tool_call(tool_call.group(1), tool_call.group(2), tool_call.group(3)))
+        loc = line_end(content, tool_call.end()) or tool_call.end()
+
+    if not tool_calls:
+        return None
+
+    loc, _ = skip_line_ends(content, loc)
+    return tool_calls, loc
+
+
+def skip_line_ends(content: str, loc: int) -> tuple[int, int]:
+    count = 0
+    while (end := line_end(content, loc)) is not None:
+        loc = end
+        count += 1
+    return loc, count
+
+
+def test_scanner_parses_like_markdown_chat_parser():
+    content = textwrap.dedent("""\
+        ---
+        key: value
+        ---
+
+        Hello @assistant
+
+        **assistant>** Let me check.
+
+        ###### Steps
+
+        - Run Shell Command [1] `{"cmd": "ls"}`
+
+        ###### Execution: Run Shell Command [1]
+
+        <pre class='output' style='display:none'>
+        file.txt
+        </pre>
+
+        **john {"name": "john"}>** Here:
+
+        ```python .eval
+        print(1 + 1)
+        ```
+
+        ###### Cell Output: stdout [cell_0]
+
+        <pre>
+        2
+        </pre>
+
+        [//]: # (meta:temperature = 0.7)
+        """)
+
+    expected = markdown_chat_parser().parse_string(content)[0].as_dict()
+
+    assert MarkdownChatScanner().parse_string(content)[0].as_dict() == expected
+
+
+def test_scanner_locates_messages():
+    content = "---\nkey: value\n---\n\nHello\n\n**assistant>** Hi\n"
+
+    front_matter, located_messages = MarkdownChatScanner().scan(content)
+
+    assert front_matter == {"key": "value"}
+    assert [(offset, message.name) for offset, message in located_messages] == [
+        (len("---\nkey: value\n---\n\n"), "user"),
+        (len("---\nkey: value\n---\n\nHello\n\n"), "assistant"),
+    ]
+
+
+def test_scanner_raises_parse_exceptions():
+    with pytest.raises(pp.ParseException):
+        MarkdownChatScanner().parse_string("**user>** Hello\n\n</pre>\n")
+    with pytest.raises(pp.ParseSyntaxException):
+        MarkdownChatScanner().parse_string("**user>** Hello\n\n###### Execution: Run Shell Command [x\n")
+    with pytest.raises(pp.ParseSyntaxException):
+        MarkdownChatScanner().parse_string("**user>** Hello\n\n```python\n```\n")
+
+
+FUZZ_FRAGMENTS = [
+    "**user>** ", "**assistant>**\n", "**john {\"name\": \"john\"}>** ", "**bad {x}>** ", "**a-b>** ", "**user>**",
+    "Hello ", "text\n", "\n", "\n\n", "* bullet\n", "# title\n", "<b>bold</b>\n", "[link](x)\n", "`code`\n",
+    "```python .eval\n", "```\n", "````\n", "```bash\n", "``` \n", "```  \n", "``` \t\n", "```python", "print(1)\n",
+    "\r\n", "<pre class='output'>\n", "<pre>", "</pre>\n", "</pre>", "&lt;tag&gt;\n", "<prefix>\n",
+    "<meta name=\"foo\" content=\"bar\" />\n", "<meta charset=\"UTF-8\">\n", "<meta x>y\n", "<meta\n",
+    "[//]: # (comment)\n", "[//]: # (meta:temperature = 0.7)\n", "[//]: # (meta:a = 'b')", "[//]: # (meta:)\n",
+    "###### Steps\n\n", "- Run Shell Command [1] `{\"cmd\": \"ls\"}`\n", "- Read File [2] `{\"path\": \"a\\`b\"}`\n",
+    "###### Execution: Run Shell Command [1]\n\n", "###### Execution: Run [2]", "###### Execution: [3]\n",
+    "###### Cell Output: stdout [cell_0]\n\n", "###### Cell Output: display_data [cell_1]", "###### Cell Outputs\n",
+    "###### Other\n", "-[x] Done\n", "---\n", "---\nkey: value\n---\n",
+]
+
+
+def generate_fuzz_content(rng: random.Random) -> str:
+    fragments = rng.choices(FUZZ_FRAGMENTS, k=rng.randint(1, 12))
+    content = "".join(fragments)
+    if content and rng.random() < 0.3:
+        # cut at an arbitrary position, as while streaming
+        content = content[:rng.randint(0, len(content))]
+    return content
+
+
+def parse_outcome(parse, content: str):
+    try:
+        return "parsed", parse(content)[0].as_dict()
+    except pp.ParseBaseException:
+        return "parse_error", None
+    except Exception as e:
+        return "error", type(e)
+
+
+def test_scanner_matches_markdown_chat_parser_on_random_chats():
+    rng = random.Random(0)
+
+    for _ in range(1000):
+        content = generate_fuzz_content(rng)
+        implicit_role = rng.choice(["user", "system"])
+        parser = compiled_parser(markdown_chat_parser, implicit_role=implicit_role)
+        scanner = MarkdownChatScanner(implicit_role=implicit_role)
+
+        assert parse_outcome(scanner.parse_string, content) == parse_outcome(parser.parse_string, content), content
+
+
+def test_scanner_locates_messages_like_located_markdown_chat_parser():
+    rng = random.Random(1)
+
+    for _ in range(300):
+        content = generate_fuzz_content(rng)
+        front_matter = rng.choice([True, False])
+        parser = compiled_parser(located_markdown_chat_parser, front_matter=front_matter)
+        try:
+            parsed = parser.parse_string(content)
+        except Exception:
+            continue
+        expected = [(located.locn_start, located.value[0].as_dict()) for located in parsed.messages]
+
+        _, located_messages = MarkdownChatScanner(front_matter=front_matter).scan(content)
+
+        assert [(offset, message.as_dict()) for offset, message in located_messages] == expected, content
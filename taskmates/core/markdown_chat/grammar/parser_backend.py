@@ -0,0 +1,85 @@
+import os
+
+import pyparsing as pp
+import pytest
+
+from taskmates.core.markdown_chat.grammar.compiled_parser import compiled_parser
+from taskmates.core.markdown_chat.grammar.markdown_chat_scanner import MarkdownChatScanner
+from taskmates.core.markdown_chat.grammar.parsers.markdown_chat_parser import markdown_chat_parser, \
+    located_markdown_chat_parser
+from taskmates.core.markdown_chat.grammar.parsers.messages_parser import MessageNode
+
+PARSER_BACKENDS = ("pyparsing", "scanner")
+
+
+def get_parser_backend() -> str:
+    """
+    Returns the markdown chat parser backend selected with `TASKMATES_PARSER_BACKEND`.
+
+    `pyparsing` (the default) parses with the grammar in `parsers/`, `scanner` with `MarkdownChatScanner`.
+    Both produce the same nodes and raise the same errors.
+    """
+    backend = os.environ.get("TASKMATES_PARSER_BACKEND", "pyparsing").lower()
+    if backend not in PARSER_BACKENDS:
+        raise ValueError(f"Unknown TASKMATES_PARSER_BACKEND {backend!r}, expected one of {PARSER_BACKENDS}")
+    return backend
+
+
+def chat_parser(implicit_role: str = "user") -> pp.ParserElement | MarkdownChatScanner:
+    """
+    Returns a parser for complete markdown chats: `parse_string(content)[0]` is a `ChatNode`.
+    """
+    if get_parser_backend() == "scanner":
+        return MarkdownChatScanner(implicit_role=implicit_role)
+    return compiled_parser(markdown_chat_parser, implicit_role=implicit_role)
+
+
+def located_chat_parser(implicit_role: str = "user", front_matter: bool = True) -> "LocatedChatParser":
+    return LocatedChatParser(implicit_role=implicit_role, front_matter=front_matter)
+
+
+class LocatedChatParser:
+    """
+    Parses a markdown chat into its front matter (None if absent) and its messages together with
+    their offsets in the content.
+    """
+
+    def __init__(self, implicit_role: str = "user", front_matter: bool = True):
+        if get_parser_backend() == "scanner":
+            self.scanner = MarkdownChatScanner(implicit_role=implicit_role, front_matter=front_matter)
+            self.parser = None
+        else:
+            self.scanner = None
+            self.parser = compiled_parser(located_markdown_chat_parser,
+                                          implicit_role=implicit_role, front_matter=front_matter)
+
+    def parse_string(self, content: str) -> tuple[object, list[tuple[int, MessageNode]]]:
+        if self.scanner is not None:
+            return self.scanner.scan(content)
+        parsed = self.parser.parse_string(content)
+        return parsed.get("front_matter"), [(located.locn_start, located.value[0]) for located in parsed.messages]
+
+
+def test_chat_parser_selects_backend(parser_backend):
+    expected_type = MarkdownChatScanner if parser_backend == "scanner" else pp.ParserElement
+
+    assert isinstance(chat_parser(), expected_type)
+
+
+def test_unknown_parser_backend(monkeypatch):
+    monkeypatch.setenv("TASKMATES_PARSER_BACKEND", "regex")
+
+    with pytest.raises(ValueError, match="TASKMATES_PARSER_BACKEND"):
+        get_parser_backend()
+
+
+def test_located_chat_parser(parser_backend):
+    content = "---\nkey: value\n---\n\nHello\n\n**assistant>** Hi\n"
+
+    front_matter, located_messages = located_chat_parser().parse_string(content)
+
+    assert front_matter == {"key": "value"}
+    assert [(offset, message.as_dict()) for offset, message in located_messages] == [
+        (len("---\nkey: value\n---\n\n"), {"name": "user", "content": "Hello\n\n"}),
+        (len("---\nkey: value\n---\n\nHello\n\n"), {"name": "assistant", "content": "Hi\n"}),
+    ]
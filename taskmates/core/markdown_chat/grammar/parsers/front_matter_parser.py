@@ -18,6 +18,10 @@ def front_matter_parser():
     return front_matter
 
 
+def located_front_matter_parser():
+    return pp.Located(front_matter_parser())
+
+
 def test_front_matter_parser():
     input = textwrap.dedent("""\
         ---
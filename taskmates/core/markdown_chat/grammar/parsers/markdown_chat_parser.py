@@ -2,11 +2,13 @@ import textwrap
 from typing import Optional
 
 import pyparsing as pp
+import pytest
 from pydantic import BaseModel
 from pyparsing import ParseResults
 
 from taskmates.core.markdown_chat.grammar.parsers.front_matter_parser import front_matter_parser
-from taskmates.core.markdown_chat.grammar.parsers.messages_parser import messages_parser, MessageNode
+from taskmates.core.markdown_chat.grammar.parsers.messages_parser import messages_parser, MessageNode, \
+    located_messages_parser
 
 pp.enable_all_warnings()
 pp.ParserElement.set_default_whitespace_chars("")
@@ -29,7 +31,25 @@ class ChatNode(BaseModel):
 def markdown_chat_parser(implicit_role: str = "user"):
     return (pp.Opt(front_matter_parser())
             + messages_parser(implicit_role=implicit_role)
-            + pp.StringEnd()).set_parse_action(ChatNode.from_tokens)
+            + pp.StringEnd()).set_parse_action(lambda s, l, t: ChatNode.from_tokens(t))
+
+
+def located_markdown_chat_parser(implicit_role: str = "user", front_matter: bool = True):
+    located_messages = located_messages_parser(implicit_role=implicit_role)
+    if front_matter:
+        return pp.Opt(front_matter_parser()) + located_messages + pp.StringEnd()
+    return located_messages + pp.StringEnd()
+
+
+def parse_chat(content: str) -> list[ChatNode]:
+    """Parses `content` with the selected parser backend, see `parser_backend`."""
+    from taskmates.core.markdown_chat.grammar.parser_backend import chat_parser
+
+    return chat_parser().parse_string(content)
+
+
+# The tests below run against every parser backend
+pytestmark = pytest.mark.usefixtures("parser_backend")
 
 
 def test_no_line_end():
@@ -43,7 +63,7 @@ def test_no_line_end():
                          {'content': 'Short answer. 1+1=',
                           'name': 'assistant'}]
 
-    results = markdown_chat_parser().parseString(input)[0].as_dict()
+    results = parse_chat(input)[0].as_dict()
 
     assert results["messages"] == expected_messages
 
@@ -60,7 +80,7 @@ def test_with_front_matter():
         **user>** Message
         """)
 
-    results = markdown_chat_parser().parseString(input)[0].as_dict()
+    results = parse_chat(input)[0].as_dict()
 
     assert results == {
         'front_matter': {'key1': 'value1', 'key2': ['item1', 'item2']},
@@ -84,7 +104,7 @@ def test_markdown_with_tool_execution():
         **user>** Here is another message.
         """)
 
-    results = markdown_chat_parser().parseString(input)[0].as_dict()
+    results = parse_chat(input)[0].as_dict()
 
     assert results["messages"] == [
         {
@@ -132,7 +152,7 @@ def test_markdown_with_code_cell():
     
         """)
 
-    results = markdown_chat_parser().parseString(input)[0].as_dict()
+    results = parse_chat(input)[0].as_dict()
 
     assert results["messages"] == [
         {
@@ -186,7 +206,7 @@ def test_markdown_with_code_cell_execution():
 
         """)
 
-    results = markdown_chat_parser().parseString(input)[0].as_dict()
+    results = parse_chat(input)[0].as_dict()
 
     assert results["messages"] == [
         {
@@ -227,7 +247,7 @@ def test_markdown_comments_outside_code_blocks():
         **assistant>** Here's another message.
         """)
 
-    results = markdown_chat_parser().parseString(input)[0].as_dict()
+    results = parse_chat(input)[0].as_dict()
 
     assert results["messages"] == [
         {
@@ -252,7 +272,7 @@ def test_markdown_comments_inside_code_blocks():
         ```
         """)
 
-    results = markdown_chat_parser().parseString(input)[0].as_dict()
+    results = parse_chat(input)[0].as_dict()
 
     assert results["messages"] == [
         {
@@ -277,7 +297,7 @@ def test_markdown_comments_inside_pre_tags():
         </pre>
         """)
 
-    results = markdown_chat_parser().parseString(input)[0].as_dict()
+    results = parse_chat(input)[0].as_dict()
 
     assert results["messages"] == [
         {
@@ -302,7 +322,7 @@ def test_special_chars():
         </pre>
         """)
 
-    results = markdown_chat_parser().parseString(input)[0].as_dict()
+    results = parse_chat(input)[0].as_dict()
 
     assert results["messages"] == [{'content': 'Special char\n\n', 'name': 'user'},
                                    {'code_cell_id': 'cell_0',
@@ -327,7 +347,7 @@ def test_markdown_with_html_meta_tags():
         Response content.
         """)
 
-    results = markdown_chat_parser().parseString(input)[0].as_dict()
+    results = parse_chat(input)[0].as_dict()
 
     assert results["messages"] == [
         {
@@ -363,7 +383,7 @@ def test_markdown_with_mixed_metadata_formats():
         Content here.
         """)
 
-    results = markdown_chat_parser().parseString(input)[0].as_dict()
+    results = parse_chat(input)[0].as_dict()
 
     assert results == {
         'front_matter': {'title': 'Test Document'},
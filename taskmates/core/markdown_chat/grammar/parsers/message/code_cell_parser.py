@@ -71,7 +71,7 @@ def code_cell_parser():
         code_cell_start
         - code_cell_content
         - (code_cell_end | pp.StringEnd())
-    ).setName("code_cell_block").set_parse_action(CodeCellNode.from_tokens)
+    ).setName("code_cell_block").set_parse_action(lambda s, l, t: CodeCellNode.from_tokens(t))
 
     return code_cell
 
@@ -11,8 +11,10 @@ class MetaTagNode:
 
     @classmethod
     def from_tokens(cls, tokens):
-        source = tokens[0]
-        
+        return cls.from_source(tokens[0])
+
+    @classmethod
+    def from_source(cls, source: str):
         # Parse attributes from the meta tag
         attributes = {}
         
@@ -51,7 +53,7 @@ def meta_tag_parser():
         pp.Combine(
             meta_start + meta_attrs
         ) + pp.LineEnd()
-    ).setName("meta_tag_line").set_parse_action(MetaTagNode.from_tokens)
+    ).setName("meta_tag_line").set_parse_action(lambda s, l, t: MetaTagNode.from_tokens(t))
     
     return meta_line
 
@@ -11,7 +11,10 @@ class PreBlockNode:
 
     @classmethod
     def from_tokens(cls, tokens):
-        source = tokens[0]
+        return cls.from_source(tokens[0])
+
+    @classmethod
+    def from_source(cls, source: str):
         unescaped = html.unescape(source)
         return cls(source=source, unescaped=unescaped)
 
@@ -24,7 +27,7 @@ def pre_tag_parser():
         pre_start +
         pre_content +
         (pre_end | pp.StringEnd())
-    ).setName("pre_tag_block").set_parse_action(PreBlockNode.from_tokens)
+    ).setName("pre_tag_block").set_parse_action(lambda s, l, t: PreBlockNode.from_tokens(t))
     return pre_tag
 
 
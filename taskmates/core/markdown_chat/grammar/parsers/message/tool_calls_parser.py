@@ -12,10 +12,11 @@ TOOL_CALLS_START_REGEX = r"^###### Steps"
 
 def parse_tool_call(string, location, tokens):
     tool_call = tokens[0]
-    tool_call_name = tool_call['name']
+    return build_tool_call(tool_call['name'], tool_call['id'], tool_call['arguments'])
 
+
+def build_tool_call(tool_call_name: str, tool_call_id: str, raw_arguments: str) -> dict:
     # The arguments come with quotes, so we need to strip them and handle escapes
-    raw_arguments = tool_call['arguments']
     if raw_arguments.startswith('`') and raw_arguments.endswith('`'):
         raw_arguments = raw_arguments[1:-1]
 
@@ -33,7 +34,7 @@ def parse_tool_call(string, location, tokens):
         arguments_dict = commentjson.loads(arguments)
 
     return {
-        "id": tool_call['id'],
+        "id": tool_call_id,
         "type": "function",
         "function": {
             "name": snake_case(tool_call_name),
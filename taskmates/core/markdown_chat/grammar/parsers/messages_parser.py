@@ -52,7 +52,11 @@ class MetaNode(BaseModel):
 
     @classmethod
     def from_tokens(cls, tokens: ParseResults):
-        meta_str = tokens.meta_str.strip()
+        return cls.from_meta_str(tokens.meta_str)
+
+    @classmethod
+    def from_meta_str(cls, meta_str: str):
+        meta_str = meta_str.strip()
 
         # Extract key and value
         try:
@@ -93,7 +97,10 @@ class MessageNode(BaseModel):
 
     @classmethod
     def create(cls, tokens: ParseResults):
-        dct = tokens.as_dict()
+        return cls.from_fields(tokens.as_dict())
+
+    @classmethod
+    def from_fields(cls, dct: dict):
         child_nodes = dct.pop("child_nodes")
         dct["meta"] = {}
 
@@ -147,7 +154,7 @@ def comment_line_parser():
             + pp.Literal('[//]: #')
             + pp.restOfLine
             + pp.LineEnd()
-    ).set_parse_action(CommentNode.from_tokens)
+    ).set_parse_action(lambda s, l, t: CommentNode.from_tokens(t))
 
 
 def meta_line_parser():
@@ -185,7 +192,7 @@ def message_content_parser():
             fr"(?:[^`<#*\[]+|{NOT_BEGINNING_OF_SECTION_AHEAD}.)+",
             re.DOTALL | re.MULTILINE
         )
-    ).setName("text_content").set_parse_action(TextContentNode.from_tokens)
+    ).setName("text_content").set_parse_action(lambda s, l, t: TextContentNode.from_tokens(t))
 
     # Define a single line that can be either metadata, comment, or text
     # OPTIMIZATION: text_content moved FIRST to prioritize the common case (plain text)
@@ -199,13 +206,13 @@ def message_content_parser():
 def first_message_parser(implicit_role: str = "user"):
     message_content = message_content_parser()
     implicit_header = (pp.LineStart().setName("first_message_start") +
-                       pp.Empty().setName("implicit_role").setParseAction(lambda: implicit_role)("name"))
+                       pp.Empty().setName("implicit_role").setParseAction(lambda s, l, t: implicit_role)("name"))
     first_message = (
             (headers_parser() | implicit_header).setName("message_header_parser")
             + message_content
             + pp.Optional(tool_calls_parser())
     ).setName("first_message")
-    return first_message.set_parse_action(MessageNode.create)
+    return first_message.set_parse_action(lambda s, l, t: MessageNode.create(t))
 
 
 def message_parser():
@@ -217,7 +224,7 @@ def message_parser():
             + message_content
             + pp.Optional(tool_calls_parser())
     ).setName("message_parser")
-    return message.set_parse_action(MessageNode.create)
+    return message.set_parse_action(lambda s, l, t: MessageNode.create(t))
 
 
 def messages_parser(implicit_role: str = "user"):
@@ -227,6 +234,32 @@ def messages_parser(implicit_role: str = "user"):
     return messages
 
 
+def located_messages_parser(implicit_role: str = "user"):
+    first_message, message = first_message_parser(implicit_role=implicit_role), message_parser()
+    located_first_message = pp.Group(pp.Located(first_message))
+    located_message = pp.Group(pp.Located(message))
+    messages = (pp.Group(located_first_message + located_message[...])
+                .setName("located_messages_sequence")
+                .set_results_name("messages"))
+
+    return messages
+
+
+def parse_messages(content: str) -> list[MessageNode]:
+    """Parses `content` with `messages_parser`, or with its counterpart in the selected parser backend."""
+    from taskmates.core.markdown_chat.grammar.markdown_chat_scanner import MarkdownChatScanner
+    from taskmates.core.markdown_chat.grammar.parser_backend import get_parser_backend
+
+    if get_parser_backend() == "scanner":
+        _, located_messages = MarkdownChatScanner(front_matter=False, string_end=False).scan(content)
+        return [message for _, message in located_messages]
+    return list(messages_parser().parseString(content).messages)
+
+
+# The tests below run against every parser backend
+pytestmark = pytest.mark.usefixtures("parser_backend")
+
+
 def test_messages_parser_single_message():
     input = textwrap.dedent("""\
         **user>** Hello, assistant!
@@ -238,9 +271,9 @@ def test_messages_parser_single_message():
     expected_messages = [{'content': 'Hello, assistant!\n\nThis is a multiline message.\n\n',
                           'name': 'user'}]
 
-    results = messages_parser().parseString(input)
+    messages = parse_messages(input)
 
-    assert [m.as_dict() for m in results.messages] == expected_messages
+    assert [m.as_dict() for m in messages] == expected_messages
 
 
 def test_messages_parser_with_false_positive():
@@ -257,9 +290,9 @@ def test_messages_parser_with_false_positive():
                          {'content': 'Here is another message.\n',
                           'name': 'assistant'}]
 
-    results = messages_parser().parseString(input)
+    messages = parse_messages(input)
 
-    assert [m.as_dict() for m in results.messages] == expected_messages
+    assert [m.as_dict() for m in messages] == expected_messages
 
 
 def test_messages_with_implicit_header():
@@ -274,9 +307,9 @@ def test_messages_with_implicit_header():
                          {'content': 'Hello\n',
                           'name': 'assistant'}]
 
-    results = messages_parser().parseString(input)
+    messages = parse_messages(input)
 
-    assert [m.as_dict() for m in results.messages] == expected_messages
+    assert [m.as_dict() for m in messages] == expected_messages
 
 
 def test_messages_with_no_line_end():
@@ -290,9 +323,9 @@ def test_messages_with_no_line_end():
                          {'content': 'Hello',
                           'name': 'alice'}]
 
-    results = messages_parser().parseString(input)
+    messages = parse_messages(input)
 
-    assert [m.as_dict() for m in results.messages] == expected_messages
+    assert [m.as_dict() for m in messages] == expected_messages
 
 
 def test_messages_parser_multiple_messages():
@@ -310,9 +343,9 @@ def test_messages_parser_multiple_messages():
         This is a reply.
         """)
 
-    results = messages_parser().parseString(input)
+    messages = parse_messages(input)
 
-    assert [m.as_dict() for m in results.messages] == [
+    assert [m.as_dict() for m in messages] == [
         {'content': 'Hello, assistant!\n\nThis is a multiline message.\n\n',
          'name': 'user'},
         {'content': 'Hi, user!\n\nThis is the response.\n\n', 'name': 'assistant'},
@@ -366,8 +399,8 @@ def test_messages_parser_with_multiple_tool_calls():
                               }
                           ]}]
 
-    results = messages_parser().parseString(input)
-    parsed_messages = [m.as_dict() for m in results.messages]
+    messages = parse_messages(input)
+    parsed_messages = [m.as_dict() for m in messages]
 
     assert parsed_messages == expected_messages
 
@@ -417,8 +450,8 @@ def test_messages_parser_with_tool_execution():
         }
     ]
 
-    results = messages_parser().parseString(input)
-    parsed_messages = [m.as_dict() for m in results.messages]
+    messages = parse_messages(input)
+    parsed_messages = [m.as_dict() for m in messages]
 
     assert parsed_messages == expected_messages
 
@@ -499,8 +532,8 @@ def test_messages_parser_with_multiple_tool_executions():
         }
     ]
 
-    results = messages_parser().parseString(input)
-    parsed_messages = [m.as_dict() for m in results.messages]
+    messages = parse_messages(input)
+    parsed_messages = [m.as_dict() for m in messages]
 
     assert parsed_messages == expected_messages
 
@@ -550,8 +583,8 @@ def test_messages_parser_with_code_cell_execution():
         }
     ]
 
-    results = messages_parser().parseString(input)
-    parsed_messages = [m.as_dict() for m in results.messages]
+    messages = parse_messages(input)
+    parsed_messages = [m.as_dict() for m in messages]
 
     assert parsed_messages == expected_messages
 
@@ -567,9 +600,9 @@ def test_messages_parser_single_message_with_implicit_header():
     expected_messages = [{'content': 'Hello, assistant!\n\nThis is a multiline message.\n\n',
                           'name': 'user'}]
 
-    results = messages_parser().parseString(input)
+    messages = parse_messages(input)
 
-    assert [m.as_dict() for m in results.messages] == expected_messages
+    assert [m.as_dict() for m in messages] == expected_messages
 
 
 def test_messages_parser_with_false_header_in_code_cell():
@@ -602,8 +635,8 @@ def test_messages_parser_with_false_header_in_code_cell():
         }
     ]
 
-    results = messages_parser().parseString(input)
-    parsed_messages = [m.as_dict() for m in results.messages]
+    messages = parse_messages(input)
+    parsed_messages = [m.as_dict() for m in messages]
 
     assert parsed_messages == expected_messages
 
@@ -640,8 +673,8 @@ def test_messages_parser_with_code_cell():
         }
     ]
 
-    results = messages_parser().parseString(input)
-    parsed_messages = [m.as_dict() for m in results.messages]
+    messages = parse_messages(input)
+    parsed_messages = [m.as_dict() for m in messages]
 
     assert parsed_messages == expected_messages
 
@@ -665,8 +698,8 @@ def test_messages_parser_code_cell_only_message():
         }
     ]
 
-    results = messages_parser().parseString(input)
-    parsed_messages = [m.as_dict() for m in results.messages]
+    messages = parse_messages(input)
+    parsed_messages = [m.as_dict() for m in messages]
 
     assert parsed_messages == expected_messages
 
@@ -690,8 +723,8 @@ def test_messages_parser_code_cell_with_no_new_line():
         }
     ]
 
-    results = messages_parser().parseString(input)
-    parsed_messages = [m.as_dict() for m in results.messages]
+    messages = parse_messages(input)
+    parsed_messages = [m.as_dict() for m in messages]
 
     assert parsed_messages == expected_messages
 
@@ -714,8 +747,8 @@ def test_messages_parser_code_cell_with_no_language():
         }
     ]
 
-    results = messages_parser().parseString(input)
-    parsed_messages = [m.as_dict() for m in results.messages]
+    messages = parse_messages(input)
+    parsed_messages = [m.as_dict() for m in messages]
 
     assert parsed_messages == expected_messages
 
@@ -739,8 +772,8 @@ def test_messages_parser_nested_code_cells():
         }
     ]
 
-    results = messages_parser().parseString(input)
-    parsed_messages = [m.as_dict() for m in results.messages]
+    messages = parse_messages(input)
+    parsed_messages = [m.as_dict() for m in messages]
 
     assert parsed_messages == expected_messages
 
@@ -767,8 +800,8 @@ def test_messages_parser_with_false_header_in_pre_tag():
         }
     ]
 
-    results = messages_parser().parseString(input)
-    parsed_messages = [m.as_dict() for m in results.messages]
+    messages = parse_messages(input)
+    parsed_messages = [m.as_dict() for m in messages]
 
     assert parsed_messages == expected_messages
 
@@ -783,8 +816,8 @@ def test_messages_parser_with_partial_code_cell():
         def hello():
         ''')
 
-    results = messages_parser().parseString(input)
-    parsed_messages = [m.as_dict() for m in results.messages]
+    messages = parse_messages(input)
+    parsed_messages = [m.as_dict() for m in messages]
 
     assert parsed_messages[0] == {
         'name': 'user',
@@ -806,8 +839,8 @@ def test_messages_parser_with_partial_pre_tag():
         some content
         ''')
 
-    results = messages_parser().parseString(input)
-    parsed_messages = [m.as_dict() for m in results.messages]
+    messages = parse_messages(input)
+    parsed_messages = [m.as_dict() for m in messages]
 
     assert len(parsed_messages) == 2
     assert parsed_messages[0] == {
@@ -855,8 +888,8 @@ def test_messages_parser_with_markdown_comments():
         }
     ]
 
-    results = messages_parser().parseString(input)
-    parsed_messages = [m.as_dict() for m in results.messages]
+    messages = parse_messages(input)
+    parsed_messages = [m.as_dict() for m in messages]
 
     assert parsed_messages == expected_messages
 
@@ -876,8 +909,8 @@ def test_messages_parser_simple_metadata():
         }
     ]
 
-    results = messages_parser().parseString(input)
-    parsed_messages = [m.as_dict() for m in results.messages]
+    messages = parse_messages(input)
+    parsed_messages = [m.as_dict() for m in messages]
 
     assert parsed_messages == expected_messages
 
@@ -890,7 +923,7 @@ def test_messages_parser_invalid_metadata():
         ''')
 
     with pytest.raises(ValueError):
-        messages_parser().parseString(input)
+        parse_messages(input)
 
 
 def test_messages_parser_with_mixed_metadata():
@@ -911,8 +944,8 @@ def test_messages_parser_with_mixed_metadata():
         }
     ]
 
-    results = messages_parser().parseString(input)
-    parsed_messages = [m.as_dict() for m in results.messages]
+    messages = parse_messages(input)
+    parsed_messages = [m.as_dict() for m in messages]
 
     assert parsed_messages == expected_messages
 
@@ -940,8 +973,8 @@ def test_messages_parser_with_complex_metadata():
         }
     ]
 
-    results = messages_parser().parseString(input)
-    parsed_messages = [m.as_dict() for m in results.messages]
+    messages = parse_messages(input)
+    parsed_messages = [m.as_dict() for m in messages]
 
     assert parsed_messages == expected_messages
 
@@ -960,8 +993,8 @@ def test_messages_parser_with_html_entities_in_pre_tag():
         </pre>
         ''')
 
-    results = messages_parser().parseString(input)
-    parsed_messages = [m.as_dict() for m in results.messages]
+    messages = parse_messages(input)
+    parsed_messages = [m.as_dict() for m in messages]
 
     # Get the content of the first (and only) message
     content = parsed_messages[0]['content']
@@ -994,8 +1027,8 @@ def test_messages_parser_with_pre_tag_between_messages():
         **assistant>** Second message.
         ''')
 
-    results = messages_parser().parseString(input)
-    parsed_messages = [m.as_dict() for m in results.messages]
+    messages = parse_messages(input)
+    parsed_messages = [m.as_dict() for m in messages]
 
     # Should have 2 messages
     assert len(parsed_messages) == 2
@@ -1014,8 +1047,8 @@ def test_messages_parser_with_closing_pre_tag_before_header():
         **assistant>** Next message.
         ''')
 
-    results = messages_parser().parseString(input)
-    parsed_messages = [m.as_dict() for m in results.messages]
+    messages = parse_messages(input)
+    parsed_messages = [m.as_dict() for m in messages]
 
     # Should have 2 messages
     assert len(parsed_messages) == 2
@@ -1044,8 +1077,8 @@ def test_messages_parser_with_html_meta_tags():
         }
     ]
 
-    results = messages_parser().parseString(input)
-    parsed_messages = [m.as_dict() for m in results.messages]
+    messages = parse_messages(input)
+    parsed_messages = [m.as_dict() for m in messages]
 
     assert parsed_messages == expected_messages
 
@@ -1073,8 +1106,8 @@ def test_messages_parser_with_mixed_meta_formats():
         }
     ]
 
-    results = messages_parser().parseString(input)
-    parsed_messages = [m.as_dict() for m in results.messages]
+    messages = parse_messages(input)
+    parsed_messages = [m.as_dict() for m in messages]
 
     assert parsed_messages == expected_messages
 
@@ -1100,8 +1133,8 @@ def test_messages_parser_html_meta_in_code_block():
         }
     ]
 
-    results = messages_parser().parseString(input)
-    parsed_messages = [m.as_dict() for m in results.messages]
+    messages = parse_messages(input)
+    parsed_messages = [m.as_dict() for m in messages]
 
     assert parsed_messages == expected_messages
 
@@ -1127,8 +1160,8 @@ def test_messages_parser_html_meta_in_pre_tag():
         }
     ]
 
-    results = messages_parser().parseString(input)
-    parsed_messages = [m.as_dict() for m in results.messages]
+    messages = parse_messages(input)
+    parsed_messages = [m.as_dict() for m in messages]
 
     assert parsed_messages == expected_messages
 
@@ -1163,7 +1196,7 @@ def test_messages_parser_multiple_messages_with_html_meta():
         }
     ]
 
-    results = messages_parser().parseString(input)
-    parsed_messages = [m.as_dict() for m in results.messages]
+    messages = parse_messages(input)
+    parsed_messages = [m.as_dict() for m in messages]
 
     assert parsed_messages == expected_messages
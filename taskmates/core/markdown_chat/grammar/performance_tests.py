@@ -1,10 +1,15 @@
+import statistics
 import textwrap
+import time
 import timeit
 
 import pyparsing as pp
 import pytest
 
+from taskmates.core.markdown_chat.grammar.compiled_parser import compiled_parser, compiled_parsers
+from taskmates.core.markdown_chat.grammar.markdown_chat_scanner import MarkdownChatScanner
 from taskmates.core.markdown_chat.grammar.parsers.markdown_chat_parser import markdown_chat_parser
+from taskmates.core.markdown_chat.incremental_chat_parser import IncrementalChatParser
 from taskmates.lib.openai_.count_tokens import count_tokens
 from taskmates.core.markdown_chat.grammar.profiling import profile_parser, print_profile_report
 
@@ -78,11 +83,27 @@ def test_performance():
         </pre>
         """)
 
+    input_string = generate_input_string(partial)
+    construction_time = timeit.timeit(markdown_chat_parser, number=1)
     parser = markdown_chat_parser()
+
     with profile_parser(parser):
-        parser.parseString(generate_input_string(partial))
+        execution_time = timeit.timeit(lambda: parser.parseString(input_string), number=1)
+
+    print(f"Mixed messages construction time: {construction_time:.4f} seconds, parsing time: {execution_time:.4f} seconds")
     print_profile_report("test_performance")
 
+@pytest.mark.timeout(5)
+@pytest.mark.xdist_group(name="performance")
+def test_performance_compiled_parser():
+    compiled_parsers.clear()
+
+    construction_time = timeit.timeit(lambda: compiled_parser(markdown_chat_parser), number=1)
+    lookup_time = timeit.timeit(lambda: compiled_parser(markdown_chat_parser), number=100) / 100
+
+    print(f"Compiled parser construction time: {construction_time:.6f} seconds, lookup time: {lookup_time:.6f} seconds")
+    assert lookup_time < construction_time / 100, f"Compiled parser lookup took too long: {lookup_time:.6f} seconds"
+
 @pytest.mark.timeout(5)
 @pytest.mark.xdist_group(name="performance")
 def test_performance_single_lines():
@@ -91,12 +112,13 @@ def test_performance_single_lines():
     """)
 
     input_string = generate_input_string(partial)
+    construction_time = timeit.timeit(markdown_chat_parser, number=1)
     parser = markdown_chat_parser()
 
     with profile_parser(parser):
         execution_time = timeit.timeit(lambda: parser.parseString(input_string), number=1)
 
-    print(f"Single lines message parsing time: {execution_time:.4f} seconds")
+    print(f"Single lines message construction time: {construction_time:.4f} seconds, parsing time: {execution_time:.4f} seconds")
     print_profile_report("test_performance_single_lines")
     assert execution_time < 0.6, f"Parsing took too long: {execution_time:.4f} seconds"
 
@@ -108,12 +130,13 @@ def test_performance_long_lines():
     """)
 
     input_string = generate_input_string(partial)
+    construction_time = timeit.timeit(markdown_chat_parser, number=1)
     parser = markdown_chat_parser()
 
     with profile_parser(parser):
         execution_time = timeit.timeit(lambda: parser.parseString(input_string), number=1)
 
-    print(f"Long lines message parsing time: {execution_time:.4f} seconds")
+    print(f"Long lines message construction time: {construction_time:.4f} seconds, parsing time: {execution_time:.4f} seconds")
     print_profile_report("test_performance_long_lines")
     assert execution_time < 0.6, f"Parsing took too long: {execution_time:.4f} seconds"
 
@@ -126,12 +149,13 @@ def test_performance_single_lines_plus_new_line():
     """)
 
     input_string = generate_input_string(partial)
+    construction_time = timeit.timeit(markdown_chat_parser, number=1)
     parser = markdown_chat_parser()
 
     with profile_parser(parser):
         execution_time = timeit.timeit(lambda: parser.parseString(input_string), number=1)
 
-    print(f"Single lines plus new line message parsing time: {execution_time:.4f} seconds")
+    print(f"Single lines plus new line message construction time: {construction_time:.4f} seconds, parsing time: {execution_time:.4f} seconds")
     print_profile_report("test_performance_single_lines_plus_new_line")
     assert execution_time < 0.6, f"Parsing took too long: {execution_time:.4f} seconds"
 
@@ -144,12 +168,13 @@ def test_performance_line_break_plus_message():
     """)
 
     input_string = generate_input_string(partial)
+    construction_time = timeit.timeit(markdown_chat_parser, number=1)
     parser = markdown_chat_parser()
 
     with profile_parser(parser):
         execution_time = timeit.timeit(lambda: parser.parseString(input_string), number=1)
 
-    print(f"Line break plus message parsing time: {execution_time:.4f} seconds")
+    print(f"Line break plus message construction time: {construction_time:.4f} seconds, parsing time: {execution_time:.4f} seconds")
     print_profile_report("test_performance_line_break_plus_message")
     assert execution_time < 0.6, f"Parsing took too long: {execution_time:.4f} seconds"
 
@@ -164,12 +189,13 @@ def test_performance_multiple_lines():
     """)
 
     input_string = generate_input_string(partial)
+    construction_time = timeit.timeit(markdown_chat_parser, number=1)
     parser = markdown_chat_parser()
 
     with profile_parser(parser):
         execution_time = timeit.timeit(lambda: parser.parseString(input_string), number=1)
 
-    print(f"Multiple lines message parsing time: {execution_time:.4f} seconds")
+    print(f"Multiple lines message construction time: {construction_time:.4f} seconds, parsing time: {execution_time:.4f} seconds")
     print_profile_report("test_performance_multiple_lines")
     assert execution_time < 0.6, f"Parsing took too long: {execution_time:.4f} seconds"
 
@@ -206,12 +232,13 @@ def test_performance_tool_calls():
     """)
 
     input_string = generate_input_string(partial)
+    construction_time = timeit.timeit(markdown_chat_parser, number=1)
     parser = markdown_chat_parser()
 
     with profile_parser(parser):
         execution_time = timeit.timeit(lambda: parser.parseString(input_string), number=1)
 
-    print(f"Tool calls message parsing time: {execution_time:.4f} seconds")
+    print(f"Tool calls message construction time: {construction_time:.4f} seconds, parsing time: {execution_time:.4f} seconds")
     print_profile_report("test_performance_tool_calls")
     assert execution_time < 0.6, f"Parsing took too long: {execution_time:.4f} seconds"
 
@@ -233,15 +260,133 @@ def test_performance_code_cells():
     """)
 
     input_string = generate_input_string(partial)
+    construction_time = timeit.timeit(markdown_chat_parser, number=1)
     parser = markdown_chat_parser()
 
     with profile_parser(parser):
         execution_time = timeit.timeit(lambda: parser.parseString(input_string), number=1)
 
-    print(f"Code cells message parsing time: {execution_time:.4f} seconds")
+    print(f"Code cells message construction time: {construction_time:.4f} seconds, parsing time: {execution_time:.4f} seconds")
     print_profile_report("test_performance_code_cells")
     assert execution_time < 0.6, f"Parsing took too long: {execution_time:.4f} seconds"
 
+@pytest.mark.timeout(120)
+@pytest.mark.xdist_group(name="performance")
+def test_performance_incremental_parse(tmp_path):
+    partial = textwrap.dedent("""\
+    **user>** Show me the files
+
+    **assistant>** Listing them.
+
+    ###### Steps
+
+    - Run Shell Command [1] `{"cmd":"ls -l"}`
+
+    ###### Execution: Run Shell Command [1]
+
+    <pre class='output' style='display:none'>
+    """) + "-rw-r--r--  1 user user 4096 Jan  1 00:00 file.txt\n" * 250 + textwrap.dedent("""\
+
+    Exit Code: 0
+    </pre>
+
+    -[x] Done
+
+    """)
+    steps = ["**assistant>** ", "This is ", "a streamed ", "response.\n\n", "**user>** Next question\n\n"] * 10
+    markdown_path = tmp_path / "chat.md"
+
+    def measure(size):
+        input_string = repeat_to_size(partial, size)
+        chat_parser = IncrementalChatParser()
+        start = time.perf_counter()
+        chat_parser.parse(input_string, markdown_path)
+        full_parse_time = time.perf_counter() - start
+
+        step_times = []
+        for step in steps:
+            input_string += step
+            start = time.perf_counter()
+            chat_parser.parse(input_string, markdown_path)
+            step_times.append(time.perf_counter() - start)
+        return full_parse_time, statistics.median(step_times)
+
+    small_full_time, small_step_time = measure(256 * 1024)
+    full_time, step_time = measure(2 * 1024 * 1024)
+
+    print(f"Incremental parsing time: full {small_full_time:.4f}/{full_time:.4f} seconds, "
+          f"per step {small_step_time * 1000:.3f}/{step_time * 1000:.3f} ms at 0.25/2 MB")
+    assert step_time < full_time / 1000, f"Incremental parsing took too long: {step_time:.4f} seconds"
+    # Flat: only the tail is parsed and built, the rest is a comparison and a copy of each message
+    assert step_time < small_step_time * 4, \
+        f"Incremental parsing slowed down as the chat grew: {small_step_time:.4f} -> {step_time:.4f} seconds"
+
+@pytest.mark.timeout(120)
+@pytest.mark.xdist_group(name="performance")
+def test_performance_scanner():
+    partial = textwrap.dedent("""\
+    **user>** This is a message with multiple lines.
+    This is a message with multiple lines.
+
+    **assistant>** This is a message with tool calls.
+
+    ###### Steps
+
+    - Run Shell Command [1] `{"cmd":"echo hello"}`
+
+    ###### Execution: Run Shell Command [1]
+
+    <pre class='output' style='display:none'>
+    hello
+
+    Exit Code: 0
+    </pre>
+
+    -[x] Done
+
+    **user>** This is a message with code cells
+
+    ```python .eval
+    print("hello")
+    ```
+
+    ###### Cell Output: stdout [cell_0]
+
+    <pre>
+    hello
+    </pre>
+
+    """)
+
+    parser = compiled_parser(markdown_chat_parser)
+    scanner = MarkdownChatScanner()
+    small_string = repeat_to_size(partial, 256 * 1024)
+    input_string = repeat_to_size(partial, 2 * 1024 * 1024)
+
+    small_time = min(timeit.repeat(lambda: scanner.parse_string(small_string), number=1, repeat=3))
+    scanner_time = min(timeit.repeat(lambda: scanner.parse_string(input_string), number=1, repeat=3))
+    start = time.perf_counter()
+    parsed = parser.parse_string(input_string)
+    pyparsing_time = time.perf_counter() - start
+    assert scanner.parse_string(input_string)[0].as_dict() == parsed[0].as_dict()
+
+    def throughput(string, seconds):
+        return len(string) / seconds / 1e6
+
+    print(f"Parsing throughput at {len(input_string) / 1e6:.1f} MB: "
+          f"pyparsing {throughput(input_string, pyparsing_time):.2f} MB/s, "
+          f"scanner {throughput(input_string, scanner_time):.2f} MB/s "
+          f"({throughput(small_string, small_time):.2f} MB/s at {len(small_string) / 1e6:.1f} MB)")
+    assert scanner_time < pyparsing_time / 10, f"Scanner took too long: {scanner_time:.4f} seconds"
+    # Linear: the throughput doesn't drop as the chat grows
+    assert throughput(input_string, scanner_time) > throughput(small_string, small_time) / 1.5, \
+        "Scanner slowed down as the chat grew"
+
+
+def repeat_to_size(base_string: str, size: int) -> str:
+    return base_string * (size // len(base_string) + 1)
+
+
 def generate_input_string(base_string: str, target_token_count: int = 10_000) -> str:
     result = ""
     current_token_count = 0
@@ -0,0 +1,343 @@
+import copy
+import random
+import textwrap
+from pathlib import Path
+from typing import Tuple, List, Dict, Union
+
+import pyparsing
+import pytest
+
+from taskmates.core.markdown_chat.grammar.parser_backend import located_chat_parser
+from taskmates.core.markdown_chat.grammar.parsers.messages_parser import MessageNode
+from taskmates.core.markdown_chat.parse_front_matter_and_messages import parse_front_matter_and_messages, \
+    resolve_markdown_path, parse_markdown, build_message, deduplicate_messages
+from taskmates.lib.markdown_.transclusion_cache import Dependencies, recording_dependencies
+from taskmates.lib.typeguard_.typechecked import typechecked
+from taskmates.logging import logger
+
+
+@typechecked
+class IncrementalChatParser:
+    """
+    Parses a markdown chat that only grows by appending, such as the transcript collected by
+    `MarkdownChatDaemon` during a completion.
+
+    The parsed messages of the previous call are kept together with their offsets. When the new
+    content extends the previous one, everything before the start of the last message (its
+    `**name>**` header) is stable, so only the tail from that header onwards is parsed again.
+    Any other change falls back to a full parse.
+
+    The message built from each node, with its transclusions and images rendered, is kept as
+    well, and only rebuilt when it is part of the tail or a file it depends on changed. Since the
+    content before the tail is unchanged, the span and the text of a stable message are too. The
+    results are identical to a full parse. The messages returned are shallow copies of the kept
+    ones: callers may set their keys, but must not mutate the values nested in them.
+    """
+
+    def __init__(self):
+        self.raw_content: str | None = None
+        self.content: str | None = None
+        self.path: Path | None = None
+        self.implicit_role: str | None = None
+        self.front_matter: dict = {}
+        self.located_messages: list[tuple[int, MessageNode]] = []
+        # the messages built from `located_messages`, and the files the ones with transclusions depend on
+        self.built_messages: list[dict] = []
+        self.built_dependencies: dict[int, Dependencies] = {}
+        # the built messages kept by `deduplicate_messages`, out of the first `deduplicated_count` ones
+        self.deduplicated_messages: list[dict] = []
+        self.deduplicated_count: int = 0
+
+    def parse(self, content: str,
+              path: Union[str, Path] | None,
+              implicit_role: str = "user") -> Tuple[
+        Dict[str, any],
+        List[Dict[str, Union[str, list[dict]]]]
+    ]:
+        path = resolve_markdown_path(path)
+        raw_content = content
+        extends = self.raw_content is not None and raw_content.startswith(self.raw_content)
+        # the offsets of the parsed messages are positions in the content with its tabs expanded
+        content = self._expand_tabs(raw_content, extends)
+
+        try:
+            if extends and self._can_resume(path, implicit_role):
+                located_messages = self._parse_tail(content, path, implicit_role)
+            else:
+                located_messages = self._parse_full(content, path, implicit_role)
+            self._build_messages(located_messages, path)
+        except Exception:
+            self.reset()
+            raise
+
+        self.raw_content = raw_content
+        self.content = content
+        self.path = path
+        self.implicit_role = implicit_role
+        self.located_messages = located_messages
+
+        front_matter = copy.deepcopy(self.front_matter)
+        messages = [{"role": "system", "content": front_matter['system']}] if 'system' in front_matter else []
+        messages += map(dict, self.deduplicated_messages)
+        messages += deduplicate_messages(list(map(dict, self.built_messages[self.deduplicated_count:])))
+        return front_matter, messages
+
+    def reset(self):
+        self.raw_content = None
+        self.content = None
+        self.path = None
+        self.implicit_role = None
+        self.front_matter = {}
+        self.located_messages = []
+        self.built_messages = []
+        self.built_dependencies = {}
+        self.deduplicated_messages = []
+        self.deduplicated_count = 0
+
+    @property
+    def tail_start(self) -> int:
+        if not self.located_messages:
+            return 0
+        return self.located_messages[-1][0]
+
+    def _expand_tabs(self, content: str, extends: bool) -> str:
+        """`content.expandtabs()`, only expanding what was appended when `content` extends the previous one."""
+        if not extends:
+            return content.expandtabs() if "\t" in content else content
+        if self.content is self.raw_content and "\t" not in content[len(self.raw_content):]:
+            return content
+        # the columns of the tabs depend on their line only
+        raw_line_start = self.raw_content.rfind("\n") + 1
+        line_start = self.content.rfind("\n") + 1
+        return self.content[:line_start] + content[raw_line_start:].expandtabs()
+
+    def _can_resume(self, path: Path, implicit_role: str) -> bool:
+        # the content extends the previous one, and so does its expansion
+        return (path == self.path
+                and implicit_role == self.implicit_role
+                and self.tail_start > 0)
+
+    def _parse_full(self, content: str, path: Path, implicit_role: str) -> list[tuple[int, MessageNode]]:
+        parser = located_chat_parser(implicit_role=implicit_role)
+        front_matter, located_messages = parse_markdown(parser, content, path)
+        self.front_matter = front_matter or {}
+        self.built_messages = []
+        self.built_dependencies = {}
+        self.deduplicated_messages = []
+        self.deduplicated_count = 0
+        return located_messages
+
+    def _parse_tail(self, content: str, path: Path, implicit_role: str) -> list[tuple[int, MessageNode]]:
+        tail_start = self.tail_start
+        parser = located_chat_parser(implicit_role=implicit_role, front_matter=False)
+        try:
+            _, tail_messages = parser.parse_string(content[tail_start:])
+        except pyparsing.exceptions.ParseBaseException:
+            logger.debug("[IncrementalChatParser] Failed to parse the tail, falling back to a full parse")
+            return self._parse_full(content, path, implicit_role)
+        stable_count = len(self.located_messages) - 1
+        del self.built_messages[stable_count:]
+        self.built_dependencies.pop(stable_count, None)
+        return self.located_messages[:-1] + [(tail_start + offset, node) for offset, node in tail_messages]
+
+    def _build_messages(self, located_messages: list[tuple[int, MessageNode]], path: Path):
+        for index, dependencies in list(self.built_dependencies.items()):
+            if not dependencies.is_current():
+                self._build_message(index, located_messages[index][1], path)
+                if index <= self.deduplicated_count:
+                    self.deduplicated_messages = []
+                    self.deduplicated_count = 0
+        for index in range(len(self.built_messages), len(located_messages)):
+            self.built_messages.append({})
+            self._build_message(index, located_messages[index][1], path)
+
+        # Whether a message is a duplicate depends on the next one, so only the messages followed by one
+        # that stays stable in the next call are deduplicated once and for all
+        deduplicated_count = len(self.built_messages) - 2
+        if deduplicated_count > self.deduplicated_count:
+            # the last message of the slice is only there as the next one of the message before it
+            self.deduplicated_messages += deduplicate_messages(
+                self.built_messages[self.deduplicated_count:deduplicated_count + 1])[:-1]
+            self.deduplicated_count = deduplicated_count
+
+    def _build_message(self, index: int, node: MessageNode, path: Path):
+        with recording_dependencies() as dependencies:
+            self.built_messages[index] = build_message(node, path)
+        if dependencies:
+            self.built_dependencies[index] = dependencies
+        else:
+            self.built_dependencies.pop(index, None)
+
+
+def test_incremental_parse_resumes_from_last_header(tmp_path, parser_backend):
+    chat_parser = IncrementalChatParser()
+    content = "**user>** Hello\n\n**assistant>** Hi"
+    chat_parser.parse(content, tmp_path / "chat.md")
+
+    assert chat_parser.tail_start == len("**user>** Hello\n\n")
+
+    content += " there\n\n**user>** How are you?\n"
+    front_matter, messages = chat_parser.parse(content, tmp_path / "chat.md")
+
+    assert messages == [
+        {'role': 'user', 'name': 'user', 'content': 'Hello\n\n'},
+        {'role': 'assistant', 'name': 'assistant', 'content': 'Hi there\n\n'},
+        {'role': 'user', 'name': 'user', 'content': 'How are you?\n'},
+    ]
+    assert chat_parser.tail_start == len("**user>** Hello\n\n**assistant>** Hi there\n\n")
+
+
+def test_incremental_parse_falls_back_to_full_parse_when_content_changes(tmp_path):
+    chat_parser = IncrementalChatParser()
+    chat_parser.parse("**user>** Hello\n\n**assistant>** Hi\n", tmp_path / "chat.md")
+
+    front_matter, messages = chat_parser.parse("**user>** Bye\n", tmp_path / "chat.md")
+
+    assert messages == [{'role': 'user', 'name': 'user', 'content': 'Bye\n'}]
+
+
+def test_incremental_parse_keeps_front_matter(tmp_path):
+    chat_parser = IncrementalChatParser()
+    content = "---\nsystem: Be brief\n---\n\n**user>** Hello\n\n**assistant>** "
+    chat_parser.parse(content, tmp_path / "chat.md")
+
+    front_matter, messages = chat_parser.parse(content + "Hi\n", tmp_path / "chat.md")
+    front_matter["system"] = "mutated"
+
+    assert chat_parser.parse(content + "Hi\n", tmp_path / "chat.md") == \
+           parse_front_matter_and_messages(content + "Hi\n", tmp_path / "chat.md")
+
+
+def test_incremental_parse_closing_an_unterminated_code_cell(tmp_path):
+    chat_parser = IncrementalChatParser()
+    content = "**user>** Hello\n\n**assistant>** Here:\n\n```python .eval\nprint(1)\n"
+    chat_parser.parse(content, tmp_path / "chat.md")
+
+    content += "```\n\n**user>** Thanks\n"
+
+    assert chat_parser.parse(content, tmp_path / "chat.md") == \
+           parse_front_matter_and_messages(content, tmp_path / "chat.md")
+
+
+def test_incremental_parse_raises_like_full_parse(tmp_path):
+    chat_parser = IncrementalChatParser()
+    content = "**user>** Hello\n\n**assistant>** Hi\n\n"
+    chat_parser.parse(content, tmp_path / "chat.md")
+
+    content += "###### Execution: Run Shell Command [x\n"
+
+    with pytest.raises(pyparsing.exceptions.ParseBaseException):
+        parse_front_matter_and_messages(content, tmp_path / "chat.md")
+    with pytest.raises(pyparsing.exceptions.ParseBaseException):
+        chat_parser.parse(content, tmp_path / "chat.md")
+    assert chat_parser.content is None
+
+
+def test_incremental_parse_builds_only_the_tail(tmp_path, monkeypatch):
+    import taskmates.core.markdown_chat.incremental_chat_parser as incremental_chat_parser
+
+    built = []
+    original_build_message = incremental_chat_parser.build_message
+
+    def counting_build_message(node, path):
+        built.append(node.name)
+        return original_build_message(node, path)
+
+    monkeypatch.setattr(incremental_chat_parser, "build_message", counting_build_message)
+    chat_parser = IncrementalChatParser()
+    content = "**user>** Hello\n\n**assistant>** Hi\n\n**user>** How are you?\n\n**assistant>** "
+    chat_parser.parse(content, tmp_path / "chat.md")
+    built.clear()
+
+    for step in ["Fine", ", thanks.\n\n", "**user>** Good\n"]:
+        content += step
+        chat_parser.parse(content, tmp_path / "chat.md")
+
+    assert built == ["assistant", "assistant", "assistant", "user"]
+
+
+def test_incremental_parse_rebuilds_messages_whose_transclusions_changed(tmp_path):
+    (tmp_path / "notes.md").write_text("first version\n")
+    chat_parser = IncrementalChatParser()
+    content = "**user>** Read this:\n\n![[notes.md]]\n\n**assistant>** "
+    chat_parser.parse(content, tmp_path / "chat.md")
+
+    (tmp_path / "notes.md").write_text("second version\n")
+    content += "Done\n"
+
+    front_matter, messages = chat_parser.parse(content, tmp_path / "chat.md")
+    assert "second version" in messages[0]["content"]
+    assert (front_matter, messages) == parse_front_matter_and_messages(content, tmp_path / "chat.md")
+
+
+def test_incremental_parse_returns_messages_the_caller_can_update(tmp_path):
+    chat_parser = IncrementalChatParser()
+    content = "**user>** Hello\n\n**assistant>** Hi\n\n**user>** "
+    front_matter, messages = chat_parser.parse(content, tmp_path / "chat.md")
+    for message in messages:
+        message["role"] = "mutated"
+        message["recipient"] = "someone"
+
+    content += "Bye\n"
+
+    assert chat_parser.parse(content, tmp_path / "chat.md") == \
+           parse_front_matter_and_messages(content, tmp_path / "chat.md")
+
+
+STEP_FRAGMENTS = [
+    "**user>** Hello @assistant\n\n",
+    "**assistant>** ",
+    "Sure, ",
+    "let me check.\n\n",
+    "###### Steps\n\n- Run Shell Command [1] `{\"cmd\": \"ls\"}`\n\n",
+    "###### Execution: Run Shell Command [1]\n\n",
+    "<pre class='output' style='display:none'>\nfile.txt\n",
+    "**user>** inside pre\n",
+    "</pre>\n\n",
+    "**assistant>** Here is some code:\n\n",
+    "```python .eval\nprint(1 + 1)\n",
+    "**assistant>** inside code\n",
+    "```\n\n",
+    "###### Cell Output: stdout [cell_0]\n\n<pre>\n2\n</pre>\n\n",
+    "[//]: # (meta:temperature = 0.7)\n",
+    "<meta name=\"foo\" content=\"bar\" />\n",
+    "**john {\"name\": \"john\"}>** ",
+    "Hello\n\n",
+    "**assistant>** Duplicate\n\n**assistant>** Duplicate\n\n",
+    "plain text without header\n",
+    "\tindented\twith tabs\n",
+    "col\t",
+]
+
+
+def test_incremental_parse_matches_full_parse(tmp_path, parser_backend):
+    rng = random.Random(0)
+
+    for _ in range(10):
+        chat_parser = IncrementalChatParser()
+        content = rng.choice(["", "---\nkey: value\n---\n\n", "Implicit first message\n\n"])
+
+        for _ in range(20):
+            content += rng.choice(STEP_FRAGMENTS)
+            try:
+                expected = parse_front_matter_and_messages(content, tmp_path / "chat.md")
+            except pyparsing.exceptions.ParseBaseException:
+                with pytest.raises(pyparsing.exceptions.ParseBaseException):
+                    chat_parser.parse(content, tmp_path / "chat.md")
+                continue
+            assert chat_parser.parse(content, tmp_path / "chat.md") == expected, content
+
+
+def test_incremental_parse_with_system_implicit_role(tmp_path):
+    content = textwrap.dedent("""\
+        You are a helpful assistant.
+
+        **user>** Hello
+        """)
+    chat_parser = IncrementalChatParser()
+    chat_parser.parse(content, tmp_path / "chat.md", implicit_role="system")
+
+    content += "\n**assistant>** Hi\n"
+
+    assert chat_parser.parse(content, tmp_path / "chat.md", implicit_role="system") == \
+           parse_front_matter_and_messages(content, tmp_path / "chat.md", implicit_role="system")
@@ -1,25 +1,21 @@
-import copy
-import json
 
-from typeguard import typechecked
-
-from taskmates.lib.openai_.count_tokens import count_tokens
+from taskmates.lib.openai_.token_accounting import count_messages_tokens, is_token_estimation_enabled
+from taskmates.lib.typeguard_.typechecked import typechecked
 
 
 @typechecked
-def calculate_input_tokens(messages: list):
-    # Count images and prepare payload for token counting
-    images = 0
-    approximate_payload = copy.deepcopy(messages)
-    for message in approximate_payload:
-        if isinstance(message.get("content", None), list):
-            for part in message.get("content", []):
-                if part["type"] != "text":
-                    del part["image_url"]
-                    images += 1
+def calculate_input_tokens(messages: list, estimate: bool | None = None):
+    """
+    Approximates the input tokens of `messages`. With `estimate` (default: TASKMATES_TOKEN_COUNTING=estimate)
+    the tokens are estimated from the length of the messages instead of being counted.
+    """
+    if estimate is None:
+        estimate = is_token_estimation_enabled()
+
+    # Count images and tokens of the payload without them
+    input_tokens, images = count_messages_tokens(messages, estimate=estimate)
 
     # Calculate available tokens: context window - input tokens - image tokens - safety buffer
-    input_tokens = count_tokens(json.dumps(approximate_payload, ensure_ascii=False))
     image_tokens = images * 100
     safety_buffer = 200
 
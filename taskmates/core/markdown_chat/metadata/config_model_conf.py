@@ -1,9 +1,9 @@
 from typing import Union
 
-from typeguard import typechecked
 
 from taskmates.config.load_model_config import load_model_config
 from taskmates.defaults.settings import Settings
+from taskmates.lib.typeguard_.typechecked import typechecked
 
 
 @typechecked
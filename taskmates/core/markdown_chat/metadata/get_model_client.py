@@ -1,24 +1,215 @@
+import asyncio
 import importlib
 import os
+import threading
+import time
+import weakref
+from dataclasses import dataclass
+
 from langchain_core.language_models import BaseChatModel
-from typeguard import typechecked
+
+from taskmates.lib.typeguard_.typechecked import typechecked
+
+# Per-request parameters: applied to a shallow copy of the pooled client instead of being part of the pool key
+REQUEST_KWARGS = ("stop", "max_tokens")
+
+CLIENT_IDLE_TIMEOUT = float(os.environ.get("TASKMATES_CLIENT_IDLE_TIMEOUT", 300))
+
+
+@dataclass
+class PooledClient:
+    client: BaseChatModel
+    last_used: float
+
+
+class NoEventLoop:
+    pass
+
+
+NO_EVENT_LOOP = NoEventLoop()
+
+# The async HTTP connection pools of the clients are bound to the event loop they were created in,
+# so clients are pooled per event loop and dropped together with it.
+model_clients: weakref.WeakKeyDictionary[object, dict[tuple, PooledClient]] = weakref.WeakKeyDictionary()
+model_clients_lock = threading.Lock()
+model_client_counters = {"hits": 0, "misses": 0, "evictions": 0}
 
 
 @typechecked
 def get_model_client(model_conf: dict) -> BaseChatModel:
+    """
+    Returns a client for `model_conf`, reusing (and keeping the connections of) a pooled client built with the
+    same type and kwargs. `stop` and `max_tokens` are applied per request on a shallow copy of the pooled client,
+    which shares its HTTP clients. Clients idle for longer than TASKMATES_CLIENT_IDLE_TIMEOUT seconds are evicted.
+    """
     client_type = model_conf['client']['type']
     client_kwargs = model_conf['client'].get('kwargs', {}).copy()
 
-    # Dynamically import the class from the client_type string
-    module_path, class_name = client_type.rsplit(".", 1)
-    module = importlib.import_module(module_path)
-    llm_class = getattr(module, class_name)
-
     # Handle env: prefix for api_key
     if "api_key" in client_kwargs:
         api_key = client_kwargs["api_key"]
         if isinstance(api_key, str) and api_key.startswith('env:'):
             client_kwargs["api_key"] = os.getenv(api_key[4:])
 
-    # Instantiate and return the LLM
-    return llm_class(**client_kwargs)
+    llm_class = import_client_class(client_type)
+
+    # Request kwargs that aren't fields of the client are passed to its constructor, as any other kwarg
+    request_fields = {}
+    for key in REQUEST_KWARGS:
+        field_name = model_field_name(llm_class, key)
+        if key in client_kwargs and field_name is not None:
+            request_fields[field_name] = client_kwargs.pop(key)
+
+    try:
+        pool_key = (client_type, freeze(client_kwargs))
+    except TypeError:
+        with model_clients_lock:
+            model_client_counters["misses"] += 1
+        return llm_class(**client_kwargs).model_copy(update=request_fields)
+
+    pool = get_pool()
+    now = time.monotonic()
+    with model_clients_lock:
+        evict_idle_clients(pool, now)
+        pooled = pool.get(pool_key)
+        if pooled is not None:
+            model_client_counters["hits"] += 1
+            pooled.last_used = now
+
+    if pooled is None:
+        # Instantiate the LLM
+        client = llm_class(**client_kwargs)
+        with model_clients_lock:
+            model_client_counters["misses"] += 1
+            pooled = pool.setdefault(pool_key, PooledClient(client=client, last_used=now))
+
+    # A shallow copy: cheap, and it keeps the HTTP clients of the pooled client
+    return pooled.client.model_copy(update=request_fields)
+
+
+def import_client_class(client_type: str) -> type[BaseChatModel]:
+    # Dynamically import the class from the client_type string
+    module_path, class_name = client_type.rsplit(".", 1)
+    module = importlib.import_module(module_path)
+    return getattr(module, class_name)
+
+
+def model_field_name(llm_class: type[BaseChatModel], key: str) -> str | None:
+    fields = llm_class.model_fields
+    if key in fields:
+        return key
+    return next((name for name, field in fields.items() if field.alias == key), None)
+
+
+def freeze(value):
+    if isinstance(value, dict):
+        return tuple(sorted((key, freeze(item)) for key, item in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(item) for item in value)
+    hash(value)
+    return value
+
+
+def get_pool() -> dict[tuple, PooledClient]:
+    try:
+        event_loop = asyncio.get_running_loop()
+    except RuntimeError:
+        event_loop = NO_EVENT_LOOP
+    with model_clients_lock:
+        return model_clients.setdefault(event_loop, {})
+
+
+def evict_idle_clients(pool: dict[tuple, PooledClient], now: float):
+    for key, pooled in list(pool.items()):
+        if now - pooled.last_used > CLIENT_IDLE_TIMEOUT:
+            del pool[key]
+            model_client_counters["evictions"] += 1
+
+
+def get_model_client_stats() -> dict:
+    with model_clients_lock:
+        return {**model_client_counters, "pooled": sum(len(pool) for pool in model_clients.values())}
+
+
+def clear_model_clients():
+    with model_clients_lock:
+        model_clients.clear()
+
+
+FIXTURE_MODEL_CONF = {
+    "client": {
+        "type": "taskmates.core.workflows.markdown_completion.completions.llm_completion.testing"
+                ".fixture_chat_model.FixtureChatModel",
+        "kwargs": {"model": "fixture",
+                   "fixture_path": "tests/fixtures/api-responses/openai_streaming_response.jsonl"},
+    }
+}
+
+OTHER_FIXTURE_PATH = "tests/fixtures/api-responses/openai_non_streaming_response.json"
+
+
+def fixture_model_conf(**kwargs) -> dict:
+    return {"client": {**FIXTURE_MODEL_CONF["client"],
+                       "kwargs": {**FIXTURE_MODEL_CONF["client"]["kwargs"], **kwargs}}}
+
+
+def test_get_model_client_reuses_pooled_clients():
+    clear_model_clients()
+    stats = get_model_client_stats()
+
+    first = get_model_client(fixture_model_conf())
+    second = get_model_client(fixture_model_conf())
+    other = get_model_client(fixture_model_conf(fixture_path=OTHER_FIXTURE_PATH))
+
+    assert get_model_client_stats()["hits"] == stats["hits"] + 1
+    assert get_model_client_stats()["misses"] == stats["misses"] + 2
+    assert get_model_client_stats()["pooled"] == 2
+    assert first is not second
+    assert len(model_clients[NO_EVENT_LOOP]) == 2
+    assert other.fixture_path == OTHER_FIXTURE_PATH
+
+
+def test_get_model_client_binds_request_kwargs():
+    clear_model_clients()
+    from langchain_anthropic import ChatAnthropic
+    model_conf = {"client": {"type": "langchain_anthropic.ChatAnthropic",
+                             "kwargs": {"model": "claude-sonnet-4-5", "api_key": "test", "max_tokens": 100,
+                                        "stop": ["**user>**"]}}}
+
+    client = get_model_client(model_conf)
+    other = get_model_client({"client": {**model_conf["client"],
+                                         "kwargs": {**model_conf["client"]["kwargs"], "max_tokens": 200,
+                                                    "stop": None}}})
+
+    assert isinstance(client, ChatAnthropic)
+    assert (client.max_tokens, client.stop_sequences) == (100, ["**user>**"])
+    assert (other.max_tokens, other.stop_sequences) == (200, None)
+    assert len(model_clients[NO_EVENT_LOOP]) == 1
+
+
+def test_get_model_client_evicts_idle_clients(monkeypatch):
+    clear_model_clients()
+    evictions = get_model_client_stats()["evictions"]
+    get_model_client(fixture_model_conf())
+
+    monkeypatch.setattr(f"{__name__}.CLIENT_IDLE_TIMEOUT", -1)
+    get_model_client(fixture_model_conf(fixture_path=OTHER_FIXTURE_PATH))
+
+    assert get_model_client_stats()["evictions"] == evictions + 1
+    assert len(model_clients[NO_EVENT_LOOP]) == 1
+
+
+async def test_get_model_client_pools_per_event_loop():
+    clear_model_clients()
+    get_model_client(fixture_model_conf())
+
+    assert list(model_clients.keys()) == [asyncio.get_running_loop()]
+
+
+def test_get_model_client_with_unhashable_kwargs():
+    clear_model_clients()
+    misses = get_model_client_stats()["misses"]
+
+    get_model_client(fixture_model_conf(metadata={"tags": {1, 2}}))
+
+    assert get_model_client_stats()["misses"] == misses + 1
@@ -2,10 +2,10 @@ import datetime
 
 import jinja2
 from jinja2 import Environment
-from typeguard import typechecked
 
 from taskmates.core.markdown_chat.participants.compute_introduction_message import compute_introduction_message
 from taskmates.core.markdown_chat.participants.format_username_prompt import format_username_prompt
+from taskmates.lib.typeguard_.typechecked import typechecked
 
 
 @typechecked
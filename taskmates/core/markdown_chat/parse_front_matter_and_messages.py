@@ -2,18 +2,20 @@ import os
 import textwrap
 import time
 from pathlib import Path
-from typing import Tuple, List, Dict, Union
+from typing import Tuple, List, Dict, Union, Iterable
 
 import pyparsing
-from typeguard import typechecked
+import pytest
 
 from taskmates.core.chat.openai.get_text_content import get_text_content
 from taskmates.core.chat.openai.set_text_content import set_text_content
-from taskmates.core.markdown_chat.grammar.parsers.markdown_chat_parser import markdown_chat_parser
+from taskmates.core.markdown_chat.grammar.parser_backend import chat_parser
+from taskmates.core.markdown_chat.grammar.parsers.messages_parser import MessageNode
 from taskmates.core.markdown_chat.processing.process_image_transclusion import render_image_transclusion
 from taskmates.lib.digest_.get_digest import get_digest
 from taskmates.lib.markdown_.render_transclusions import render_transclusions
 from taskmates.lib.root_path.root_path import root_path
+from taskmates.lib.typeguard_.typechecked import typechecked
 from taskmates.logging import logger, file_logger
 
 
@@ -26,29 +28,36 @@ def parse_front_matter_and_messages(content: str,
 ]:
     logger.debug("Parsing markdown structure")
 
+    path = resolve_markdown_path(path)
+
+    parser = chat_parser(implicit_role=implicit_role)
+    parsed_chat = parse_markdown(parser, content, path)[0]
+
+    front_matter = parsed_chat.front_matter or {}
+    messages = build_messages(front_matter, parsed_chat.messages, path)
+
+    return front_matter, messages
+
+
+def resolve_markdown_path(path: Union[str, Path] | None) -> Path:
     if path is None:
         path = Path(os.getcwd()) / f"{get_digest(path)}.md"
-    path = Path(path)
+    return Path(path)
 
-    transclusions_base_dir = path.parent
-
-    messages: list[dict] = []
 
+def parse_markdown(parser, content: str, path: Path):
+    """
+    Parses `content` with `parser` (anything with a `parse_string` method, see `parser_backend`), logging
+    the content and any parse errors.
+    """
     start_time = time.time()  # Record the start time
     logger.debug(f"[parse_front_matter_and_messages] Parsing markdown: {start_time}-parsed-{path.name}")
     logger.debug("Markdown Content:\n" + content)
 
-    parser = markdown_chat_parser(implicit_role=implicit_role)
-
-    end_time = time.time()  # Record the end time
-    time_taken = end_time - start_time
-    logger.debug(
-        f"[parse_front_matter_and_messages] Parsed markdown {start_time}-parsed-{path.name} in {time_taken:.4f} seconds")
-
     file_logger.debug(f"{start_time}-parsed-{path.name}", content=content)
 
     try:
-        parsed_chat = parser.parse_string(content)[0]
+        parsed = parser.parse_string(content)
     except pyparsing.exceptions.ParseSyntaxException as e:
         file_logger.debug(f"[parse_front_matter_and_messages_error] {start_time}-parsed-{path.name}",
                           content=content)
@@ -61,49 +70,69 @@ def parse_front_matter_and_messages(content: str,
         logger.error(f"Failed to parse markdown: ~/.taskmates/logs/{start_time}-parsed-{path.name}")
         logger.error(e)
         raise
-    front_matter = parsed_chat.front_matter or {}
+
+    end_time = time.time()  # Record the end time
+    time_taken = end_time - start_time
+    logger.debug(
+        f"[parse_front_matter_and_messages] Parsed markdown {start_time}-parsed-{path.name} in {time_taken:.4f} seconds")
+
+    return parsed
+
+
+def build_messages(front_matter: dict,
+                   parsed_messages: Iterable[MessageNode],
+                   path: Path) -> List[Dict[str, Union[str, list[dict]]]]:
+    messages: list[dict] = []
 
     # If the front_matter contains a `system` key, prepend it as the system message
     if 'system' in front_matter:
-        messages = [{"role": "system", "content": front_matter['system']}] + messages
+        messages.append({"role": "system", "content": front_matter['system']})
+
+    messages.extend(build_message(parsed_message, path) for parsed_message in parsed_messages)
+
+    # remove duplicate/incomplete messages
+    return deduplicate_messages(messages)
+
 
-    for parsed_message in parsed_chat.messages:
-        message_dict = parsed_message.as_dict()
+def build_message(parsed_message: MessageNode, path: Path) -> Dict[str, Union[str, list[dict]]]:
+    """
+    Builds the message of a parsed message node, rendering its transclusions and images. The result
+    depends only on the node and the files it transcludes, see `IncrementalChatParser`.
+    """
+    transclusions_base_dir = path.parent
 
-        name = message_dict["name"]
-        attributes = message_dict.get("attributes", {})
-        meta = message_dict.get("meta", {})
+    message_dict = parsed_message.as_dict()
 
-        message = {**({"role": message_dict["role"]} if "role" in message_dict else {}),
-                   "name": name,
-                   "content": message_dict["content"],
-                   **({"code_cell_id": message_dict["code_cell_id"]} if "code_cell_id" in message_dict else {}),
-                   **({"tool_call_id": message_dict["tool_call_id"]} if "tool_call_id" in message_dict else {}),
-                   **attributes,
-                   **({"meta": meta} if meta else {})}
+    name = message_dict["name"]
+    attributes = message_dict.get("attributes", {})
+    meta = message_dict.get("meta", {})
 
-        if "tool_calls" in message_dict:
-            message["tool_calls"] = message_dict["tool_calls"]
+    message = {**({"role": message_dict["role"]} if "role" in message_dict else {}),
+               "name": name,
+               "content": message_dict["content"],
+               **({"code_cell_id": message_dict["code_cell_id"]} if "code_cell_id" in message_dict else {}),
+               **({"tool_call_id": message_dict["tool_call_id"]} if "tool_call_id" in message_dict else {}),
+               **attributes,
+               **({"meta": meta} if meta else {})}
 
-        if "code_cells" in message_dict:
-            message["code_cells"] = message_dict["code_cells"]
+    if "tool_calls" in message_dict:
+        message["tool_calls"] = message_dict["tool_calls"]
 
-        text_content = get_text_content(message_dict)
+    if "code_cells" in message_dict:
+        message["code_cells"] = message_dict["code_cells"]
 
-        # transclusions
-        text_content = render_transclusions(text_content, source_file=path)
+    text_content = get_text_content(message_dict)
 
-        # image_transclusion
-        text_content = render_image_transclusion(text_content, transclusions_base_dir=transclusions_base_dir)
+    # transclusions
+    text_content = render_transclusions(text_content, source_file=path)
 
-        set_text_content(message, text_content)
+    # image_transclusion
+    text_content = render_image_transclusion(text_content, transclusions_base_dir=transclusions_base_dir)
 
-        messages.append(message)
+    set_text_content(message, text_content)
 
-    # set message roles based on the name
-    for message in messages:
-        if "role" in message:
-            continue
+    # set the message role based on the name
+    if "role" not in message:
         name = message.get("name", "user")
         # The role should match the name for user/assistant/system/tool messages
         if name in ("user", "assistant", "system", "tool"):
@@ -112,19 +141,15 @@ def parse_front_matter_and_messages(content: str,
             # For any other name, default to user role
             message["role"] = "user"
 
-    for message in messages:
-        if message.get("role") == "cell_output":
-            output_name = message["name"]
-            message["name"] = "cell_output"
-            message["role"] = "user"
-            set_text_content(message,
-                             f"###### Cell Output: {output_name} [{message['code_cell_id']}]\n"
-                             + get_text_content(message))
+    if message.get("role") == "cell_output":
+        output_name = message["name"]
+        message["name"] = "cell_output"
+        message["role"] = "user"
+        set_text_content(message,
+                         f"###### Cell Output: {output_name} [{message['code_cell_id']}]\n"
+                         + get_text_content(message))
 
-    # remove duplicate/incomplete messages
-    messages = deduplicate_messages(messages)
-
-    return front_matter, messages
+    return message
 
 
 def deduplicate_messages(messages: List[Dict[str, Union[str, list[dict]]]]) -> List[Dict[str, Union[str, list[dict]]]]:
@@ -143,6 +168,10 @@ def deduplicate_messages(messages: List[Dict[str, Union[str, list[dict]]]]) -> L
     return deduplicated_messages
 
 
+# The tests below run against every parser backend
+pytestmark = pytest.mark.usefixtures("parser_backend")
+
+
 def test_parse_chat_messages_with_internal_header(tmp_path):
     input = """\
         **user>** Here is a message.
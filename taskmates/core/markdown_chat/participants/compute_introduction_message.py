@@ -2,11 +2,11 @@ import textwrap
 from pathlib import Path
 
 import pytest
-from typeguard import typechecked
 
 from taskmates.config.find_config_file import find_config_file
 from taskmates.core.workflow_engine.transactions.transaction import TRANSACTION
 from taskmates.defaults.settings import Settings
+from taskmates.lib.typeguard_.typechecked import typechecked
 
 
 @typechecked
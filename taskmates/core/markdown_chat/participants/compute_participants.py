@@ -1,8 +1,10 @@
-from typeguard import typechecked
+import copy
+import random
 
 from taskmates.config.load_participant_config import load_participant_config
 from taskmates.core.markdown_chat.participants.compute_and_reassign_roles import compute_and_reassign_roles
-from taskmates.core.markdown_chat.participants.compute_recipient import compute_recipient
+from taskmates.core.markdown_chat.participants.compute_recipient import RecipientTracker, compute_recipient
+from taskmates.lib.typeguard_.typechecked import typechecked
 from taskmates.logging import logger
 
 
@@ -28,7 +30,54 @@ def compute_participants(front_matter, messages) -> tuple[dict, dict]:
         participant_config.update(loaded_config)
         participants_configs[participant_name] = participant_config
 
-    # TODO: Everything below this line can be moved into a separate function
+    assign_recipients(messages, participants_configs)
+
+    recipient = messages[-1].get("recipient")
+    compute_and_reassign_roles(messages, recipient)
+
+    recipient_name = messages[-1].get("recipient")
+    recipient_role = messages[-1].get("recipient_role")
+
+    logger.debug(f"Recipient/Role: {recipient_name}/{recipient_role}")
+
+    recipient_config = participants_configs.get(recipient_name, {}).copy() if recipient_name else {}
+    if recipient_name:
+        recipient_config["name"] = recipient_name
+
+    return recipient_config, participants_configs
+
+
+def assign_recipients(messages: list[dict], participants_configs: dict):
+    """
+    Sets the `recipient`/`recipient_role` of every message and reassigns the roles of the participants'
+    messages, loading the configs of the participants as they appear.
+    """
+    recipient_tracker = RecipientTracker()
+    for current_message in messages:
+        if current_message["role"] == "user":
+            name = current_message.get("name", current_message.get("role"))
+            if current_message["name"] not in participants_configs:
+                participants_configs[name] = load_participant_config(participants_configs, name)
+
+        recipient = recipient_tracker.compute_recipient(current_message, list(participants_configs.keys()))
+        current_message["recipient"] = recipient
+
+        if current_message["role"] not in ("system", "tool"):
+            name = current_message.get("name", "user")
+            current_message["role"] = participants_configs[name].get("role", "user")
+        recipient_tracker.append(current_message)
+
+        if recipient and recipient not in participants_configs:
+            participants_configs[recipient] = load_participant_config(participants_configs, recipient)
+            current_message["recipient_role"] = participants_configs[recipient].get("role", "user")
+        elif recipient:
+            current_message["recipient_role"] = participants_configs[recipient].get("role", "user")
+        else:
+            current_message["recipient_role"] = None
+
+
+def assign_recipients_by_prefixes(messages: list[dict], participants_configs: dict):
+    # The quadratic reference implementation: `compute_recipient` on every prefix of the chat
     for messages_end in range(1, len(messages) + 1):
         current_messages = messages[:messages_end]
         current_message = current_messages[-1]
@@ -53,16 +102,45 @@ def compute_participants(front_matter, messages) -> tuple[dict, dict]:
         else:
             current_message["recipient_role"] = None
 
-    recipient = messages[-1].get("recipient")
-    compute_and_reassign_roles(messages, recipient)
 
-    recipient_name = messages[-1].get("recipient")
-    recipient_role = messages[-1].get("recipient_role")
+def generate_chat(rng: random.Random, length: int, names: list[str]) -> list[dict]:
+    contents = ["Hello", "@alice can you help?", "Hey @bob\nhow much is 1 + 1?", "Thanks @carol and @bob",
+                "@user done", "@dave are you there?", "Sure", "Let me check with @assistant"]
+    messages = []
+    if rng.random() < 0.5:
+        messages.append({"role": "system", "name": "system", "content": "You are helpful"})
+    for _ in range(length):
+        kind = rng.random()
+        if kind < 0.15:
+            message = {"role": "tool", "name": "run_shell_command", "content": "output", "tool_call_id": "1"}
+        elif kind < 0.25:
+            message = {"role": "user", "name": "cell_output", "content": "2", "code_cell_id": "cell_0"}
+        else:
+            message = {"role": rng.choice(["user", "assistant"]), "name": rng.choice(names),
+                       "content": rng.choice(contents)}
+        messages.append(message)
+    return messages
 
-    logger.debug(f"Recipient/Role: {recipient_name}/{recipient_role}")
 
-    recipient_config = participants_configs.get(recipient_name, {}).copy() if recipient_name else {}
-    if recipient_name:
-        recipient_config["name"] = recipient_name
+def recipients_outcome(assign, messages: list[dict], participants_configs: dict):
+    try:
+        assign(messages, participants_configs)
+    except Exception as e:
+        return "error", type(e), messages
+    return "assigned", participants_configs, messages
 
-    return recipient_config, participants_configs
+
+def test_assign_recipients_matches_compute_recipient_on_every_prefix(transaction):
+    rng = random.Random(0)
+
+    for _ in range(200):
+        participants_configs = {name: {"role": rng.choice(["user", "assistant"])}
+                                for name in rng.sample(["user", "assistant", "alice", "bob", "carol"],
+                                                       rng.randint(1, 5))}
+        messages = generate_chat(rng, rng.randint(1, 60), names=list(participants_configs) + ["user"])
+
+        expected = recipients_outcome(assign_recipients_by_prefixes,
+                                      copy.deepcopy(messages), copy.deepcopy(participants_configs))
+        actual = recipients_outcome(assign_recipients, copy.deepcopy(messages), copy.deepcopy(participants_configs))
+
+        assert actual == expected, messages
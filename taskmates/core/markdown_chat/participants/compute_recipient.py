@@ -2,11 +2,11 @@ import textwrap
 
 import pytest
 from loguru import logger
-from typeguard import typechecked
 
 from taskmates.core.chat.openai.get_text_content import get_text_content
 from taskmates.core.markdown_chat.parse_front_matter_and_messages import parse_front_matter_and_messages
 from taskmates.core.markdown_chat.participants.parse_mention import parse_mention
+from taskmates.lib.typeguard_.typechecked import typechecked
 
 
 @typechecked
@@ -80,6 +80,120 @@ def compute_recipient(messages, participants: list[str]) -> str | None:
     return recipient
 
 
+def is_participant_message(message: dict) -> bool:
+    return message["role"] not in ("system", "tool") and message.get("name") not in ("cell_output",)
+
+
+def is_output_message(message: dict) -> bool:
+    return message["role"] == "tool" or message.get("name") == "cell_output"
+
+
+@typechecked
+class RecipientTracker:
+    """
+    Computes the same recipients as `compute_recipient(messages[:i + 1], participants)` for i = 0, 1, ...
+    in a single forward pass, instead of filtering and scanning every prefix of the chat again.
+
+    Call `compute_recipient` with each message, then `append` it once its role has been reassigned: the
+    state carried over only needs the last participant messages and the last message that is not a tool
+    or cell output, in their final roles.
+    """
+
+    def __init__(self):
+        self.messages_count: int = 0
+        self.previous_message: dict | None = None
+        self.participant_messages_count: int = 0
+        self.last_participant_message: dict | None = None
+        self.previous_participant_message: dict | None = None
+        # the last participant message with a different name than `last_participant_message`
+        self.other_participant_message: dict | None = None
+        self.last_requesting_message: dict | None = None
+
+    def compute_recipient(self, message: dict, participants: list[str]) -> str | None:
+        recipient = None
+
+        if is_participant_message(message):
+            participant_messages_count = self.participant_messages_count + 1
+            last_participant_message = message
+            previous_participant_message = self.last_participant_message
+        else:
+            participant_messages_count = self.participant_messages_count
+            last_participant_message = self.last_participant_message
+            previous_participant_message = self.previous_participant_message
+
+        if not participant_messages_count:
+            return None
+
+        last_participant_message.setdefault("name", last_participant_message.get("role"))
+        last_participant_message_role = last_participant_message.get("role")
+
+        # parse @mentions
+        mention = parse_mention(get_text_content(last_participant_message), participants)
+
+        is_self_mention = mention == message.get("name")
+        is_tool_reply = message["role"] == "tool"
+        is_code_cell_reply = message.get("name") == "cell_output"
+
+        if mention and not is_self_mention and not is_tool_reply:
+            recipient = mention
+
+        # code cell/tool call: resume conversation with caller
+        elif is_tool_reply or is_code_cell_reply:
+            recipient = last_participant_message["name"]
+
+        # code cell/tool caller: resume conversation with requester
+        elif self.messages_count + 1 > 2 and is_output_message(self.previous_message):
+            output_message = self.previous_message
+            # the previous message is an output, so this is the last requesting message before it
+            requesting_message = self.last_requesting_message
+
+            if not requesting_message:
+                raise ValueError()
+
+            if message["name"] != output_message["recipient"]:
+                recipient = output_message["recipient"]
+            else:
+                recipient = requesting_message["recipient"]
+
+        # alternating participants
+        elif len(participants) == 2 and "user" in participants:
+            recipient = [participant for participant in participants
+                         if participant != last_participant_message.get("name",
+                                                                       last_participant_message.get("role"))][0]
+
+        # default: assistant reply to request
+        elif last_participant_message_role == "assistant" and participant_messages_count > 1:
+            recipient = previous_participant_message["name"]
+
+        # re-initiate conversation
+        elif last_participant_message_role == "user":
+            # the last message of someone else
+            other_participant_message = self.other_participant_message
+            if last_participant_message is message and self.last_participant_message is not None:
+                if self.last_participant_message["name"] != message["name"]:
+                    other_participant_message = self.last_participant_message
+            if other_participant_message is not None:
+                recipient = other_participant_message["name"]
+
+        logger.debug(f"Computed recipient: {recipient}")
+        return recipient
+
+    def append(self, message: dict):
+        self.messages_count += 1
+        self.previous_message = message
+
+        if is_participant_message(message):
+            if self.last_participant_message is not None \
+                    and self.last_participant_message.get("name") != message.get("name"):
+                self.other_participant_message = self.last_participant_message
+            self.previous_participant_message = self.last_participant_message
+            self.last_participant_message = message
+            self.participant_messages_count += 1
+
+        if not is_output_message(message):
+            self.last_requesting_message = message
+
+
 # Test cases
 
 @pytest.fixture
@@ -1,8 +1,8 @@
 import re
 
-from typeguard import typechecked
 
 from taskmates.core.markdown_chat.participants.parse_potential_mentions import parse_potential_mentions, MENTION_PATTERN
+from taskmates.lib.typeguard_.typechecked import typechecked
 
 
 @typechecked
@@ -0,0 +1,29 @@
+import copy
+import random
+import timeit
+
+import pytest
+
+from taskmates.core.markdown_chat.participants.compute_participants import assign_recipients, \
+    assign_recipients_by_prefixes, generate_chat
+
+pytestmark = pytest.mark.slow
+
+
+@pytest.mark.timeout(30)
+@pytest.mark.xdist_group(name="performance")
+def test_performance_assign_recipients(transaction):
+    participants_configs = {"user": {"role": "user"},
+                            "assistant": {"role": "assistant"},
+                            "alice": {"role": "assistant"}}
+    messages = generate_chat(random.Random(0), 5000, names=list(participants_configs))
+
+    def assign(implementation):
+        implementation(copy.deepcopy(messages), copy.deepcopy(participants_configs))
+
+    linear_time = timeit.timeit(lambda: assign(assign_recipients), number=1)
+    prefixes_time = timeit.timeit(lambda: assign(assign_recipients_by_prefixes), number=1)
+
+    print(f"Recipients of {len(messages)} messages: single pass {linear_time:.4f} seconds, "
+          f"every prefix {prefixes_time:.4f} seconds")
+    assert linear_time < prefixes_time / 2, f"Assigning recipients took too long: {linear_time:.4f} seconds"
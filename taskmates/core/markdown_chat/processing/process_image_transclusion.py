@@ -4,7 +4,8 @@ from pathlib import Path
 import pytest
 
 from taskmates.core.markdown_chat.processing.extract_transclusion_links import extract_transclusion_links
-from taskmates.lib.image_.encode_image import encode_image
+from taskmates.lib.image_.encoded_image_cache import encode_images
+from taskmates.lib.markdown_.transclusion_cache import record_file, transclusion_path_glob
 from taskmates.lib.path_.is_image import is_image
 from taskmates.lib.root_path.root_path import root_path
 
@@ -14,27 +15,33 @@ def render_image_transclusion(content, transclusions_base_dir):
         return content
     transclusion_links = extract_transclusion_links(content)
     if transclusion_links:
-        content_parts = []
+        image_filenames = []
         for link in transclusion_links:
             if link.startswith("/"):
                 filenames = [link]
             else:
-                filenames = list(sorted(Path(transclusions_base_dir).glob(link)))
+                filenames = transclusion_path_glob(link, Path(transclusions_base_dir))
             if not filenames:
                 raise ValueError(f"Transclusion link {link} not found")
             for filename in filenames:
-                if os.path.isfile(filename):
+                if record_file(Path(filename)) is not None:
                     file_extension = os.path.splitext(filename)[1].lower()
                     if is_image(filename):
-                        content_parts.append({
-                            "type": "image_url",
-                            "image_url": {
-                                "url": f"data:image/{file_extension[1:]};base64,{encode_image(filename)}",
-                                # "detail": "low",
-                            },
-                        })
+                        image_filenames.append(filename)
                     else:
                         raise ValueError(f"File extension {file_extension} not supported")
+
+        # the images are encoded concurrently and cached, see `encode_images`
+        content_parts = []
+        for filename, encoded_image in zip(image_filenames, encode_images(image_filenames)):
+            file_extension = os.path.splitext(filename)[1].lower()
+            content_parts.append({
+                "type": "image_url",
+                "image_url": {
+                    "url": f"data:image/{file_extension[1:]};base64,{encoded_image}",
+                    # "detail": "low",
+                },
+            })
         content_parts.insert(0, {
             "type": "text",
             "text": content
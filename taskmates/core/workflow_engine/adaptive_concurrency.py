@@ -0,0 +1,374 @@
+import asyncio
+import contextvars
+import email.utils
+import os
+import random
+import re
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, AsyncIterator, Deque, Dict, Mapping, Optional
+
+import httpx
+import pytest
+
+from taskmates.core.workflow_engine.transaction_scheduler import DEFAULT_MAX_CONCURRENCY
+
+# Status codes of providers asking to slow down: rate limited, unavailable, overloaded (Anthropic)
+THROTTLING_STATUS_CODES = (429, 503, 529)
+
+# Headers giving the time until requests are accepted again, in order of precedence
+RETRY_AFTER_HEADERS = ("retry-after-ms", "retry-after",
+                       "x-ratelimit-reset-requests", "x-ratelimit-reset-tokens",
+                       "anthropic-ratelimit-requests-reset", "anthropic-ratelimit-tokens-reset")
+
+MAX_RETRY_AFTER = float(os.environ.get("TASKMATES_MAX_RETRY_AFTER", 120))
+RETRY_JITTER = float(os.environ.get("TASKMATES_RETRY_JITTER", 0.25))
+
+DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+DURATION_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+
+def status_code_of(exception: BaseException) -> Optional[int]:
+    status_code = getattr(exception, "status_code", None)
+    if status_code is None:
+        status_code = getattr(getattr(exception, "response", None), "status_code", None)
+    return status_code if isinstance(status_code, int) else None
+
+
+def throttling_error(exception: BaseException) -> Optional[BaseException]:
+    """The exception, or one of its causes, by which a provider asked to slow down."""
+    seen = set()
+    while exception is not None and id(exception) not in seen:
+        if status_code_of(exception) in THROTTLING_STATUS_CODES:
+            return exception
+        seen.add(id(exception))
+        exception = exception.__cause__ or exception.__context__
+    return None
+
+
+def parse_retry_after(name: str, value: str, now: float) -> Optional[float]:
+    """The seconds to wait according to a rate limit header: a delay, a duration ("6m0s") or a date."""
+    value = value.strip()
+    try:
+        seconds = float(value)
+        return seconds / 1000 if name == "retry-after-ms" else seconds
+    except ValueError:
+        pass
+    parts = DURATION_PART.findall(value)
+    if parts and "".join(number + unit for number, unit in parts) == value:
+        return sum(float(number) * DURATION_UNITS[unit] for number, unit in parts)
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp() - now
+    except ValueError:
+        pass
+    date = email.utils.parsedate_to_datetime(value) if value else None
+    return date.timestamp() - now if date is not None else None
+
+
+def retry_after(exception: BaseException) -> Optional[float]:
+    """The delay requested by the rate limit headers of the response of `exception`, if any."""
+    headers: Mapping[str, str] = getattr(getattr(exception, "response", None), "headers", None) or {}
+    now = time.time()
+    for name in RETRY_AFTER_HEADERS:
+        value = headers.get(name)
+        if value is None:
+            continue
+        try:
+            seconds = parse_retry_after(name, value, now)
+        except (TypeError, ValueError):
+            continue
+        if seconds is not None:
+            return min(max(seconds, 0.0), MAX_RETRY_AFTER)
+    return None
+
+
+def concurrency_key(outcome: str, inputs: Optional[Dict[str, Any]]) -> str:
+    """The model an operation calls when its inputs name it, since rate limits are per model, or else its outcome."""
+    inputs = inputs or {}
+    model = inputs.get("model_name") or inputs.get("model")
+    return model if isinstance(model, str) and model else outcome
+
+
+def jittered(delay: float, jitter: float = RETRY_JITTER) -> float:
+    """`delay` plus up to `jitter` of it, so that the retries of a burst don't all happen at once."""
+    return delay * (1 + random.uniform(0, jitter))
+
+
+# The keys of the attempts the current task runs in
+_attempting: contextvars.ContextVar[frozenset] = contextvars.ContextVar("attempting", default=frozenset())
+
+
+@dataclass
+class KeyState:
+    # None until the key is throttled: no adaptive limit
+    limit: Optional[float] = None
+    in_flight: int = 0
+    last_decrease: float = 0.0
+    resume_at: float = 0.0
+    throttled: int = 0
+    waiters: Deque[asyncio.Future] = field(default_factory=deque)
+
+
+class AdaptiveConcurrency:
+    """
+    Additive-increase/multiplicative-decrease (AIMD) limits on the attempts in flight per concurrency key
+    (see `concurrency_key`). The TransactionScheduler doesn't start jobs of a key at its limit, and retries
+    wait for `attempt` like first attempts.
+
+    A key has no limit until it's throttled: its limit is then `decrease` times the attempts in flight, and
+    halves again on the throttling of attempts started after the previous decrease (the throttling of the
+    attempts that were already in flight is a consequence of the same overload). Each success adds
+    `1 / limit`, about one per round of attempts, until `max_limit` where the key is unlimited again.
+
+    Throttled keys with a Retry-After (or rate limit reset) header pause until then, plus jitter.
+    """
+
+    def __init__(self, max_limit: int = DEFAULT_MAX_CONCURRENCY, min_limit: int = 1, decrease: float = 0.5):
+        self.max_limit = max_limit
+        self.min_limit = min_limit
+        self.decrease = decrease
+        self._states: Dict[str, KeyState] = {}
+        self._lock = threading.Lock()
+
+    def limit(self, key: str) -> Optional[int]:
+        state = self._states.get(key)
+        if state is None or state.limit is None:
+            return None
+        return max(self.min_limit, int(state.limit))
+
+    @asynccontextmanager
+    async def attempt(self, key: str) -> AsyncIterator[float]:
+        """
+        Waits until `key` resumes and is under its limit, counts an attempt in flight, and yields the time it
+        started. Attempts within an attempt of the same key run within its permit: they neither wait nor count.
+        """
+        attempting = _attempting.get()
+        if key in attempting:
+            yield time.monotonic()
+            return
+
+        state = await self._acquire(key)
+        token = _attempting.set(attempting | {key})
+        try:
+            yield time.monotonic()
+        finally:
+            _attempting.reset(token)
+            with self._lock:
+                state.in_flight -= 1
+                self._wake(state)
+
+    async def _acquire(self, key: str) -> KeyState:
+        while True:
+            waiter = None
+            with self._lock:
+                state = self._states.setdefault(key, KeyState())
+                remaining = state.resume_at - time.monotonic()
+                if remaining <= 0:
+                    if state.limit is None or state.in_flight < self.limit(key):
+                        state.in_flight += 1
+                        return state
+                    waiter = asyncio.get_running_loop().create_future()
+                    state.waiters.append(waiter)
+
+            if waiter is None:
+                await asyncio.sleep(jittered(remaining))
+                continue
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                with self._lock:
+                    if waiter in state.waiters:
+                        state.waiters.remove(waiter)
+                    else:
+                        # Woken up, but leaving: wake up another one instead
+                        self._wake(state)
+                raise
+
+    def _wake(self, state: KeyState) -> None:
+        capacity = len(state.waiters) if state.limit is None else \
+            max(self.min_limit, int(state.limit)) - state.in_flight
+        for _ in range(min(capacity, len(state.waiters))):
+            waiter = state.waiters.popleft()
+            waiter.get_loop().call_soon_threadsafe(_resolve, waiter)
+
+    def on_success(self, key: str) -> None:
+        state = self._states.get(key)
+        if state is None or state.limit is None:
+            return
+        with self._lock:
+            state.limit += 1 / state.limit
+            if state.limit >= self.max_limit:
+                state.limit = None
+            self._wake(state)
+
+    def on_throttled(self, key: str, started_at: float, delay: Optional[float] = None) -> None:
+        """Records that an attempt started at `started_at` was throttled, with a requested `delay`."""
+        now = time.monotonic()
+        with self._lock:
+            state = self._states.setdefault(key, KeyState())
+            state.throttled += 1
+            if state.limit is None:
+                state.limit = max(self.min_limit, state.in_flight * self.decrease)
+                state.last_decrease = now
+            elif started_at >= state.last_decrease:
+                state.limit = max(self.min_limit, state.limit * self.decrease)
+                state.last_decrease = now
+            if delay:
+                state.resume_at = max(state.resume_at, now + delay)
+
+    def on_error(self, key: str, started_at: float, exception: BaseException) -> Optional[float]:
+        """
+        Records the throttling of an attempt that failed with `exception`, if it was throttled, and returns the
+        delay requested by the provider. A throttling is only recorded by the innermost operation it fails.
+        """
+        throttled = throttling_error(exception)
+        if throttled is None:
+            return None
+        delay = retry_after(throttled)
+        if not getattr(throttled, "_throttling_recorded", False):
+            throttled._throttling_recorded = True
+            self.on_throttled(key, started_at, delay)
+        return delay
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {key: {"limit": self.limit(key), "in_flight": state.in_flight, "throttled": state.throttled}
+                    for key, state in self._states.items()}
+
+    def reset(self) -> None:
+        with self._lock:
+            for state in self._states.values():
+                state.limit = None
+                state.resume_at = 0.0
+                self._wake(state)
+            self._states.clear()
+
+
+def _resolve(waiter: asyncio.Future) -> None:
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+adaptive_concurrency = AdaptiveConcurrency()
+
+
+def rate_limit_error(status_code: int = 429, headers: Optional[Dict[str, str]] = None):
+    import openai
+
+    request = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+    response = httpx.Response(status_code, headers=headers or {}, request=request)
+    return openai.RateLimitError("Rate limit reached", response=response, body=None)
+
+
+def test_throttling_error_follows_the_causes():
+    error = rate_limit_error()
+    try:
+        try:
+            raise error
+        except Exception as e:
+            raise RuntimeError("completion failed") from e
+    except RuntimeError as wrapped:
+        assert throttling_error(wrapped) is error
+    assert throttling_error(ValueError("not throttled")) is None
+
+
+@pytest.mark.parametrize("headers, expected", [
+    ({"retry-after-ms": "1500"}, 1.5),
+    ({"retry-after": "3"}, 3),
+    ({"x-ratelimit-reset-requests": "1m30s"}, 90),
+    ({"x-ratelimit-reset-tokens": "250ms"}, 0.25),
+    ({"retry-after": "9999"}, MAX_RETRY_AFTER),
+    ({}, None),
+])
+def test_retry_after(headers, expected):
+    assert retry_after(rate_limit_error(headers=headers)) == pytest.approx(expected)
+
+
+def test_retry_after_dates():
+    later = datetime.fromtimestamp(time.time() + 30).astimezone()
+    assert retry_after(rate_limit_error(headers={"anthropic-ratelimit-requests-reset": later.isoformat()})) \
+           == pytest.approx(30, abs=1)
+    assert retry_after(rate_limit_error(headers={"retry-after": email.utils.format_datetime(later)})) \
+           == pytest.approx(30, abs=1)
+
+
+async def test_aimd_limits():
+    concurrency = AdaptiveConcurrency(max_limit=8)
+    throttled = asyncio.Event()
+
+    async def call():
+        async with concurrency.attempt("model") as started_at:
+            await throttled.wait()
+            concurrency.on_throttled("model", started_at)
+
+    calls = [asyncio.create_task(call()) for _ in range(6)]
+    await asyncio.sleep(0.01)
+    assert concurrency.stats()["model"] == {"limit": None, "in_flight": 6, "throttled": 0}
+
+    # The attempts in flight when the limit first decreases don't decrease it again
+    throttled.set()
+    await asyncio.gather(*calls)
+    assert concurrency.limit("model") == 3
+
+    async with concurrency.attempt("model") as started_at:
+        concurrency.on_throttled("model", started_at)
+    assert concurrency.limit("model") == 1
+
+    for _ in range(40):
+        concurrency.on_success("model")
+    assert concurrency.limit("model") is None
+    assert concurrency.stats()["model"] == {"limit": None, "in_flight": 0, "throttled": 7}
+
+
+async def test_attempts_wait_for_the_limit_of_their_key():
+    concurrency = AdaptiveConcurrency()
+    async with concurrency.attempt("model") as started_at:
+        concurrency.on_throttled("model", started_at)
+    running = 0
+    max_running = 0
+
+    async def call(nested: bool = False):
+        nonlocal running, max_running
+        async with concurrency.attempt("model"):
+            running += 1
+            max_running = max(max_running, running)
+            await asyncio.sleep(0.01)
+            if nested:
+                # Within the permit of its caller: doesn't deadlock
+                await call()
+            running -= 1
+
+    await asyncio.wait_for(asyncio.gather(*[call(nested=i == 0) for i in range(4)]), timeout=5)
+
+    assert concurrency.limit("model") == 1
+    assert max_running == 2  # The nested call
+    assert concurrency.stats()["model"]["in_flight"] == 0
+
+
+def test_on_error_records_each_throttling_once():
+    concurrency = AdaptiveConcurrency()
+    error = rate_limit_error(headers={"retry-after": "2"})
+
+    assert concurrency.on_error("model", 0.0, error) == 2
+    assert concurrency.on_error("caller", 0.0, RuntimeError("failed")) is None
+    assert concurrency.on_error("caller", 0.0, error) == 2
+
+    assert concurrency.stats()["model"]["throttled"] == 1
+    assert "caller" not in concurrency.stats()
+
+
+async def test_attempts_resume_after_the_requested_delay():
+    concurrency = AdaptiveConcurrency()
+    concurrency.on_throttled("model", 0.0, delay=0.05)
+
+    start = time.monotonic()
+    async with concurrency.attempt("model"):
+        pass
+    async with concurrency.attempt("other"):
+        pass
+
+    assert 0.05 <= time.monotonic() - start < 0.05 * (1 + RETRY_JITTER) + 0.05
@@ -1,9 +1,13 @@
 import asyncio
+import time
+import weakref
 from contextlib import contextmanager
-from typing import List, Tuple, TypeAlias, Sequence, Self, Any, Callable, Coroutine
+from inspect import iscoroutinefunction
+from typing import List, Tuple, TypeAlias, Sequence, Self, Any, Callable, Coroutine, Dict, Hashable
 
 import pytest
-from blinker import NamedSignal
+from blinker import NamedSignal, ANY
+from blinker.base import ANY_ID, make_id
 
 SourceTarget: TypeAlias = Tuple['BaseSignals', 'BaseSignals']
 
@@ -33,17 +37,75 @@ def connected_signals(signal_pairs: List[SourceTarget]):
         disconnect_relay(handlers)
 
 
+# Bumped whenever a TypedSignal gains or loses a receiver: the routes resolved before are then stale
+_routing_version = 0
+
+
+def _invalidate_routes():
+    global _routing_version
+    _routing_version += 1
+
+
 class TypedSignal(NamedSignal):
     def __init__(self, namespace: 'TypedNamespace', name: str, doc: str | None = None) -> None:
         super().__init__(doc)
 
         self.namespace = namespace
         self.name: str = name
+        # sender id -> route (see `route`)
+        self._routes: Dict[Hashable, List[Tuple[Any, bool]]] = {}
+        self._routes_version = _routing_version
 
     def __repr__(self) -> str:
         base = super().__repr__()
         return f"{base[:-1]}; {self.namespace.name}/{self.name!r}>"  # noqa: E702
 
+    def connect(self, receiver, sender: Any = ANY, weak: bool = True):
+        _invalidate_routes()
+        return super().connect(receiver, sender, weak)
+
+    def _disconnect(self, receiver_id: Hashable, sender_id: Hashable) -> None:
+        _invalidate_routes()
+        super()._disconnect(receiver_id, sender_id)
+
+    def route(self, sender: Any) -> List[Tuple[Any, bool]]:
+        """
+        The final receivers of a signal sent by `sender`, as (receiver reference, is coroutine function) pairs.
+
+        Relays to other TypedSignals (see `relay`) are followed depth first, so the receivers are in the
+        order in which sending through each relay would call them. Relayed signals without receivers are
+        skipped. Routes of str, int and None senders are cached until a TypedSignal connection changes.
+        """
+        if self._routes_version != _routing_version:
+            self._routes = {}
+            self._routes_version = _routing_version
+
+        sender_id = make_id(sender)
+        route = self._routes.get(sender_id)
+        if route is None:
+            route = []
+            self._resolve_route(sender_id, route)
+            if sender is None or isinstance(sender, (str, int)):
+                self._routes[sender_id] = route
+        return route
+
+    def _resolve_route(self, sender_id: Hashable, route: List[Tuple[Any, bool]]) -> None:
+        if sender_id in self._by_sender:
+            ids = self._by_sender[ANY_ID] | self._by_sender[sender_id]
+        else:
+            ids = self._by_sender[ANY_ID]
+
+        for receiver_id in ids:
+            receiver = self.receivers.get(receiver_id)
+            strong = receiver() if isinstance(receiver, weakref.ref) else receiver
+            if strong is None:
+                continue
+            if getattr(strong, "__func__", None) is TypedSignal.send_async:
+                # A relay
+                strong.__self__._resolve_route(sender_id, route)
+            else:
+                route.append((receiver, iscoroutinefunction(strong)))
+
     async def send_async(
             self,
             sender: Any | None = None,
@@ -60,10 +122,65 @@ class TypedSignal(NamedSignal):
         if not self.receivers:
             raise ValueError(f"receivers not set: {self.namespace.name}/{self.name}")
 
-        # print(f"Send async called: {self.namespace.name}/{self.name}")
-        # ic(self, self.receivers)
+        if self.is_muted:
+            return []
 
-        return await super().send_async(sender, **kwargs)
+        # Delivered straight to the final receivers of the relays, rather than through a send at each relay
+        route = self.route(sender)
+        if not route:
+            raise ValueError(f"receivers not set: {self.namespace.name}/{self.name}")
+
+        results = []
+        for receiver, is_coroutine_function in route:
+            if isinstance(receiver, weakref.ref):
+                receiver = receiver()
+                if receiver is None:
+                    continue
+
+            if is_coroutine_function:
+                result = await receiver(sender, **kwargs)
+            elif _sync_wrapper is None:
+                raise RuntimeError("Cannot send to a non-coroutine function.")
+            else:
+                result = await _sync_wrapper(receiver)(sender, **kwargs)
+
+            results.append((receiver, result))
+
+        return results
+
+
+class CoalescingSender:
+    """
+    Sends the string `value` chunks of `sender` on `signal`, joining adjacent chunks into one send once
+    `max_chars` characters are pending, or `max_delay` seconds after the first pending chunk. Call `flush`
+    before sending anything else on the signal, and once done.
+    """
+
+    def __init__(self, signal: TypedSignal, sender: Any, max_chars: int, max_delay: float):
+        self.signal = signal
+        self.sender = sender
+        self.max_chars = max_chars
+        self.max_delay = max_delay
+        self._pending: List[str] = []
+        self._pending_chars = 0
+        self._first_pending_at = 0.0
+
+    async def send(self, value: str) -> None:
+        if not self._pending:
+            self._first_pending_at = time.monotonic()
+        self._pending.append(value)
+        self._pending_chars += len(value)
+        if (self._pending_chars >= self.max_chars
+                or time.monotonic() - self._first_pending_at >= self.max_delay):
+            await self.flush()
+
+    async def flush(self) -> None:
+        if not self._pending:
+            return
+        value = "".join(self._pending)
+        self._pending = []
+        self._pending_chars = 0
+        await self.signal.send_async(self.sender, value=value)
 
 
 class TypedNamespace(dict[str, TypedSignal]):
@@ -100,6 +217,44 @@ class BaseSignals:
         yield from connected_signals([self, other])
 
 
+class SignalGroups(dict[str, BaseSignals]):
+    """
+    Signal groups by name, each created from its factory on first access: most transactions never touch
+    most of their groups, and creating the signals of a group is much more expensive than a dict lookup.
+    """
+
+    def __init__(self, name: str, factories: Dict[str, Callable[..., BaseSignals]]):
+        super().__init__()
+        self.name = name
+        self.factories = factories
+        self.callbacks: List[Callable[[str, BaseSignals], Any]] = []
+
+    def __missing__(self, key: str) -> BaseSignals:
+        group = self.factories[key](name=self.name)
+        self[key] = group
+        for callback in list(self.callbacks):
+            callback(key, group)
+        return group
+
+    @contextmanager
+    def on_create(self, callback: Callable[[str, BaseSignals], Any]):
+        """Calls `callback(name, group)` for the groups created so far, and for each group created until exit."""
+        self.subscribe(callback)
+        try:
+            yield
+        finally:
+            self.unsubscribe(callback)
+
+    def subscribe(self, callback: Callable[[str, BaseSignals], Any]) -> None:
+        """Like on_create, until unsubscribe."""
+        for key, group in list(self.items()):
+            callback(key, group)
+        self.callbacks.append(callback)
+
+    def unsubscribe(self, callback: Callable[[str, BaseSignals], Any]) -> None:
+        self.callbacks.remove(callback)
+
+
 # Tests
 class TestSignals(BaseSignals):
     def __init__(self, **kwargs):
@@ -160,3 +315,97 @@ async def test_multiple_signals():
         assert signals1.processed_messages == ['processed']
         assert signals2.received_messages == ['received']
         assert signals2.processed_messages == ['processed']
+
+
+def test_signal_groups_are_created_on_first_access():
+    groups = SignalGroups("outcome", {"test": TestSignals})
+    created = []
+
+    assert "test" not in groups
+
+    with groups.on_create(lambda name, group: created.append(name)):
+        group = groups["test"]
+        assert groups["test"] is group
+
+    assert group.namespace.name == "outcome"
+    assert created == ["test"]
+    assert groups.callbacks == []
+
+
+async def test_relayed_signals_are_delivered_to_the_final_receivers():
+    signals = [TestSignals(name=f"level{i}") for i in range(3)]
+    received = []
+
+    async def on_response(sender, **kw):
+        received.append((sender, kw['message']))
+
+    signals[2].message_received.connect(on_response, sender="response")
+
+    with connected_signals([(signals[0], signals[1]), (signals[1], signals[2])]):
+        results = await signals[0].message_received.send_async("response", message="chunk")
+        await signals[0].message_received.send_async("other", message="not for on_response")
+
+        route = signals[0].message_received.route("response")
+        assert signals[0].message_received.route("response") is route
+        assert len(route) == 4
+
+    assert [value for _, value in results] == [None, None, None, None]
+    assert [message for message in signals[2].received_messages] == ["chunk", "not for on_response"]
+    assert received == [("response", "chunk")]
+    assert signals[0].message_received.route("response") is not route
+
+
+async def test_relay_to_signal_without_receivers():
+    source = BaseSignals(name="source")
+    source.namespace.signal("message_received")
+    target = TestSignals(name="target")
+    dead_end = BaseSignals(name="dead_end")
+    dead_end.namespace.signal("message_received")
+    dead_end.namespace.signal("message_processed")
+
+    with connected_signals([(source, dead_end)]):
+        with pytest.raises(ValueError, match="receivers not set: source/message_received"):
+            await source.namespace["message_received"].send_async(source, message="lost")
+
+    with connected_signals([(source, dead_end), (source, target)]):
+        await source.namespace["message_received"].send_async(source, message="delivered")
+
+    assert target.received_messages == ["delivered"]
+
+
+async def test_route_skips_collected_receivers():
+    signals = TestSignals(name="signals")
+    received = []
+
+    class Receiver:
+        async def on_message(self, sender, **kw):
+            received.append(kw['message'])
+
+    receiver = Receiver()
+    signals.message_received.connect(receiver.on_message)
+    await signals.message_received.send_async("response", message="first")
+    del receiver
+    await signals.message_received.send_async("response", message="second")
+
+    assert received == ["first"]
+    assert signals.received_messages == ["first", "second"]
+
+
+async def test_coalescing_sender():
+    signals = BaseSignals(name="signals")
+    response = signals.namespace.signal("response")
+    received = []
+
+    async def on_response(sender, **kw):
+        received.append(kw['value'])
+
+    response.connect(on_response, sender="response")
+    coalescing_sender = CoalescingSender(response, "response", max_chars=4, max_delay=60)
+
+    for chunk in ["a", "bc", "de", "f"]:
+        await coalescing_sender.send(chunk)
+    assert received == ["abcde"]
+
+    await coalescing_sender.flush()
+    await coalescing_sender.flush()
+    assert received == ["abcde", "f"]
@@ -2,9 +2,28 @@ import hashlib
 import json
 from typing import Dict, Any
 
+from taskmates.core.workflow_engine.input_blobs import with_blob_references, BLOB_THRESHOLD
+
 
 def generate_cache_key(outcome: str, inputs: Dict[str, Any]) -> str:
-    """Generate a cache key from outcome and inputs."""
-    sorted_inputs = json.dumps(inputs, sort_keys=True)
+    """
+    Generate a cache key from outcome and inputs.
+
+    Strings longer than BLOB_THRESHOLD enter the key by their (memoized) digest, so large transcripts and
+    code bases are hashed once. Keys of inputs without such strings are unchanged.
+    """
+    sorted_inputs = json.dumps(with_blob_references(inputs), sort_keys=True)
     hash_value = hashlib.sha256(sorted_inputs.encode()).hexdigest()
     return f"{outcome}/{hash_value}"
+
+
+def test_generate_cache_key_is_stable_for_small_inputs():
+    assert generate_cache_key("op", {"b": [1, "x"], "a": {"c": None}}) == \
+           "op/abb6530f6cd8980710c0584e84a10cd9b37bf3c60bfcb220a9852656e299ae5b"
+
+
+def test_generate_cache_key_references_large_strings_by_digest():
+    large = "x" * (BLOB_THRESHOLD + 1)
+
+    assert generate_cache_key("op", {"text": large}) == generate_cache_key("op", {"text": "x" + large[1:]})
+    assert generate_cache_key("op", {"text": large}) != generate_cache_key("op", {"text": large + "y"})
@@ -0,0 +1,146 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+
+# Strings of inputs longer than this are referenced by digest in cache keys and stored inputs
+BLOB_THRESHOLD = int(os.environ.get("TASKMATES_INPUT_BLOB_THRESHOLD", 4096))
+# The memoized strings are kept alive, so they are bounded by their total size rather than by their number
+MAX_MEMOIZED_DIGEST_BYTES = int(os.environ.get("TASKMATES_MAX_MEMOIZED_DIGEST_BYTES", 64 * 1024 * 1024))
+
+BLOB_REFERENCE = "$blob"
+
+# string -> sha256 hex digest. Looking a string up is much cheaper than hashing it again: Python caches
+# the hash of a str object, and compares equal objects by identity first.
+string_digests: OrderedDict[str, str] = OrderedDict()
+string_digests_bytes = 0
+string_digests_lock = threading.Lock()
+
+
+def string_digest(value: str) -> str:
+    global string_digests_bytes
+    with string_digests_lock:
+        digest = string_digests.get(value)
+        if digest is not None:
+            string_digests.move_to_end(value)
+            return digest
+
+    digest = hashlib.sha256(value.encode("utf-8", "surrogatepass")).hexdigest()
+    if len(value) > MAX_MEMOIZED_DIGEST_BYTES:
+        return digest
+    with string_digests_lock:
+        if value not in string_digests:
+            string_digests[value] = digest
+            string_digests_bytes += len(value)
+            while string_digests_bytes > MAX_MEMOIZED_DIGEST_BYTES:
+                evicted, _ = string_digests.popitem(last=False)
+                string_digests_bytes -= len(evicted)
+    return digest
+
+
+def clear_string_digests():
+    global string_digests_bytes
+    with string_digests_lock:
+        string_digests.clear()
+        string_digests_bytes = 0
+
+
+def with_blob_references(value: Any, blobs: Optional[Dict[str, str]] = None) -> Any:
+    """
+    Returns `value` with its strings longer than BLOB_THRESHOLD replaced by {"$blob": digest}, adding
+    them to `blobs` by digest. Values without such strings are returned as is.
+    """
+    if isinstance(value, str):
+        if len(value) <= BLOB_THRESHOLD:
+            return value
+        digest = string_digest(value)
+        if blobs is not None:
+            blobs[digest] = value
+        return {BLOB_REFERENCE: digest}
+    if isinstance(value, dict):
+        items = {key: with_blob_references(item, blobs) for key, item in value.items()}
+        return value if all(items[key] is item for key, item in value.items()) else items
+    if isinstance(value, (list, tuple)):
+        items = [with_blob_references(item, blobs) for item in value]
+        return value if all(new is old for new, old in zip(items, value)) else items
+    return value
+
+
+def resolve_blob_references(value: Any, read_blob: Callable[[str], str]) -> Any:
+    """The reverse of `with_blob_references`, reading each blob with `read_blob(digest)`."""
+    if isinstance(value, dict):
+        if value.keys() == {BLOB_REFERENCE}:
+            return read_blob(value[BLOB_REFERENCE])
+        return {key: resolve_blob_references(item, read_blob) for key, item in value.items()}
+    if isinstance(value, list):
+        return [resolve_blob_references(item, read_blob) for item in value]
+    return value
+
+
+class BlobStore:
+    """
+    Content-addressed text blobs in {blobs_dir}/{digest[:2]}/{digest}, each stored once.
+    """
+
+    def __init__(self, blobs_dir: Path):
+        self.blobs_dir = Path(blobs_dir)
+
+    def path(self, digest: str) -> Path:
+        return self.blobs_dir / digest[:2] / digest
+
+    def put(self, digest: str, text: str) -> None:
+        path = self.path(digest)
+        if path.exists():
+            return
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        temp_path.write_text(text, encoding="utf-8")
+        os.replace(temp_path, path)
+
+    def put_all(self, blobs: Dict[str, str]) -> None:
+        for digest, text in blobs.items():
+            self.put(digest, text)
+
+    def get(self, digest: str) -> str:
+        return self.path(digest).read_text(encoding="utf-8")
+
+
+def test_with_blob_references_replaces_large_strings_only():
+    large = "x" * (BLOB_THRESHOLD + 1)
+    small_inputs = {"question": "q", "chunks": [{"uri": "a.py"}]}
+    blobs = {}
+
+    referenced = with_blob_references({"question": "q", "chunks": [{"uri": "a.py", "text": large}]}, blobs)
+
+    assert with_blob_references(small_inputs) is small_inputs
+    assert referenced == {"question": "q", "chunks": [{"uri": "a.py", "text": {BLOB_REFERENCE: string_digest(large)}}]}
+    assert blobs == {string_digest(large): large}
+
+
+def test_blob_store_round_trip(tmp_path):
+    large = "é" * (BLOB_THRESHOLD + 1)
+    inputs = {"markdown_chat": large, "other": [large, 1]}
+    blobs = {}
+    referenced = with_blob_references(inputs, blobs)
+
+    store = BlobStore(tmp_path)
+    store.put_all(blobs)
+    store.put_all(blobs)
+
+    assert len(list(tmp_path.glob("*/*"))) == 1
+    assert resolve_blob_references(referenced, store.get) == inputs
+
+
+def test_memoized_digests_are_bounded_by_size(monkeypatch):
+    monkeypatch.setattr(f"{__name__}.MAX_MEMOIZED_DIGEST_BYTES", 10)
+    clear_string_digests()
+
+    for value in ["a" * 4, "b" * 4, "a" * 4, "c" * 4, "d" * 11]:
+        string_digest(value)
+
+    assert list(string_digests) == ["a" * 4, "c" * 4]
+    assert string_digests_bytes == 8
+    assert string_digest("d" * 11) == hashlib.sha256(b"d" * 11).hexdigest()
+    clear_string_digests()
@@ -3,13 +3,17 @@ from datetime import datetime
 from typing import Dict, Any, Optional, Hashable
 
 from pydantic import BaseModel, ConfigDict, Field, field_validator, model_validator
-from typeguard import typechecked
+from typeguard import typeguard_ignore
 
+from taskmates.core.workflow_engine.generate_cache_key import generate_cache_key
+from taskmates.lib.typeguard_.typechecked import typechecked
 from taskmates.types import ResultFormat
 
 
 @typechecked
 class ObjectiveKey(Dict[str, Any]):
+    __slots__ = ("_hash", "_cache_key")
+
     def __init__(self,
                  outcome: Optional[str] = None,
                  inputs: Optional[Dict[str, Any]] = None,
@@ -20,9 +24,33 @@ class ObjectiveKey(Dict[str, Any]):
         self['inputs'] = inputs or {}  # args
         self['scope'] = scope or datetime.now()  # scope
         # self['requesting_run'] = requesting_run  # context
-        self._hash = hash((self['outcome'], str(self['inputs'])))
+        self._hash: Optional[int] = None
+        self._cache_key: Optional[str] = None
+
+    @classmethod
+    @typeguard_ignore
+    def lightweight(cls, outcome: Optional[str] = None, inputs: Optional[Dict[str, Any]] = None) -> 'ObjectiveKey':
+        """Like `ObjectiveKey(outcome=outcome, inputs=inputs)`, without the type checks, see Transaction.lightweight."""
+        key = dict.__new__(cls)
+        dict.__init__(key, outcome=outcome, inputs=inputs or {}, scope=datetime.now())
+        key._hash = None
+        key._cache_key = None
+        return key
+
+    @property
+    def cache_key(self) -> str:
+        """The cache key of the outcome and inputs (see generate_cache_key), computed once."""
+        if self._cache_key is None:
+            self._cache_key = generate_cache_key(self['outcome'], self['inputs'])
+        return self._cache_key
 
     def __hash__(self) -> int:
+        if self._hash is None:
+            try:
+                self._hash = hash(self.cache_key)
+            except TypeError:
+                # Inputs that aren't JSON serializable
+                self._hash = hash((self['outcome'], str(self['inputs'])))
         return self._hash
 
     def __eq__(self, other: object) -> bool:
@@ -121,6 +149,15 @@ def test_objective_get_root():
     single = Objective(key=ObjectiveKey(outcome="single"))
     assert single._get_root() is single
 
+
+def test_objective_key_memoizes_cache_key():
+    key = ObjectiveKey(outcome="op", inputs={"markdown_chat": "hello"})
+
+    assert key.cache_key == generate_cache_key("op", {"markdown_chat": "hello"})
+    assert key.cache_key is key.cache_key
+    assert hash(key) == hash(ObjectiveKey(outcome="op", inputs={"markdown_chat": "hello"}))
+    assert hash(ObjectiveKey(outcome="op", inputs={"callback": object()})) is not None
+
 # def test_objective_dump_graph_with_current():
 #     # Create a root objective
 #     root = Objective(key=ObjectiveKey(outcome="root", inputs={"root_input": "value"}))
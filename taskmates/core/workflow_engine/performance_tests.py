@@ -0,0 +1,500 @@
+import asyncio
+import random
+import string
+import time
+import timeit
+
+import pytest
+
+from taskmates.core.workflow_engine.generate_cache_key import generate_cache_key
+from taskmates.core.workflow_engine.sqlite_transaction_cache import SqliteCache, migrate_directory_cache
+from taskmates.core.workflow_engine.transaction_cache import DirectoryCache
+
+pytestmark = pytest.mark.slow
+
+
+def chunk_results(rng: random.Random, count: int) -> list[tuple[str, str, dict, list]]:
+    outcome = "taskmates.workflows.codebase_rag.operations.select_chunks.select_chunks"
+    entries = []
+    for i in range(count):
+        inputs = {"question": "How are transactions cached?", "batch": i}
+        chunks = [{"uri": f"file_{i}_{j}.py", "content": "".join(rng.choices(string.printable, k=2000))}
+                  for j in range(4)]
+        entries.append((outcome, generate_cache_key(outcome, inputs), inputs, chunks))
+    return entries
+
+
+@pytest.mark.timeout(120)
+@pytest.mark.xdist_group(name="performance")
+def test_performance_sqlite_cache(tmp_path):
+    entries = chunk_results(random.Random(0), 500)
+    directory_cache = DirectoryCache(tmp_path / "cache")
+    sqlite_cache = SqliteCache(tmp_path / "results.sqlite")
+
+    def write_directory():
+        for entry in entries:
+            directory_cache.set(*entry)
+
+    def write_sqlite():
+        for entry in entries:
+            sqlite_cache.set(*entry)
+
+    def read(cache):
+        for outcome, cache_key, _, result in entries:
+            assert cache.get(outcome, cache_key) == result
+
+    directory_write_time = timeit.timeit(write_directory, number=1)
+    sqlite_write_time = timeit.timeit(write_sqlite, number=1)
+    directory_read_time = timeit.timeit(lambda: read(directory_cache), number=1)
+    sqlite_read_time = timeit.timeit(lambda: read(sqlite_cache), number=1)
+    migration_time = timeit.timeit(lambda: migrate_directory_cache(tmp_path / "cache",
+                                                                   SqliteCache(tmp_path / "migrated.sqlite")),
+                                   number=1)
+
+    print(f"{len(entries)} results: "
+          f"directory write {directory_write_time:.4f}s, read {directory_read_time:.4f}s; "
+          f"sqlite write {sqlite_write_time:.4f}s, read {sqlite_read_time:.4f}s; "
+          f"migration {migration_time:.4f}s")
+    assert sqlite_read_time < directory_read_time / 5, \
+        f"Reading from SQLite took too long: {sqlite_read_time:.4f} seconds"
+    assert sqlite_write_time < directory_write_time, \
+        f"Writing to SQLite took too long: {sqlite_write_time:.4f} seconds"
+
+
+@pytest.mark.timeout(60)
+@pytest.mark.xdist_group(name="performance")
+async def test_performance_map_parallel_scales_with_concurrency():
+    from taskmates.core.workflow_engine.transaction_cache import NoCache
+    from taskmates.core.workflow_engine.transaction_manager import TransactionManager, runtime
+
+    async def select_batch(batch: int) -> int:
+        await asyncio.sleep(0.02)  # an LLM call
+        return batch
+
+    async def run(max_concurrency: int) -> float:
+        manager = TransactionManager(cache=NoCache(), max_concurrency=max_concurrency)
+        start = time.perf_counter()
+        with runtime.transaction_manager_context(manager):
+            await manager.map_parallel(select_batch, [{"batch": i} for i in range(32)])
+        return time.perf_counter() - start
+
+    sequential_time = await run(1)
+    parallel_time = await run(8)
+
+    print(f"32 operations: 1 worker {sequential_time:.4f} seconds, 8 workers {parallel_time:.4f} seconds")
+    assert parallel_time < sequential_time / 4, f"map_parallel took too long: {parallel_time:.4f} seconds"
+
+
+def measure_transaction_overhead() -> None:
+    """
+    Prints the construction and execution times per transaction as JSON, under the TASKMATES_TYPECHECK policy of
+    the process.
+    """
+    import json
+
+    from taskmates.core.workflow_engine.objective import Objective, ObjectiveKey
+    from taskmates.core.workflow_engine.transaction_cache import NoCache
+    from taskmates.core.workflow_engine.transaction_manager import ExecutableTransaction, TransactionManager, \
+        runtime
+    from taskmates.core.workflow_engine.transactions.transaction import Transaction, EMITS, CONSUMES
+    from taskmates.core.workflow_engine.transactions.transactional import transactional
+    from taskmates.lib.pydantic_.construct import construct
+    from taskmates.lib.typeguard_.typechecked import TYPECHECK_POLICY
+
+    context = {"runner_environment": {"taskmates_dirs": [], "markdown_path": "test.md", "cwd": "/tmp",
+                                      "request_id": "test-request", "env": {}},
+               "run_opts": {"model": "test", "max_steps": 10}}
+    manager = TransactionManager(cache=NoCache())
+
+    async def count_tokens(text: str) -> int:
+        return len(text)
+
+    def validated(parent: Transaction, text: str = "chunk") -> ExecutableTransaction:
+        objective = Objective(key=ObjectiveKey(outcome="count_tokens", inputs={"text": text}))
+        transaction = ExecutableTransaction(of=parent, manager=manager, context=parent.context.copy(),
+                                            operation=count_tokens, objective=objective)
+        transaction.bind_to_parent(parent)
+        return transaction
+
+    def eager(parent: Transaction, text: str) -> ExecutableTransaction:
+        # What each transaction cost before its signal groups were created on first access: all of them,
+        # relayed to the parent once entered
+        transaction = validated(parent, text)
+        for name in EMITS:
+            transaction.emits[name]
+        for name in CONSUMES:
+            transaction.consumes[name]
+        return transaction
+
+    def lightweight(parent: Transaction) -> ExecutableTransaction:
+        key = ObjectiveKey.lightweight(outcome="count_tokens", inputs={"text": "chunk"})
+        return ExecutableTransaction.lightweight(bound=True, of=parent, manager=manager,
+                                                 context=parent.context.copy(), operation=count_tokens,
+                                                 objective=construct(Objective, key=key), max_retries=1,
+                                                 initial_delay=1.0)
+
+    @transactional
+    async def select_chunks(count: int) -> int:
+        return sum([await transactional(count_tokens)(text=f"chunk {i}") for i in range(count)])
+
+    @transactional
+    async def select_chunks_eagerly(count: int) -> int:
+        return sum([await eager(runtime.transaction, text=f"chunk {i}")() for i in range(count)])
+
+    async def executed(select_chunks) -> float:
+        await select_chunks(count=10)
+        samples = []
+        for _ in range(5):
+            start = time.perf_counter()
+            await select_chunks(count=500)
+            samples.append((time.perf_counter() - start) / 500)
+        return min(samples)
+
+    async def measure() -> dict:
+        parent = Transaction(objective=Objective(key=ObjectiveKey(outcome="select_files")), context=context)
+        results = {
+            # Many short samples, so that the minimum is not skewed by other processes running at the same time
+            "validated": min(timeit.repeat(lambda: validated(parent), number=200, repeat=10)) / 200,
+            "lightweight": min(timeit.repeat(lambda: lightweight(parent), number=200, repeat=10)) / 200,
+        }
+        with runtime.transaction_manager_context(manager):
+            results["executed"] = await executed(select_chunks)
+            results["eagerly_executed"] = await executed(select_chunks_eagerly)
+        return results
+
+    print(json.dumps({"policy": TYPECHECK_POLICY, **asyncio.run(measure())}))
+
+
+@pytest.mark.timeout(120)
+@pytest.mark.xdist_group(name="performance")
+def test_performance_transaction_overhead():
+    import json
+    import os
+    import subprocess
+    import sys
+
+    # Without type checks, as in production. The policy is applied when the modules are imported
+    output = subprocess.run(
+        [sys.executable, "-c", f"from {__name__} import measure_transaction_overhead; measure_transaction_overhead()"],
+        env={**os.environ, "TASKMATES_TYPECHECK": "off"}, capture_output=True, text=True, check=True).stdout
+    results = json.loads(output.strip().splitlines()[-1])
+
+    print(f"Per transaction: validated construction {results['validated'] * 1e6:.1f}us, "
+          f"lightweight construction {results['lightweight'] * 1e6:.1f}us, "
+          f"executed {results['executed'] * 1e6:.1f}us, "
+          f"eagerly executed {results['eagerly_executed'] * 1e6:.1f}us")
+    assert results["policy"] == "off"
+    # About 3.3x faster when measured alone. Without type checks, validating the models costs little more than
+    # building them: what remains is creating and relaying the signal groups, and executing the transaction
+    assert results["executed"] < results["eagerly_executed"] / 2, \
+        f"Executing a transaction took too long: {results['executed'] * 1e6:.1f}us"
+
+
+@pytest.mark.timeout(120)
+@pytest.mark.xdist_group(name="performance")
+async def test_performance_relayed_response_dispatch():
+    from blinker import NamedSignal
+
+    from taskmates.core.workflow_engine.base_signals import connected_signals
+    from taskmates.core.workflows.signals.execution_environment_signals import ExecutionEnvironmentSignals
+
+    tokens = 2000
+    received = []
+
+    async def history_sink(sender, value):
+        received.append(value)
+
+    async def websocket_streamer(sender, value):
+        pass
+
+    async def markdown_chat_daemon(sender, value):
+        pass
+
+    final_receivers = [history_sink, websocket_streamer, markdown_chat_daemon]
+
+    async def per_token(send) -> float:
+        start = time.perf_counter()
+        for i in range(tokens):
+            await send("response", value="token ")
+        return (time.perf_counter() - start) / tokens
+
+    async def routed(depth: int) -> float:
+        # The response of the innermost transaction, relayed up to the outermost one
+        levels = [ExecutionEnvironmentSignals(name=f"level{i}") for i in range(depth + 1)]
+        for receiver in final_receivers:
+            levels[-1].response.connect(receiver, sender="response")
+        with connected_signals([(levels[i], levels[i + 1]) for i in range(depth)]):
+            return await per_token(levels[0].response.send_async)
+
+    async def relayed_per_hop(depth: int) -> float:
+        # What each hop costs when sending through each relay in turn
+        levels = [NamedSignal(f"level{i}") for i in range(depth + 1)]
+        for receiver in final_receivers:
+            levels[-1].connect(receiver, sender="response")
+        for i in range(depth):
+            levels[i].connect(levels[i + 1].send_async, weak=False)
+        return await per_token(levels[0].send_async)
+
+    report = []
+    for depth in range(1, 6):
+        routed_time = await routed(depth)
+        per_hop_time = await relayed_per_hop(depth)
+        report.append((depth, routed_time, per_hop_time))
+        print(f"Depth {depth}: routed {routed_time * 1e6:.1f}us per token, "
+              f"relayed per hop {per_hop_time * 1e6:.1f}us per token")
+
+    assert len(received) == tokens * 5 * 2
+    depth, routed_time, per_hop_time = report[-1]
+    assert routed_time < per_hop_time / 2, f"Routing took too long: {routed_time * 1e6:.1f}us per token"
+
+
+def measure_typecheck_policy() -> None:
+    """
+    Prints the streaming and participants times per call as JSON, under the TASKMATES_TYPECHECK policy of the process.
+    """
+    import json
+    import tempfile
+    from pathlib import Path
+
+    from langchain_core.messages import AIMessageChunk
+
+    from taskmates.core.markdown_chat.parse_front_matter_and_messages import parse_front_matter_and_messages
+    from taskmates.core.markdown_chat.participants.compute_participants import compute_participants
+    from taskmates.core.workflows.markdown_completion.completions.llm_completion.response.llm_completion_markdown_appender import \
+        LlmCompletionMarkdownAppender
+    from taskmates.core.workflows.signals.execution_environment_signals import ExecutionEnvironmentSignals
+    from taskmates.lib.typeguard_.typechecked import TYPECHECK_POLICY
+
+    async def stream(tokens: int) -> float:
+        signals = ExecutionEnvironmentSignals(name="stream")
+
+        async def sink(sender, value):
+            pass
+
+        signals.response.connect(sink)
+        appender = LlmCompletionMarkdownAppender(recipient="assistant", last_tool_call_id=0, is_resume_request=False,
+                                                 execution_environment_signals=signals)
+        chunks = [AIMessageChunk(content=f"token{i} ") for i in range(tokens)]
+        start = time.perf_counter()
+        for chunk in chunks:
+            await appender.process_chat_completion_chunk(chunk)
+        return (time.perf_counter() - start) / tokens
+
+    content = "".join(f"**{'user' if i % 2 == 0 else 'assistant'}>** Message {i} for @assistant\n\n"
+                      for i in range(200))
+
+    front_matter, messages = parse_front_matter_and_messages(content, Path(tempfile.mkdtemp()) / "chat.md")
+
+    def participants():
+        # What each completion step does with the parsed chat: the recipient and role of every message,
+        # through checked functions. Parsing itself spends little time in them
+        compute_participants(dict(front_matter), [dict(message) for message in messages])
+
+    asyncio.run(stream(100))
+    streaming_time = asyncio.run(stream(5000))
+    # Many short samples, so that the minimum is not skewed by other processes running at the same time
+    participants_time = min(timeit.repeat(participants, number=5, repeat=15)) / 5
+    print(json.dumps({"policy": TYPECHECK_POLICY, "streaming": streaming_time, "participants": participants_time}))
+
+
+@pytest.mark.timeout(300)
+@pytest.mark.xdist_group(name="performance")
+def test_performance_typecheck_policies():
+    import json
+    import os
+    import subprocess
+    import sys
+
+    results = {}
+    for policy in ("full", "sampled", "off"):
+        # The policy is applied when the modules are imported, so each one is measured in a fresh process
+        output = subprocess.run(
+            [sys.executable, "-c", f"from {__name__} import measure_typecheck_policy; measure_typecheck_policy()"],
+            env={**os.environ, "TASKMATES_TYPECHECK": policy}, capture_output=True, text=True, check=True).stdout
+        results[policy] = json.loads(output.strip().splitlines()[-1])
+        print(f"Type checks {policy}: streaming {results[policy]['streaming'] * 1e6:.1f}us per token, "
+              f"participants {results[policy]['participants'] * 1e3:.2f}ms per chat")
+
+    assert all(results[policy]["policy"] == policy for policy in results)
+    assert results["off"]["streaming"] < results["full"]["streaming"] / 1.5, \
+        f"Streaming without type checks took too long: {results['off']['streaming'] * 1e6:.1f}us per token"
+    # About 7x faster when measured alone
+    assert results["off"]["participants"] < results["full"]["participants"] / 3, \
+        f"Participants without type checks took too long: {results['off']['participants'] * 1e3:.2f}ms per chat"
+
+
+def measure_streaming_scaling() -> None:
+    """
+    Prints, as JSON, the time per chunk of streaming completions of increasing sizes through the stop sequence
+    processor, the streamed response, the markdown appender and the markdown chat, by replaying the chunks of a
+    recorded streaming response until each size is reached.
+    """
+    import json
+
+    from langchain_core.messages import AIMessageChunk
+
+    from taskmates.core.workflows.daemons.markdown_chat_daemon import MarkdownChatDaemon
+    from taskmates.core.workflows.markdown_completion.completions.llm_completion.response.llm_completion_markdown_appender import \
+        LlmCompletionMarkdownAppender
+    from taskmates.core.workflows.markdown_completion.completions.llm_completion.response.stop_sequence_processor import \
+        StopSequenceProcessor
+    from taskmates.core.workflows.markdown_completion.completions.llm_completion.response.streamed_response import \
+        StreamedResponse
+    from taskmates.core.workflows.signals.execution_environment_signals import ExecutionEnvironmentSignals
+    from taskmates.core.workflows.states.markdown_chat import MarkdownChat
+    from taskmates.lib.root_path.root_path import root_path
+
+    fixture = root_path() / "tests/fixtures/api-responses/grok_live_search_streaming_response.jsonl"
+    recorded = [AIMessageChunk(content=data["content"], id=data.get("id"))
+                for data in map(json.loads, fixture.read_text().splitlines())
+                if isinstance(data.get("content"), str) and data["content"]]
+    recorded_size = sum(len(chunk.content) for chunk in recorded)
+
+    async def replay(size: int):
+        for _ in range(size // recorded_size + 1):
+            for chunk in recorded:
+                yield chunk
+
+    async def stream(size: int) -> tuple[float, int]:
+        signals = ExecutionEnvironmentSignals(name="stream")
+        markdown_chat = MarkdownChat(initial="**user>** Search the news\n\n")
+        appender = LlmCompletionMarkdownAppender(recipient="assistant", last_tool_call_id=0, is_resume_request=False,
+                                                 execution_environment_signals=signals)
+        response = StreamedResponse()
+        chunks = 0
+        with MarkdownChatDaemon(signals, markdown_chat):
+            start = time.perf_counter()
+            async for chunk in StopSequenceProcessor(replay(size), stop_sequences=["\n**user>** "]):
+                await response.accept(chunk)
+                await appender.process_chat_completion_chunk(chunk)
+                chunks += 1
+            completion = markdown_chat.get()["completion"]
+            elapsed = time.perf_counter() - start
+        assert len(response.content_delta) == len(markdown_chat.get()["text"]) >= size
+        return elapsed / chunks, len(completion)
+
+    asyncio.run(stream(recorded_size))
+    print(json.dumps([stream_result for stream_result in map(asyncio.run, map(stream, (128_000, 1_200_000)))]))
+
+
+@pytest.mark.timeout(300)
+@pytest.mark.xdist_group(name="performance")
+def test_performance_streaming_scales_linearly():
+    import json
+    import os
+    import subprocess
+    import sys
+
+    # Type checks add the same cost to every chunk, so they are turned off to keep the 1MB run short
+    output = subprocess.run(
+        [sys.executable, "-c", f"from {__name__} import measure_streaming_scaling; measure_streaming_scaling()"],
+        env={**os.environ, "TASKMATES_TYPECHECK": "off"}, capture_output=True, text=True, check=True).stdout
+    (small_time, small_size), (large_time, large_size) = json.loads(output.strip().splitlines()[-1])
+    print(f"Streaming {small_size / 1e3:.0f}KB: {small_time * 1e6:.1f}us per chunk, "
+          f"{large_size / 1e6:.1f}MB: {large_time * 1e6:.1f}us per chunk")
+
+    assert large_size > 1_000_000
+    assert large_time < small_time * 2, f"Streaming 1MB took too long: {large_time * 1e6:.1f}us per chunk"
+
+
+@pytest.mark.timeout(120)
+@pytest.mark.xdist_group(name="performance")
+async def test_performance_stream_post_processing():
+    from taskmates.core.workflows.markdown_completion.completions.llm_completion.response.llm_completion_pre_processor import \
+        LlmCompletionPreProcessor
+    from taskmates.core.workflows.markdown_completion.completions.llm_completion.response.llm_completion_stream_processor import \
+        LlmCompletionStreamProcessor, STREAMING_FIXTURES
+    from taskmates.core.workflows.markdown_completion.completions.llm_completion.response.llm_completion_with_username import \
+        LlmCompletionWithUsername
+    from taskmates.core.workflows.markdown_completion.completions.llm_completion.response.stop_sequence_processor import \
+        StopSequenceProcessor, load_fixture_chunks, collect_chunks
+
+    stop_sequences = ["^######", "\n**user>** "]
+    repeats = 30
+
+    pipelines = {
+        "unprocessed": lambda chunks: chunks,
+        "stacked": lambda chunks: LlmCompletionWithUsername(
+            LlmCompletionPreProcessor(StopSequenceProcessor(chunks, stop_sequences))),
+        "fused": lambda chunks: LlmCompletionStreamProcessor(chunks, stop_sequences),
+    }
+
+    def has_text(chunk) -> bool:
+        if isinstance(chunk.content, str):
+            return bool(chunk.content)
+        return any(isinstance(part, dict) and part.get("type") == "text" and part.get("text")
+                   for part in chunk.content)
+
+    async def replay(chunks):
+        for chunk in chunks:
+            yield chunk
+
+    async def run(pipeline, chunks) -> tuple[float, float]:
+        """Returns the time to process the whole stream and the time until the first text is yielded."""
+        start = time.perf_counter()
+        first_text = None
+        async for chunk in pipeline(replay(chunks)):
+            if first_text is None and has_text(chunk):
+                first_text = time.perf_counter() - start
+        total = time.perf_counter() - start
+        return total, total if first_text is None else first_text
+
+    totals = {name: 0.0 for name in pipelines}
+    first_texts = {name: 0.0 for name in pipelines}
+    source_chunks = 0
+    for fixture_name in STREAMING_FIXTURES:
+        recorded = await collect_chunks(load_fixture_chunks(fixture_name))
+        source_chunks += len(recorded)
+        for name, pipeline in pipelines.items():
+            # The processors modify the chunks they pass through, so each run gets its own copies
+            copies = [[chunk.model_copy(deep=True) for chunk in recorded] for _ in range(repeats)]
+            total, first_text = min([await run(pipeline, chunks) for chunks in copies])
+            totals[name] += total
+            first_texts[name] += first_text
+
+    overhead = {name: (totals[name] - totals["unprocessed"]) / source_chunks for name in ("stacked", "fused")}
+    extra_first_text = {name: (first_texts[name] - first_texts["unprocessed"]) / len(STREAMING_FIXTURES)
+                        for name in ("stacked", "fused")}
+    for name in ("stacked", "fused"):
+        print(f"{name.capitalize()} post-processing over {len(STREAMING_FIXTURES)} fixtures: "
+              f"{overhead[name] * 1e6:.1f}us per chunk, "
+              f"{extra_first_text[name] * 1e6:.1f}us added to the time to the first text")
+
+    assert overhead["fused"] < overhead["stacked"], \
+        f"Fused post-processing took too long: {overhead['fused'] * 1e6:.1f}us per chunk"
+
+
+@pytest.mark.timeout(120)
+@pytest.mark.xdist_group(name="performance")
+def test_performance_tool_schema_registry():
+    from langchain_core.tools import StructuredTool
+
+    from taskmates.core.tools_registry import tools_registry
+    from taskmates.core.workflows.markdown_completion.completions.llm_completion.request.build_llm_args import \
+        build_llm_args
+    from taskmates.core.workflows.markdown_completion.completions.llm_completion.request.tool_schema_registry import \
+        tool_schema_registry
+
+    available_tools = ["echo", "get_weather", "run_shell_command", "read_file", "write_file",
+                       "append_to_file", "delete_file", "move", "create_directory",
+                       "create_issue", "read_issue", "add_comment", "update_status",
+                       "search_issues"]
+    messages = [{"role": "user", "content": "Hello", "recipient": "assistant", "recipient_role": "assistant"}]
+    repeats = 20
+
+    def from_scratch():
+        for name in available_tools:
+            StructuredTool.from_function(func=tools_registry[name])
+
+    def memoized():
+        build_llm_args(messages, available_tools, {}, {}, {}, client=None)
+
+    tool_schema_registry.warm(tools_registry)
+    scratch_time = min(timeit.repeat(from_scratch, number=1, repeat=repeats))
+    memoized_time = min(timeit.repeat(memoized, number=1, repeat=repeats))
+
+    print(f"Tools for {len(available_tools)} functions: {scratch_time * 1e3:.2f}ms built from scratch, "
+          f"{memoized_time * 1e3:.2f}ms for the whole build_llm_args with memoized tools")
+
+    assert memoized_time < scratch_time / 2, \
+        f"build_llm_args took too long with memoized tools: {memoized_time * 1e3:.2f}ms"
@@ -0,0 +1,391 @@
+import asyncio
+import importlib
+import os
+import socket
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+from uuid import uuid4
+
+import pytest
+from loguru import logger
+
+from taskmates.core.workflow_engine.transaction_cache import read_operation_and_inputs, blob_store_of
+from taskmates.core.workflow_engine.transaction_manager import TransactionManager, TransactionalOperation, runtime
+from taskmates.core.workflow_engine.transaction_scheduler import DEFAULT_MAX_CONCURRENCY
+
+QUEUE_LEASES_FILENAME = "queue_leases.sqlite"
+DEFAULT_LEASE_TTL = float(os.environ.get("TASKMATES_QUEUE_LEASE_TTL", 60))
+DEFAULT_MAX_ATTEMPTS = int(os.environ.get("TASKMATES_QUEUE_MAX_ATTEMPTS", 3))
+
+
+class QueueLeases:
+    """
+    Leases on the queued operations of a cache directory, shared by the worker processes through a SQLite
+    file in that directory.
+
+    A worker processes an operation only while it holds its lease. Leases expire `lease_ttl` seconds after
+    they were claimed or last renewed, so the operations of a crashed worker are claimed again by the others.
+    Each claim counts as an attempt: operations are no longer claimed after `max_attempts`.
+    """
+
+    def __init__(self, path: Path, lease_ttl: float = DEFAULT_LEASE_TTL, max_attempts: int = DEFAULT_MAX_ATTEMPTS):
+        self.path = Path(path)
+        self.lease_ttl = lease_ttl
+        self.max_attempts = max_attempts
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._connection = sqlite3.connect(str(self.path), isolation_level=None, timeout=30,
+                                           check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("CREATE TABLE IF NOT EXISTS leases ("
+                                     "cache_key TEXT PRIMARY KEY, "
+                                     "worker_id TEXT NOT NULL, "
+                                     "expires_at REAL NOT NULL, "
+                                     "attempts INTEGER NOT NULL, "
+                                     "error TEXT)")
+
+    def claim(self, cache_key: str, worker_id: str) -> bool:
+        """Claims the lease of `cache_key` if nobody holds it and it has attempts left."""
+        now = time.time()
+        with self._lock:
+            cursor = self._connection.execute(
+                "INSERT INTO leases (cache_key, worker_id, expires_at, attempts) VALUES (?, ?, ?, 1) "
+                "ON CONFLICT (cache_key) DO UPDATE SET "
+                "worker_id = excluded.worker_id, expires_at = excluded.expires_at, "
+                "attempts = leases.attempts + 1, error = NULL "
+                "WHERE leases.expires_at <= ? AND leases.attempts < ?",
+                (cache_key, worker_id, now + self.lease_ttl, now, self.max_attempts))
+        return cursor.rowcount == 1
+
+    def renew(self, worker_id: str, cache_keys: List[str]) -> None:
+        """The heartbeat of `worker_id`: extends the leases it still holds on `cache_keys`."""
+        expires_at = time.time() + self.lease_ttl
+        with self._lock:
+            self._connection.executemany(
+                "UPDATE leases SET expires_at = ? WHERE cache_key = ? AND worker_id = ?",
+                [(expires_at, cache_key, worker_id) for cache_key in cache_keys])
+
+    def complete(self, cache_key: str, worker_id: str) -> None:
+        """Drops the lease of an operation whose result was published."""
+        with self._lock:
+            self._connection.execute("DELETE FROM leases WHERE cache_key = ? AND worker_id = ?",
+                                     (cache_key, worker_id))
+
+    def release(self, cache_key: str, worker_id: str, error: Optional[str] = None) -> None:
+        """
+        Lets other workers claim `cache_key` again. Without an `error` (the worker is shutting down) the
+        attempt isn't counted.
+        """
+        with self._lock:
+            self._connection.execute(
+                "UPDATE leases SET expires_at = 0, error = ?, attempts = attempts - ? "
+                "WHERE cache_key = ? AND worker_id = ?",
+                (error, 0 if error else 1, cache_key, worker_id))
+
+    def exhausted(self) -> Set[str]:
+        """The cache keys that are no longer claimed, as they have failed `max_attempts` times."""
+        with self._lock:
+            rows = self._connection.execute("SELECT cache_key FROM leases WHERE attempts >= ? AND expires_at <= ?",
+                                            (self.max_attempts, time.time())).fetchall()
+        return {cache_key for cache_key, in rows}
+
+    def error(self, cache_key: str) -> Optional[str]:
+        with self._lock:
+            row = self._connection.execute("SELECT error FROM leases WHERE cache_key = ?", (cache_key,)).fetchone()
+        return row[0] if row is not None else None
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+
+def queued_cache_keys(cache_dir: Path) -> List[str]:
+    """The cache keys of the operations queued in `cache_dir` (by TransactionManager.queue) or executed there."""
+    cache_keys = []
+    for outcome_entry in os.scandir(cache_dir):
+        if not outcome_entry.is_dir() or outcome_entry.name == "blobs":
+            continue
+        for entry in os.scandir(outcome_entry.path):
+            if entry.is_dir() and os.path.exists(os.path.join(entry.path, "operation.yml")):
+                cache_keys.append(f"{outcome_entry.name}/{entry.name}")
+    return sorted(cache_keys)
+
+
+def resolve_operation(outcome: str) -> Callable:
+    """Imports the operation of an outcome named `{module}.{qualified name}`, as queued by TransactionManager."""
+    parts = outcome.split(".")
+    for split in range(len(parts) - 1, 0, -1):
+        module_name = ".".join(parts[:split])
+        try:
+            target: Any = importlib.import_module(module_name)
+        except ModuleNotFoundError as e:
+            if e.name is not None and module_name.startswith(e.name):
+                continue
+            raise
+        for name in parts[split:]:
+            target = getattr(target, name)
+        if isinstance(target, TransactionalOperation):
+            target = target.operation
+        return target
+    raise ValueError(f"Cannot import the operation of {outcome!r}")
+
+
+class QueueWorker:
+    """
+    Processes the operations queued in `cache_dir`, together with the other workers sharing it, possibly in
+    other processes or on other hosts sharing the directory: see `taskmates worker`.
+
+    Each operation is claimed through `QueueLeases`, executed by a TransactionManager of `cache_dir` (so its
+    result and logs end up next to its inputs, under the cache key it was queued with), and its lease is
+    renewed every `lease_ttl / 3` seconds while it runs.
+    """
+
+    def __init__(self,
+                 cache_dir: Path,
+                 worker_id: Optional[str] = None,
+                 concurrency: int = DEFAULT_MAX_CONCURRENCY,
+                 lease_ttl: float = DEFAULT_LEASE_TTL,
+                 max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+                 poll_interval: float = 1.0,
+                 max_retries: int = 3,
+                 initial_delay: float = 1.0):
+        self.cache_dir = Path(cache_dir)
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{uuid4().hex[:8]}"
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.max_retries = max_retries
+        self.initial_delay = initial_delay
+        self.manager = TransactionManager(cache_dir=str(self.cache_dir), max_concurrency=concurrency)
+        self.leases = QueueLeases(self.cache_dir / QUEUE_LEASES_FILENAME, lease_ttl, max_attempts)
+        self.blob_store = blob_store_of(self.cache_dir)
+        self.processed = 0
+        self.failed = 0
+        self._held: Set[str] = set()
+        # The queued operations without a result that have attempts left, in queue order (a dict as an ordered set)
+        self._pending: Dict[str, None] = {}
+        # The queued operations known to have a result, which don't need to be checked again
+        self._settled: Set[str] = set()
+        # Pending operations another worker holds the lease of, not claimed again until the next refresh
+        self._contended: Set[str] = set()
+        self._refreshed_at = float("-inf")
+
+    def pending(self) -> List[str]:
+        """The queued operations without a result that have attempts left, as of the last refresh."""
+        return list(self._pending)
+
+    async def refresh(self) -> None:
+        """
+        Updates the pending operations with the ones queued since the last refresh, and drops the ones that got a
+        result (e.g. from another worker) or ran out of attempts. The cache directory is scanned in a thread, so
+        that the heartbeat keeps renewing the leases of large queues.
+        """
+        self._refreshed_at = time.monotonic()
+        known = set(self._pending) | self._settled
+        pending = list(self._pending)
+        new, settled, exhausted = await asyncio.to_thread(self._scan, known, pending)
+
+        self._settled.update(settled)
+        for cache_key in settled | exhausted:
+            self._pending.pop(cache_key, None)
+        for cache_key in new:
+            if cache_key not in exhausted and cache_key not in settled:
+                self._pending[cache_key] = None
+        self._contended.clear()
+
+    def _scan(self, known: Set[str], pending: List[str]) -> Tuple[List[str], Set[str], Set[str]]:
+        """
+        Returns the queued operations that aren't `known` yet, the ones that have a result among them and
+        `pending`, and the ones that ran out of attempts.
+        """
+        exhausted = self.leases.exhausted()
+        new = [cache_key for cache_key in queued_cache_keys(self.cache_dir) if cache_key not in known]
+        settled = {cache_key for cache_key in new + pending if self.manager.cache.has(cache_key)}
+        return new, settled, exhausted
+
+    def _claim(self, running: Set[asyncio.Task]) -> None:
+        """Starts processing pending operations until `concurrency` of them are running."""
+        for cache_key in list(self._pending):
+            if len(running) >= self.concurrency:
+                break
+            if cache_key in self._held or cache_key in self._contended:
+                continue
+            if not self.leases.claim(cache_key, self.worker_id):
+                self._contended.add(cache_key)
+                continue
+            # Completed by another worker since the last refresh: its lease was dropped after its result was set
+            if self.manager.cache.has(cache_key):
+                self.leases.complete(cache_key, self.worker_id)
+                self._pending.pop(cache_key)
+                self._settled.add(cache_key)
+                continue
+            self._held.add(cache_key)
+            task = asyncio.create_task(self._process(cache_key))
+            running.add(task)
+            task.add_done_callback(running.discard)
+
+    async def run(self, exit_when_empty: bool = False) -> int:
+        """
+        Processes queued operations until cancelled, or with `exit_when_empty` until every queued operation
+        has a result or has failed `max_attempts` times. Returns the number of operations processed.
+        """
+        logger.info(f"Worker {self.worker_id} processing the queue of {self.cache_dir}")
+        running: Set[asyncio.Task] = set()
+        heartbeat = asyncio.create_task(self._heartbeat())
+        try:
+            with runtime.transaction_manager_context(self.manager):
+                while True:
+                    # Completed operations are dropped as they complete: the queue is only scanned again
+                    # every poll_interval, not on every completion
+                    if time.monotonic() - self._refreshed_at >= self.poll_interval:
+                        await self.refresh()
+                    self._claim(running)
+
+                    if exit_when_empty and not running and not self._pending:
+                        await self.refresh()
+                        if not self._pending:
+                            break
+                        continue
+
+                    if running:
+                        await asyncio.wait(running, timeout=self.poll_interval,
+                                           return_when=asyncio.FIRST_COMPLETED)
+                    else:
+                        await asyncio.sleep(self.poll_interval)
+        finally:
+            heartbeat.cancel()
+            for task in running:
+                task.cancel()
+            await asyncio.gather(heartbeat, *running, return_exceptions=True)
+            self.leases.close()
+
+        logger.info(f"Worker {self.worker_id} processed {self.processed} operations, {self.failed} failed")
+        return self.processed
+
+    async def _process(self, cache_key: str) -> None:
+        try:
+            outcome, inputs = read_operation_and_inputs(self.cache_dir / cache_key, self.blob_store)
+            operation = TransactionalOperation(operation=resolve_operation(outcome), outcome=outcome,
+                                               max_retries=self.max_retries, initial_delay=self.initial_delay)
+            result = await operation(**inputs)
+            # Inputs that don't survive the YAML round trip would be cached under another key
+            if not self.manager.cache.has(cache_key):
+                self.manager.cache.set(outcome, cache_key, inputs, result)
+        except asyncio.CancelledError:
+            self.leases.release(cache_key, self.worker_id)
+            raise
+        except Exception as e:
+            logger.error(f"Worker {self.worker_id} failed to process {cache_key}: {e}")
+            self.failed += 1
+            self.leases.release(cache_key, self.worker_id, error=repr(e))
+        else:
+            self.processed += 1
+            self.leases.complete(cache_key, self.worker_id)
+            self._pending.pop(cache_key, None)
+            self._settled.add(cache_key)
+        finally:
+            self._held.discard(cache_key)
+
+    async def _heartbeat(self) -> None:
+        while True:
+            await asyncio.sleep(self.leases.lease_ttl / 3)
+            if self._held:
+                self.leases.renew(self.worker_id, list(self._held))
+
+
+def run_worker(cache_dir: str, exit_when_empty: bool, **options) -> int:
+    """Entry point of the worker processes started by `taskmates worker`."""
+    from taskmates.taskmates_runtime import TASKMATES_RUNTIME
+
+    TASKMATES_RUNTIME.get().initialize()
+    return asyncio.run(QueueWorker(Path(cache_dir), **options).run(exit_when_empty=exit_when_empty))
+
+
+calls: List[int] = []
+
+
+async def double(value: int) -> int:
+    calls.append(value)
+    await asyncio.sleep(0.01)
+    return value * 2
+
+
+async def fail(value: int) -> int:
+    raise ValueError(f"Cannot process {value}")
+
+
+@pytest.fixture
+def queued(tmp_path):
+    calls.clear()
+    manager = TransactionManager(cache_dir=str(tmp_path))
+    return manager, [manager.queue(double, {"value": value}) for value in range(6)]
+
+
+async def test_workers_process_each_queued_operation_once(tmp_path, queued):
+    manager, handles = queued
+    workers = [QueueWorker(tmp_path, worker_id=f"worker{i}", concurrency=2, poll_interval=0.01) for i in range(3)]
+
+    processed = await asyncio.gather(*[worker.run(exit_when_empty=True) for worker in workers])
+
+    assert manager.get_results(handles) == [0, 2, 4, 6, 8, 10]
+    assert sorted(calls) == list(range(6))
+    assert sum(processed) == 6
+    assert not any(manager.is_queued(handle['operation_name'], handle['inputs']) for handle in handles)
+
+
+async def test_queue_is_not_scanned_again_on_every_completion(tmp_path, monkeypatch):
+    manager = TransactionManager(cache_dir=str(tmp_path))
+    handles = [manager.queue(double, {"value": value}) for value in range(20)]
+    scans = []
+    original_queued_cache_keys = queued_cache_keys
+
+    def counting_queued_cache_keys(cache_dir):
+        scans.append(threading.current_thread())
+        return original_queued_cache_keys(cache_dir)
+
+    monkeypatch.setattr(f"{__name__}.queued_cache_keys", counting_queued_cache_keys)
+
+    worker = QueueWorker(tmp_path, concurrency=2, poll_interval=60)
+    assert await asyncio.wait_for(worker.run(exit_when_empty=True), timeout=30) == 20
+
+    assert manager.get_results(handles) == [value * 2 for value in range(20)]
+    # Once to start, and once more to make sure nothing was queued meanwhile, both off the event loop
+    assert len(scans) == 2
+    assert threading.main_thread() not in scans
+
+
+async def test_operations_of_crashed_workers_are_claimed_once_their_lease_expires(tmp_path, queued):
+    manager, handles = queued
+    leases = QueueLeases(tmp_path / QUEUE_LEASES_FILENAME, lease_ttl=0.2)
+    assert leases.claim(handles[0]['cache_key'], "crashed")
+    assert not leases.claim(handles[0]['cache_key'], "other")
+
+    worker = QueueWorker(tmp_path, poll_interval=0.05, lease_ttl=0.2)
+    processed = await worker.run(exit_when_empty=True)
+
+    assert processed == 6
+    assert manager.get_result(handles[0]) == 0
+
+
+async def test_failed_operations_are_retried_up_to_max_attempts(tmp_path):
+    manager = TransactionManager(cache_dir=str(tmp_path))
+    handle = manager.queue(fail, {"value": 1})
+
+    worker = QueueWorker(tmp_path, poll_interval=0.01, max_attempts=2, max_retries=1)
+    assert await worker.run(exit_when_empty=True) == 0
+
+    assert worker.failed == 2
+    assert manager.is_queued(handle['operation_name'], handle['inputs'])
+    assert "Cannot process 1" in QueueLeases(tmp_path / QUEUE_LEASES_FILENAME).error(handle['cache_key'])
+
+
+def test_resolve_operation():
+    from taskmates.workflows.codebase_rag.operations.select_chunks import select_chunks
+
+    assert resolve_operation(f"{__name__}.double") is double
+    assert resolve_operation(select_chunks.outcome) is select_chunks.operation
+    with pytest.raises(AttributeError):
+        resolve_operation(f"{__name__}.missing")
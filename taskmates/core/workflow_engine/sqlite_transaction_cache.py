@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+A TransactionCache in a single SQLite file, and a tool to migrate a DirectoryCache into it.
+
+Usage:
+    python -m taskmates.core.workflow_engine.sqlite_transaction_cache CACHE_DIR [--db PATH] [--include-inputs]
+"""
+import argparse
+import json
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional
+
+import yaml
+
+from taskmates.core.workflow_engine.input_blobs import with_blob_references, resolve_blob_references, \
+    BLOB_THRESHOLD
+from taskmates.core.workflow_engine.transaction_cache import TransactionCache, DirectoryCache, blob_store_of
+
+SQLITE_CACHE_FILENAME = "results.sqlite"
+
+
+class SqliteCache(TransactionCache):
+    """
+    Stores the results as JSON in one table keyed by cache key. Inputs are only stored with `store_inputs`:
+    they are only needed to inspect the cache, and can be much larger than the results. Their large strings
+    are stored once in a blobs table keyed by digest.
+
+    The database is in WAL mode, so other processes can read it while it's being written.
+    """
+
+    def __init__(self, path: Path, store_inputs: bool = False):
+        super().__init__()
+        self.path = Path(path)
+        self.store_inputs = store_inputs
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._connection = sqlite3.connect(str(self.path), isolation_level=None, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+            self._connection.execute("CREATE TABLE IF NOT EXISTS results ("
+                                     "cache_key TEXT PRIMARY KEY, "
+                                     "outcome TEXT NOT NULL, "
+                                     "inputs TEXT, "
+                                     "result TEXT NOT NULL)")
+            self._connection.execute("CREATE TABLE IF NOT EXISTS blobs ("
+                                     "digest TEXT PRIMARY KEY, "
+                                     "content TEXT NOT NULL)")
+
+    def load(self, cache_key: str) -> Optional[Any]:
+        with self._lock:
+            row = self._connection.execute("SELECT result FROM results WHERE cache_key = ?",
+                                           (cache_key,)).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    def set(self, outcome: str, cache_key: str, inputs: Dict[str, Any], result: Any) -> None:
+        self.set_many([(outcome, cache_key, inputs, result)])
+
+    def set_many(self, entries: Iterable[tuple[str, str, Dict[str, Any], Any]]) -> int:
+        """Stores the (outcome, cache key, inputs, result) entries in a single SQLite transaction."""
+        blobs = {}
+        rows = [(cache_key, outcome, self._serialize_inputs(inputs, blobs), json.dumps(result, ensure_ascii=False))
+                for outcome, cache_key, inputs, result in entries
+                if result is not None]
+        with self._lock:
+            self._connection.execute("BEGIN")
+            try:
+                self._connection.executemany("INSERT OR IGNORE INTO blobs (digest, content) VALUES (?, ?)",
+                                             blobs.items())
+                self._connection.executemany("INSERT OR REPLACE INTO results (cache_key, outcome, inputs, result) "
+                                             "VALUES (?, ?, ?, ?)", rows)
+            except BaseException:
+                self._connection.execute("ROLLBACK")
+                raise
+            self._connection.execute("COMMIT")
+        return len(rows)
+
+    def has(self, cache_key: str) -> bool:
+        with self._lock:
+            return self._connection.execute("SELECT 1 FROM results WHERE cache_key = ?",
+                                            (cache_key,)).fetchone() is not None
+
+    def get_inputs(self, cache_key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._connection.execute("SELECT inputs FROM results WHERE cache_key = ?",
+                                           (cache_key,)).fetchone()
+        if row is None or row[0] is None:
+            return None
+        return resolve_blob_references(json.loads(row[0]), self.get_blob)
+
+    def get_blob(self, digest: str) -> str:
+        with self._lock:
+            return self._connection.execute("SELECT content FROM blobs WHERE digest = ?", (digest,)).fetchone()[0]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._connection.execute("DELETE FROM results")
+            self._connection.execute("DELETE FROM blobs")
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+    def __len__(self):
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def _serialize_inputs(self, inputs: Dict[str, Any], blobs: Dict[str, str]) -> Optional[str]:
+        if not self.store_inputs:
+            return None
+        return json.dumps(with_blob_references(inputs, blobs), ensure_ascii=False)
+
+
+def read_directory_cache(cache_dir: Path, include_inputs: bool = False) \
+        -> Iterable[tuple[str, str, Dict[str, Any], Any]]:
+    """Yields the (outcome, cache key, inputs, result) of each result stored in the directory layout."""
+    loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+    blob_store = blob_store_of(cache_dir)
+    for result_path in sorted(cache_dir.rglob("result.yml")):
+        entry_dir = result_path.parent
+        cache_key = entry_dir.relative_to(cache_dir).as_posix()
+
+        operation_path = entry_dir / "operation.yml"
+        if operation_path.exists():
+            outcome = yaml.load(operation_path.read_text(), Loader=loader)['operation']
+        else:
+            outcome = cache_key.rsplit("/", 1)[0]
+
+        inputs = {}
+        inputs_path = entry_dir / "inputs.yml"
+        if include_inputs and inputs_path.exists():
+            inputs = resolve_blob_references(yaml.load(inputs_path.read_text(), Loader=loader), blob_store.get)
+
+        yield outcome, cache_key, inputs, yaml.load(result_path.read_text(), Loader=loader)
+
+
+def migrate_directory_cache(cache_dir: Path, cache: SqliteCache, include_inputs: bool = False,
+                            batch_size: int = 1000) -> int:
+    """
+    Copies the results of a DirectoryCache in `cache_dir` into `cache`, leaving the directories in place.
+    Returns the number of migrated results.
+    """
+    migrated = 0
+    batch = []
+    for entry in read_directory_cache(Path(cache_dir), include_inputs):
+        batch.append(entry)
+        if len(batch) >= batch_size:
+            migrated += cache.set_many(batch)
+            batch = []
+    return migrated + cache.set_many(batch)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Migrate the results of a transaction cache directory into a SQLite cache"
+    )
+    parser.add_argument("cache_dir", help="Cache directory of the transaction manager")
+    parser.add_argument("--db", help=f"SQLite file to migrate to (default: CACHE_DIR/{SQLITE_CACHE_FILENAME})")
+    parser.add_argument("--include-inputs", action="store_true", help="Also store the inputs of each result")
+
+    args = parser.parse_args()
+
+    cache_dir = Path(args.cache_dir)
+    db_path = Path(args.db) if args.db else cache_dir / SQLITE_CACHE_FILENAME
+    cache = SqliteCache(db_path, store_inputs=args.include_inputs)
+    try:
+        migrated = migrate_directory_cache(cache_dir, cache, include_inputs=args.include_inputs)
+    finally:
+        cache.close()
+    print(f"Migrated {migrated} results from {cache_dir} to {db_path}")
+
+
+def test_sqlite_cache(tmp_path):
+    cache = SqliteCache(tmp_path / "results.sqlite")
+    cache.set("op", "op/a", {"x": 1}, {"chunks": ["é", 1, None]})
+
+    assert cache.get("op", "op/a") == {"chunks": ["é", 1, None]}
+    assert cache.get("op", "op/b") is None
+    assert cache.has("op/a") and not cache.has("op/b")
+    assert cache.get_inputs("op/a") is None
+    assert cache.stats() == {"op": {"hits": 1, "misses": 1, "evictions": 0, "coalesced": 0}}
+
+    cache.close()
+    assert SqliteCache(tmp_path / "results.sqlite").get("op", "op/a") == {"chunks": ["é", 1, None]}
+
+
+def test_sqlite_cache_stores_inputs_optionally(tmp_path):
+    cache = SqliteCache(tmp_path / "results.sqlite", store_inputs=True)
+    cache.set("op", "op/a", {"x": 1}, 2)
+    cache.set("op", "op/none", {"x": 2}, None)
+
+    assert cache.get_inputs("op/a") == {"x": 1}
+    assert not cache.has("op/none")
+
+
+def test_sqlite_cache_stores_large_inputs_once(tmp_path):
+    cache = SqliteCache(tmp_path / "results.sqlite", store_inputs=True)
+    transcript = "a long transcript " * BLOB_THRESHOLD
+    cache.set_many([("op", "op/a", {"markdown_chat": transcript}, 1),
+                    ("op", "op/b", {"markdown_chat": transcript, "step": 2}, 2)])
+
+    assert cache.get_inputs("op/b") == {"markdown_chat": transcript, "step": 2}
+    assert cache._connection.execute("SELECT COUNT(*) FROM blobs").fetchone()[0] == 1
+
+
+def test_migrate_directory_cache(tmp_path):
+    directory_cache = DirectoryCache(tmp_path / "cache")
+    directory_cache.set("pkg.select_chunks", "pkg.select_chunks/abc", {"question": "q"}, [{"text": "chunk"}])
+    directory_cache.set("pkg.list_files", "pkg.list_files/def", {"root": "."}, ["a.py", "b.py"])
+    (tmp_path / "cache" / "pkg.list_files" / "queued").mkdir()
+
+    cache = SqliteCache(tmp_path / "results.sqlite", store_inputs=True)
+    assert migrate_directory_cache(tmp_path / "cache", cache, include_inputs=True, batch_size=1) == 2
+
+    assert cache.get("pkg.select_chunks", "pkg.select_chunks/abc") == [{"text": "chunk"}]
+    assert cache.get("pkg.list_files", "pkg.list_files/def") == ["a.py", "b.py"]
+    assert cache.get_inputs("pkg.select_chunks/abc") == {"question": "q"}
+
+
+if __name__ == "__main__":
+    main()
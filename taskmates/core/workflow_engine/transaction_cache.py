@@ -0,0 +1,385 @@
+import copy
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict, defaultdict
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import yaml
+
+from taskmates.core.workflow_engine.input_blobs import BlobStore, with_blob_references, resolve_blob_references, \
+    BLOB_THRESHOLD
+
+
+# "coalesced" counts the executions that awaited an identical transaction in flight instead of running
+CACHE_EVENTS = ("hits", "misses", "evictions", "coalesced")
+
+
+def empty_counters() -> Dict[str, int]:
+    return {event: 0 for event in CACHE_EVENTS}
+
+
+class CacheMetrics:
+    """
+    Hit, miss, eviction and coalescing counters of a cache, per outcome.
+    """
+
+    def __init__(self):
+        self._counters: Dict[str, Dict[str, int]] = defaultdict(empty_counters)
+        self._lock = threading.Lock()
+
+    def record(self, outcome: str, event: str, count: int = 1) -> None:
+        with self._lock:
+            self._counters[outcome][event] += count
+
+    def snapshot(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return {outcome: dict(counters) for outcome, counters in self._counters.items()}
+
+
+class TransactionCache(ABC):
+    """
+    Where a TransactionManager stores the results of its transactions.
+
+    Results are stored by cache key (see generate_cache_key). A result of None means "not cached",
+    so None results are never stored.
+    """
+
+    # Whether results are kept at all, i.e. whether an identical transaction may reuse a result
+    caches_results = True
+
+    def __init__(self):
+        self.metrics = CacheMetrics()
+
+    def get(self, outcome: str, cache_key: str) -> Optional[Any]:
+        result = self.load(cache_key)
+        self.metrics.record(outcome, "hits" if result is not None else "misses")
+        return result
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Returns the hits, misses and evictions of each outcome."""
+        return self.metrics.snapshot()
+
+    @abstractmethod
+    def load(self, cache_key: str) -> Optional[Any]:
+        """Returns the cached result, without recording a hit or a miss."""
+
+    @abstractmethod
+    def set(self, outcome: str, cache_key: str, inputs: Dict[str, Any], result: Any) -> None:
+        pass
+
+    @abstractmethod
+    def has(self, cache_key: str) -> bool:
+        pass
+
+    def clear(self) -> None:
+        pass
+
+
+class NoCache(TransactionCache):
+    """Caches nothing: every transaction is executed."""
+
+    caches_results = False
+
+    def load(self, cache_key: str) -> Optional[Any]:
+        return None
+
+    def set(self, outcome: str, cache_key: str, inputs: Dict[str, Any], result: Any) -> None:
+        pass
+
+    def has(self, cache_key: str) -> bool:
+        return False
+
+
+class MemoryCache(TransactionCache):
+    """
+    A bounded LRU of results. Entries expire `ttl` seconds after they were stored, if a ttl is given.
+
+    Results are deep-copied in and out, so callers can't alter the cached results.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: Optional[float] = None):
+        super().__init__()
+        self.max_entries = max_entries
+        self.ttl = ttl
+        # cache_key -> (outcome, stored_at, result)
+        self._entries: OrderedDict[str, tuple[str, float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def load(self, cache_key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry is None:
+                return None
+            outcome, stored_at, result = entry
+            if self._is_expired(stored_at):
+                del self._entries[cache_key]
+                self.metrics.record(outcome, "evictions")
+                return None
+            self._entries.move_to_end(cache_key)
+        return copy.deepcopy(result)
+
+    def set(self, outcome: str, cache_key: str, inputs: Dict[str, Any], result: Any) -> None:
+        if result is None:
+            return
+        result = copy.deepcopy(result)
+        with self._lock:
+            self._entries[cache_key] = (outcome, time.monotonic(), result)
+            self._entries.move_to_end(cache_key)
+            while len(self._entries) > self.max_entries:
+                _, (evicted_outcome, _, _) = self._entries.popitem(last=False)
+                self.metrics.record(evicted_outcome, "evictions")
+
+    def has(self, cache_key: str) -> bool:
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            return entry is not None and not self._is_expired(entry[1])
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _is_expired(self, stored_at: float) -> bool:
+        return self.ttl is not None and time.monotonic() - stored_at > self.ttl
+
+
+def write_operation_and_inputs(entry_dir: Path, outcome: str, inputs: Dict[str, Any], blob_store: BlobStore) -> None:
+    """
+    Writes the operation.yml and inputs.yml of a cache entry. Large strings of the inputs are stored
+    once in `blob_store` and referenced by digest in inputs.yml.
+    """
+    entry_dir.mkdir(parents=True, exist_ok=True)
+
+    # Store operation info
+    operation_file = entry_dir / "operation.yml"
+    with open(operation_file, 'w') as f:
+        yaml.dump({'operation': outcome}, f, default_flow_style=False)
+
+    # Store inputs
+    blobs = {}
+    referenced_inputs = with_blob_references(inputs, blobs)
+    blob_store.put_all(blobs)
+    inputs_file = entry_dir / "inputs.yml"
+    with open(inputs_file, 'w') as f:
+        yaml.dump(referenced_inputs, f, default_flow_style=False)
+
+
+def read_operation_and_inputs(entry_dir: Path, blob_store: BlobStore) -> tuple[str, Dict[str, Any]]:
+    """Reads back the outcome and inputs written by `write_operation_and_inputs`."""
+    with open(entry_dir / "operation.yml", 'r') as f:
+        outcome = yaml.safe_load(f)['operation']
+    with open(entry_dir / "inputs.yml", 'r') as f:
+        inputs = yaml.safe_load(f) or {}
+    return outcome, resolve_blob_references(inputs, blob_store.get)
+
+
+def blob_store_of(cache_dir: Path) -> BlobStore:
+    return BlobStore(Path(cache_dir) / "blobs")
+
+
+class DirectoryCache(TransactionCache):
+    """
+    Stores each result in {cache_dir}/{cache_key}/result.yml, next to the operation.yml and inputs.yml
+    it was computed from. Large input strings are stored once in {cache_dir}/blobs.
+    """
+
+    def __init__(self, cache_dir: Path):
+        super().__init__()
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.blob_store = blob_store_of(self.cache_dir)
+
+    def result_path(self, cache_key: str) -> Path:
+        return self.cache_dir / cache_key / "result.yml"
+
+    def load(self, cache_key: str) -> Optional[Any]:
+        try:
+            with open(self.result_path(cache_key), 'r') as f:
+                return yaml.safe_load(f)
+        except FileNotFoundError:
+            return None
+
+    def set(self, outcome: str, cache_key: str, inputs: Dict[str, Any], result: Any) -> None:
+        cache_path = self.result_path(cache_key)
+        write_operation_and_inputs(cache_path.parent, outcome, inputs, self.blob_store)
+
+        # Store result. Written aside and renamed, as other processes may be polling for it
+        temporary_path = cache_path.with_name(f"{cache_path.name}.{os.getpid()}.tmp")
+        with open(temporary_path, 'w') as f:
+            yaml.dump(result, f, default_flow_style=False)
+        os.replace(temporary_path, cache_path)
+
+    def has(self, cache_key: str) -> bool:
+        return self.result_path(cache_key).exists()
+
+
+class TieredCache(TransactionCache):
+    """
+    A memory cache in front of a persistent one. Results are written to both, and results read from
+    the persistent cache are kept in memory.
+    """
+
+    def __init__(self, memory: MemoryCache, persistent: TransactionCache):
+        super().__init__()
+        self.memory = memory
+        self.persistent = persistent
+
+    def get(self, outcome: str, cache_key: str) -> Optional[Any]:
+        result = self.memory.load(cache_key)
+        if result is None:
+            result = self.persistent.load(cache_key)
+            if result is not None:
+                self.memory.set(outcome, cache_key, {}, result)
+        self.metrics.record(outcome, "hits" if result is not None else "misses")
+        return result
+
+    def load(self, cache_key: str) -> Optional[Any]:
+        result = self.memory.load(cache_key)
+        return result if result is not None else self.persistent.load(cache_key)
+
+    def set(self, outcome: str, cache_key: str, inputs: Dict[str, Any], result: Any) -> None:
+        self.persistent.set(outcome, cache_key, inputs, result)
+        self.memory.set(outcome, cache_key, inputs, result)
+
+    def has(self, cache_key: str) -> bool:
+        return self.memory.has(cache_key) or self.persistent.has(cache_key)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        stats = self.metrics.snapshot()
+        for outcome, counters in self.memory.stats().items():
+            stats.setdefault(outcome, empty_counters())
+            stats[outcome]["evictions"] += counters["evictions"]
+        return stats
+
+    def clear(self) -> None:
+        self.memory.clear()
+        self.persistent.clear()
+
+
+def memory_cache_from_env() -> MemoryCache:
+    ttl = os.environ.get("TASKMATES_TRANSACTION_CACHE_TTL")
+    return MemoryCache(max_entries=int(os.environ.get("TASKMATES_TRANSACTION_CACHE_MAX_ENTRIES", 1024)),
+                       ttl=float(ttl) if ttl else None)
+
+
+def default_transaction_cache() -> TransactionCache:
+    """
+    The cache of the default TransactionManager, selected with TASKMATES_TRANSACTION_CACHE:
+    - "none" (default): transactions are always executed
+    - "memory": a MemoryCache bounded by TASKMATES_TRANSACTION_CACHE_MAX_ENTRIES and TASKMATES_TRANSACTION_CACHE_TTL
+    - "tiered": that MemoryCache in front of a DirectoryCache in TASKMATES_TRANSACTION_CACHE_DIR
+    - "sqlite": that MemoryCache in front of a SqliteCache in TASKMATES_TRANSACTION_CACHE_DIR
+    """
+    cache_type = os.environ.get("TASKMATES_TRANSACTION_CACHE", "none").lower()
+    if cache_type == "none":
+        return NoCache()
+    if cache_type == "memory":
+        return memory_cache_from_env()
+    if cache_type in ("tiered", "sqlite"):
+        cache_dir = os.environ.get("TASKMATES_TRANSACTION_CACHE_DIR")
+        if not cache_dir:
+            raise ValueError(f"TASKMATES_TRANSACTION_CACHE={cache_type} requires TASKMATES_TRANSACTION_CACHE_DIR")
+        if cache_type == "sqlite":
+            from taskmates.core.workflow_engine.sqlite_transaction_cache import SqliteCache, SQLITE_CACHE_FILENAME
+            return TieredCache(memory_cache_from_env(), SqliteCache(Path(cache_dir) / SQLITE_CACHE_FILENAME))
+        return TieredCache(memory_cache_from_env(), DirectoryCache(Path(cache_dir)))
+    raise ValueError(f"Unknown TASKMATES_TRANSACTION_CACHE: {cache_type!r}. "
+                     f"Expected one of: none, memory, tiered, sqlite")
+
+
+def test_memory_cache_evicts_least_recently_used_first():
+    cache = MemoryCache(max_entries=2)
+    cache.set("op", "op/a", {}, 1)
+    cache.set("op", "op/b", {}, 2)
+    assert cache.get("op", "op/a") == 1
+    cache.set("op", "op/c", {}, 3)
+
+    assert cache.has("op/a")
+    assert not cache.has("op/b")
+    assert cache.has("op/c")
+    assert cache.stats() == {"op": {"hits": 1, "misses": 0, "evictions": 1, "coalesced": 0}}
+
+
+def test_memory_cache_expires_entries(monkeypatch):
+    now = 1000.0
+    monkeypatch.setattr(time, "monotonic", lambda: now)
+    cache = MemoryCache(ttl=10)
+    cache.set("op", "op/a", {}, 1)
+
+    now += 5
+    assert cache.get("op", "op/a") == 1
+
+    now += 10
+    assert not cache.has("op/a")
+    assert cache.get("op", "op/a") is None
+    assert cache.stats() == {"op": {"hits": 1, "misses": 1, "evictions": 1, "coalesced": 0}}
+
+
+def test_memory_cache_copies_results():
+    cache = MemoryCache()
+    result = {"items": [1, 2]}
+    cache.set("op", "op/a", {}, result)
+    result["items"].append(3)
+    cache.get("op", "op/a")["items"].append(4)
+
+    assert cache.get("op", "op/a") == {"items": [1, 2]}
+
+
+def test_directory_cache_layout(tmp_path):
+    cache = DirectoryCache(tmp_path)
+    cache.set("op", "op/abc", {"x": 1}, {"result": 2})
+
+    assert yaml.safe_load((tmp_path / "op/abc/operation.yml").read_text()) == {"operation": "op"}
+    assert yaml.safe_load((tmp_path / "op/abc/inputs.yml").read_text()) == {"x": 1}
+    assert DirectoryCache(tmp_path).get("op", "op/abc") == {"result": 2}
+    assert cache.get("op", "op/missing") is None
+    assert cache.stats() == {"op": {"hits": 0, "misses": 1, "evictions": 0, "coalesced": 0}}
+
+
+def test_directory_cache_stores_large_inputs_once(tmp_path):
+    cache = DirectoryCache(tmp_path)
+    transcript = "a long transcript " * BLOB_THRESHOLD
+    cache.set("op", "op/a", {"markdown_chat": transcript, "step": 1}, 1)
+    cache.set("op", "op/b", {"markdown_chat": transcript, "step": 2}, 2)
+
+    stored_inputs = yaml.safe_load((tmp_path / "op/b/inputs.yml").read_text())
+
+    assert len(list((tmp_path / "blobs").glob("*/*"))) == 1
+    assert len((tmp_path / "op/b/inputs.yml").read_text()) < 200
+    assert resolve_blob_references(stored_inputs, cache.blob_store.get) == {"markdown_chat": transcript, "step": 2}
+
+
+def test_tiered_cache_promotes_persistent_results(tmp_path):
+    DirectoryCache(tmp_path).set("op", "op/a", {"x": 1}, 42)
+    cache = TieredCache(MemoryCache(max_entries=1), DirectoryCache(tmp_path))
+
+    assert cache.get("op", "op/a") == 42
+    assert cache.memory.has("op/a")
+
+    cache.set("op", "op/b", {"x": 2}, 43)
+    assert not cache.memory.has("op/a")
+    assert cache.get("op", "op/a") == 42
+    assert cache.get("op", "op/c") is None
+    assert cache.stats() == {"op": {"hits": 2, "misses": 1, "evictions": 2, "coalesced": 0}}
+
+
+def test_default_transaction_cache(tmp_path, monkeypatch):
+    monkeypatch.delenv("TASKMATES_TRANSACTION_CACHE", raising=False)
+    assert isinstance(default_transaction_cache(), NoCache)
+
+    monkeypatch.setenv("TASKMATES_TRANSACTION_CACHE", "memory")
+    monkeypatch.setenv("TASKMATES_TRANSACTION_CACHE_TTL", "60")
+    cache = default_transaction_cache()
+    assert isinstance(cache, MemoryCache) and cache.ttl == 60
+
+    monkeypatch.setenv("TASKMATES_TRANSACTION_CACHE", "tiered")
+    monkeypatch.setenv("TASKMATES_TRANSACTION_CACHE_DIR", str(tmp_path))
+    assert isinstance(default_transaction_cache().persistent, DirectoryCache)
+
+    monkeypatch.setenv("TASKMATES_TRANSACTION_CACHE", "sqlite")
+    assert type(default_transaction_cache().persistent).__name__ == "SqliteCache"
@@ -0,0 +1,136 @@
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, TextIO
+
+from loguru import logger
+
+MAX_OPEN_LOG_FILES = int(os.environ.get("TASKMATES_TRANSACTION_LOG_MAX_OPEN_FILES", 64))
+
+TRANSACTION_LOG_FORMAT = "{time:YYYY-MM-DD HH:mm:ss} | {level: <8} | {message}"
+
+
+class TransactionLogRouter:
+    """
+    Writes the records bound to a `transaction_id` to the log file of that transaction, through a single
+    loguru sink: each record costs one dict lookup, however many transactions are running.
+
+    Files are opened on their first record and kept open (buffered) until their transaction completes;
+    past `max_open_files` the least recently written one is closed, and reopened in append mode if its
+    transaction logs again. The sink is only installed while transactions are routed.
+    """
+
+    def __init__(self, max_open_files: int = MAX_OPEN_LOG_FILES):
+        self.max_open_files = max_open_files
+        # transaction_id -> [log path, number of executions of the transaction routed]
+        self._routes: Dict[str, List] = {}
+        self._open_files: OrderedDict[str, TextIO] = OrderedDict()
+        self._lock = threading.Lock()
+        self._sink_id: Optional[int] = None
+
+    def route(self, transaction_id: str, log_path: Path) -> None:
+        """Starts writing the records bound to `transaction_id` to `log_path`."""
+        log_path.parent.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            route = self._routes.get(transaction_id)
+            if route is not None:
+                route[1] += 1
+                return
+            self._routes[transaction_id] = [log_path, 1]
+            if self._sink_id is None:
+                self._sink_id = logger.add(self._sink, format=TRANSACTION_LOG_FORMAT, level="DEBUG",
+                                           filter=self._is_routed)
+
+    def complete(self, transaction_id: str) -> None:
+        """Flushes and closes the log file of `transaction_id` once its last execution completes."""
+        sink_id = None
+        with self._lock:
+            route = self._routes.get(transaction_id)
+            if route is None:
+                return
+            route[1] -= 1
+            if route[1] > 0:
+                return
+            del self._routes[transaction_id]
+            log_file = self._open_files.pop(transaction_id, None)
+            if log_file is not None:
+                log_file.close()
+            if not self._routes:
+                sink_id, self._sink_id = self._sink_id, None
+        if sink_id is not None:
+            logger.remove(sink_id)
+
+    def open_files(self) -> int:
+        with self._lock:
+            return len(self._open_files)
+
+    def _is_routed(self, record) -> bool:
+        return record["extra"].get("transaction_id") in self._routes
+
+    def _sink(self, message) -> None:
+        transaction_id = message.record["extra"].get("transaction_id")
+        with self._lock:
+            route = self._routes.get(transaction_id)
+            if route is None:
+                return
+            log_file = self._open_files.get(transaction_id)
+            if log_file is None:
+                log_file = open(route[0], "a", encoding="utf-8")
+                self._open_files[transaction_id] = log_file
+                if len(self._open_files) > self.max_open_files:
+                    _, evicted = self._open_files.popitem(last=False)
+                    evicted.close()
+            else:
+                self._open_files.move_to_end(transaction_id)
+            log_file.write(message)
+
+
+transaction_log_router = TransactionLogRouter()
+
+
+def test_routes_records_by_transaction_id(tmp_path):
+    router = TransactionLogRouter()
+    router.route("op/a", tmp_path / "a" / "logs.txt")
+    router.route("op/b", tmp_path / "b" / "logs.txt")
+
+    logger.bind(transaction_id="op/a").info("to a")
+    logger.bind(transaction_id="op/b").debug("to b")
+    logger.bind(transaction_id="op/c").info("not routed")
+    logger.info("no transaction")
+
+    router.complete("op/a")
+    router.complete("op/b")
+
+    assert (tmp_path / "a" / "logs.txt").read_text().endswith("| INFO     | to a\n")
+    assert (tmp_path / "b" / "logs.txt").read_text().endswith("| DEBUG    | to b\n")
+    assert router._sink_id is None
+
+
+def test_caps_open_files(tmp_path):
+    router = TransactionLogRouter(max_open_files=2)
+    for name in "abc":
+        router.route(name, tmp_path / name / "logs.txt")
+        logger.bind(transaction_id=name).info(f"first {name}")
+
+    assert router.open_files() == 2
+
+    logger.bind(transaction_id="a").info("second a")
+    for name in "abc":
+        router.complete(name)
+
+    assert router.open_files() == 0
+    assert [line.split(" | ")[-1] for line in (tmp_path / "a" / "logs.txt").read_text().splitlines()] == \
+           ["first a", "second a"]
+
+
+def test_keeps_routing_until_the_last_execution_completes(tmp_path):
+    router = TransactionLogRouter()
+    router.route("op/a", tmp_path / "logs.txt")
+    router.route("op/a", tmp_path / "logs.txt")
+
+    router.complete("op/a")
+    logger.bind(transaction_id="op/a").info("still running")
+    router.complete("op/a")
+
+    assert (tmp_path / "logs.txt").read_text().count("still running") == 1
@@ -68,33 +68,52 @@ Each Transaction is identified by a cache key derived from:
 - Operation name (module.function)
 - Operation inputs (JSON-serialized and hashed)
 
+Results are cached by a TransactionCache (see transaction_cache.py): a bounded in-memory LRU,
+the directory layout below, or a memory cache in front of it. While a transaction runs, identical
+transactions (same cache key) await its result instead of running the operation again.
+
 Cached results are stored in: {cache_dir}/{operation_name}/{hash}/result.yml
 Transaction logs are stored in: {cache_dir}/{operation_name}/{hash}/logs.txt
+
+QUEUING
+=======
+
+queue() writes the operation.yml and inputs.yml of an entry without its result. The entries are
+processed by process_queued() in the same process, or by `taskmates worker CACHE_DIR` processes
+that claim them through leases in {cache_dir}/queue_leases.sqlite (see queue_worker.py).
 """
 
 import asyncio
+import copy
 import os
-from contextlib import contextmanager
+import time
+import weakref
+from contextlib import contextmanager, aclosing
 from contextvars import ContextVar
 from pathlib import Path
-from typing import Any, Dict, Optional, Callable, TypeVar
+from typing import Any, AsyncIterator, Dict, Optional, Callable, TypeVar
 
 import pytest
-import yaml
 from blinker import Signal
 from loguru import logger
 from opentelemetry import trace
 from ordered_set import OrderedSet
 from pydantic import Field
-from typeguard import typechecked
 
+from taskmates.core.workflow_engine.adaptive_concurrency import adaptive_concurrency, concurrency_key, jittered
 from taskmates.core.workflow_engine.composite_context_manager import CompositeContextManager
 from taskmates.core.workflow_engine.generate_cache_key import generate_cache_key
 from taskmates.core.workflow_engine.objective import ObjectiveKey, Objective
 from taskmates.core.workflow_engine.run_context import RunContext
+from taskmates.core.workflow_engine.transaction_cache import TransactionCache, DirectoryCache, NoCache, \
+    memory_cache_from_env, default_transaction_cache, write_operation_and_inputs, blob_store_of
+from taskmates.core.workflow_engine.transaction_log_router import transaction_log_router
+from taskmates.core.workflow_engine.transaction_scheduler import TransactionScheduler, DEFAULT_MAX_CONCURRENCY
 from taskmates.core.workflow_engine.transactions.no_op_logger import _noop_logger
 from taskmates.core.workflow_engine.transactions.transaction import Transaction, TRANSACTION
 from taskmates.defaults.settings import Settings
+from taskmates.lib.pydantic_.construct import construct
+from taskmates.lib.typeguard_.typechecked import typechecked
 
 Signal.set_class = OrderedSet
 
@@ -187,23 +206,21 @@ class TransactionalOperation:
 
     async def __call__(self, **kwargs) -> Any:
         transaction_manager = runtime.transaction_manager()
+        parent = runtime.transaction
 
-        if runtime.transaction is not None:
-            context = runtime.transaction.context.copy()
+        if parent is not None:
+            context = parent.context.copy()
         else:
             context = Settings().get()
 
         # Create objective from inputs
-        objective = Objective(
-            key=ObjectiveKey(
-                outcome=self.outcome,
-                inputs=kwargs
-            )
-        )
+        objective = construct(Objective, key=ObjectiveKey.lightweight(outcome=self.outcome, inputs=kwargs))
 
-        # Create executable transaction
-        transaction = ExecutableTransaction(
-            of=runtime.transaction,
+        # Create executable transaction, bound to the parent transaction if one exists. Built on every call:
+        # its fields are only built here and in build_executable_transaction, so they are not validated again
+        transaction = ExecutableTransaction.lightweight(
+            bound=True,
+            of=parent,
             manager=transaction_manager,
             context=context,
             operation=self.operation,
@@ -213,10 +230,6 @@ class TransactionalOperation:
             initial_delay=self.initial_delay
         )
 
-        # Automatically bind to parent transaction if one exists
-        if runtime.transaction is not None:
-            transaction.bind_to_parent(runtime.transaction)
-
         return await transaction()
 
     def __get__(self, instance, owner):
@@ -254,19 +267,40 @@ class TransactionManager:
     - **Cache Key**: Derived from operation name + inputs, identifies cached results
     """
 
-    def __init__(self, cache_dir: Optional[str] = None):
+    def __init__(self,
+                 cache_dir: Optional[str] = None,
+                 cache: Optional[TransactionCache] = None,
+                 max_concurrency: Optional[int] = None,
+                 outcome_limits: Optional[Dict[str, int]] = None):
         """
         Initialize the transaction manager.
 
         Args:
-            cache_dir: Directory for caching results. If None, uses in-memory cache.
+            cache_dir: Directory for caching results and transaction logs.
+            cache: Where results are cached. Defaults to a DirectoryCache in cache_dir if given,
+                   or a bounded in-memory cache otherwise.
+            max_concurrency: Maximum number of operations run at once by map_parallel and process_queued
+                             (default: TASKMATES_MAX_CONCURRENCY, or 8).
+            outcome_limits: Maximum number of operations of an outcome run at once.
         """
         self.cache_dir = Path(cache_dir) if cache_dir else None
         if self.cache_dir:
             self.cache_dir.mkdir(parents=True, exist_ok=True)
 
-        # In-memory cache when cache_dir is None
-        self._memory_cache: Dict[str, Any] = {}
+        if cache is None:
+            cache = DirectoryCache(self.cache_dir) if self.cache_dir else memory_cache_from_env()
+        self.cache = cache
+
+        # cache_key -> result_future of the transaction computing it
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        # cache_key -> number of transactions awaiting the one in flight
+        self._followers: Dict[str, int] = {}
+
+        self.max_concurrency = max_concurrency or DEFAULT_MAX_CONCURRENCY
+        self.outcome_limits = outcome_limits or {}
+        # Futures are bound to their event loop, so each loop has its own scheduler
+        self._schedulers: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, TransactionScheduler] = \
+            weakref.WeakKeyDictionary()
 
     def build_executable_transaction(self,
                                      operation: Callable,
@@ -286,7 +320,8 @@ class TransactionManager:
         else:
             tx_context = Settings().get()
 
-        objective = Objective(
+        objective = construct(
+            Objective,
             key=ObjectiveKey(
                 outcome=outcome,
                 inputs=inputs
@@ -294,7 +329,7 @@ class TransactionManager:
             result_format=result_format or {'format': 'completion', 'interactive': False}
         )
 
-        return ExecutableTransaction(
+        return ExecutableTransaction.lightweight(
             of=of,
             manager=self,
             objective=objective,
@@ -305,12 +340,6 @@ class TransactionManager:
             initial_delay=initial_delay
         )
 
-    def _get_cache_path(self, cache_key: str) -> Optional[Path]:
-        """Get the cache path for a given key."""
-        if not self.cache_dir:
-            return None
-        return self.cache_dir / cache_key / "result.yml"
-
     def _get_log_path(self, cache_key: str) -> Optional[Path]:
         """Get the log path for a given key."""
         if not self.cache_dir:
@@ -318,66 +347,27 @@ class TransactionManager:
         return self.cache_dir / cache_key / "logs.txt"
 
     def get_cached_result(self, outcome: str, inputs: Dict[str, Any]) -> Optional[Any]:
-        cache_key = generate_cache_key(outcome, inputs)
-
-        # Try in-memory cache first
-        if self.cache_dir is None:
-            return None
-            # return self._memory_cache.get(cache_key)
-
-        # Try file-based cache
-        cache_path = self._get_cache_path(cache_key)
-        if cache_path and cache_path.exists():
-            with open(cache_path, 'r') as f:
-                return yaml.safe_load(f)
-
-        return None
+        return self.cache.get(outcome, generate_cache_key(outcome, inputs))
 
     def set_cached_result(self, outcome: str, inputs: Dict[str, Any], result: Any) -> None:
-        cache_key = generate_cache_key(outcome, inputs)
-
-        # Store in memory cache
-        if self.cache_dir is None:
-            # self._memory_cache[cache_key] = result
-            return
-
-        # Store in file-based cache
-        cache_path = self._get_cache_path(cache_key)
-        if cache_path:
-            cache_path.parent.mkdir(parents=True, exist_ok=True)
-
-            # Store operation info
-            operation_file = cache_path.parent / "operation.yml"
-            with open(operation_file, 'w') as f:
-                yaml.dump({'operation': outcome}, f, default_flow_style=False)
-
-            # Store inputs
-            inputs_file = cache_path.parent / "inputs.yml"
-            with open(inputs_file, 'w') as f:
-                yaml.dump(inputs, f, default_flow_style=False)
-
-            # Store result
-            with open(cache_path, 'w') as f:
-                yaml.dump(result, f, default_flow_style=False)
+        self.cache.set(outcome, generate_cache_key(outcome, inputs), inputs, result)
 
     def has_cached_result(self, outcome: str, inputs: Dict[str, Any]) -> bool:
-        cache_key = generate_cache_key(outcome, inputs)
+        return self.cache.has(generate_cache_key(outcome, inputs))
 
-        # Check in-memory cache
-        if self.cache_dir is None:
-            return False
-            # return cache_key in self._memory_cache
-
-        # Check file-based cache
-        result_file = self.cache_dir / cache_key / "result.yml"
-        return result_file.exists()
+    def cache_stats(self) -> Dict[str, Dict[str, int]]:
+        """Returns the cache hits, misses and evictions of each outcome."""
+        return self.cache.stats()
 
     def queue(self, operation: Callable, inputs: Dict[str, Any]) -> Dict[str, Any]:
         """
         Queue an operation for processing by creating cache entry without result.
 
+        Queued operations are processed by process_queued() in this process, or by `taskmates worker`
+        processes sharing cache_dir, which import the operation by its name.
+
         Args:
-            operation: Callable to queue
+            operation: Callable to queue (can be a TransactionalOperation or plain function)
             inputs: Dictionary of input parameters
 
         Returns:
@@ -386,19 +376,12 @@ class TransactionManager:
         if not self.cache_dir:
             raise RuntimeError("Cannot queue operations without cache_dir")
 
-        operation_name = f"{operation.__module__}.{operation.__name__}"
+        if isinstance(operation, TransactionalOperation):
+            operation_name = operation.outcome
+        else:
+            operation_name = f"{operation.__module__}.{operation.__name__}"
         cache_key = generate_cache_key(operation_name, inputs)
-        cache_dir = self.cache_dir / cache_key
-        cache_dir.mkdir(parents=True, exist_ok=True)
-
-        operation_file = cache_dir / "operation.yml"
-        inputs_file = cache_dir / "inputs.yml"
-
-        with open(operation_file, 'w') as f:
-            yaml.dump({'operation': operation_name}, f, default_flow_style=False)
-
-        with open(inputs_file, 'w') as f:
-            yaml.dump(inputs, f, default_flow_style=False)
+        write_operation_and_inputs(self.cache_dir / cache_key, operation_name, inputs, blob_store_of(self.cache_dir))
 
         logger.info(f"Queued operation {operation_name} with cache key {cache_key}")
 
@@ -427,9 +410,8 @@ class TransactionManager:
         cache_dir = self.cache_dir / cache_key
 
         operation_file = cache_dir / "operation.yml"
-        result_file = cache_dir / "result.yml"
 
-        return operation_file.exists() and not result_file.exists()
+        return operation_file.exists() and not self.cache.has(cache_key)
 
     def get_result(self, handle: Dict[str, Any]) -> Any:
         """
@@ -468,52 +450,103 @@ class TransactionManager:
         """
         return [self.get_result(handle) for handle in handles]
 
+    def scheduler(self) -> TransactionScheduler:
+        """Returns the scheduler of the running event loop."""
+        event_loop = asyncio.get_running_loop()
+        scheduler = self._schedulers.get(event_loop)
+        if scheduler is None:
+            scheduler = TransactionScheduler(self.max_concurrency, self.outcome_limits,
+                                             adaptive_limit=adaptive_concurrency.limit)
+            self._schedulers[event_loop] = scheduler
+        return scheduler
+
     async def process_queued(self, handles: list[Dict[str, Any]], max_retries: int = 3,
-                             initial_delay: float = 1.0) -> None:
+                             initial_delay: float = 1.0, max_workers: Optional[int] = None,
+                             priority: int = 0) -> None:
         """
-        Process queued operations sequentially.
+        Process queued operations concurrently, through the scheduler.
 
         Args:
             handles: List of handle dicts returned from queue()
             max_retries: Maximum number of retry attempts per operation
             initial_delay: Initial delay in seconds before first retry
+            max_workers: Maximum number of these operations running at once (default: the scheduler's limits)
+            priority: Scheduling priority, lower runs first
         """
+        jobs = []
         for handle in handles:
-            operation = handle['operation']
-            inputs = handle['inputs']
-
             # Skip if already cached
-            if self.has_cached_result(handle['operation_name'], inputs):
+            if self.has_cached_result(handle['operation_name'], handle['inputs']):
                 logger.info(f"Skipping {handle['operation_name']} [{handle['cache_key']}] - already cached")
                 continue
 
-            # Execute the operation
-            transactional_op = TransactionalOperation(
-                operation=operation,
-                outcome=None,
-                max_retries=max_retries,
-                initial_delay=initial_delay
-            )
-            await transactional_op(**inputs)
+            transactional_op = self._transactional_operation(handle['operation'], max_retries, initial_delay)
+            jobs.append((transactional_op.outcome,
+                         lambda transactional_op=transactional_op, inputs=handle['inputs']: transactional_op(**inputs),
+                         concurrency_key(transactional_op.outcome, handle['inputs'])))
+
+        await self.scheduler().gather(jobs, priority=priority, group=request_group(), max_workers=max_workers)
 
     async def map_parallel(self, operation: Callable, inputs_list: list[Dict[str, Any]],
-                           max_workers: Optional[int] = 1, max_retries: int = 3,
-                           initial_delay: float = 1.0) -> list[Any]:
+                           max_workers: Optional[int] = None, max_retries: int = 3,
+                           initial_delay: float = 1.0, priority: int = 0) -> list[Any]:
         """
-        Execute an operation in parallel over multiple inputs.
+        Execute an operation concurrently over multiple inputs, through the scheduler.
 
-        This is a convenience method that combines queue() + parallel processing + get_results().
+        The scheduler bounds the operations running at once globally and per outcome, shares them fairly
+        between concurrent requests, and lets nested map_parallel calls use the slots of their callers.
 
         Args:
             operation: Callable to execute (can be a TransactionalOperation or plain function)
             inputs_list: List of input dicts, one per operation call
-            max_workers: Maximum number of parallel workers (default: 1)
+            max_workers: Maximum number of these operations running at once (default: the scheduler's limits)
             max_retries: Maximum number of retry attempts per operation
             initial_delay: Initial delay in seconds before first retry
+            priority: Scheduling priority, lower runs first
 
         Returns:
             List of results in the same order as inputs_list
         """
+        transactional_op = self._transactional_operation(operation, max_retries, initial_delay)
+
+        return await self.scheduler().map(
+            outcome=transactional_op.outcome,
+            run=lambda inputs: transactional_op(**inputs),
+            inputs_list=inputs_list,
+            priority=priority,
+            group=request_group(),
+            max_workers=max_workers,
+            limit_key=lambda inputs: concurrency_key(transactional_op.outcome, inputs)
+        )
+
+    async def map_parallel_iter(self, operation: Callable, inputs_list: list[Dict[str, Any]],
+                                max_workers: Optional[int] = None, max_retries: int = 3,
+                                initial_delay: float = 1.0, priority: int = 0,
+                                until: Optional[Callable[[int, Any], bool]] = None) -> AsyncIterator[tuple[int, Any]]:
+        """
+        Like map_parallel, but yields (index, result) as each operation completes.
+
+        Args:
+            until: Predicate on (index, result): once it is true, the remaining operations are cancelled
+                   and the iteration stops, after yielding that result
+
+        The remaining operations are also cancelled when the iteration is closed: iterate within
+        `contextlib.aclosing` to break out of it.
+        """
+        transactional_op = self._transactional_operation(operation, max_retries, initial_delay)
+        scheduler = self.scheduler()
+        jobs = scheduler.jobs(transactional_op.outcome, lambda inputs: transactional_op(**inputs), inputs_list,
+                              limit_key=lambda inputs: concurrency_key(transactional_op.outcome, inputs))
+
+        async with aclosing(scheduler.as_completed(jobs, priority=priority, group=request_group(),
+                                                   max_workers=max_workers)) as completed:
+            async for index, result in completed:
+                yield index, result
+                if until is not None and until(index, result):
+                    return
+
+    @staticmethod
+    def _transactional_operation(operation: Callable, max_retries: int, initial_delay: float) -> TransactionalOperation:
         # Handle TransactionalOperation - extract the underlying operation
         if isinstance(operation, TransactionalOperation):
             actual_operation = operation.operation
@@ -522,64 +555,12 @@ class TransactionManager:
             actual_operation = operation
             outcome = None
 
-        if not self.cache_dir:
-            # Without caching, just execute sequentially
-            results = []
-            transactional_op = TransactionalOperation(
-                operation=actual_operation,
-                outcome=outcome,
-                max_retries=max_retries,
-                initial_delay=initial_delay
-            )
-            for inputs in inputs_list:
-                result = await transactional_op(**inputs)
-                results.append(result)
-            return results
-
-        # Queue all operations and collect handles
-        handles = [self.queue(actual_operation, inputs) for inputs in inputs_list]
-
-        # Filter to only unprocessed operations
-        unprocessed_handles = [
-            handle for handle in handles
-            if not self.has_cached_result(handle['operation_name'], handle['inputs'])
-        ]
-
-        if unprocessed_handles:
-            logger.info(f"Processing {len(unprocessed_handles)} operations in parallel "
-                        f"({len(handles) - len(unprocessed_handles)} already cached)")
-
-            # Process in parallel using asyncio.gather
-            if max_workers is None or max_workers == 1:
-                # Sequential execution
-                for handle in unprocessed_handles:
-                    transactional_op = TransactionalOperation(
-                        operation=handle['operation'],
-                        outcome=None,
-                        max_retries=max_retries,
-                        initial_delay=initial_delay
-                    )
-                    await transactional_op(**handle['inputs'])
-            else:
-                # Parallel execution with semaphore
-                semaphore = asyncio.Semaphore(max_workers)
-
-                async def process_with_semaphore(handle):
-                    async with semaphore:
-                        transactional_op = TransactionalOperation(
-                            operation=handle['operation'],
-                            outcome=None,
-                            max_retries=max_retries,
-                            initial_delay=initial_delay
-                        )
-                        return await transactional_op(**handle['inputs'])
-
-                await asyncio.gather(*[process_with_semaphore(handle) for handle in unprocessed_handles])
-        else:
-            logger.info(f"All {len(handles)} operations already cached")
-
-        # Return results in original order
-        return self.get_results(handles)
+        return TransactionalOperation(
+            operation=actual_operation,
+            outcome=outcome,
+            max_retries=max_retries,
+            initial_delay=initial_delay
+        )
 
     async def execute(
             self,
@@ -591,6 +572,11 @@ class TransactionManager:
         """
         Execute a transaction with caching, retry logic, and isolated logging.
 
+        Failed attempts are retried after an exponential backoff with jitter. Attempts throttled by the
+        provider (429, 503, 529) also lower the adaptive concurrency of their model or outcome, and pause
+        its attempts until the time requested by the Retry-After or rate limit headers (see
+        adaptive_concurrency.py).
+
         Args:
             transaction: Transaction to execute
             operation: The actual operation to execute
@@ -603,30 +589,34 @@ class TransactionManager:
 
         outcome = transaction.objective.key['outcome']
         inputs = transaction.objective.key['inputs']
-
-        # Check cache first
-        cached_result = self.get_cached_result(outcome, inputs)
-        if cached_result is not None:
-            logger.info(f"Cache HIT for {outcome}")
-            return cached_result
+        # Computed once per transaction, and only when results are cached or logged by key: the inputs can be
+        # whole transcripts or code bases, and hashing them costs more than running a small transaction
+        cache_key = None
+        if self.cache.caches_results or self.cache_dir:
+            cache_key = transaction.objective.key.cache_key
+
+            # Check cache first
+            cached_result = self.cache.get(outcome, cache_key)
+            if cached_result is not None:
+                logger.info(f"Cache HIT for {outcome}")
+                return cached_result
+
+            in_flight = self._in_flight.get(cache_key)
+            if in_flight is not None:
+                return await self._await_in_flight(cache_key, in_flight, transaction, operation, max_retries,
+                                                   initial_delay)
+        else:
+            self.cache.metrics.record(outcome, "misses")
 
         logger.info(f"Cache MISS for {outcome} - executing operation")
 
         # Setup transaction-scoped logging
-        cache_key = generate_cache_key(outcome, inputs)
-        log_path = self._get_log_path(cache_key)
+        log_path = self._get_log_path(cache_key) if cache_key else None
 
-        sink_id = None
         transaction_logger = logger
         if log_path:
-            log_path.parent.mkdir(parents=True, exist_ok=True)
             transaction_logger = logger.bind(transaction_id=cache_key)
-            sink_id = transaction_logger.add(
-                str(log_path),
-                format="{time:YYYY-MM-DD HH:mm:ss} | {level: <8} | {message}",
-                filter=lambda record: record["extra"].get("transaction_id") == cache_key,
-                level="DEBUG"
-            )
+            transaction_log_router.route(cache_key, log_path)
 
         # Set logger on transaction
         transaction.logger = transaction_logger
@@ -634,22 +624,34 @@ class TransactionManager:
         # Set as current transaction
         token = runtime.set(transaction)
 
+        # Identical transactions arriving while this one runs await its result instead of running again,
+        # as they would have found it in the cache if they had arrived later
+        is_leader = (self.cache.caches_results
+                     and transaction.result_future.get_loop() is asyncio.get_running_loop())
+        if is_leader:
+            self._in_flight[cache_key] = transaction.result_future
+
         try:
             async with transaction.async_transaction_context():
                 last_exception = None
                 delay = initial_delay
+                limit_key = concurrency_key(outcome, inputs)
+                started_at = time.monotonic()
 
                 for attempt in range(max_retries):
                     try:
-                        # Handle workflow instance if present
-                        if hasattr(transaction, 'workflow_instance') and transaction.workflow_instance is not None:
-                            result = await operation(transaction.workflow_instance, **inputs)
-                        else:
-                            result = await operation(**inputs)
+                        async with adaptive_concurrency.attempt(limit_key) as started_at:
+                            # Handle workflow instance if present
+                            if hasattr(transaction, 'workflow_instance') and transaction.workflow_instance is not None:
+                                result = await operation(transaction.workflow_instance, **inputs)
+                            else:
+                                result = await operation(**inputs)
+                        adaptive_concurrency.on_success(limit_key)
 
                         # Cache the result
-                        self.set_cached_result(outcome, inputs, result)
-                        logger.info(f"Cached result for {outcome}")
+                        if cache_key:
+                            self.cache.set(outcome, cache_key, inputs, result)
+                            logger.info(f"Cached result for {outcome}")
 
                         # Set transaction result
                         if transaction.result_future.done():
@@ -657,18 +659,23 @@ class TransactionManager:
                                 f"Transaction result_future already set for {outcome}. "
                                 "This indicates the operation set its own result, which should not happen."
                             )
-                        transaction.result_future.set_result(result)
+                        # The coalesced transactions get their own copies, like cache hits, taken before the
+                        # caller of this one can alter the result
+                        transaction.result_future.set_result(
+                            copy.deepcopy(result) if self._followers.get(cache_key) else result)
 
                         return result
 
                     except Exception as e:
                         last_exception = e
+                        delay = max(delay, adaptive_concurrency.on_error(limit_key, started_at, e) or 0)
                         if attempt < max_retries - 1:
+                            retry_delay = jittered(delay)
                             logger.warning(
                                 f"Attempt {attempt + 1}/{max_retries} failed for {outcome}: {e}. "
-                                f"Retrying in {delay:.1f}s..."
+                                f"Retrying in {retry_delay:.1f}s..."
                             )
-                            await asyncio.sleep(delay)
+                            await asyncio.sleep(retry_delay)
                             delay *= 2  # Exponential backoff
                         else:
                             logger.error(f"All {max_retries} attempts failed for {outcome}: {e}")
@@ -680,6 +687,8 @@ class TransactionManager:
                         "This indicates the operation set its own result/exception, which should not happen."
                     )
                 transaction.result_future.set_exception(last_exception)
+                # Raised below: don't log it again when the future is collected without being awaited
+                transaction.result_future.exception()
                 # If we get here, all retries failed
                 raise last_exception
 
@@ -687,8 +696,48 @@ class TransactionManager:
             # Mark transaction as completed
             transaction.completed = True
             runtime.reset(token)
-            if sink_id is not None:
-                logger.remove(sink_id)
+            if log_path:
+                transaction_log_router.complete(cache_key)
+            if is_leader:
+                del self._in_flight[cache_key]
+                # Cancelled (or failed outside of the operation): the coalesced transactions run it themselves
+                if not transaction.result_future.done():
+                    transaction.result_future.cancel()
+
+    async def _await_in_flight(self,
+                               cache_key: str,
+                               in_flight: asyncio.Future,
+                               transaction: Transaction,
+                               operation: Callable,
+                               max_retries: int,
+                               initial_delay: float) -> Any:
+        """Returns the result of the identical transaction in flight, or raises its exception."""
+        outcome = transaction.objective.key['outcome']
+        self.cache.metrics.record(outcome, "coalesced")
+        logger.info(f"Coalescing {outcome} with the identical transaction in flight")
+
+        self._followers[cache_key] = self._followers.get(cache_key, 0) + 1
+        try:
+            # Shielded: cancelling this transaction must not cancel the one in flight
+            return copy.deepcopy(await asyncio.shield(in_flight))
+        except asyncio.CancelledError:
+            if not in_flight.cancelled() or asyncio.current_task().cancelling():
+                raise
+        finally:
+            self._followers[cache_key] -= 1
+            if not self._followers[cache_key]:
+                del self._followers[cache_key]
+
+        logger.info(f"The transaction in flight for {outcome} was cancelled - executing operation")
+        return await self.execute(transaction, operation, max_retries, initial_delay)
+
+
+def request_group() -> Optional[str]:
+    """The request of the current transaction, whose operations share the scheduler fairly with other requests."""
+    transaction = TRANSACTION.get()
+    if transaction is None:
+        return None
+    return transaction.context.get("runner_environment", {}).get("request_id")
 
 
 class Runtime:
@@ -721,16 +770,17 @@ class Runtime:
 
     def map_parallel(self, operation: Callable, inputs_list: list[Dict[str, Any]],
                      max_workers: Optional[int] = None, max_retries: int = 3,
-                     initial_delay: float = 1.0) -> list[Any]:
+                     initial_delay: float = 1.0, priority: int = 0) -> list[Any]:
         """
         Execute an operation in parallel over multiple inputs within the current transaction.
 
         Args:
             operation: Callable to execute
             inputs_list: List of input dicts, one per operation call
-            max_workers: Maximum number of parallel workers
+            max_workers: Maximum number of these operations running at once
             max_retries: Maximum number of retry attempts per operation
             initial_delay: Initial delay in seconds before first retry
+            priority: Scheduling priority, lower runs first
 
         Returns:
             List of results in the same order as inputs_list
@@ -742,7 +792,25 @@ class Runtime:
         if ctx is None:
             raise RuntimeError("map_parallel() called outside of transaction context")
 
-        return ctx.manager.map_parallel(operation, inputs_list, max_workers, max_retries, initial_delay)
+        return ctx.manager.map_parallel(operation, inputs_list, max_workers, max_retries, initial_delay, priority)
+
+    def map_parallel_iter(self, operation: Callable, inputs_list: list[Dict[str, Any]],
+                          max_workers: Optional[int] = None, max_retries: int = 3,
+                          initial_delay: float = 1.0, priority: int = 0,
+                          until: Optional[Callable[[int, Any], bool]] = None) -> AsyncIterator[tuple[int, Any]]:
+        """
+        Execute an operation in parallel over multiple inputs within the current transaction, yielding
+        (index, result) as each operation completes. See TransactionManager.map_parallel_iter.
+
+        Raises:
+            RuntimeError: If called outside of a transaction context
+        """
+        ctx = TRANSACTION.get()
+        if ctx is None:
+            raise RuntimeError("map_parallel_iter() called outside of transaction context")
+
+        return ctx.manager.map_parallel_iter(operation, inputs_list, max_workers, max_retries, initial_delay,
+                                             priority, until)
 
     def transaction_manager(self) -> TransactionManager:
         """
@@ -788,15 +856,16 @@ def get_default_transaction_manager() -> TransactionManager:
     """
     Get or create the global default transaction manager.
 
-    The default manager uses in-memory caching (cache_dir=None).
-    For persistent caching, create a custom TransactionManager with a cache_dir.
+    The default manager runs operations such as completions, which stream their output and read files that
+    aren't part of their inputs, so it caches nothing unless TASKMATES_TRANSACTION_CACHE says otherwise
+    (see default_transaction_cache). For persistent caching, create a custom TransactionManager with a cache_dir.
 
     Returns:
         The global default TransactionManager instance
     """
     global _default_manager
     if _default_manager is None:
-        _default_manager = TransactionManager(cache_dir=None)
+        _default_manager = TransactionManager(cache=default_transaction_cache())
     return _default_manager
 
 
@@ -1244,6 +1313,43 @@ async def test_child_transaction_context_binding():
     assert len(child_signals_sent) == 1  # Child should receive parent's signal
 
 
+async def test_child_transaction_relays_signal_groups_once_created(test_context):
+    parent = Transaction(objective=Objective(key=ObjectiveKey(outcome="parent")), context=test_context)
+    child = parent.create_child_transaction(outcome="child")
+    received = []
+
+    async def on_stdout(sender, **kwargs):
+        received.append(sender)
+
+    parent.consumes["execution_environment"].stdout.connect(on_stdout)
+
+    async with child.async_transaction_context():
+        await child.consumes["execution_environment"].stdout.send_async("output")
+
+    # Only the groups that were used were created
+    assert list(child.emits) == [] and list(child.consumes) == ["execution_environment"]
+    assert list(parent.emits) == [] and list(parent.consumes) == ["execution_environment"]
+    assert received == ["output"]
+    # The relay is disconnected with the context
+    assert not child.consumes["execution_environment"].stdout.receivers
+
+
+async def test_lightweight_executable_transaction(test_context):
+    async def operation(value: int) -> int:
+        return value * 2
+
+    manager = TransactionManager(cache=NoCache())
+    objective = construct(Objective, key=ObjectiveKey(outcome="double", inputs={"value": 2}))
+    transaction = ExecutableTransaction.lightweight(manager=manager, operation=operation, objective=objective,
+                                                    context=test_context, max_retries=1, initial_delay=1.0)
+
+    assert transaction.of is None and transaction.workflow_instance is None
+    assert not transaction.completed and not transaction.result_future.done()
+    assert objective.result_format == {'format': 'completion', 'interactive': False}
+    assert await transaction() == 4
+    assert transaction.result_future.result() == 4
+
+
 def test_transaction_unified_state_management():
     """Test that transaction state can be set independently of completion status"""
     # Create a transaction
@@ -1417,37 +1523,307 @@ async def test_outcome_derivation():
     assert outcome == "CustomOutcome.v2"
     print(f"✓ Custom outcome: {outcome}")
 
-# TODO
-# async def test_in_memory_caching():
-#     """Test that in-memory caching works correctly."""
-#     from taskmates.core.workflow_engine.transactions.transactional import transactional
-#
-#     # Create a manager with in-memory cache
-#     manager = TransactionManager(cache_dir=None)
-#
-#     call_count = 0
-#
-#     @transactional
-#     async def counting_operation(value: int) -> int:
-#         nonlocal call_count
-#         call_count += 1
-#         return value * 2
-#
-#     # First call should execute
-#     with runtime.transaction_manager_context(manager):
-#         result1 = await counting_operation(value=5)
-#         assert result1 == 10
-#         assert call_count == 1
-#
-#         # Second call with same inputs should use cache
-#         result2 = await counting_operation(value=5)
-#         assert result2 == 10
-#         assert call_count == 1  # Should not increment
-#
-#         # Call with different inputs should execute
-#         result3 = await counting_operation(value=7)
-#         assert result3 == 14
-#         assert call_count == 2
+async def test_in_memory_caching():
+    """Test that in-memory caching works correctly."""
+    from taskmates.core.workflow_engine.transactions.transactional import transactional
+
+    # Create a manager with in-memory cache
+    manager = TransactionManager(cache_dir=None)
+
+    call_count = 0
+
+    @transactional
+    async def counting_operation(value: int) -> int:
+        nonlocal call_count
+        call_count += 1
+        return value * 2
+
+    # First call should execute
+    with runtime.transaction_manager_context(manager):
+        result1 = await counting_operation(value=5)
+        assert result1 == 10
+        assert call_count == 1
+
+        # Second call with same inputs should use cache
+        result2 = await counting_operation(value=5)
+        assert result2 == 10
+        assert call_count == 1  # Should not increment
+
+        # Call with different inputs should execute
+        result3 = await counting_operation(value=7)
+        assert result3 == 14
+        assert call_count == 2
+
+
+async def test_cache_stats_per_outcome():
+    """Test that cache hits, misses and evictions are reported per outcome."""
+    from taskmates.core.workflow_engine.transaction_cache import MemoryCache
+    from taskmates.core.workflow_engine.transactions.transactional import transactional
+
+    manager = TransactionManager(cache=MemoryCache(max_entries=1))
+
+    @transactional(outcome="double")
+    async def double(value: int) -> int:
+        return value * 2
+
+    with runtime.transaction_manager_context(manager):
+        await double(value=1)
+        await double(value=1)
+        await double(value=2)
+
+    assert manager.cache_stats() == {"double": {"hits": 1, "misses": 2, "evictions": 1, "coalesced": 0}}
+
+
+async def test_identical_transactions_in_flight_are_coalesced():
+    """Test that concurrent identical transactions run the operation once."""
+    from taskmates.core.workflow_engine.transactions.transactional import transactional
+
+    manager = TransactionManager()
+    release = asyncio.Event()
+    call_count = 0
+
+    @transactional(outcome="slow_double")
+    async def slow_double(value: int) -> int:
+        nonlocal call_count
+        call_count += 1
+        await release.wait()
+        return value * 2
+
+    with runtime.transaction_manager_context(manager):
+        tasks = [asyncio.create_task(slow_double(value=1)) for _ in range(3)]
+        other = asyncio.create_task(slow_double(value=2))
+        await asyncio.sleep(0)
+        release.set()
+        results = await asyncio.gather(*tasks, other)
+
+    assert results == [2, 2, 2, 4]
+    assert call_count == 2
+    assert manager.cache_stats()["slow_double"]["coalesced"] == 2
+    assert manager._in_flight == {}
+
+
+async def test_coalesced_transactions_get_their_own_copy_of_the_result():
+    """Test that altering the result of a coalesced transaction doesn't alter the others'."""
+    from taskmates.core.workflow_engine.transactions.transactional import transactional
+
+    manager = TransactionManager()
+    release = asyncio.Event()
+
+    @transactional(outcome="slow_items")
+    async def slow_items(value: int) -> dict:
+        await release.wait()
+        return {"items": [value]}
+
+    async def append_to(task: asyncio.Task, item: int) -> dict:
+        result = await task
+        result["items"].append(item)
+        return result
+
+    with runtime.transaction_manager_context(manager):
+        tasks = [asyncio.create_task(append_to(asyncio.create_task(slow_items(value=1)), item))
+                 for item in range(3)]
+        await asyncio.sleep(0)
+        release.set()
+        results = await asyncio.gather(*tasks)
+
+    assert results == [{"items": [1, 0]}, {"items": [1, 1]}, {"items": [1, 2]}]
+    assert manager.cache_stats()["slow_items"]["coalesced"] == 2
+    assert manager._followers == {}
+
+
+async def test_coalesced_transactions_share_failures():
+    """Test that the exception of the transaction in flight is raised by the coalesced ones."""
+    from taskmates.core.workflow_engine.transactions.transactional import transactional
+
+    manager = TransactionManager()
+    call_count = 0
+
+    @transactional
+    async def failing(value: int) -> int:
+        nonlocal call_count
+        call_count += 1
+        await asyncio.sleep(0.01)
+        raise ValueError(f"failed {value}")
+
+    with runtime.transaction_manager_context(manager):
+        results = await asyncio.gather(failing(value=1), failing(value=1), return_exceptions=True)
+
+    assert [str(result) for result in results] == ["failed 1", "failed 1"]
+    assert call_count == 1
+
+
+async def test_coalesced_transactions_survive_cancellations():
+    """Test that cancelling either side of a coalesced transaction doesn't cancel the other one."""
+    from taskmates.core.workflow_engine.transactions.transactional import transactional
+
+    manager = TransactionManager()
+    call_count = 0
+
+    @transactional
+    async def slow_double(value: int) -> int:
+        nonlocal call_count
+        call_count += 1
+        await asyncio.sleep(0.05)
+        return value * 2
+
+    with runtime.transaction_manager_context(manager):
+        # The transaction in flight is cancelled: the coalesced one runs the operation
+        leader = asyncio.create_task(slow_double(value=1))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(slow_double(value=1))
+        await asyncio.sleep(0)
+        leader.cancel()
+        assert await follower == 2
+        assert leader.cancelled()
+        assert call_count == 2
+
+        # A coalesced transaction is cancelled: the one in flight completes
+        leader = asyncio.create_task(slow_double(value=3))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(slow_double(value=3))
+        await asyncio.sleep(0)
+        follower.cancel()
+        assert await leader == 6
+        assert follower.cancelled()
+        assert call_count == 3
+
+
+async def test_map_parallel_runs_concurrently_without_cache_dir():
+    """Test that map_parallel runs operations concurrently, within the manager's limits."""
+    manager = TransactionManager(cache=NoCache(), max_concurrency=3)
+    running = 0
+    max_running = 0
+
+    async def slow_double(value: int) -> int:
+        nonlocal running, max_running
+        running += 1
+        max_running = max(max_running, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        return value * 2
+
+    with runtime.transaction_manager_context(manager):
+        results = await manager.map_parallel(slow_double, [{"value": i} for i in range(10)])
+
+    assert results == [i * 2 for i in range(10)]
+    assert max_running == 3
+
+
+async def test_map_parallel_adapts_concurrency_to_rate_limits():
+    """Test that rate limited operations retry after the requested delay, with fewer of them at once."""
+    from taskmates.core.workflow_engine.adaptive_concurrency import rate_limit_error
+
+    manager = TransactionManager(cache=NoCache(), max_concurrency=4)
+    model_name = "rate-limited-model"
+    attempts = 0
+    running = 0
+    max_running_after_throttling = 0
+    throttled_at = None
+
+    async def call_model(model_name: str, value: int) -> int:
+        nonlocal attempts, running, max_running_after_throttling, throttled_at
+        attempts += 1
+        running += 1
+        if throttled_at is not None:
+            max_running_after_throttling = max(max_running_after_throttling, running)
+        try:
+            await asyncio.sleep(0.01)
+            if attempts <= 4:
+                throttled_at = throttled_at or time.monotonic()
+                raise rate_limit_error(headers={"retry-after-ms": "100"})
+            return value * 2
+        finally:
+            running -= 1
+
+    try:
+        with runtime.transaction_manager_context(manager):
+            results = await manager.map_parallel(call_model, [{"model_name": model_name, "value": i}
+                                                              for i in range(8)], initial_delay=0.01)
+        stats = adaptive_concurrency.stats()[model_name]
+    finally:
+        adaptive_concurrency.reset()
+
+    assert results == [i * 2 for i in range(8)]
+    assert stats["throttled"] == 4
+    assert max_running_after_throttling < 4
+    assert time.monotonic() - throttled_at >= 0.1
+
+
+async def test_nested_map_parallel_does_not_deadlock():
+    """Test that operations waiting for a nested map_parallel lend their slot to it."""
+    from taskmates.core.workflow_engine.transactions.transactional import transactional
+
+    manager = TransactionManager(cache=NoCache(), max_concurrency=1)
+
+    @transactional
+    async def leaf(value: int) -> int:
+        await asyncio.sleep(0)
+        return value
+
+    @transactional
+    async def fan_out(value: int) -> int:
+        results = await runtime.map_parallel(leaf, [{"value": value * 10 + i} for i in range(3)])
+        return sum(results)
+
+    with runtime.transaction_manager_context(manager):
+        results = await asyncio.wait_for(manager.map_parallel(fan_out, [{"value": i} for i in range(3)]), timeout=5)
+
+    assert results == [3, 33, 63]
+    assert manager.scheduler().running == 0
+
+
+async def test_map_parallel_iter_yields_results_as_they_complete():
+    """Test that map_parallel_iter yields results in completion order and stops once `until` is satisfied."""
+    from taskmates.core.workflow_engine.transactions.transactional import transactional
+
+    manager = TransactionManager(cache=NoCache())
+    started = []
+
+    @transactional
+    async def wait_for(delay: float) -> float:
+        started.append(delay)
+        await asyncio.sleep(delay)
+        return delay
+
+    @transactional
+    async def first_two_results(delays: list) -> list:
+        return [result async for _, result in runtime.map_parallel_iter(wait_for, [{"delay": d} for d in delays])]
+
+    @transactional
+    async def first_result_below(delays: list, threshold: float) -> list:
+        return [(index, result) async for index, result in
+                runtime.map_parallel_iter(wait_for, [{"delay": d} for d in delays], max_workers=2,
+                                          until=lambda index, result: result < threshold)]
+
+    with runtime.transaction_manager_context(manager):
+        assert await first_two_results(delays=[0.03, 0.01]) == [0.01, 0.03]
+
+        started.clear()
+        assert await first_result_below(delays=[0.05, 0.01, 0.2, 0.3], threshold=0.02) == [(1, 0.01)]
+        assert started[:2] == [0.05, 0.01] and 0.3 not in started
+
+
+async def test_default_manager_caches_nothing_by_default(monkeypatch):
+    """Test that the default manager executes every transaction unless configured otherwise."""
+    from taskmates.core.workflow_engine.transactions.transactional import transactional
+
+    monkeypatch.delenv("TASKMATES_TRANSACTION_CACHE", raising=False)
+    monkeypatch.setattr(f"{__name__}._default_manager", None)
+
+    call_count = 0
+
+    @transactional
+    async def test_op(x: int) -> int:
+        nonlocal call_count
+        call_count += 1
+        return x + 1
+
+    await test_op(x=1)
+    await test_op(x=1)
+    assert call_count == 2
+
+    await asyncio.gather(test_op(x=1), test_op(x=1))
+    assert call_count == 4
 
 
 async def test_file_based_caching(tmp_path):
@@ -1483,36 +1859,6 @@ async def test_file_based_caching(tmp_path):
         assert call_count == 1
 
 
-# async def test_default_manager_uses_memory_cache():
-#     """Test that the default manager uses in-memory caching."""
-#     from taskmates.core.workflow_engine.transactions.transactional import transactional
-#
-#     # Reset default manager
-#     global _default_manager
-#     _default_manager = None
-#
-#     manager = get_default_transaction_manager()
-#     assert manager.cache_dir is None
-#     assert isinstance(manager._memory_cache, dict)
-#
-#     call_count = 0
-#
-#     @transactional
-#     async def test_op(x: int) -> int:
-#         nonlocal call_count
-#         call_count += 1
-#         return x + 1
-#
-#     # Should use default manager with memory cache
-#     result1 = await test_op(x=1)
-#     assert result1 == 2
-#     assert call_count == 1
-#
-#     result2 = await test_op(x=1)
-#     assert result2 == 2
-#     assert call_count == 1  # Cached
-
-
 async def test_memory_cache_isolation():
     """Test that different managers have isolated memory caches."""
     from taskmates.core.workflow_engine.transactions.transactional import transactional
@@ -1541,39 +1887,39 @@ async def test_memory_cache_isolation():
         assert call_count == 2  # Should execute again
 
 
-# async def test_has_cached_result_memory():
-#     """Test has_cached_result with in-memory cache."""
-#     manager = TransactionManager(cache_dir=None)
-#
-#     # Initially no cache
-#     assert not manager.has_cached_result("test_op", {"x": 1})
-#
-#     # Set a result
-#     manager.set_cached_result("test_op", {"x": 1}, 42)
-#
-#     # Now should have cache
-#     assert manager.has_cached_result("test_op", {"x": 1})
-#
-#     # Different inputs should not have cache
-#     assert not manager.has_cached_result("test_op", {"x": 2})
+async def test_has_cached_result_memory():
+    """Test has_cached_result with in-memory cache."""
+    manager = TransactionManager(cache_dir=None)
 
+    # Initially no cache
+    assert not manager.has_cached_result("test_op", {"x": 1})
 
-# async def test_get_cached_result_memory():
-#     """Test get_cached_result with in-memory cache."""
-#     manager = TransactionManager(cache_dir=None)
-#
-#     # Initially returns None
-#     assert manager.get_cached_result("test_op", {"x": 1}) is None
-#
-#     # Set a result
-#     manager.set_cached_result("test_op", {"x": 1}, {"result": 42})
-#
-#     # Should retrieve the result
-#     result = manager.get_cached_result("test_op", {"x": 1})
-#     assert result == {"result": 42}
-#
-#     # Different inputs should return None
-#     assert manager.get_cached_result("test_op", {"x": 2}) is None
+    # Set a result
+    manager.set_cached_result("test_op", {"x": 1}, 42)
+
+    # Now should have cache
+    assert manager.has_cached_result("test_op", {"x": 1})
+
+    # Different inputs should not have cache
+    assert not manager.has_cached_result("test_op", {"x": 2})
+
+
+async def test_get_cached_result_memory():
+    """Test get_cached_result with in-memory cache."""
+    manager = TransactionManager(cache_dir=None)
+
+    # Initially returns None
+    assert manager.get_cached_result("test_op", {"x": 1}) is None
+
+    # Set a result
+    manager.set_cached_result("test_op", {"x": 1}, {"result": 42})
+
+    # Should retrieve the result
+    result = manager.get_cached_result("test_op", {"x": 1})
+    assert result == {"result": 42}
+
+    # Different inputs should return None
+    assert manager.get_cached_result("test_op", {"x": 2}) is None
 
 
 async def test_transaction_completed_flag_lifecycle():
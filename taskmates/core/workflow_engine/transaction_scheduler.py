@@ -0,0 +1,444 @@
+import asyncio
+import contextvars
+import heapq
+import itertools
+import os
+from collections import Counter, OrderedDict, deque
+from contextlib import asynccontextmanager, aclosing
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+
+import pytest
+
+DEFAULT_MAX_CONCURRENCY = int(os.environ.get("TASKMATES_MAX_CONCURRENCY", 8))
+
+
+@dataclass(order=True)
+class ScheduledJob:
+    # Within a group, nested jobs run before the jobs of their parents' level, then in submission order
+    sort_key: tuple
+    outcome: str = field(compare=False)
+    run: Callable[[], Awaitable[Any]] = field(compare=False)
+    future: asyncio.Future = field(compare=False)
+    group: Hashable = field(compare=False)
+    depth: int = field(compare=False)
+    context: contextvars.Context = field(compare=False)
+    scheduler: "TransactionScheduler" = field(compare=False)
+    holds_slot: bool = field(default=False, compare=False)
+    task: Optional[asyncio.Task] = field(default=None, compare=False)
+    # What the adaptive limits apply to, e.g. the model the job calls
+    limit_key: Hashable = field(default=None, compare=False)
+
+
+# (outcome, run) or (outcome, run, limit key)
+Job = Tuple[Any, ...]
+
+current_job: contextvars.ContextVar[Optional[ScheduledJob]] = contextvars.ContextVar("current_job", default=None)
+
+
+class TransactionScheduler:
+    """
+    Runs jobs of an event loop concurrently, within limits:
+    - at most `max_concurrency` jobs run at once, and at most `outcome_limits[outcome]` jobs of an outcome
+    - at most `adaptive_limit(limit_key)` jobs of a limit key, a limit that changes as the jobs run (see
+      adaptive_concurrency.py)
+    - jobs of a lower `priority` lane run first
+    - within a lane, groups (the top-level requests) take turns, so a large fan-out can't starve the others
+    - a job waiting for the jobs it submitted lends them its slot: nested fan-outs neither deadlock nor
+      run more jobs than the limits
+    """
+
+    def __init__(self, max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+                 outcome_limits: Optional[Dict[str, int]] = None,
+                 adaptive_limit: Optional[Callable[[Hashable], Optional[int]]] = None):
+        self.max_concurrency = max_concurrency
+        self.outcome_limits = dict(outcome_limits or {})
+        self.adaptive_limit = adaptive_limit
+        # priority -> group -> heap of jobs, groups in round-robin order
+        self._lanes: Dict[int, OrderedDict[Hashable, List[ScheduledJob]]] = {}
+        self._running = 0
+        self._running_by_outcome: Counter = Counter()
+        self._running_by_limit_key: Counter = Counter()
+        # Jobs taking their slot back after lending it, served before any new job
+        self._resuming: deque[asyncio.Future] = deque()
+        self._sequence = itertools.count()
+
+    @property
+    def running(self) -> int:
+        return self._running
+
+    def submit(self,
+               outcome: str,
+               run: Callable[[], Awaitable[Any]],
+               priority: int = 0,
+               group: Optional[Hashable] = None,
+               limit_key: Optional[Hashable] = None) -> asyncio.Future:
+        """
+        Schedules `run()` and returns the future of its result. It runs in a copy of the current context.
+        Jobs submitted from a job belong to its group unless `group` is given; top-level jobs without a
+        group are alone in theirs. The adaptive limit of `limit_key` (default: the outcome) applies to the job.
+        """
+        parent = current_job.get()
+        depth = parent.depth + 1 if parent is not None else 0
+        if group is None:
+            group = parent.group if parent is not None else object()
+
+        job = ScheduledJob(sort_key=(-depth, next(self._sequence)),
+                           outcome=outcome,
+                           run=run,
+                           future=asyncio.get_running_loop().create_future(),
+                           group=group,
+                           depth=depth,
+                           context=contextvars.copy_context(),
+                           scheduler=self,
+                           limit_key=limit_key if limit_key is not None else outcome)
+        job.future.add_done_callback(lambda future: self._on_job_done(job))
+        heapq.heappush(self._lanes.setdefault(priority, OrderedDict()).setdefault(group, []), job)
+        self._dispatch()
+        return job.future
+
+    async def map(self,
+                  outcome: str,
+                  run: Callable[[Dict[str, Any]], Awaitable[Any]],
+                  inputs_list: List[Dict[str, Any]],
+                  priority: int = 0,
+                  group: Optional[Hashable] = None,
+                  max_workers: Optional[int] = None,
+                  limit_key: Optional[Callable[[Dict[str, Any]], Hashable]] = None) -> List[Any]:
+        """Returns `run(inputs)` for each of `inputs_list`, in order. See `as_completed`."""
+        return await self.gather(self.jobs(outcome, run, inputs_list, limit_key), priority, group, max_workers)
+
+    @staticmethod
+    def jobs(outcome: str,
+             run: Callable[[Dict[str, Any]], Awaitable[Any]],
+             inputs_list: List[Dict[str, Any]],
+             limit_key: Optional[Callable[[Dict[str, Any]], Hashable]] = None) -> List[Job]:
+        """The (outcome, run, limit key) of each of `inputs_list`. The limit key is computed from the inputs."""
+        return [(outcome, lambda inputs=inputs: run(inputs), limit_key(inputs) if limit_key else None)
+                for inputs in inputs_list]
+
+    async def gather(self,
+                     jobs: List[Job],
+                     priority: int = 0,
+                     group: Optional[Hashable] = None,
+                     max_workers: Optional[int] = None) -> List[Any]:
+        """Returns `run()` for each (outcome, run[, limit key]) of `jobs`, in order. See `as_completed`."""
+        results: List[Any] = [None] * len(jobs)
+        async with aclosing(self.as_completed(jobs, priority, group, max_workers)) as completed:
+            async for index, result in completed:
+                results[index] = result
+        return results
+
+    async def as_completed(self,
+                           jobs: List[Job],
+                           priority: int = 0,
+                           group: Optional[Hashable] = None,
+                           max_workers: Optional[int] = None) -> AsyncIterator[Tuple[int, Any]]:
+        """
+        Yields (index, result) of each (outcome, run[, limit key]) of `jobs` as they complete, running at most `max_workers`
+        of them at once. The jobs of a top-level call share a group. Raises the first exception.
+
+        The remaining jobs are cancelled when the generator is closed or raises: iterate it within
+        `contextlib.aclosing` to stop early.
+        """
+        if group is None and current_job.get() is None:
+            group = object()
+
+        limit = max_workers or len(jobs)
+        pending: Dict[asyncio.Future, int] = {}
+        next_index = 0
+
+        def submit_next():
+            nonlocal next_index
+            while next_index < len(jobs) and len(pending) < limit:
+                outcome, run, *limit_key = jobs[next_index]
+                pending[self.submit(outcome, run, priority, group, *limit_key)] = next_index
+                next_index += 1
+
+        try:
+            submit_next()
+            while pending:
+                # Only lent while waiting: the caller needs its slot back to process the results
+                async with self.lending_slot():
+                    done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+
+                completed = []
+                exception = None
+                for future in sorted(done, key=pending.get):
+                    index = pending.pop(future)
+                    if future.cancelled():
+                        exception = exception or asyncio.CancelledError()
+                    elif future.exception() is not None:
+                        exception = exception or future.exception()
+                    else:
+                        completed.append((index, future.result()))
+                if exception is not None:
+                    raise exception
+                submit_next()
+
+                for index, result in completed:
+                    yield index, result
+        finally:
+            for future in pending:
+                future.cancel()
+
+    @asynccontextmanager
+    async def lending_slot(self):
+        """
+        Within a job of this scheduler, releases its slot for the duration of the block, for the jobs it waits for.
+        """
+        job = current_job.get()
+        if job is None or job.scheduler is not self or not job.holds_slot:
+            yield
+            return
+
+        self._release(job)
+        self._dispatch()
+        try:
+            yield
+        finally:
+            await self._reacquire(job)
+
+    def _dispatch(self):
+        while self._running < self.max_concurrency:
+            if self._resuming:
+                waiter = self._resuming.popleft()
+                if not waiter.done():
+                    self._running += 1
+                    waiter.set_result(None)
+                continue
+
+            job = self._pop_runnable()
+            if job is None:
+                return
+            if not job.future.done():
+                self._start(job)
+
+    def _pop_runnable(self) -> Optional[ScheduledJob]:
+        for priority in sorted(self._lanes):
+            groups = self._lanes[priority]
+            for group, heap in list(groups.items()):
+                if self._has_capacity(heap[0]):
+                    job = heapq.heappop(heap)
+                else:
+                    job = next((job for job in sorted(heap) if self._has_capacity(job)), None)
+                    if job is None:
+                        continue
+                    heap.remove(job)
+                    heapq.heapify(heap)
+                # Round-robin: the group goes to the end of its lane
+                del groups[group]
+                if heap:
+                    groups[group] = heap
+                if not groups:
+                    del self._lanes[priority]
+                return job
+        return None
+
+    def _has_capacity(self, job: ScheduledJob) -> bool:
+        limit = self.outcome_limits.get(job.outcome)
+        if limit is not None and self._running_by_outcome[job.outcome] >= limit:
+            return False
+        adaptive_limit = self.adaptive_limit(job.limit_key) if self.adaptive_limit else None
+        return adaptive_limit is None or self._running_by_limit_key[job.limit_key] < adaptive_limit
+
+    def _start(self, job: ScheduledJob):
+        self._acquire(job)
+        job.task = asyncio.get_running_loop().create_task(self._run(job), context=job.context)
+
+    async def _run(self, job: ScheduledJob):
+        token = current_job.set(job)
+        try:
+            result = await job.run()
+        except asyncio.CancelledError:
+            job.future.cancel()
+        except BaseException as e:
+            if not job.future.done():
+                job.future.set_exception(e)
+        else:
+            if not job.future.done():
+                job.future.set_result(result)
+        finally:
+            current_job.reset(token)
+            self._release(job)
+            self._dispatch()
+
+    def _on_job_done(self, job: ScheduledJob):
+        if job.future.cancelled() and job.task is not None and not job.task.done():
+            job.task.cancel()
+        if job.task is None:
+            # Cancelled before it started: forget it
+            self._forget(job)
+
+    def _forget(self, job: ScheduledJob):
+        for priority, groups in list(self._lanes.items()):
+            heap = groups.get(job.group)
+            if heap is not None and job in heap:
+                heap.remove(job)
+                heapq.heapify(heap)
+                if not heap:
+                    del groups[job.group]
+                if not groups:
+                    del self._lanes[priority]
+                return
+
+    def _acquire(self, job: ScheduledJob):
+        self._running += 1
+        self._running_by_outcome[job.outcome] += 1
+        self._running_by_limit_key[job.limit_key] += 1
+        job.holds_slot = True
+
+    def _release(self, job: ScheduledJob):
+        if job.holds_slot:
+            job.holds_slot = False
+            self._running -= 1
+            self._running_by_outcome[job.outcome] -= 1
+            self._running_by_limit_key[job.limit_key] -= 1
+
+    async def _reacquire(self, job: ScheduledJob):
+        if self._running < self.max_concurrency and not self._resuming:
+            self._running += 1
+        else:
+            waiter = asyncio.get_running_loop().create_future()
+            self._resuming.append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                if waiter.done() and not waiter.cancelled():
+                    # Granted a slot, but cancelled before taking it
+                    self._running -= 1
+                    self._dispatch()
+                raise
+        self._running_by_outcome[job.outcome] += 1
+        self._running_by_limit_key[job.limit_key] += 1
+        job.holds_slot = True
+
+
+class ConcurrencyProbe:
+    def __init__(self):
+        self.running = 0
+        self.max_running = 0
+        self.order: List[Any] = []
+
+    async def run(self, name: Any, delay: float = 0.01):
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        self.order.append(name)
+        try:
+            await asyncio.sleep(delay)
+        finally:
+            self.running -= 1
+        return name
+
+
+async def test_map_runs_within_the_global_limit():
+    scheduler = TransactionScheduler(max_concurrency=3)
+    probe = ConcurrencyProbe()
+
+    results = await scheduler.map("op", lambda inputs: probe.run(inputs["i"]), [{"i": i} for i in range(10)])
+
+    assert results == list(range(10))
+    assert probe.max_running == 3
+    assert scheduler.running == 0
+
+
+async def test_map_respects_outcome_limits_and_max_workers():
+    scheduler = TransactionScheduler(max_concurrency=8, outcome_limits={"llm": 2})
+    llm, other = ConcurrencyProbe(), ConcurrencyProbe()
+
+    await asyncio.gather(
+        scheduler.map("llm", lambda inputs: llm.run(inputs["i"]), [{"i": i} for i in range(6)]),
+        scheduler.map("other", lambda inputs: other.run(inputs["i"]), [{"i": i} for i in range(6)], max_workers=3))
+
+    assert llm.max_running == 2
+    assert other.max_running == 3
+
+
+async def test_map_respects_adaptive_limits_per_limit_key():
+    limits = {"small-model": 1}
+    scheduler = TransactionScheduler(max_concurrency=8, adaptive_limit=limits.get)
+    small, large = ConcurrencyProbe(), ConcurrencyProbe()
+
+    async def run(inputs):
+        probe = small if inputs["model"] == "small-model" else large
+        return await probe.run(inputs["i"])
+
+    inputs_list = [{"model": model, "i": i} for i in range(4) for model in ("small-model", "large-model")]
+    await scheduler.map("llm", run, inputs_list, limit_key=lambda inputs: inputs["model"])
+
+    assert small.max_running == 1
+    assert large.max_running == 4
+
+
+async def test_priority_lanes_and_fair_sharing_between_groups():
+    scheduler = TransactionScheduler(max_concurrency=1)
+    probe = ConcurrencyProbe()
+
+    blocker = scheduler.submit("op", lambda: probe.run("blocker"))
+    large = [scheduler.submit("op", lambda i=i: probe.run(f"large-{i}"), group="large") for i in range(3)]
+    small = [scheduler.submit("op", lambda i=i: probe.run(f"small-{i}"), group="small") for i in range(2)]
+    urgent = scheduler.submit("op", lambda: probe.run("urgent"), priority=-1, group="large")
+    await asyncio.gather(blocker, *large, *small, urgent)
+
+    assert probe.order == ["blocker", "urgent", "large-0", "small-0", "large-1", "small-1", "large-2"]
+
+
+async def test_nested_maps_lend_their_slot():
+    scheduler = TransactionScheduler(max_concurrency=2)
+    probe = ConcurrencyProbe()
+
+    async def parent(inputs):
+        children = await scheduler.map("child", lambda child: probe.run((inputs["i"], child["j"])),
+                                       [{"j": j} for j in range(3)])
+        return len(children)
+
+    results = await asyncio.wait_for(scheduler.map("parent", parent, [{"i": i} for i in range(4)]), timeout=5)
+
+    assert results == [3, 3, 3, 3]
+    assert probe.max_running <= 2
+    assert scheduler.running == 0
+
+
+async def test_map_raises_the_first_exception_and_cancels_the_rest():
+    scheduler = TransactionScheduler(max_concurrency=2)
+    probe = ConcurrencyProbe()
+
+    async def run(inputs):
+        if inputs["i"] == 1:
+            raise ValueError("failed")
+        return await probe.run(inputs["i"], delay=0.05)
+
+    with pytest.raises(ValueError):
+        await scheduler.map("op", run, [{"i": i} for i in range(6)])
+    await asyncio.sleep(0.1)
+
+    assert len(probe.order) < 5
+    assert scheduler.running == 0
+
+
+async def test_as_completed_yields_results_as_they_complete():
+    scheduler = TransactionScheduler(max_concurrency=4)
+    delays = [0.04, 0.01, 0.03, 0.02]
+    probe = ConcurrencyProbe()
+    jobs = scheduler.jobs("op", lambda inputs: probe.run(inputs["i"], delay=inputs["delay"]),
+                          [{"i": i, "delay": delay} for i, delay in enumerate(delays)])
+
+    completed = [index async for index, _ in scheduler.as_completed(jobs)]
+
+    assert completed == [1, 3, 2, 0]
+
+
+async def test_as_completed_cancels_the_remaining_jobs_when_closed():
+    scheduler = TransactionScheduler(max_concurrency=2)
+    probe = ConcurrencyProbe()
+    jobs = scheduler.jobs("op", lambda inputs: probe.run(inputs["i"], delay=0.01 * (inputs["i"] + 1)),
+                          [{"i": i} for i in range(6)])
+
+    async with aclosing(scheduler.as_completed(jobs)) as completed:
+        async for index, result in completed:
+            break
+    await asyncio.sleep(0.1)
+
+    assert index == result == 0
+    assert len(probe.order) == 3
+    assert scheduler.running == 0
@@ -1,12 +1,12 @@
 import asyncio
 import contextvars
-from contextlib import AbstractAsyncContextManager, ExitStack, AsyncExitStack, contextmanager, asynccontextmanager
-from typing import TypedDict, Dict, Any, Sequence, Optional
+from contextlib import ExitStack, AsyncExitStack, contextmanager, asynccontextmanager
+from typing import TypedDict, Dict, Any, Optional
 
 from pydantic import BaseModel, ConfigDict, Field
-from typeguard import typechecked
+from typeguard import typeguard_ignore
 
-from taskmates.core.workflow_engine.base_signals import BaseSignals
+from taskmates.core.workflow_engine.base_signals import SignalGroups
 from taskmates.core.workflow_engine.objective import Objective, ObjectiveKey
 from taskmates.core.workflow_engine.run_context import RunContext
 from taskmates.core.workflows.signals.control_signals import ControlSignals
@@ -14,8 +14,8 @@ from taskmates.core.workflows.signals.execution_environment_signals import Execu
 from taskmates.core.workflows.signals.input_streams_signals import InputStreamsSignals
 from taskmates.core.workflows.signals.status_signals import StatusSignals
 from taskmates.core.workflows.states.interrupt_state import InterruptState
-from taskmates.lib.context_.temp_context import temp_context
-from taskmates.lib.contextlib_.ensure_async_context_manager import ensure_async_context_manager
+from taskmates.lib.pydantic_.construct import construct
+from taskmates.lib.typeguard_.typechecked import typechecked
 from taskmates.taskmates_runtime import TASKMATES_RUNTIME
 
 
@@ -39,52 +39,70 @@ class Transaction(BaseModel):
 
     context: RunContext = Field(default_factory=dict)
 
-    emits: Dict[str, BaseSignals] = Field(default_factory=dict)
-    consumes: Dict[str, BaseSignals] = Field(default_factory=dict)
-    state: Dict[str, Any] = Field(default_factory=dict)
-    resources: Dict[str, Any] = Field(default_factory=dict)
-
-    # Unified state management
-    result_future: asyncio.Future = Field(default_factory=asyncio.Future, exclude=True)
-    interrupt_state: 'InterruptState' = Field(default_factory=lambda: InterruptState(), exclude=True)
-    completed: bool = Field(default=False, exclude=True)
-
-    # Logger for transaction-scoped logging
-    logger: Any = Field(default=None, exclude=True)
-
-    # Runtime-only fields, excluded from serialization
+    # Runtime state set up by _init_runtime_fields for every transaction: the `emits` and `consumes` signal
+    # groups, the `state` and `resources` dicts, the unified state (`result_future`, `interrupt_state` and
+    # `completed`), the transaction-scoped `logger`, and the context managers and exit stacks of the transaction
+    # contexts. Slots rather than fields, as it is never validated nor serialized
+    __slots__ = ("emits", "consumes", "state", "resources", "result_future", "interrupt_state", "completed",
+                 "logger", "async_context_managers", "exit_stack", "async_exit_stack")
 
     # namespace: Namespace = Field(default_factory=Namespace, exclude=True)
 
     # daemons: Dict[str, AbstractContextManager] = Field(default_factory=dict)
-    async_context_managers: Sequence[AbstractAsyncContextManager] = Field(default_factory=list)
-    exit_stack: ExitStack = Field(default_factory=ExitStack, exclude=True)
-    async_exit_stack: AsyncExitStack = Field(default_factory=AsyncExitStack, exclude=True)
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
-
+        self._init_runtime_fields()
+
+    @classmethod
+    @typeguard_ignore
+    def lightweight(cls, bound: bool = False, **fields: Any) -> 'Transaction':
+        """
+        Builds a transaction from fields known to be valid, skipping their validation and type checks. This
+        is how the transactions of each call of a transactional operation are built. With `bound`, the
+        transaction is also bound to its parent `of`, if any (see bind_to_parent).
+        """
+        transaction = construct(cls, **fields)
+        transaction._init_runtime_fields()
+        if bound and transaction.of is not None:
+            transaction._bind_to_parent(transaction.of)
+        return transaction
+
+    @typeguard_ignore
+    def _init_runtime_fields(self):
         outcome = self.objective.key['outcome']
 
-        self.emits: Transaction.Emits = {
-            'control': ControlSignals(name=outcome),
-            'input_streams': InputStreamsSignals(name=outcome),
-        }
+        # Signal groups are created on first access (see Transaction.Emits and Transaction.Consumes)
+        object.__setattr__(self, "emits", SignalGroups(outcome, EMITS))
+        object.__setattr__(self, "consumes", SignalGroups(outcome, CONSUMES))
+
+        object.__setattr__(self, "state", {})
+        object.__setattr__(self, "resources", {})
 
-        self.consumes: Transaction.Consumes = {
-            'status': StatusSignals(name=outcome),
-            'execution_environment': ExecutionEnvironmentSignals(name=outcome)
-        }
+        object.__setattr__(self, "result_future", asyncio.Future())
+        object.__setattr__(self, "interrupt_state", InterruptState())
+        object.__setattr__(self, "completed", False)
+        object.__setattr__(self, "logger", None)
 
-        self.state = {}
-        self.resources = {}
+        # Entered by async_transaction_context, whether synchronous or asynchronous
+        object.__setattr__(self, "async_context_managers", [])
+        object.__setattr__(self, "exit_stack", ExitStack())
+        object.__setattr__(self, "async_exit_stack", AsyncExitStack())
+
+    @typeguard_ignore
+    def __setattr__(self, name: str, value: Any) -> None:
+        # Pydantic only sets fields, not the slots of the runtime state
+        if name in Transaction.__slots__:
+            object.__setattr__(self, name, value)
+        else:
+            super().__setattr__(name, value)
 
     @contextmanager
     def transaction_context(self):
         TASKMATES_RUNTIME.get().initialize()
 
-        # Sets the current execution context
-        self.exit_stack.enter_context(temp_context(TRANSACTION, self))
+        # Sets the current execution context, until the contexts entered within it are exited
+        token = TRANSACTION.set(self)
 
         # TODO: this is what we want to get rid of
         # Enters the context of all daemons
@@ -93,13 +111,19 @@ class Transaction(BaseModel):
         try:
             yield self
         finally:
-            self.exit_stack.close()
+            try:
+                self.exit_stack.close()
+            finally:
+                TRANSACTION.reset(token)
 
     @asynccontextmanager
     async def async_transaction_context(self):
         async with self.async_exit_stack:
             for cm in self.async_context_managers:
-                await self.async_exit_stack.enter_async_context(cm)
+                if hasattr(cm, '__aenter__'):
+                    await self.async_exit_stack.enter_async_context(cm)
+                else:
+                    self.async_exit_stack.enter_context(cm)
             with self.transaction_context():
                 yield self
 
@@ -120,12 +144,13 @@ class Transaction(BaseModel):
     #             return await runner.get_result()
 
     def bind_to_parent(self, parent_transaction: 'Transaction'):
+        self._bind_to_parent(parent_transaction)
+
+    @typeguard_ignore
+    def _bind_to_parent(self, parent_transaction: 'Transaction'):
         # Bind parent and child transactions
-        from taskmates.core.workflows.markdown_completion.bound_contexts import bound_contexts
-        bound_context_manager = ensure_async_context_manager(
-            bound_contexts(parent_transaction, self))
-        self.async_context_managers = list(self.async_context_managers) + [
-            bound_context_manager]
+        from taskmates.core.workflows.markdown_completion.bound_contexts import RelayedSignalGroups
+        self.async_context_managers.append(RelayedSignalGroups(parent_transaction, self))
 
     def create_child_transaction(self,
                                  outcome: str,
@@ -248,4 +273,14 @@ class Transaction(BaseModel):
     #     return value
 
 
+EMITS = {
+    'control': ControlSignals,
+    'input_streams': InputStreamsSignals,
+}
+
+CONSUMES = {
+    'status': StatusSignals,
+    'execution_environment': ExecutionEnvironmentSignals,
+}
+
 TRANSACTION: contextvars.ContextVar[Transaction] = contextvars.ContextVar('Transaction', default=None)
@@ -1,15 +1,44 @@
-from typeguard import typechecked
-
-from taskmates.core.workflow_engine.base_signals import connected_signals
+from taskmates.core.workflow_engine.base_signals import relay, disconnect_relay
 from taskmates.core.workflow_engine.transactions.transaction import Transaction
+from taskmates.lib.typeguard_.typechecked import typechecked
 
 
 @typechecked
 def bound_contexts(parent_context: Transaction, child_context: Transaction):
-    return connected_signals(
-        [
-            (parent_context.emits["control"], child_context.emits["control"]),
-            (parent_context.emits["input_streams"], child_context.emits["input_streams"]),
-            (child_context.consumes["status"], parent_context.consumes["status"]),
-            (child_context.consumes["execution_environment"], parent_context.consumes["execution_environment"])
-        ])
+    return RelayedSignalGroups(parent_context, child_context)
+
+
+class RelayedSignalGroups:
+    """
+    Relays the control and input streams of the parent to the child, and the status and execution environment
+    of the child to the parent. Each group is relayed once the child creates it: until then nothing receives
+    or sends signals of that group on the child.
+
+    A plain context manager rather than a generator, as every bound transaction enters one.
+    """
+
+    def __init__(self, parent_context: Transaction, child_context: Transaction):
+        self.parent_context = parent_context
+        self.child_context = child_context
+        self.handlers = []
+
+    def relay_emits(self, name, group):
+        self.handlers.extend(relay([(self.parent_context.emits[name], group)]))
+
+    def relay_consumes(self, name, group):
+        self.handlers.extend(relay([(group, self.parent_context.consumes[name])]))
+
+    def __enter__(self):
+        self.child_context.emits.subscribe(self.relay_emits)
+        try:
+            self.child_context.consumes.subscribe(self.relay_consumes)
+        except BaseException:
+            self.child_context.emits.unsubscribe(self.relay_emits)
+            disconnect_relay(self.handlers)
+            raise
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.child_context.consumes.unsubscribe(self.relay_consumes)
+        self.child_context.emits.unsubscribe(self.relay_emits)
+        disconnect_relay(self.handlers)
@@ -1,3 +1,4 @@
+from taskmates.core.markdown_chat.incremental_chat_parser import IncrementalChatParser
 from taskmates.core.markdown_chat.metadata.get_available_tools import get_available_tools
 from taskmates.core.markdown_chat.parse_front_matter_and_messages import parse_front_matter_and_messages
 from taskmates.core.markdown_chat.participants.compute_participants import compute_participants
@@ -7,13 +8,17 @@ from taskmates.types import CompletionRequest, RunOpts
 
 def build_completion_request(markdown_chat: str,
                              markdown_path: str | None = None,
-                             run_opts: RunOpts | None = None) -> CompletionRequest:
+                             run_opts: RunOpts | None = None,
+                             chat_parser: IncrementalChatParser | None = None) -> CompletionRequest:
 
     # Parse structure
-    front_matter, messages = parse_front_matter_and_messages(
-        markdown_chat,
-        markdown_path
-    )
+    if chat_parser is not None:
+        front_matter, messages = chat_parser.parse(markdown_chat, markdown_path)
+    else:
+        front_matter, messages = parse_front_matter_and_messages(
+            markdown_chat,
+            markdown_path
+        )
 
     # TODO: split this method
 
@@ -6,7 +6,6 @@ import textwrap
 from typing import Mapping, Optional
 
 import pytest
-from typeguard import typechecked
 
 from taskmates.core.workflow_engine.transactions.transaction import TRANSACTION
 from taskmates.core.workflows.markdown_completion.completions.code_cell_execution.execution.kernel_manager import \
@@ -18,6 +17,7 @@ from taskmates.core.workflows.markdown_completion.completions.code_cell_executio
 from taskmates.core.workflows.signals.control_signals import ControlSignals
 from taskmates.core.workflows.signals.execution_environment_signals import ExecutionEnvironmentSignals
 from taskmates.core.workflows.signals.status_signals import StatusSignals
+from taskmates.lib.typeguard_.typechecked import typechecked
 
 pytestmark = pytest.mark.slow
 
@@ -1,13 +1,13 @@
 import signal
 
 from jupyter_client import AsyncKernelManager
-from typeguard import typechecked
 
 from taskmates.core.workflows.markdown_completion.completions.code_cell_execution.execution.message_handler import \
     MessageHandler
 from taskmates.core.workflows.markdown_completion.completions.code_cell_execution.jupyter_notebook_logger import \
     jupyter_notebook_logger
 from taskmates.core.workflows.signals.status_signals import StatusSignals
+from taskmates.lib.typeguard_.typechecked import typechecked
 
 
 @typechecked
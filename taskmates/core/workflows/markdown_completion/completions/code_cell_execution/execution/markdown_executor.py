@@ -1,7 +1,6 @@
 from typing import Mapping, Tuple, List
 
 from nbformat import NotebookNode
-from typeguard import typechecked
 
 from taskmates.core.workflows.markdown_completion.completions.code_cell_execution.execution.bash_script_handler import BashScriptHandler
 from taskmates.core.workflows.markdown_completion.completions.code_cell_execution.execution.cell_executor import CellExecutor
@@ -14,6 +13,7 @@ from taskmates.core.workflows.markdown_completion.completions.code_cell_executio
 from taskmates.core.workflows.signals.control_signals import ControlSignals
 from taskmates.core.workflows.signals.execution_environment_signals import ExecutionEnvironmentSignals
 from taskmates.core.workflows.signals.status_signals import StatusSignals
+from taskmates.lib.typeguard_.typechecked import typechecked
 
 
 @typechecked
@@ -3,10 +3,10 @@ from queue import Empty
 from typing import Optional
 
 from jupyter_client import AsyncKernelClient
-from typeguard import typechecked
 
 from taskmates.core.workflows.markdown_completion.completions.code_cell_execution.jupyter_notebook_logger import jupyter_notebook_logger
 from taskmates.core.workflows.signals.status_signals import StatusSignals
+from taskmates.lib.typeguard_.typechecked import typechecked
 
 
 @typechecked
@@ -2,11 +2,11 @@ import json
 from pathlib import Path
 
 from nbconvert.filters import strip_ansi
-from typeguard import typechecked
 
 from taskmates.core.workflows.markdown_completion.completions.code_cell_execution.code_execution_output_appender import CodeExecutionOutputAppender
 from taskmates.core.workflows.markdown_completion.completions.code_cell_execution.execution.code_execution import CodeExecution
 from taskmates.core.workflows.signals.execution_environment_signals import ExecutionEnvironmentSignals
+from taskmates.lib.typeguard_.typechecked import typechecked
 
 
 @typechecked
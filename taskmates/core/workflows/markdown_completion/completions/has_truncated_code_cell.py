@@ -1,4 +1,4 @@
-from typeguard import typechecked
+from taskmates.lib.typeguard_.typechecked import typechecked
 
 
 @typechecked
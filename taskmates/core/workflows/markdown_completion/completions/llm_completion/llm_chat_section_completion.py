@@ -1,5 +1,4 @@
 import pytest
-from typeguard import typechecked
 
 from taskmates.core.workflow_engine.base_signals import connected_signals
 from taskmates.core.workflow_engine.transaction_manager import runtime
@@ -17,6 +16,7 @@ from taskmates.core.workflows.signals.control_signals import ControlSignals
 from taskmates.core.workflows.signals.execution_environment_signals import ExecutionEnvironmentSignals
 from taskmates.core.workflows.signals.status_signals import StatusSignals
 from taskmates.core.workflows.states.markdown_chat import MarkdownChat
+from taskmates.lib.typeguard_.typechecked import typechecked
 from taskmates.runtimes.cli.collect_markdown_bindings import CollectMarkdownBindings
 from taskmates.types import CompletionRequest
 
@@ -33,6 +33,15 @@ class LlmChatSectionCompletion(SectionCompletion):
         recipient_role = last_message["recipient_role"]
         return recipient_role is not None and not recipient_role == "user"
 
+    @staticmethod
+    def cache_session(messages: list[dict]) -> str | None:
+        """The markdown chat and the participant the completion is for, whose successive requests share a prompt."""
+        runner_environment = runtime.transaction.context.get("runner_environment", {})
+        chat_id = runner_environment.get("markdown_path") or runner_environment.get("request_id")
+        if chat_id is None:
+            return None
+        return f"{chat_id}#{messages[-1].get('recipient')}"
+
     @transactional
     async def perform_completion(self, chat: CompletionRequest) -> str:
         markdown_chat_state = MarkdownChat()
@@ -44,7 +53,7 @@ class LlmChatSectionCompletion(SectionCompletion):
             status_signals: StatusSignals = runtime.transaction.consumes["status"]
 
             messages = chat["messages"]
-            request = LlmCompletionRequest(chat)
+            request = LlmCompletionRequest(chat, cache_session=self.cache_session(messages))
 
             markdown_appender = LlmCompletionMarkdownAppender(
                 recipient=messages[-1]["recipient"],
@@ -62,7 +71,10 @@ class LlmChatSectionCompletion(SectionCompletion):
 
                     ]):
                 # Execute streaming since we have a receiver connected (markdown_appender)
-                await request.execute_streaming()
+                try:
+                    await request.execute_streaming()
+                finally:
+                    await markdown_appender.flush()
 
         return markdown_chat_state.get()["completion"]
 
@@ -400,3 +412,38 @@ async def test_gemini_tool_call_streaming_response(transaction: Transaction):
     )
 
     assert full_output == expected_output, f"Expected:\n{repr(expected_output)}\n\nGot:\n{repr(full_output)}"
+
+
+@pytest.mark.asyncio
+async def test_completion_reports_prompt_cache_usage(transaction: Transaction):
+    from taskmates.core.workflows.markdown_completion.completions.llm_completion.request.prompt_cache_planner import \
+        prompt_cache_planner
+
+    chat = {
+        "messages": [
+            {"role": "user", "content": "Hello", "recipient": "assistant", "recipient_role": "assistant"}
+        ],
+        "participants": {"assistant": {"role": "assistant"}},
+        "available_tools": [],
+        "run_opts": {
+            "model": {
+                "name": "fixture",
+                "kwargs": {
+                    "fixture_path": "tests/fixtures/api-responses/anthropic_streaming_response.jsonl"
+                }
+            }
+        }
+    }
+
+    transaction.context["runner_environment"]["markdown_path"] = "/tmp/chat.md"
+    transaction.emits["control"] = ControlSignals(name="ControlSignals")
+    transaction.consumes["execution_environment"] = ExecutionEnvironmentSignals(name="ExecutionEnvironmentSignals")
+    transaction.consumes["status"] = StatusSignals(name="StatusSignals")
+
+    input_tokens = prompt_cache_planner.stats()["input_tokens"]
+    async with transaction.async_transaction_context():
+        assert LlmChatSectionCompletion.cache_session(chat["messages"]) == "/tmp/chat.md#assistant"
+        await LlmChatSectionCompletion().perform_completion(chat=chat)
+
+    # The fixture reports 15 input tokens, none of them read from or written to the cache
+    assert prompt_cache_planner.stats()["input_tokens"] == input_tokens + 15
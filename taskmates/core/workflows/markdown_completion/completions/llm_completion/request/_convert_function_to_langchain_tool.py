@@ -1,10 +1,11 @@
 from typing import Callable
 
-from langchain_core.tools import BaseTool, StructuredTool
+from langchain_core.tools import BaseTool
+
+from taskmates.core.workflows.markdown_completion.completions.llm_completion.request.tool_schema_registry import \
+    tool_schema_registry
 
 
 def _convert_function_to_langchain_tool(func: Callable) -> BaseTool:
-    """Convert a raw function to a LangChain tool using StructuredTool.from_function."""
-    if isinstance(func, StructuredTool):
-        return func
-    return StructuredTool.from_function(func=func)
+    """Convert a raw function to a LangChain tool using StructuredTool.from_function, built once per function."""
+    return tool_schema_registry.get_tool(func)
@@ -2,10 +2,10 @@ import json
 
 from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, SystemMessage, ToolMessage, ToolCall
 from langchain_core.tools import BaseTool
-from typeguard import typechecked
 
 from taskmates.core.workflows.markdown_completion.completions.llm_completion.request._convert_function_to_langchain_tool import \
     _convert_function_to_langchain_tool
+from taskmates.lib.typeguard_.typechecked import typechecked
 
 
 @typechecked
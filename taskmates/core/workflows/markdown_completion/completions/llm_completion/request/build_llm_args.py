@@ -2,7 +2,6 @@ import json
 
 from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, SystemMessage, ToolMessage, ToolCall
 from langchain_core.tools import BaseTool
-from typeguard import typechecked
 
 from taskmates.core.markdown_chat.metadata.prepend_recipient_system import prepend_recipient_system
 from taskmates.core.tools_registry import tools_registry
@@ -10,6 +9,7 @@ from taskmates.core.workflows.markdown_completion.completions.llm_completion.req
     _convert_function_to_langchain_tool
 from taskmates.core.workflows.markdown_completion.completions.llm_completion.request.configure_vendor_specifics import \
     configure_vendor_specifics
+from taskmates.lib.typeguard_.typechecked import typechecked
 
 
 @typechecked
@@ -19,7 +19,8 @@ def build_llm_args(
         participants: dict,
         inputs: dict,
         model_conf: dict,
-        client=None
+        client=None,
+        cache_session: str | None = None
 ) -> dict:
     """
     Prepare the request payload for LLM completion.
@@ -62,16 +63,18 @@ def build_llm_args(
                  if key not in ("recipient", "recipient_role", "code_cells", "meta")}
                 for m in messages]
 
-    # convert "arguments" to str
+    # convert "arguments" to str, leaving the tool calls of the chat as they are
     for message in messages:
-        tool_calls = message.get("tool_calls", [])
-        for tool_call in tool_calls:
-            tool_call["function"]["arguments"] = json.dumps(tool_call["function"]["arguments"],
-                                                            ensure_ascii=False)
+        if "tool_calls" in message:
+            message["tool_calls"] = [
+                {**tool_call, "function": {**tool_call["function"],
+                                           "arguments": json.dumps(tool_call["function"]["arguments"],
+                                                                   ensure_ascii=False)}}
+                for tool_call in message["tool_calls"]]
 
     # Apply vendor-specific configurations if client is provided
     if client is not None:
-        messages, tools = configure_vendor_specifics(client, messages, tools)
+        messages, tools = configure_vendor_specifics(client, messages, tools, cache_session)
 
     # Convert messages to LangChain format
     role_map = {
@@ -612,3 +615,27 @@ def test_build_llm_args_with_inputs_from_run_opts(tmp_path):
     system_message = next((msg for msg in result["messages"] if isinstance(msg, SystemMessage)), None)
     assert system_message is not None
     assert system_message.content == "User's name is Alice. Their role is developer.\n"
+
+
+def test_build_llm_args_places_prompt_cache_breakpoints_across_steps():
+    """Test that successive requests of a chat read back the prompt prefix cached by the previous one."""
+    from langchain_anthropic import ChatAnthropic
+
+    client = ChatAnthropic(model="claude-3-haiku-20240307", api_key="dummy-key")
+    participants = {"assistant": {"name": "assistant", "role": "assistant", "system": "You are a helpful assistant."}}
+    model_conf = {"model": "claude-3-haiku-20240307"}
+    messages = [{"role": "user", "name": "user", "content": "Question 0", "recipient": "assistant"}]
+
+    def cached_blocks(messages: list[dict]) -> list[str]:
+        result = build_llm_args([dict(message) for message in messages], [], participants, {}, model_conf,
+                                client=client, cache_session="test_prompt_cache.md#assistant")
+        payload = client._get_request_payload(result["messages"])
+        blocks = payload["system"] + [block for message in payload["messages"] if isinstance(message["content"], list)
+                                      for block in message["content"]]
+        return [block["text"] for block in blocks if "cache_control" in block]
+
+    assert cached_blocks(messages) == ["You are a helpful assistant.\n", "Question 0"]
+
+    messages += [{"role": "assistant", "name": "assistant", "content": "Answer 0"},
+                 {"role": "user", "name": "user", "content": "Question 1", "recipient": "assistant"}]
+    assert cached_blocks(messages) == ["You are a helpful assistant.\n", "Question 0", "Question 1"]
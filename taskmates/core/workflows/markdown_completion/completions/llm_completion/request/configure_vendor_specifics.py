@@ -5,27 +5,31 @@ from langchain_anthropic import ChatAnthropic
 from langchain_core.language_models import BaseChatModel
 from langchain_openai import ChatOpenAI
 from langchain_xai import ChatXAI
-from typeguard import typechecked
 
+from taskmates.core.workflows.markdown_completion.completions.llm_completion.request.prompt_cache_planner import \
+    prompt_cache_planner
 from taskmates.core.workflows.markdown_completion.completions.llm_completion.testing.fixture_chat_model import \
     FixtureChatModel
+from taskmates.lib.typeguard_.typechecked import typechecked
 
 
 @typechecked
-def configure_vendor_specifics(client: BaseChatModel, messages: list[dict], tools: list) -> Tuple[list, list]:
+def configure_vendor_specifics(client: BaseChatModel, messages: list[dict], tools: list,
+                               cache_session: str | None = None) -> Tuple[list, list]:
     """Configure messages and tools based on the vendor.
 
     Args:
         client: The LangChain chat model client
         messages: List of messages to potentially modify
         tools: List of tools to potentially modify
+        cache_session: Identifies the successive requests of a chat, so that they share cached prompt prefixes
 
     Returns:
         Tuple of (messages, tools) with vendor-specific configurations applied
     """
     # Handle Anthropic-specific caching
     if isinstance(client, ChatAnthropic):
-        _setup_anthropic_caching(messages)
+        _setup_anthropic_caching(messages, cache_session)
 
     # Handle OpenAI-specific tools
     if "gpt-4" in (getattr(client, "model_name", "") or getattr(client, "model", "")):
@@ -43,32 +47,14 @@ def configure_vendor_specifics(client: BaseChatModel, messages: list[dict], tool
     return messages, tools
 
 
-def _setup_anthropic_caching(messages: list[dict]) -> None:
+def _setup_anthropic_caching(messages: list[dict], cache_session: str | None = None) -> None:
     """Configure Anthropic-specific message caching.
 
     Args:
         messages: List of messages to add cache control to (modified in-place)
+        cache_session: Identifies the successive requests of a chat, see `PromptCachePlanner`
     """
-    first_message = messages[0]
-    if first_message["role"] == "system":
-        first_message["content"] = [{
-            "type": "text",
-            "text": first_message["content"],
-            "cache_control": {"type": "ephemeral"}
-        }]
-
-    # Add cache control to the last 3 non-system messages
-    non_system_count = 0
-    for message in reversed(messages):
-        if not message["role"] == "system":
-            if isinstance(message["content"], str):
-                message["content"] = [{"type": "text", "text": message["content"]}]
-            for content in message["content"]:
-                if content["type"] == "text":
-                    content["cache_control"] = {"type": "ephemeral"}
-            non_system_count += 1
-            if non_system_count >= 3:
-                break
+    prompt_cache_planner.apply(cache_session, messages)
 
 
 @pytest.mark.integration
@@ -89,47 +75,28 @@ def test_configure_vendor_specifics_with_openai():
     assert result_tools[1] == {"type": "web_search_preview"}
 
 
-@pytest.mark.integration
 def test_configure_vendor_specifics_with_anthropic():
     """Test that Anthropic models get caching configured."""
-    from langchain_anthropic import ChatAnthropic
-    from langchain.schema import SystemMessage, HumanMessage, AIMessage
-
-    # Real Anthropic client
     client = ChatAnthropic(model="claude-3-haiku-20240307", api_key="dummy-key")
 
-    # Real message objects
     messages = [
-        SystemMessage(content="System prompt"),
-        HumanMessage(content="User message 1"),
-        AIMessage(content="AI message 2"),
-        HumanMessage(content="User message 3"),
-        AIMessage(content="AI message 4"),
+        {"role": "system", "content": "System prompt"},
+        {"role": "user", "content": "User message 1"},
+        {"role": "assistant", "content": "AI message 2"},
+        {"role": "user", "content": "User message 3"},
+        {"role": "assistant", "content": "AI message 4"},
     ]
 
     tools = []
 
     result_messages, result_tools = configure_vendor_specifics(client, messages, tools)
 
-    # Check system message has cache control
-    assert messages[0].content == {
-        "type": "text",
-        "text": "System prompt",
-        "cache_control": {"type": "ephemeral"}
-    }
-
-    # Check last 3 non-system messages have cache control
-    expected_contents = [
-        [{"type": "text", "text": "User message 1", "cache_control": {"type": "ephemeral"}}],
-        [{"type": "text", "text": "AI message 2", "cache_control": {"type": "ephemeral"}}],
-        [{"type": "text", "text": "User message 3", "cache_control": {"type": "ephemeral"}}],
-    ]
-
-    for i, expected in enumerate(expected_contents, 1):
-        assert messages[i].content == expected
+    # The system message and the whole prompt are cached
+    assert messages[0]["content"] == [{"type": "text", "text": "System prompt", "cache_control": {"type": "ephemeral"}}]
+    assert messages[4]["content"] == [{"type": "text", "text": "AI message 4", "cache_control": {"type": "ephemeral"}}]
 
-    # The 4th message should not have cache control
-    assert messages[4].content == "AI message 4"
+    # The other messages are unchanged
+    assert [message["content"] for message in messages[1:4]] == ["User message 1", "AI message 2", "User message 3"]
 
     # Tools should be unchanged
     assert result_tools == tools
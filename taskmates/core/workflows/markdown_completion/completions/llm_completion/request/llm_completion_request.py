@@ -5,7 +5,6 @@ import pytest
 from httpx import ReadError
 from loguru import logger
 from opentelemetry import trace
-from typeguard import typechecked
 
 from taskmates.core.markdown_chat.metadata.get_model_client import get_model_client
 from taskmates.core.markdown_chat.metadata.config_model_conf import config_model_conf
@@ -14,18 +13,17 @@ from taskmates.core.workflows.markdown_completion.completions.llm_completion._ge
     _get_usernames_stop_sequences
 from taskmates.core.workflows.markdown_completion.completions.llm_completion.request.build_llm_args import \
     build_llm_args
+from taskmates.core.workflows.markdown_completion.completions.llm_completion.request.prompt_cache_planner import \
+    prompt_cache_planner
 from taskmates.core.workflows.markdown_completion.completions.llm_completion.request.request_interruption_monitor import \
     RequestInterruptionMonitor
-from taskmates.core.workflows.markdown_completion.completions.llm_completion.response.llm_completion_pre_processor import \
-    LlmCompletionPreProcessor
-from taskmates.core.workflows.markdown_completion.completions.llm_completion.response.llm_completion_with_username import \
-    LlmCompletionWithUsername
-from taskmates.core.workflows.markdown_completion.completions.llm_completion.response.stop_sequence_processor import \
-    StopSequenceProcessor
+from taskmates.core.workflows.markdown_completion.completions.llm_completion.response.llm_completion_stream_processor import \
+    LlmCompletionStreamProcessor
 from taskmates.core.workflows.signals.control_signals import ControlSignals
 from taskmates.core.workflows.signals.llm_chat_completion_signals import LlmChatCompletionSignals
 from taskmates.core.workflows.signals.status_signals import StatusSignals
 from taskmates.defaults.settings import Settings
+from taskmates.lib.typeguard_.typechecked import typechecked
 from taskmates.logging import file_logger
 from taskmates.types import CompletionRequest
 
@@ -34,7 +32,7 @@ tracer = trace.get_tracer_provider().get_tracer(__name__)
 
 @typechecked
 class LlmCompletionRequest:
-    def __init__(self, chat: CompletionRequest, stop_sequences: list | None = None):
+    def __init__(self, chat: CompletionRequest, stop_sequences: list | None = None, cache_session: str | None = None):
         run_opts = chat["run_opts"]
         model_alias = run_opts["model"]
         participants = chat.get("participants", {})
@@ -71,7 +69,8 @@ class LlmCompletionRequest:
             participants=participants,
             inputs=inputs,
             model_conf=model_conf,
-            client=self.client
+            client=self.client,
+            cache_session=cache_session
         )
         self.messages = self.llm_args["messages"]
         self.tools = self.llm_args["tools"]
@@ -132,20 +131,12 @@ class LlmCompletionRequest:
 
     async def _stream_and_emit(self, llm, messages, stop_sequences, request_interruption_monitor):
         """Stream chunks and emit them via signals without accumulating."""
-        chat_completion = llm.astream(messages)
+        chat_completion = self._recording_usage(llm.astream(messages))
 
         received_chunk = False
 
         try:
-            async for chat_completion_chunk in \
-                    LlmCompletionWithUsername(
-                        LlmCompletionPreProcessor(
-                            StopSequenceProcessor(
-                                chat_completion,
-                                stop_sequences
-                            )
-                        )
-                    ):
+            async for chat_completion_chunk in LlmCompletionStreamProcessor(chat_completion, stop_sequences):
                 received_chunk = True
                 if request_interruption_monitor.interrupted_or_killed:
                     break
@@ -165,6 +156,20 @@ class LlmCompletionRequest:
             logger.debug(f"No chunks received. Cancelling request.")
             raise asyncio.CancelledError
 
+    @staticmethod
+    async def _recording_usage(chat_completion):
+        """Passes the chunks through, adding the token counts they report to the prompt cache telemetry."""
+        async for chunk in chat_completion:
+            usage_metadata = chunk.usage_metadata
+            if usage_metadata and usage_metadata.get("input_tokens"):
+                prompt_cache_planner.record_usage(usage_metadata)
+                details = usage_metadata.get("input_token_details") or {}
+                span = trace.get_current_span()
+                span.set_attribute("llm.usage.input_tokens", usage_metadata["input_tokens"])
+                span.set_attribute("llm.usage.cache_read_input_tokens", details.get("cache_read") or 0)
+                span.set_attribute("llm.usage.cache_creation_input_tokens", details.get("cache_creation") or 0)
+            yield chunk
+
     @property
     def result(self) -> Optional[dict]:
         """Get the result if execution is complete."""
@@ -0,0 +1,228 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Mapping, Optional
+
+
+# Anthropic accepts at most 4 blocks with cache_control per request
+MAX_CACHE_BREAKPOINTS = int(os.environ.get("TASKMATES_MAX_CACHE_BREAKPOINTS", 4))
+MAX_CACHE_SESSIONS = int(os.environ.get("TASKMATES_MAX_CACHE_SESSIONS", 256))
+
+CACHE_CONTROL = {"type": "ephemeral"}
+
+
+def message_digest(message: dict) -> str:
+    """Digest of what a message contributes to the prompt, ignoring any cache_control already set on it."""
+    content = message.get("content")
+    if isinstance(content, list):
+        content = [{key: value for key, value in part.items() if key != "cache_control"}
+                   if isinstance(part, dict) else part
+                   for part in content]
+    key = [message.get("role"), message.get("name"), content, message.get("tool_calls"),
+           message.get("tool_call_id")]
+    return hashlib.sha256(json.dumps(key, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def common_prefix_length(previous: List[str], current: List[str]) -> int:
+    length = 0
+    for previous_digest, current_digest in zip(previous, current):
+        if previous_digest != current_digest:
+            break
+        length += 1
+    return length
+
+
+def _has_text(message: dict) -> bool:
+    content = message.get("content")
+    if isinstance(content, str):
+        return bool(content)
+    return isinstance(content, list) and any(isinstance(part, dict) and part.get("type") == "text"
+                                             and part.get("text") for part in content)
+
+
+def _set_breakpoint(message: dict) -> None:
+    """Puts cache_control on the last text block of the message, turning a string content into a text block."""
+    if isinstance(message["content"], str):
+        message["content"] = [{"type": "text", "text": message["content"]}]
+    else:
+        message["content"] = [dict(part) if isinstance(part, dict) else part for part in message["content"]]
+    for part in reversed(message["content"]):
+        if isinstance(part, dict) and part.get("type") == "text" and part.get("text"):
+            part["cache_control"] = dict(CACHE_CONTROL)
+            return
+
+
+class PromptCachePlanner:
+    """
+    Places prompt cache breakpoints where the provider can reuse them from one request of a session to the next.
+
+    A cached prefix is only read back by a later request whose breakpoint falls at the end of the same prefix,
+    so the planner remembers the message digests of the previous request of each session (e.g. a markdown
+    chat, across its steps) and puts at most `max_breakpoints` breakpoints:
+
+    - on the last message, writing the whole prompt for the next request
+    - at the end of the prefix shared with the previous request, reading what that request wrote
+    - on the system message, which is shared by every request of the session
+
+    It also collects the cache read and write token counts reported in the responses.
+    """
+
+    def __init__(self, max_breakpoints: int = MAX_CACHE_BREAKPOINTS, max_sessions: int = MAX_CACHE_SESSIONS):
+        self.max_breakpoints = max_breakpoints
+        self.max_sessions = max_sessions
+        self._sessions: OrderedDict[str, List[str]] = OrderedDict()
+        self._usage: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.reset()
+
+    def plan(self, session: Optional[str], messages: List[dict]) -> List[int]:
+        """Returns the indices of the messages that get a breakpoint, and remembers the messages of `session`."""
+        digests = [message_digest(message) for message in messages]
+        with self._lock:
+            previous = self._sessions.get(session, []) if session is not None else []
+            if session is not None:
+                self._sessions[session] = digests
+                self._sessions.move_to_end(session)
+                while len(self._sessions) > self.max_sessions:
+                    self._sessions.popitem(last=False)
+
+        stable = common_prefix_length(previous, digests)
+        candidates = [len(messages) - 1, stable - 1]
+        if messages and messages[0].get("role") == "system":
+            candidates.append(0)
+
+        breakpoints = []
+        for index in candidates:
+            # Messages without text (e.g. tool calls only) can't hold a breakpoint: use the closest one before
+            while index >= 0 and not _has_text(messages[index]):
+                index -= 1
+            if index >= 0 and index not in breakpoints and len(breakpoints) < self.max_breakpoints:
+                breakpoints.append(index)
+        return sorted(breakpoints)
+
+    def apply(self, session: Optional[str], messages: List[dict]) -> List[dict]:
+        """Puts the planned breakpoints on `messages`, replacing the content of the messages that get one."""
+        for index in self.plan(session, messages):
+            _set_breakpoint(messages[index])
+        return messages
+
+    def record_usage(self, usage_metadata: Mapping[str, Any]) -> None:
+        """Adds the token counts of a response, as reported in the `usage_metadata` of its chunks."""
+        details = usage_metadata.get("input_token_details") or {}
+        with self._lock:
+            self._usage["input_tokens"] += usage_metadata.get("input_tokens") or 0
+            self._usage["cache_read_input_tokens"] += details.get("cache_read") or 0
+            self._usage["cache_creation_input_tokens"] += details.get("cache_creation") or 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            usage = dict(self._usage)
+        input_tokens = usage["input_tokens"]
+        return {**usage,
+                "cache_hit_rate": usage["cache_read_input_tokens"] / input_tokens if input_tokens else 0.0,
+                "cache_write_rate": usage["cache_creation_input_tokens"] / input_tokens if input_tokens else 0.0}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._sessions.clear()
+            self._usage = {"input_tokens": 0, "cache_read_input_tokens": 0, "cache_creation_input_tokens": 0}
+
+
+prompt_cache_planner = PromptCachePlanner()
+
+
+def conversation(turns: int) -> List[dict]:
+    messages = [{"role": "system", "content": "You are a helpful assistant."}]
+    for turn in range(turns):
+        messages.append({"role": "user", "content": f"Question {turn}"})
+        messages.append({"role": "assistant", "content": f"Answer {turn}"})
+    return messages
+
+
+def breakpoints_of(messages: List[dict]) -> List[int]:
+    return [index for index, message in enumerate(messages)
+            if isinstance(message["content"], list)
+            and any("cache_control" in part for part in message["content"])]
+
+
+def test_first_request_caches_the_system_message_and_the_whole_prompt():
+    messages = conversation(3)[:-1]
+
+    PromptCachePlanner().apply("chat.md", messages)
+
+    assert breakpoints_of(messages) == [0, 5]
+    assert messages[5]["content"] == [{"type": "text", "text": "Question 2", "cache_control": CACHE_CONTROL}]
+    assert messages[4]["content"] == "Answer 1"
+
+
+def test_next_request_reads_the_prefix_written_by_the_previous_one():
+    planner = PromptCachePlanner()
+    first = conversation(3)[:-1]
+    planner.apply("chat.md", first)
+
+    second = conversation(4)[:-1]
+    planner.apply("chat.md", second)
+
+    # 5 is where the first request ended, 7 where this one ends
+    assert breakpoints_of(second) == [0, 5, 7]
+
+
+def test_stable_prefix_ends_where_the_history_changed():
+    planner = PromptCachePlanner()
+    planner.plan("chat.md", conversation(4))
+
+    edited = conversation(4)
+    edited[3]["content"] = "Question 1, edited"
+
+    assert planner.plan("chat.md", edited) == [0, 2, 8]
+    assert planner.plan("other.md", conversation(4)) == [0, 8]
+    assert planner.plan(None, conversation(4)) == [0, 8]
+
+
+def test_breakpoints_stay_within_the_budget_and_skip_messages_without_text():
+    planner = PromptCachePlanner(max_breakpoints=2)
+    messages = conversation(2) + [
+        {"role": "user", "content": [{"type": "text", "text": "First part"}, {"type": "text", "text": "Second part"}]},
+        {"role": "assistant", "content": "", "tool_calls": [{"id": "call_1", "type": "function",
+                                                              "function": {"name": "echo", "arguments": "{}"}}]},
+    ]
+
+    planner.apply("chat.md", messages)
+
+    # The last message only calls a tool, so the whole prompt is cached up to the message before it
+    assert breakpoints_of(messages) == [0, 5]
+    assert messages[5]["content"] == [{"type": "text", "text": "First part"},
+                                      {"type": "text", "text": "Second part", "cache_control": CACHE_CONTROL}]
+
+
+def test_digests_ignore_cache_control():
+    message = {"role": "user", "content": "Hello"}
+    with_breakpoint = {"role": "user", "content": [{"type": "text", "text": "Hello"}]}
+    digest = message_digest(with_breakpoint)
+    _set_breakpoint(with_breakpoint)
+
+    assert message_digest(with_breakpoint) == digest
+    assert message_digest(message) != digest
+
+
+def test_sessions_are_evicted_least_recently_used_first():
+    planner = PromptCachePlanner(max_sessions=2)
+    for session in ["a.md", "b.md", "a.md", "c.md"]:
+        planner.plan(session, conversation(1))
+
+    assert list(planner._sessions) == ["a.md", "c.md"]
+
+
+def test_cache_hit_rate():
+    planner = PromptCachePlanner()
+    planner.record_usage({"input_tokens": 1000, "output_tokens": 0,
+                          "input_token_details": {"cache_read": 0, "cache_creation": 800}})
+    planner.record_usage({"input_tokens": 1200, "output_tokens": 0,
+                          "input_token_details": {"cache_read": 800, "cache_creation": 300}})
+    planner.record_usage({"input_tokens": 0, "output_tokens": 50})
+
+    assert planner.stats() == {"input_tokens": 2200, "cache_read_input_tokens": 800,
+                               "cache_creation_input_tokens": 1100,
+                               "cache_hit_rate": 800 / 2200, "cache_write_rate": 1100 / 2200}
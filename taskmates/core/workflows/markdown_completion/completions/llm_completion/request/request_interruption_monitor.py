@@ -2,10 +2,10 @@ from dataclasses import dataclass, field
 from typing import Any
 
 import pytest
-from typeguard import typechecked
 
 from taskmates.core.workflows.signals.control_signals import ControlSignals
 from taskmates.core.workflows.signals.status_signals import StatusSignals
+from taskmates.lib.typeguard_.typechecked import typechecked
 
 
 # TODO rename this class
@@ -0,0 +1,189 @@
+import inspect
+import threading
+from typing import Any, Callable, Dict, Mapping, Optional
+
+from langchain_core.tools import BaseTool, StructuredTool
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+from taskmates.logging import logger
+
+
+def code_version(func: Callable) -> Optional[Any]:
+    """The code object behind `func`, looking through decorators, which changes when the function is redefined."""
+    try:
+        return getattr(inspect.unwrap(func), "__code__", None)
+    except ValueError:
+        return None
+
+
+class ToolSchema:
+    """A LangChain tool built from a function, with its JSON schemas computed on first use."""
+
+    __slots__ = ("func", "code", "tool", "_args_schema", "_function_schema")
+
+    def __init__(self, func: Callable, code: Optional[Any], tool: BaseTool):
+        self.func = func
+        self.code = code
+        self.tool = tool
+        self._args_schema: Optional[dict] = None
+        self._function_schema: Optional[dict] = None
+
+    @property
+    def args_schema(self) -> dict:
+        if self._args_schema is None:
+            args_schema = self.tool.args_schema
+            self._args_schema = args_schema.model_json_schema() \
+                if hasattr(args_schema, "model_json_schema") else dict(args_schema)
+        return self._args_schema
+
+    @property
+    def function_schema(self) -> dict:
+        """The tool in the OpenAI function calling format."""
+        if self._function_schema is None:
+            self._function_schema = convert_to_openai_tool(self.tool)
+        return self._function_schema
+
+
+class ToolSchemaRegistry:
+    """
+    Builds the LangChain tool of each function once per function object and code version.
+
+    `StructuredTool.from_function` parses the docstring, inspects the signature and creates a pydantic model for
+    the arguments, which is too much work to repeat for every tool of every completion step. Tools are looked up
+    by the identity of the function, and rebuilt if its code changed (e.g. the module was reloaded).
+    """
+
+    def __init__(self):
+        self._entries: Dict[int, ToolSchema] = {}
+        self._tools: Dict[int, ToolSchema] = {}
+        self._lock = threading.Lock()
+        self.reset()
+
+    def get(self, func: Callable) -> ToolSchema:
+        code = None if isinstance(func, BaseTool) else code_version(func)
+        with self._lock:
+            # A tool built here, as passed back by build_llm_args
+            entry = self._tools.get(id(func))
+            if entry is not None and entry.tool is func:
+                self._hits += 1
+                return entry
+
+            entry = self._entries.get(id(func))
+            if entry is not None and entry.func is func and entry.code is code:
+                self._hits += 1
+                return entry
+
+            self._misses += 1
+            tool = func if isinstance(func, StructuredTool) else StructuredTool.from_function(func=func)
+            if entry is not None:
+                self._tools.pop(id(entry.tool), None)
+            entry = ToolSchema(func, code, tool)
+            self._entries[id(func)] = entry
+            self._tools[id(tool)] = entry
+            return entry
+
+    def get_tool(self, func: Callable) -> BaseTool:
+        return self.get(func).tool
+
+    def warm(self, functions: Mapping[str, Callable]) -> None:
+        """Builds the tools and schemas of `functions` ahead of the first completion that needs them."""
+        for name, func in functions.items():
+            try:
+                self.get(func).function_schema
+            except Exception as e:
+                # It will fail again, and be reported, when a completion uses it
+                logger.debug(f"Could not build the schema of tool {name}: {e}")
+
+    def schemas(self, functions: Mapping[str, Callable]) -> Dict[str, dict]:
+        """The function schemas of `functions` that can be built, by name."""
+        schemas = {}
+        for name, func in functions.items():
+            try:
+                schemas[name] = self.get(func).function_schema
+            except Exception as e:
+                logger.debug(f"Could not build the schema of tool {name}: {e}")
+        return schemas
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"tools": len(self._entries), "hits": self._hits, "misses": self._misses}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._tools.clear()
+            self._hits = 0
+            self._misses = 0
+
+
+tool_schema_registry = ToolSchemaRegistry()
+
+
+def get_weather(location: str) -> str:
+    """Get the weather for a location."""
+    return f"The weather in {location} is sunny and 72°F"
+
+
+def get_forecast(location: str, days: int = 3) -> str:
+    """Get the weather forecast for a location."""
+    return f"The weather in {location} will be sunny for {days} days"
+
+
+def test_builds_each_tool_once():
+    registry = ToolSchemaRegistry()
+
+    tool = registry.get_tool(get_weather)
+
+    assert registry.get_tool(get_weather) is tool
+    assert tool.name == "get_weather"
+    assert registry.stats() == {"tools": 1, "hits": 1, "misses": 1}
+
+
+def test_schemas_match_the_ones_built_from_scratch():
+    registry = ToolSchemaRegistry()
+    from_scratch = StructuredTool.from_function(func=get_forecast)
+
+    entry = registry.get(get_forecast)
+
+    assert entry.function_schema == convert_to_openai_tool(from_scratch)
+    assert entry.args_schema == from_scratch.args_schema.model_json_schema()
+    assert registry.get(entry.tool) is entry
+
+
+def test_rebuilds_the_tool_when_the_code_changes():
+    def lookup(location: str) -> str:
+        """Look up a location."""
+        return location
+
+    registry = ToolSchemaRegistry()
+    tool = registry.get_tool(lookup)
+
+    lookup.__code__ = get_forecast.__code__
+    lookup.__doc__ = get_forecast.__doc__
+    rebuilt = registry.get_tool(lookup)
+
+    assert rebuilt is not tool
+    assert list(rebuilt.args) == ["location", "days"]
+    assert registry.stats() == {"tools": 1, "hits": 0, "misses": 2}
+
+
+def test_structured_tools_are_used_as_they_are():
+    registry = ToolSchemaRegistry()
+    tool = StructuredTool.from_function(func=get_weather)
+
+    assert registry.get_tool(tool) is tool
+    assert registry.get(tool).function_schema["function"]["name"] == "get_weather"
+
+
+def test_warm_skips_functions_that_cannot_be_tools():
+    def undocumented(location: str) -> str:
+        return location
+
+    registry = ToolSchemaRegistry()
+    functions = {"get_weather": get_weather, "undocumented": undocumented}
+
+    registry.warm(functions)
+
+    assert registry.stats() == {"tools": 1, "hits": 0, "misses": 2}
+    assert list(registry.schemas(functions)) == ["get_weather"]
+    assert registry.stats()["hits"] == 1
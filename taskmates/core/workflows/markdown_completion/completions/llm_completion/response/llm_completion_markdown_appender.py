@@ -1,12 +1,20 @@
+import os
 import re
 from typing import Dict
 
 import pytest
 from icecream import ic
 from langchain_core.messages import AIMessageChunk
-from typeguard import typechecked
 
+from taskmates.core.workflow_engine.base_signals import CoalescingSender
 from taskmates.core.workflows.signals.execution_environment_signals import ExecutionEnvironmentSignals
+from taskmates.lib.str_.text_buffer import TextBuffer
+from taskmates.lib.typeguard_.typechecked import typechecked
+
+# Optional micro-batching of the streamed response: adjacent chunks are sent as one once this many characters
+# are pending, or after TASKMATES_RESPONSE_BATCH_MAX_DELAY seconds. 0 sends each chunk as it arrives.
+RESPONSE_BATCH_MAX_CHARS = int(os.environ.get("TASKMATES_RESPONSE_BATCH_MAX_CHARS", 0))
+RESPONSE_BATCH_MAX_DELAY = float(os.environ.get("TASKMATES_RESPONSE_BATCH_MAX_DELAY", 0.05))
 
 
 def snake_case_to_title_case(text: str) -> str:
@@ -27,10 +35,15 @@ class LlmCompletionMarkdownAppender:
         self.name = None
         self.is_resume_request = is_resume_request
         self._tool_call_accumulator = {}
-        self._content_buffer = ""
+        self._content_buffer = TextBuffer()
         self._annotations = []
         self._citation_counter = 0
         self._tool_calls_finalized = False
+        self._response_sender = None
+        if RESPONSE_BATCH_MAX_CHARS > 0:
+            self._response_sender = CoalescingSender(execution_environment_signals.response, "response",
+                                                     max_chars=RESPONSE_BATCH_MAX_CHARS,
+                                                     max_delay=RESPONSE_BATCH_MAX_DELAY)
 
     async def process_chat_completion_chunk(self, chunk: AIMessageChunk):
         # role
@@ -122,14 +135,14 @@ class LlmCompletionMarkdownAppender:
 
             # Handle both string and list content
             if isinstance(content, str):
-                self._content_buffer += content
+                self._content_buffer.append(content)
                 await self.append(content)
             elif isinstance(content, list):
                 # Extract text from list content
                 for part in content:
                     if isinstance(part, dict) and part.get("type") == "text":
                         text = part.get("text", "")
-                        self._content_buffer += text
+                        self._content_buffer.append(text)
                         await self.append(text)
 
     async def on_received_role(self, chunk: AIMessageChunk):
@@ -137,10 +150,19 @@ class LlmCompletionMarkdownAppender:
             self.role = "assistant"
             recipient = self.recipient
             if not self.is_resume_request:
+                await self.flush()
                 await self.execution_environment_signals.response.send_async(sender="responder", value=f"**{recipient}>** ")
 
     async def append(self, text: str):
-        await self.execution_environment_signals.response.send_async(sender="response", value=text)
+        if self._response_sender is not None:
+            await self._response_sender.send(text)
+        else:
+            await self.execution_environment_signals.response.send_async(sender="response", value=text)
+
+    async def flush(self):
+        """Sends the response chunks that are pending when micro-batching is on."""
+        if self._response_sender is not None:
+            await self._response_sender.flush()
 
     async def on_received_annotations(self, chunk: AIMessageChunk):
         # Check for annotations in the custom attribute
@@ -260,3 +282,22 @@ async def test_openai_web_search_tool_call_completion():
     assert "### References" in appended_text
     assert "Axios AM: What if they're right?" in appended_text
     assert "https://www.axios.com/" in appended_text
+
+
+async def test_response_micro_batching(monkeypatch):
+    monkeypatch.setattr(f"{__name__}.RESPONSE_BATCH_MAX_CHARS", 8)
+    execution_environment_signals = ExecutionEnvironmentSignals(name="test")
+    outputs = []
+
+    async def capture(sender, value):
+        outputs.append((sender, value))
+
+    execution_environment_signals.response.connect(capture, weak=False)
+    appender = LlmCompletionMarkdownAppender(recipient="assistant", last_tool_call_id=0, is_resume_request=False,
+                                             execution_environment_signals=execution_environment_signals)
+
+    for content in ["Hel", "lo, ", "wor", "ld"]:
+        await appender.process_chat_completion_chunk(AIMessageChunk(content=content))
+    await appender.flush()
+
+    assert outputs == [("responder", "**assistant>** "), ("response", "Hello, wor"), ("response", "ld")]
@@ -0,0 +1,246 @@
+import re
+from typing import AsyncIterable, List, Optional
+
+import pytest
+from langchain_core.messages import AIMessageChunk
+
+from taskmates.core.workflows.markdown_completion.completions.llm_completion.response.llm_completion_with_username import \
+    LlmCompletionWithUsername
+from taskmates.core.workflows.markdown_completion.completions.llm_completion.response.stop_sequence_matcher import \
+    StopSequenceMatcher
+from taskmates.lib.root_path.root_path import root_path
+from taskmates.lib.str_.text_buffer import TextBuffer
+
+MARKDOWN_START = re.compile(r'[#*\->`\[\]{}]')
+
+# A complete "**username>** " prefix, with the content that follows it, or the beginning of one
+USERNAME_PREFIX = re.compile(r'[ \n]*\*\*(?:([^*]+)>\*\*[ \n]+(.*)|[^*]*\*?\*?[ \n]?$)', re.DOTALL)
+
+
+class LlmCompletionStreamProcessor(AsyncIterable[AIMessageChunk]):
+    """
+    Post-processes the streamed chunks of a completion in a single stage, yielding the same chunks as
+    `LlmCompletionWithUsername(LlmCompletionPreProcessor(StopSequenceProcessor(chat_completion, stop_sequences)))`:
+
+    - stops at the first stop sequence, holding back the text that may be the beginning of one
+    - removes carriage returns, and starts the completion on a new line if it starts with a markdown element
+    - moves a leading "**username>** " to the name of a chunk of its own
+
+    The text of each chunk is extracted and scanned once, and released text is put in a single new chunk.
+    """
+
+    def __init__(self, chat_completion: AsyncIterable[AIMessageChunk], stop_sequences: Optional[List[str]] = None):
+        self.chat_completion = chat_completion
+        self.stop_sequences = stop_sequences or []
+        self.matcher = StopSequenceMatcher(self.stop_sequences) if self.stop_sequences else None
+        self.first_chunk = True
+        self.buffering = True
+        self.username_prefix = TextBuffer()
+
+    async def aclose(self):
+        """Close the underlying stream."""
+        if hasattr(self.chat_completion, 'aclose'):
+            await self.chat_completion.aclose()
+
+    async def __aiter__(self):
+        chunk = None
+        async for chunk in self.chat_completion:
+            content = chunk.content
+            if self.matcher is None or not content or not isinstance(content, str):
+                for processed_chunk in self._process(chunk):
+                    yield processed_chunk
+                continue
+
+            released, stop_sequence = self.matcher.feed(content)
+            if released:
+                for processed_chunk in self._process_released(chunk, released):
+                    yield processed_chunk
+            if stop_sequence is not None:
+                return
+
+        if self.matcher is not None:
+            released, _ = self.matcher.flush()
+            if released:
+                for processed_chunk in self._process_released(chunk or AIMessageChunk(content=""), released):
+                    yield processed_chunk
+
+    def _process_released(self, chunk: AIMessageChunk, released: str) -> List[AIMessageChunk]:
+        text = self._preprocess_text(released)
+        return self._with_username(self._released_chunk(chunk, text), text)
+
+    @staticmethod
+    def _released_chunk(chunk: AIMessageChunk, content: str) -> AIMessageChunk:
+        """
+        Same chunk as `StopSequenceProcessor._with_content`, copied from the already validated `chunk` instead of
+        being validated again.
+        """
+        return chunk.model_copy(update={
+            "content": content,
+            "additional_kwargs": {},
+            "name": None,
+            "example": False,
+            "invalid_tool_calls": [],
+        })
+
+    def _process(self, chunk: AIMessageChunk) -> List[AIMessageChunk]:
+        content = chunk.content
+        if isinstance(content, str):
+            if content:
+                chunk.content = content = self._preprocess_text(content)
+            return self._with_username(chunk, content)
+
+        text = ""
+        if isinstance(content, list):
+            annotations = []
+            texts = []
+            for part in content:
+                if isinstance(part, dict):
+                    if "annotations" in part:
+                        annotations.extend(part.get("annotations", []))
+                    if part.get("type") == "text":
+                        texts.append(part.get("text", ""))
+            # Store annotations as a custom attribute
+            if annotations:
+                chunk.annotations = annotations
+            text = "".join(texts)
+        return self._with_username(chunk, text)
+
+    def _preprocess_text(self, text: str) -> str:
+        # Remove carriage returns
+        text = text.replace("\r", "")
+
+        # Add newline for markdown elements on first chunk with content
+        if self.first_chunk and text:
+            self.first_chunk = False
+            if MARKDOWN_START.match(text):
+                text = "\n" + text
+        return text
+
+    def _with_username(self, chunk: AIMessageChunk, text: str) -> List[AIMessageChunk]:
+        if not self.buffering:
+            return [chunk]
+
+        if chunk.tool_calls:
+            self.buffering = False
+            buffered = str(self.username_prefix)
+            match = USERNAME_PREFIX.match(buffered)
+            username = match.group(1) if match else None
+
+            # For tool calls with no content, yield a single chunk with username and tool_calls
+            if not text:
+                return [LlmCompletionWithUsername._create_chunk(chunk, '', 'assistant', username,
+                                                                tool_calls=chunk.tool_calls)]
+
+            # Regular flow: yield username chunk first, then the buffered content and the chunk itself
+            chunks = [LlmCompletionWithUsername._create_chunk(chunk, '', 'assistant', username)]
+            remaining = match.group(2) if username is not None else buffered
+            if remaining:
+                chunks.append(LlmCompletionWithUsername._create_chunk(chunk, remaining))
+            chunks.append(chunk)
+            return chunks
+
+        if chunk.content is None:
+            return [chunk]
+
+        # Only buffer text content for username detection
+        self.username_prefix.append(text)
+        buffered = str(self.username_prefix)
+        if not buffered:
+            return []
+
+        match = USERNAME_PREFIX.match(buffered)
+        if match and match.group(1) is None:
+            # Could still become a username prefix
+            return []
+
+        self.buffering = False
+        self.username_prefix.clear()
+        username = match.group(1) if match else None
+        remaining = match.group(2) if match else buffered
+        chunks = [LlmCompletionWithUsername._create_chunk(chunk, '', 'assistant', username)]
+        if remaining:
+            chunks.append(LlmCompletionWithUsername._create_chunk(chunk, remaining))
+        return chunks
+
+
+STREAMING_FIXTURES = sorted(path.name for path in (root_path() / "tests/fixtures/api-responses").glob("*.jsonl"))
+
+
+async def replay(chunks: List[AIMessageChunk]):
+    for chunk in chunks:
+        # The processors modify the chunks they pass through, so each pipeline gets its own copies
+        yield chunk.model_copy(deep=True)
+
+
+async def collect_chunks(async_iter):
+    return [chunk async for chunk in async_iter]
+
+
+async def stacked_and_fused(chunks: List[AIMessageChunk], stop_sequences: List[str]):
+    # The stacked processors this one replaces, as the reference
+    from taskmates.core.workflows.markdown_completion.completions.llm_completion.response.llm_completion_pre_processor import \
+        LlmCompletionPreProcessor
+    from taskmates.core.workflows.markdown_completion.completions.llm_completion.response.stop_sequence_processor import \
+        StopSequenceProcessor
+
+    stacked = await collect_chunks(
+        LlmCompletionWithUsername(LlmCompletionPreProcessor(StopSequenceProcessor(replay(chunks), stop_sequences))))
+    fused = await collect_chunks(LlmCompletionStreamProcessor(replay(chunks), stop_sequences))
+    return stacked, fused
+
+
+def as_comparable(chunks: List[AIMessageChunk]) -> List[dict]:
+    return [{**chunk.model_dump(), "annotations": getattr(chunk, "annotations", None)} for chunk in chunks]
+
+
+@pytest.mark.parametrize("fixture_name", STREAMING_FIXTURES)
+@pytest.mark.parametrize("stop_sequences", [[], ["^######", "\n**user>** "], ["2", "4\n5", "the"]])
+async def test_yields_the_same_chunks_as_the_stacked_processors(fixture_name, stop_sequences):
+    from taskmates.core.workflows.markdown_completion.completions.llm_completion.response.stop_sequence_processor import \
+        load_fixture_chunks
+
+    chunks = await collect_chunks(load_fixture_chunks(fixture_name))
+
+    stacked, fused = await stacked_and_fused(chunks, stop_sequences)
+
+    assert as_comparable(fused) == as_comparable(stacked)
+
+
+@pytest.mark.parametrize("contents", [
+    ["**assis", "tant>** ", "Hello\r\nworld"],
+    ["**alice>**\n", "# Title\n", "text\n###### Steps\n"],
+    [" \n**bob>** Hi ", "there\n**user>** ", "never shown"],
+    ["", "# Title", "* Item"],
+    ["**not a username", " at all"],
+    ["Hello ", "world"],
+    ["**assistant", ">** "],
+    ["\r", "\r", "`code`"],
+])
+@pytest.mark.parametrize("stop_sequences", [[], ["^######", "\n**user>** "]])
+async def test_yields_the_same_chunks_as_the_stacked_processors_for_usernames_and_markdown(contents, stop_sequences):
+    chunks = [AIMessageChunk(content=content, id="run-1") for content in contents]
+
+    stacked, fused = await stacked_and_fused(chunks, stop_sequences)
+
+    assert as_comparable(fused) == as_comparable(stacked)
+
+
+@pytest.mark.parametrize("contents", [["**assistant>** ", "Calling a tool"], ["**assis"], ["Let me check"]])
+async def test_yields_the_same_chunks_as_the_stacked_processors_for_tool_calls(contents):
+    tool_call = {"name": "get_weather", "args": {"location": "Paris"}, "id": "call_1"}
+    chunks = [AIMessageChunk(content=content, id="run-1") for content in contents]
+    chunks.append(AIMessageChunk(content="", id="run-1", tool_calls=[tool_call]))
+    chunks.append(AIMessageChunk(content="after", id="run-1", tool_calls=[tool_call]))
+
+    stacked, fused = await stacked_and_fused(chunks, ["\n**user>** "])
+
+    assert as_comparable(fused) == as_comparable(stacked)
+
+
+async def test_extracts_username_and_stops():
+    chunks = [AIMessageChunk(content=content) for content in ["**alice>** # Ti", "tle\r\nHello", "\n**user>** Hi"]]
+
+    processed = await collect_chunks(LlmCompletionStreamProcessor(replay(chunks), ["^######", "\n**user>** "]))
+
+    assert processed[0].name == "alice"
+    assert "".join(chunk.content for chunk in processed) == "# Title\nHello"
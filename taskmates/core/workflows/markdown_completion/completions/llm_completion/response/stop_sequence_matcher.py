@@ -0,0 +1,212 @@
+import re
+import re._parser
+from typing import List, Optional, Tuple
+
+import pytest
+
+# Regex stop sequences that can match text of any length, or that look around their match, are assumed to need
+# at most this many characters
+REGEX_MAX_MATCH_LENGTH = 100
+
+LOOKAROUNDS = ("(?=", "(?!", "(?<=", "(?<!")
+
+REGEX_INDICATORS = [
+    r'^',  # Start of string/line anchor
+    r'$',  # End of string/line anchor
+    r'\(',  # Capturing group
+    r'(?:',  # Non-capturing group
+    r'(?=',  # Lookahead
+    r'(?!',  # Negative lookahead
+    r'(?<=',  # Lookbehind
+    r'(?<!',  # Negative lookbehind
+    r'\b',  # Word boundary
+    r'\d',  # Digit class
+    r'\w',  # Word class
+    r'\s',  # Whitespace class
+    r'.*',  # Any character repeated
+    r'.+',  # Any character one or more
+    r'.\?',  # Any character optional
+]
+
+
+def regex_max_length(pattern: re.Pattern) -> int:
+    """The number of characters a stop sequence regex needs to see to match."""
+    if any(lookaround in pattern.pattern for lookaround in LOOKAROUNDS):
+        return REGEX_MAX_MATCH_LENGTH
+    _, max_width = re._parser.parse(pattern.pattern, pattern.flags).getwidth()
+    return min(max_width, REGEX_MAX_MATCH_LENGTH)
+
+
+def is_regex_pattern(seq: str) -> bool:
+    """Check if a sequence should be treated as a regex pattern."""
+    # Only treat as regex if it contains anchors or specific regex constructs
+    # that indicate intentional regex usage
+    if any(indicator in seq for indicator in REGEX_INDICATORS):
+        return True
+
+    # Check for unescaped special regex chars that suggest regex intent
+    # But exclude simple brackets which might be literal
+    return re.search(r'(?<!\\)[*+?{}|]', seq) is not None
+
+
+class StopSequenceMatcher:
+    """
+    Finds the earliest of several literal and regex stop sequences in text that arrives in chunks.
+
+    All the stop sequences are compiled into a single alternation, so each chunk is scanned once whatever the
+    number of participants. Only the new text is scanned, together with a lookback window as long as the longest
+    stop sequence, because any earlier match would already have been found. Text is released as soon as no stop
+    sequence can start in it, and a few released characters are kept as context for anchors and lookbehinds.
+    """
+
+    def __init__(self, stop_sequences: List[str]):
+        patterns: List[re.Pattern] = []
+        alternatives: List[str] = []
+        max_length = 0
+
+        for seq in stop_sequences:
+            if is_regex_pattern(seq):
+                try:
+                    # Use MULTILINE flag so ^ matches start of lines, not just start of string
+                    pattern = re.compile(seq, re.MULTILINE)
+                except re.error:
+                    # If regex compilation fails, treat as literal
+                    pattern = None
+                if pattern is not None:
+                    patterns.append(pattern)
+                    alternatives.append(f"(?:{seq})")
+                    max_length = max(max_length, regex_max_length(pattern))
+                    continue
+            patterns.append(re.compile(re.escape(seq)))
+            alternatives.append(re.escape(seq))
+            max_length = max(max_length, len(seq))
+
+        self.stop_sequences = stop_sequences
+        self.lookback = max(max_length - 1, 0)
+        self._patterns = patterns
+        self._combined = None
+        # Groups would renumber the backreferences of the patterns that follow them in the alternation
+        if patterns and all(pattern.groups == 0 for pattern in patterns):
+            try:
+                self._combined = re.compile("|".join(alternatives), re.MULTILINE)
+            except re.error:
+                # e.g. global inline flags, which are only allowed at the start of the whole expression
+                pass
+
+        # Text that may still be part of a stop sequence, preceded by some already released context
+        self._window = ""
+        # Where the text not released yet starts in the window
+        self._pending = 0
+
+    def _search(self, pos: int) -> Optional[re.Match]:
+        if self._combined is not None:
+            return self._combined.search(self._window, pos)
+
+        # Like the alternation, prefers the earliest match, and the first stop sequence among those starting there
+        earliest = None
+        for pattern in self._patterns:
+            match = pattern.search(self._window, pos)
+            if match and (earliest is None or match.start() < earliest.start()):
+                earliest = match
+        return earliest
+
+    def feed(self, text: str) -> Tuple[str, Optional[str]]:
+        """
+        Appends `text` and returns the text that can be released, and the stop sequence text that was matched,
+        if any. Once a stop sequence is matched, the released text ends right before it.
+        """
+        scan_from = max(len(self._window) - self.lookback, self._pending)
+        self._window += text
+
+        match = self._search(scan_from)
+        if match:
+            released = self._window[self._pending:match.start()]
+            self._pending = match.start()
+            return released, match.group()
+
+        release_end = len(self._window) - self.lookback
+        if release_end <= self._pending:
+            return "", None
+
+        released = self._window[self._pending:release_end]
+        # Keep at least one released character, so that ^ doesn't match at the start of the trimmed window
+        context = max(self.lookback, 1)
+        trim = max(release_end - context, 0)
+        self._window = self._window[trim:]
+        self._pending = release_end - trim
+        return released, None
+
+    def flush(self) -> Tuple[str, Optional[str]]:
+        """Returns the text that was held back, up to the stop sequence it contains, if any, at the end of the stream."""
+        match = self._search(self._pending)
+        end = match.start() if match else len(self._window)
+        released = self._window[self._pending:end]
+        self._pending = end
+        return released, match.group() if match else None
+
+
+def feed_all(matcher: StopSequenceMatcher, chunks: List[str]) -> Tuple[str, Optional[str]]:
+    released = []
+    for chunk in chunks:
+        text, stop = matcher.feed(chunk)
+        released.append(text)
+        if stop is not None:
+            return "".join(released), stop
+    text, stop = matcher.flush()
+    released.append(text)
+    return "".join(released), stop
+
+
+@pytest.mark.parametrize("chunks, stop_sequences, expected", [
+    (["Hello, this is chunk 1, part ", "1. And this is chunk 2, part 2."], ["part 1. And"],
+     ("Hello, this is chunk 1, ", "part 1. And")),
+    (["before\n#####", "# Cell Output\nafter"], ["###### Cell Output"], ("before\n", "###### Cell Output")),
+    (["Some text\n", "###### Cell Output\n", "hidden"], ["^######"], ("Some text\n", "######")),
+    (["###### Cell Output\n", "hidden"], ["^######"], ("", "######")),
+    (["1, 2, 3"], ["NEVER_APPEARS"], ("1, 2, 3", None)),
+    ([], [", 3"], ("", None)),
+])
+def test_matches_stop_sequences_spanning_chunks(chunks, stop_sequences, expected):
+    assert feed_all(StopSequenceMatcher(stop_sequences), chunks) == expected
+
+
+def test_prefers_the_earliest_match_of_any_stop_sequence():
+    stop_sequences = ["^######"] + [f"\n**{name}>** " for name in ["user", "alice", "bob"]]
+    text = "Hi there\n**bob>** Hello\n**alice>** Hi\n###### Steps\n"
+
+    assert feed_all(StopSequenceMatcher(stop_sequences), list(text)) == ("Hi there", "\n**bob>** ")
+    assert feed_all(StopSequenceMatcher(stop_sequences), [text]) == ("Hi there", "\n**bob>** ")
+
+
+def test_start_of_line_anchor_only_matches_at_line_starts():
+    text = "x" * 150 + " ###### not a heading\n###### Steps"
+
+    # Released text is trimmed from the window, which must not turn the middle of a line into the start of one
+    assert feed_all(StopSequenceMatcher(["^######"]), [text[i:i + 7] for i in range(0, len(text), 7)]) == \
+           ("x" * 150 + " ###### not a heading\n", "######")
+
+
+def test_releases_text_that_cannot_start_a_stop_sequence():
+    matcher = StopSequenceMatcher(["\n**user>** "])
+
+    assert matcher.feed("Hello") == ("", None)
+    assert matcher.feed(" world, how are you") == ("Hello world, h", None)
+    assert matcher.feed("\n**us") == ("ow ar", None)
+    assert matcher.feed("er>** ") == ("e you", "\n**user>** ")
+
+
+@pytest.mark.parametrize("stop_sequences, lookback", [
+    (["^######", "\n**user>** "], 10),
+    (["^######"], 5),
+    ([r"\n\*\*\w+>\*\* "], REGEX_MAX_MATCH_LENGTH - 1),
+    ([r"stop(?=\n)"], REGEX_MAX_MATCH_LENGTH - 1),
+])
+def test_holds_back_only_as_much_text_as_the_longest_stop_sequence(stop_sequences, lookback):
+    assert StopSequenceMatcher(stop_sequences).lookback == lookback
+
+
+def test_falls_back_to_separate_patterns_when_they_cannot_be_combined():
+    matcher = StopSequenceMatcher([r"(\w)\1!", "stop"])
+
+    assert matcher._combined is None
+    assert feed_all(matcher, ["say wo", "o! or stop"]) == ("say w", "oo!")
@@ -1,9 +1,11 @@
-import re
-from typing import AsyncIterable, List, Optional, Union, Tuple
+from typing import AsyncIterable, List, Optional
 
 import pytest
 from langchain_core.messages import AIMessageChunk
 
+from taskmates.core.workflows.markdown_completion.completions.llm_completion.response.stop_sequence_matcher import \
+    StopSequenceMatcher
+
 
 class StopSequenceProcessor(AsyncIterable[AIMessageChunk]):
     """
@@ -15,189 +17,61 @@ class StopSequenceProcessor(AsyncIterable[AIMessageChunk]):
     def __init__(self, chat_completion: AsyncIterable[AIMessageChunk], stop_sequences: Optional[List[str]] = None):
         self.chat_completion = chat_completion
         self.stop_sequences = stop_sequences or []
-        # Compile regex patterns for stop sequences
-        self.stop_patterns = []
-        self.max_stop_len = 0
-        
-        for seq in self.stop_sequences:
-            # Check if it's a regex pattern (contains regex special chars or anchors)
-            if self._is_regex_pattern(seq):
-                try:
-                    # Use MULTILINE flag so ^ matches start of lines, not just start of string
-                    pattern = re.compile(seq, re.MULTILINE)
-                    self.stop_patterns.append((pattern, None))
-                    # For regex patterns, use a reasonable max length
-                    self.max_stop_len = max(self.max_stop_len, 100)
-                except re.error:
-                    # If regex compilation fails, treat as literal
-                    self.stop_patterns.append((None, seq))
-                    self.max_stop_len = max(self.max_stop_len, len(seq))
-            else:
-                # Literal string
-                self.stop_patterns.append((None, seq))
-                self.max_stop_len = max(self.max_stop_len, len(seq))
-        
-        # A buffer to hold text that might be part of a stop sequence.
-        self.buffer = ""
+        self.matcher = StopSequenceMatcher(self.stop_sequences)
 
     async def aclose(self):
         """Close the underlying stream."""
         if hasattr(self.chat_completion, 'aclose'):
             await self.chat_completion.aclose()
 
-    def _is_regex_pattern(self, seq: str) -> bool:
-        """Check if a sequence should be treated as a regex pattern."""
-        # Only treat as regex if it contains anchors or specific regex constructs
-        # that indicate intentional regex usage
-        regex_indicators = [
-            r'^',      # Start of string/line anchor
-            r'$',      # End of string/line anchor  
-            r'\(',     # Capturing group
-            r'(?:',    # Non-capturing group
-            r'(?=',    # Lookahead
-            r'(?!',    # Negative lookahead
-            r'(?<=',   # Lookbehind
-            r'(?<!',   # Negative lookbehind
-            r'\b',     # Word boundary
-            r'\d',     # Digit class
-            r'\w',     # Word class
-            r'\s',     # Whitespace class
-            r'.*',     # Any character repeated
-            r'.+',     # Any character one or more
-            r'.\?',    # Any character optional
-        ]
-        
-        for indicator in regex_indicators:
-            if indicator in seq:
-                return True
-        
-        # Check for unescaped special regex chars that suggest regex intent
-        # But exclude simple brackets which might be literal
-        if re.search(r'(?<!\\)[*+?{}|]', seq):
-            return True
-            
-        return False
-
     def _extract_text(self, chunk: AIMessageChunk) -> str:
         """Extracts text content from a chunk for stop sequence detection."""
         if not chunk.content or not isinstance(chunk.content, str):
             return ""
         return chunk.content
 
-    def _find_stop_sequence(self, text: str) -> Tuple[bool, Optional[str], Optional[int]]:
-        """
-        Find if any stop sequence exists in the text.
-        Returns (found, matched_text, index).
-        """
-        earliest_index = len(text)
-        found_match = None
-        
-        for pattern, literal in self.stop_patterns:
-            if pattern:
-                # Regex pattern
-                match = pattern.search(text)
-                if match and match.start() < earliest_index:
-                    earliest_index = match.start()
-                    found_match = match.group()
-            else:
-                # Literal string
-                index = text.find(literal)
-                if index != -1 and index < earliest_index:
-                    earliest_index = index
-                    found_match = literal
-        
-        if found_match is not None:
-            return True, found_match, earliest_index
-        return False, None, None
+    @staticmethod
+    def _with_content(chunk: AIMessageChunk, content: str) -> AIMessageChunk:
+        """Creates a new chunk with the given content, preserving the metadata of `chunk`."""
+        return AIMessageChunk(
+            content=content,
+            response_metadata=chunk.response_metadata,
+            tool_calls=chunk.tool_calls,
+            tool_call_chunks=chunk.tool_call_chunks,
+            usage_metadata=chunk.usage_metadata,
+            id=chunk.id,
+        )
 
     async def __aiter__(self) -> AsyncIterable[AIMessageChunk]:
         """
         Yields chunks from the source stream, stopping when a stop sequence is found.
-        It buffers text to handle sequences that span across chunk boundaries.
+        The matcher holds back the text that may be the beginning of a stop sequence spanning chunk boundaries.
         """
         if not self.stop_sequences:
             async for chunk in self.chat_completion:
                 yield chunk
             return
 
+        chunk = None
         async for chunk in self.chat_completion:
             chunk_text = self._extract_text(chunk)
             if not chunk_text:
                 yield chunk
                 continue
 
-            # Add new text to the buffer
-            self.buffer += chunk_text
-
-            # Check if any stop sequence is now in the buffer
-            stop_found, found_seq, stop_index = self._find_stop_sequence(self.buffer)
-
-            if stop_found:
-                # A stop sequence was found. Truncate the buffer at the sequence.
-                content_to_yield = self.buffer[:stop_index]
-
-                if content_to_yield:
-                    # Create a new chunk with the truncated content, preserving original metadata.
-                    # We use the current chunk's metadata as a representative.
-                    new_chunk = AIMessageChunk(
-                        content=content_to_yield,
-                        response_metadata=chunk.response_metadata,
-                        tool_calls=chunk.tool_calls,
-                        tool_call_chunks=chunk.tool_call_chunks,
-                        usage_metadata=chunk.usage_metadata,
-                        id=chunk.id,
-                    )
-                    yield new_chunk
+            # We use the current chunk's metadata as a representative for the text released with it.
+            content_to_yield, stop_sequence = self.matcher.feed(chunk_text)
+            if content_to_yield:
+                yield self._with_content(chunk, content_to_yield)
+            if stop_sequence is not None:
                 # Stop the iteration.
                 return
 
-            # No stop sequence found yet. Yield content from the buffer that is safe.
-            # "Safe" content is the part of the buffer that cannot be part of a future stop sequence.
-            # We keep a portion of the buffer that is `max_stop_len - 1` long.
-            yield_len = len(self.buffer) - self.max_stop_len + 1
-            if yield_len > 0:
-                content_to_yield = self.buffer[:yield_len]
-                self.buffer = self.buffer[yield_len:]
-
-                # Create a new chunk with the safe content.
-                new_chunk = AIMessageChunk(
-                    content=content_to_yield,
-                    response_metadata=chunk.response_metadata,
-                    tool_calls=chunk.tool_calls,
-                    tool_call_chunks=chunk.tool_call_chunks,
-                    usage_metadata=chunk.usage_metadata,
-                    id=chunk.id,
-                )
-                yield new_chunk
-
-        # After the loop, if there's anything left in the buffer, yield it.
-        if self.buffer:
-            # Since the stream is finished, no more text will come.
-            # Check one last time for a stop sequence.
-            stop_found, found_seq, stop_index = self._find_stop_sequence(self.buffer)
-
-            if stop_found:
-                content_to_yield = self.buffer[:stop_index]
-            else:
-                content_to_yield = self.buffer
-
-            if content_to_yield:
-                # We need a reference chunk for metadata. If the last chunk exists, use it.
-                # If the stream was empty, we can't create a chunk.
-                try:
-                    ref_chunk = chunk
-                except NameError:
-                    ref_chunk = AIMessageChunk(content="")  # Fallback
-
-                final_chunk = AIMessageChunk(
-                    content=content_to_yield,
-                    response_metadata=ref_chunk.response_metadata,
-                    tool_calls=ref_chunk.tool_calls,
-                    tool_call_chunks=ref_chunk.tool_call_chunks,
-                    usage_metadata=ref_chunk.usage_metadata,
-                    id=ref_chunk.id,
-                )
-                yield final_chunk
+        # Since the stream is finished, no more text will come: release what was held back, up to any stop sequence.
+        content_to_yield, _ = self.matcher.flush()
+        if content_to_yield:
+            # If the stream was empty, there is no chunk to take the metadata from.
+            yield self._with_content(chunk if chunk is not None else AIMessageChunk(content=""), content_to_yield)
 
 
 # Test helpers
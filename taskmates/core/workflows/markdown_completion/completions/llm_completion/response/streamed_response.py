@@ -1,5 +1,7 @@
 from langchain_core.messages import AIMessageChunk
 
+from taskmates.lib.str_.text_buffer import TextBuffer
+
 
 class StreamedResponse:
     def __init__(self):
@@ -8,7 +10,7 @@ class StreamedResponse:
         self.current_tool_call_id = None
         self.tool_calls_by_id = {}
         self.tool_calls_by_index = {}  # New: track tool calls by index for streaming
-        self.content_delta = ''
+        self._content = TextBuffer()
         self.choices = []
         self.finish_reason = None
 
@@ -92,12 +94,12 @@ class StreamedResponse:
         if content is not None:
             # Handle both string and list content
             if isinstance(content, str):
-                self.content_delta += content
+                self._content.append(content)
             elif isinstance(content, list):
                 # Extract text from list content
                 for part in content:
                     if isinstance(part, dict) and part.get("type") == "text":
-                        self.content_delta += part.get("text", "")
+                        self._content.append(part.get("text", ""))
 
         # Compose a dict for this chunk (for final_json aggregation), ignore 'choices'
         chunk_json = {}
@@ -112,6 +114,10 @@ class StreamedResponse:
             del chunk_json['choices']
         self.final_json.update(chunk_json)
 
+    @property
+    def content_delta(self) -> str:
+        return str(self._content)
+
     @property
     def payload(self):
         # Merge tool calls from both sources
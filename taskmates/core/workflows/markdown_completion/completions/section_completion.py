@@ -1,7 +1,7 @@
 from abc import ABC, abstractmethod
 
-from typeguard import typechecked
 
+from taskmates.lib.typeguard_.typechecked import typechecked
 from taskmates.types import CompletionRequest
 
 
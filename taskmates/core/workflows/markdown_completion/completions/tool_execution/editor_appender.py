@@ -1,6 +1,6 @@
-from typeguard import typechecked
 
 from taskmates.core.workflows.signals.execution_environment_signals import ExecutionEnvironmentSignals
+from taskmates.lib.typeguard_.typechecked import typechecked
 
 
 # TODO: Remove this class
@@ -1,6 +1,5 @@
 import os
 
-from typeguard import typechecked
 
 from taskmates.core.tools_registry import tools_registry
 from taskmates.core.workflow_engine.transaction_manager import runtime
@@ -17,6 +16,7 @@ from taskmates.core.workflows.signals.control_signals import ControlSignals
 from taskmates.core.workflows.signals.execution_environment_signals import ExecutionEnvironmentSignals
 from taskmates.core.workflows.signals.status_signals import StatusSignals
 from taskmates.core.workflows.states.markdown_chat import MarkdownChat
+from taskmates.lib.typeguard_.typechecked import typechecked
 from taskmates.runtimes.cli.collect_markdown_bindings import CollectMarkdownBindings
 from taskmates.types import CompletionRequest, RunnerEnvironment, ToolCall
 
@@ -1,10 +1,10 @@
-from typeguard import typechecked
 
 from taskmates.core.workflow_engine.transactions.transaction import Transaction
 from taskmates.core.workflows.daemons.interrupt_request_daemon import InterruptRequestDaemon
 from taskmates.core.workflows.daemons.interrupted_or_killed_daemon import InterruptedOrKilledDaemon
 from taskmates.core.workflows.states.interrupt_state import InterruptState
 from taskmates.lib.contextlib_.ensure_async_context_manager import ensure_async_context_manager
+from taskmates.lib.typeguard_.typechecked import typechecked
 
 
 @typechecked
@@ -1,7 +1,7 @@
+import asyncio
 import textwrap
 
-from typeguard import typechecked
-
+from taskmates.core.markdown_chat.incremental_chat_parser import IncrementalChatParser
 from taskmates.core.workflow_engine.transaction_manager import runtime
 from taskmates.core.workflow_engine.transactions.transactional import transactional
 from taskmates.core.workflows.markdown_completion.append_trailing_newlines import append_trailing_newlines
@@ -11,6 +11,7 @@ from taskmates.core.workflows.markdown_completion.interrupt_signals_bindings imp
 from taskmates.core.workflows.signals.execution_environment_signals import ExecutionEnvironmentSignals
 from taskmates.core.workflows.states.current_step import CurrentStep
 from taskmates.core.workflows.states.markdown_chat import MarkdownChat
+from taskmates.lib.typeguard_.typechecked import typechecked
 from taskmates.logging import logger, file_logger
 from taskmates.runtimes.cli.collect_markdown_bindings import CollectMarkdownBindings
 from taskmates.types import CompletionRequest
@@ -20,6 +21,7 @@ from taskmates.types import CompletionRequest
 class MarkdownCompletion:
     def __init__(self):
         self.current_step: CurrentStep = CurrentStep()
+        self.chat_parser: IncrementalChatParser = IncrementalChatParser()
 
     @transactional()
     async def fulfill(self, markdown_chat: str) -> str:
@@ -27,19 +29,20 @@ class MarkdownCompletion:
         logger.debug(f"Starting MarkdownComplete with markdown:\n{markdown_chat}")
 
         # TODO: merge MarkdownChat and CompletionPayload
-        # 1. make current_chat / build_completion_request incremental - parse only the the additional markdown
         markdown_chat_state = MarkdownChat(initial=markdown_chat)
+        # markdown_chat_state only grows, so each step parses only the additional markdown
+        self.chat_parser = IncrementalChatParser()
 
         async with InterruptSignalsBindings(transaction, transaction.interrupt_state), \
                 CollectMarkdownBindings(transaction, markdown_chat_state):
             self.current_step.set(1)
 
             await self.before_start_completion(
-                message=self.current_chat(markdown_chat_state)["messages"][-1],
+                message=(await self.current_chat(markdown_chat_state))["messages"][-1],
                 execution_environment_signals=transaction.consumes["execution_environment"])
 
             while True:
-                chat = self.current_chat(markdown_chat_state)
+                chat = await self.current_chat(markdown_chat_state)
                 file_logger.debug("parsed_chat.json", content=chat)
 
                 # TODO: if recipient == "user", set transaction result
@@ -61,14 +64,14 @@ class MarkdownCompletion:
 
                 await completion_assistance.perform_completion(chat=chat)
                 # TODO: this should be part of completion_step_transaction
-                await self.end_section(self.current_chat(markdown_chat_state)["messages"][-1],
+                await self.end_section((await self.current_chat(markdown_chat_state))["messages"][-1],
                                        transaction.consumes["execution_environment"])
 
                 self.current_step.increment()
 
             if not transaction.interrupt_state.is_terminated():
                 # Build final chat payload for end_workflow
-                chat = self.current_chat(markdown_chat_state)
+                chat = await self.current_chat(markdown_chat_state)
                 await self.after_finish_completion(
                     chat=chat,
                     execution_environment=transaction.consumes["execution_environment"]
@@ -81,14 +84,17 @@ class MarkdownCompletion:
             response = markdown_chat_state.get()[response_format]
             return response
 
-    def current_chat(self, markdown_chat_state: MarkdownChat) -> CompletionRequest:
+    async def current_chat(self, markdown_chat_state: MarkdownChat) -> CompletionRequest:
         transaction = runtime.transaction
         run_opts = transaction.context.get("run_opts", {}).copy()
         run_opts["inputs"] = {**run_opts.get("inputs", {}), **transaction.objective.key.get('inputs', {})}
-        return build_completion_request(
+        # Parsing renders the transclusions and encodes the images, which must not block the event loop
+        return await asyncio.to_thread(
+            build_completion_request,
             markdown_chat=markdown_chat_state.get()["full"],
             markdown_path=transaction.context["runner_environment"]["markdown_path"],
-            run_opts=run_opts
+            run_opts=run_opts,
+            chat_parser=self.chat_parser
         )
 
     async def end_section(self, message: dict,
@@ -159,6 +165,45 @@ async def test_completion_result(tmp_path):
     assert result == expected_result
 
 
+async def test_completion_encodes_images_off_the_event_loop(tmp_path, monkeypatch):
+    import time
+
+    from taskmates.lib.image_.encoded_image_cache import clear_encoded_images
+    from taskmates.lib.root_path.root_path import root_path
+
+    monkeypatch.setenv("TASKMATES_IMAGE_DISK_CACHE", "false")
+    clear_encoded_images()
+
+    def slow_encode_image(path, width):
+        time.sleep(0.2)
+        return "encoded"
+
+    monkeypatch.setattr("taskmates.lib.image_.encoded_image_cache.encode_image", slow_encode_image)
+
+    longest_pause = 0.0
+    done = asyncio.Event()
+
+    async def tick():
+        nonlocal longest_pause
+        while not done.is_set():
+            start = time.perf_counter()
+            await asyncio.sleep(0.01)
+            longest_pause = max(longest_pause, time.perf_counter() - start)
+
+    ticker = asyncio.create_task(tick())
+    await asyncio.sleep(0.02)
+    try:
+        # Addressed to the user, so the chat is parsed without requesting a completion
+        image_path = root_path() / "tests/fixtures/image.jpg"
+        await MarkdownCompletion().fulfill(markdown_chat=f"**user>** Hi\n\n**assistant>** Look\n![[{image_path}]]\n\n")
+    finally:
+        done.set()
+        await ticker
+    clear_encoded_images()
+
+    assert longest_pause < 0.15
+
+
 async def test_completion_streaming(tmp_path):
     # Create MarkdownCompletion transaction
     markdown_chat = "**user>** Hello\n\n"
@@ -1,17 +1,19 @@
 from typing import Dict
 
+from taskmates.lib.str_.text_buffer import TextBuffer
+
 
 class MarkdownChat:
     def __init__(self, initial=""):
         super().__init__()
         self.outputs = {
-            "full": initial,
-            "completion": "",
-            "text": ""
+            "full": TextBuffer(initial),
+            "completion": TextBuffer(),
+            "text": TextBuffer()
         }
 
     def get(self) -> Dict[str, str]:
-        return self.outputs
+        return {format: str(buffer) for format, buffer in self.outputs.items()}
 
     def append_to_format(self, format: str, content: str) -> None:
-        self.outputs[format] += content
+        self.outputs[format].append(content)
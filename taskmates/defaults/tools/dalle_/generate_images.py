@@ -5,7 +5,8 @@ from pathlib import Path
 from typing import Literal, Optional
 
 from openai import AsyncOpenAI
-from typeguard import typechecked
+
+from taskmates.lib.typeguard_.typechecked import typechecked
 
 
 async def main():
@@ -3,7 +3,7 @@ import copy
 from contextlib import contextmanager
 from typing import TypeVar, Iterator
 
-from typeguard import typechecked
+from taskmates.lib.typeguard_.typechecked import typechecked
 
 T = TypeVar('T')
 
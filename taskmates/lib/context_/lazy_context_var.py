@@ -1,7 +1,7 @@
 from contextvars import ContextVar
 from typing import TypeVar, Callable, Union, Generic
 
-from typeguard import typechecked
+from taskmates.lib.typeguard_.typechecked import typechecked
 
 T = TypeVar('T')
 
@@ -3,9 +3,9 @@ from typing import List, Optional, Dict, Any
 import pytest
 import time
 from github import Issue, PullRequest, Commit, GithubException
-from typeguard import typechecked
 
 from taskmates.lib.github_.get_github_client import get_github_client
+from taskmates.lib.typeguard_.typechecked import typechecked
 
 """
 This module contains functions for interacting with GitHub.
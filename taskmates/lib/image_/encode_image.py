@@ -3,17 +3,19 @@ from io import BytesIO
 
 from PIL import Image
 
+DEFAULT_IMAGE_WIDTH = 768
 
-def encode_image(image_path):
+
+def encode_image(image_path, width: int = DEFAULT_IMAGE_WIDTH):
     with Image.open(image_path) as img:
         original_format = img.format  # Detect the original image format
 
         # Calculate the height using the aspect ratio
         aspect_ratio = img.height / img.width
-        new_height = int(768 * aspect_ratio)
+        new_height = int(width * aspect_ratio)
 
         # Resize the image while maintaining the aspect ratio
-        img = img.resize((768, new_height), Image.Resampling.LANCZOS)
+        img = img.resize((width, new_height), Image.Resampling.LANCZOS)
 
         # Save the image to a bytes buffer, keeping the original format
         with BytesIO() as buffer:
@@ -0,0 +1,273 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Iterable
+
+from taskmates.lib.image_.encode_image import encode_image, DEFAULT_IMAGE_WIDTH
+from taskmates.lib.root_path.root_path import root_path
+
+# Encoded images are looked up by (resolved path, mtime, size, width): editing or replacing a file
+# changes its mtime/size, so stale entries are simply never hit again and age out of the LRU.
+CacheKey = tuple[str, int, int, int]
+
+MAX_CACHED_IMAGE_BYTES = int(os.environ.get("TASKMATES_IMAGE_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+MAX_DISK_CACHED_IMAGE_BYTES = int(os.environ.get("TASKMATES_IMAGE_DISK_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+IMAGE_ENCODING_WORKERS = int(os.environ.get("TASKMATES_IMAGE_ENCODING_WORKERS", min(4, os.cpu_count() or 1)))
+
+encoded_images: OrderedDict[CacheKey, str] = OrderedDict()
+encoded_images_bytes = 0
+encoded_images_lock = threading.Lock()
+disk_cache_lock = threading.Lock()
+
+_executor: ThreadPoolExecutor | None = None
+_executor_lock = threading.Lock()
+
+
+def encode_images(image_paths: Iterable[str | Path], width: int = DEFAULT_IMAGE_WIDTH) -> list[str]:
+    """
+    Returns the base64 encoded images, like `encode_image`, in the order of `image_paths`.
+
+    Images are served from the in-memory LRU, then from the disk cache under TASKMATES_HOME, if
+    enabled with TASKMATES_IMAGE_DISK_CACHE=true. The remaining ones are encoded concurrently
+    in a thread pool: PIL releases the GIL while decoding, resizing and encoding.
+    """
+    keys = [image_cache_key(image_path, width) for image_path in image_paths]
+
+    results = [get_cached_image(key) for key in keys]
+
+    misses = {key: None for key, result in zip(keys, results) if result is None}
+    if len(misses) == 1:
+        key = next(iter(misses))
+        misses[key] = encode_and_cache_image(key)
+    elif misses:
+        encoded = get_executor().map(encode_and_cache_image, misses)
+        misses = dict(zip(misses, encoded))
+
+    return [result if result is not None else misses[key] for key, result in zip(keys, results)]
+
+
+def encode_image_cached(image_path: str | Path, width: int = DEFAULT_IMAGE_WIDTH) -> str:
+    return encode_images([image_path], width)[0]
+
+
+def image_cache_key(image_path: str | Path, width: int) -> CacheKey:
+    resolved_path = Path(image_path).resolve()
+    stat = resolved_path.stat()
+    return str(resolved_path), stat.st_mtime_ns, stat.st_size, width
+
+
+def get_cached_image(key: CacheKey) -> str | None:
+    with encoded_images_lock:
+        encoded = encoded_images.get(key)
+        if encoded is not None:
+            encoded_images.move_to_end(key)
+            return encoded
+
+    disk_path = disk_cache_path(key)
+    if disk_path is not None and disk_path.exists():
+        try:
+            encoded = disk_path.read_text()
+            # the modification time of the entries orders them for pruning, see prune_disk_cache
+            os.utime(disk_path)
+        except OSError:
+            return None
+        remember_image(key, encoded)
+        return encoded
+
+    return None
+
+
+def encode_and_cache_image(key: CacheKey) -> str:
+    image_path, _, _, width = key
+    encoded = encode_image(image_path, width)
+    remember_image(key, encoded)
+
+    disk_path = disk_cache_path(key)
+    if disk_path is not None:
+        try:
+            disk_path.parent.mkdir(parents=True, exist_ok=True)
+            temp_path = disk_path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+            temp_path.write_text(encoded)
+            os.replace(temp_path, disk_path)
+            prune_disk_cache(disk_path.parent.parent)
+        except OSError:
+            pass
+
+    return encoded
+
+
+def remember_image(key: CacheKey, encoded: str):
+    global encoded_images_bytes
+    with encoded_images_lock:
+        if key in encoded_images:
+            encoded_images.move_to_end(key)
+            return
+        encoded_images[key] = encoded
+        encoded_images_bytes += len(encoded)
+        while encoded_images_bytes > MAX_CACHED_IMAGE_BYTES and len(encoded_images) > 1:
+            _, evicted = encoded_images.popitem(last=False)
+            encoded_images_bytes -= len(evicted)
+
+
+def clear_encoded_images():
+    global encoded_images_bytes
+    with encoded_images_lock:
+        encoded_images.clear()
+        encoded_images_bytes = 0
+
+
+def prune_disk_cache(cache_dir: Path):
+    """
+    Deletes the least recently used entries of the disk cache until it fits in MAX_DISK_CACHED_IMAGE_BYTES.
+    The entries of edited images are never used again, so they are the first to go.
+    """
+    with disk_cache_lock:
+        entries = []
+        for entry_path in cache_dir.glob("*/*.b64"):
+            try:
+                stat = entry_path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, entry_path))
+
+        total_bytes = sum(size for _, size, _ in entries)
+        for _, size, entry_path in sorted(entries):
+            if total_bytes <= MAX_DISK_CACHED_IMAGE_BYTES:
+                break
+            try:
+                entry_path.unlink()
+            except OSError:
+                continue
+            total_bytes -= size
+
+
+def disk_cache_path(key: CacheKey) -> Path | None:
+    if os.environ.get("TASKMATES_IMAGE_DISK_CACHE", "false").lower() not in ["true", "1", "t"]:
+        return None
+    taskmates_home = Path(os.environ.get("TASKMATES_HOME", str(Path.home() / ".taskmates")))
+    digest = hashlib.sha256(repr(key).encode()).hexdigest()
+    return taskmates_home / "cache" / "images" / digest[:2] / f"{digest}.b64"
+
+
+def get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=IMAGE_ENCODING_WORKERS,
+                                               thread_name_prefix="taskmates-image-encoding")
+    return _executor
+
+
+def test_encoded_images_are_cached_in_memory(tmp_path, monkeypatch):
+    monkeypatch.setenv("TASKMATES_IMAGE_DISK_CACHE", "false")
+    clear_encoded_images()
+    image_path = root_path() / "tests/fixtures/image.jpg"
+
+    calls = []
+    original_encode_image = encode_image
+
+    def counting_encode_image(path, width=DEFAULT_IMAGE_WIDTH):
+        calls.append((path, width))
+        return original_encode_image(path, width)
+
+    monkeypatch.setattr(f"{__name__}.encode_image", counting_encode_image)
+
+    encoded = encode_image_cached(image_path)
+
+    assert encoded == original_encode_image(image_path)
+    assert encode_image_cached(image_path) == encoded
+    assert len(calls) == 1
+
+    encode_image_cached(image_path, width=256)
+    assert len(calls) == 2
+
+
+def test_encoded_images_are_invalidated_when_the_file_changes(tmp_path, monkeypatch):
+    monkeypatch.setenv("TASKMATES_IMAGE_DISK_CACHE", "false")
+    image_path = tmp_path / "image.jpg"
+    image_path.write_bytes((root_path() / "tests/fixtures/image.jpg").read_bytes())
+
+    encoded = encode_image_cached(image_path, width=64)
+
+    from PIL import Image
+    Image.new("RGB", (100, 50), "red").save(image_path, format="JPEG")
+
+    assert encode_image_cached(image_path, width=64) != encoded
+    assert encode_image_cached(image_path, width=64) == encode_image(image_path, width=64)
+
+
+def test_encoded_images_are_cached_on_disk(tmp_path, monkeypatch):
+    monkeypatch.setenv("TASKMATES_HOME", str(tmp_path / ".taskmates"))
+    monkeypatch.setenv("TASKMATES_IMAGE_DISK_CACHE", "true")
+    image_path = root_path() / "tests/fixtures/image.jpg"
+
+    encoded = encode_image_cached(image_path, width=128)
+    clear_encoded_images()
+
+    def fail(*args, **kwargs):
+        raise AssertionError("should have been read from the disk cache")
+
+    monkeypatch.setattr(f"{__name__}.encode_image", fail)
+
+    assert encode_image_cached(image_path, width=128) == encoded
+    assert len(list((tmp_path / ".taskmates" / "cache" / "images").glob("*/*.b64"))) == 1
+
+
+def test_disk_cache_is_opt_in(tmp_path, monkeypatch):
+    monkeypatch.setenv("TASKMATES_HOME", str(tmp_path / ".taskmates"))
+    monkeypatch.delenv("TASKMATES_IMAGE_DISK_CACHE", raising=False)
+
+    assert disk_cache_path((str(tmp_path / "image.jpg"), 0, 0, 128)) is None
+
+
+def test_disk_cache_evicts_the_least_recently_used_entries(tmp_path, monkeypatch):
+    monkeypatch.setenv("TASKMATES_HOME", str(tmp_path / ".taskmates"))
+    monkeypatch.setenv("TASKMATES_IMAGE_DISK_CACHE", "true")
+    monkeypatch.setattr(f"{__name__}.encode_image", lambda path, width: "x" * 10)
+    monkeypatch.setattr(f"{__name__}.MAX_DISK_CACHED_IMAGE_BYTES", 25)
+    clear_encoded_images()
+    cache_dir = tmp_path / ".taskmates" / "cache" / "images"
+
+    keys = [("a", 0, 0, 1), ("b", 0, 0, 1), ("c", 0, 0, 1)]
+    for i, key in enumerate(keys[:2]):
+        encode_and_cache_image(key)
+        os.utime(disk_cache_path(key), ns=(i, i))
+    clear_encoded_images()
+    get_cached_image(keys[0])
+    encode_and_cache_image(keys[2])
+    clear_encoded_images()
+
+    assert [disk_cache_path(key).exists() for key in keys] == [True, False, True]
+    assert sum(path.stat().st_size for path in cache_dir.glob("*/*.b64")) == 20
+
+
+def test_encoded_images_are_evicted_least_recently_used_first(monkeypatch):
+    monkeypatch.setattr(f"{__name__}.MAX_CACHED_IMAGE_BYTES", 10)
+    clear_encoded_images()
+
+    remember_image(("a", 0, 0, 1), "1234")
+    remember_image(("b", 0, 0, 1), "1234")
+    get_cached_image(("a", 0, 0, 1))
+    remember_image(("c", 0, 0, 1), "1234")
+
+    assert list(encoded_images) == [("a", 0, 0, 1), ("c", 0, 0, 1)]
+    assert encoded_images_bytes == 8
+    clear_encoded_images()
+
+
+def test_encode_images_concurrently(tmp_path, monkeypatch):
+    monkeypatch.setenv("TASKMATES_IMAGE_DISK_CACHE", "false")
+    from PIL import Image
+    image_paths = []
+    for i, color in enumerate(["red", "green", "blue"]):
+        image_path = tmp_path / f"image_{i}.png"
+        Image.new("RGB", (100 + i, 50), color).save(image_path, format="PNG")
+        image_paths.append(image_path)
+
+    encoded = encode_images(image_paths + image_paths[:1], width=32)
+
+    assert encoded == [encode_image(path, width=32) for path in image_paths + image_paths[:1]]
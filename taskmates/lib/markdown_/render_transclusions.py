@@ -1,20 +1,20 @@
-import glob
 import re
 from pathlib import Path
 from typing import Union
 from urllib.parse import unquote
 
 import pytest
-from typeguard import typechecked
 
 from taskmates.core.markdown_chat.processing.extract_transclusion_links import extract_transclusion_links
 from taskmates.core.markdown_chat.processing.filter_comments import filter_comments
-from taskmates.lib.markdown_.first_sections_with_heading import first_sections_with_heading
 from taskmates.lib.markdown_.language_mappings import language_mappings
-from taskmates.lib.markdown_.transclusion_pattern import match_transclusion
+from taskmates.lib.markdown_.transclusion_cache import read_transclusion_source, transclusion_glob, \
+    transclusion_sections_with_heading, render_embedding_cached, record_file, clear_transclusion_cache, \
+    transclusion_sources
+from taskmates.lib.markdown_.transclusion_pattern import match_transclusion, has_transclusion
 from taskmates.lib.path_.is_binary_file import is_binary_file
-from taskmates.lib.pdf_.read_pdf import read_pdf
 from taskmates.lib.root_path.root_path import root_path
+from taskmates.lib.typeguard_.typechecked import typechecked
 
 
 @typechecked
@@ -27,8 +27,13 @@ def render_transclusions(text: str,
     if processed_files is None:
         processed_files = set()
 
-    output = []
-    lines = text.split('\n')
+    if has_transclusion(text):
+        output = []
+        lines = text.split('\n')
+    else:
+        # fast path: no line is a transclusion, so there is nothing to render line by line
+        output = [text if not is_embedding else text.replace('\n', '')]
+        lines = []
     for i, line in enumerate(lines):
         match = match_transclusion(line)
         if not match:
@@ -57,6 +62,8 @@ def render_transclusions(text: str,
     final_output = '\n'.join(output) if not is_embedding else ''.join(output)
 
     transclusion_links = extract_transclusion_links(final_output)
+    for link in transclusion_links:
+        record_file(transclusions_base_dir / link)
     non_binary_links = [link for link in transclusion_links if not is_binary_file(transclusions_base_dir / link)]
 
     if non_binary_links:
@@ -94,7 +101,7 @@ def process_transclusion(token: Transclusion,
     target_glob = token.target_glob
     # print(f"Processing transclusion for: {target_glob}")  # Debug print
     if "*" in target_glob:
-        filenames = list(sorted(glob.glob(target_glob, root_dir=transclusions_base_dir)))
+        filenames = transclusion_glob(target_glob, root_dir=transclusions_base_dir)
     else:
         filenames = [target_glob]
         if len(filenames) == 0:
@@ -103,21 +110,19 @@ def process_transclusion(token: Transclusion,
     for filename in filenames:
         resolved_path = (Path(transclusions_base_dir) / filename).resolve()
         try:
-            if filename.lower().endswith('.pdf'):
-                content = read_pdf(resolved_path)
-            else:
+            if not filename.lower().endswith('.pdf'):
                 if resolved_path.is_dir():
                     continue
                 if not resolved_path.exists():
                     raise ValueError(f"Transclusion not found: {resolved_path}. Source file: {source_file}")
-                with open(resolved_path, 'r') as f:
-                    content = f.read()
+            # file contents, pdf texts, sections and embeddings are cached until the files they depend on change
+            content = read_transclusion_source(resolved_path)
         except UnicodeDecodeError:
             fragments.append(f"![[{filename}]]")
             continue
         if token.section:
             heading = re.sub(r'^(#+)', r'\1 ', token.section)
-            sections = first_sections_with_heading(content, heading)
+            sections = transclusion_sections_with_heading(resolved_path, content, heading)
             if len(sections) == 0:
                 raise ValueError(f"Section not found: {token.section}")
             section = sections[-1]
@@ -134,9 +139,11 @@ def process_transclusion(token: Transclusion,
             language = language_mappings[extension]["language_hint"]
 
         if is_embedding:
-            fragments.append(render_transclusions(content,
-                                                  source_file=resolved_path,
-                                                  processed_files={filename}))
+            fragments.append(render_embedding_cached(
+                resolved_path, filename,
+                lambda: render_transclusions(read_transclusion_source(resolved_path),
+                                             source_file=resolved_path,
+                                             processed_files={filename})))
         else:
             if transclusions_base_dir and not Path(filename).is_absolute():
                 path = (Path(transclusions_base_dir) / filename).relative_to(transclusions_base_dir)
@@ -344,3 +351,19 @@ def test_pdf_transclusion(tmp_path):
     rendered = render_transclusions(doc, source_file=tmp_path / "main.md")
     expected = "The sky is blue\n"
     assert rendered.strip() == expected.strip()
+
+
+def test_embedding_transclusion_is_rerendered_when_a_nested_file_changes(tmp_path):
+    clear_transclusion_cache()
+    sub_dir = tmp_path / "sub"
+    sub_dir.mkdir()
+    (sub_dir / "foo.md").write_text("![[bar.md]]\n")
+    (sub_dir / "bar.md").write_text("Hello, world!\n")
+    doc = '![[{}/foo.md]]\n'.format(str(sub_dir))
+
+    assert render_transclusions(doc, source_file=sub_dir / "main.md") == "Hello, world!\n"
+    assert (sub_dir / "bar.md").resolve() in transclusion_sources
+
+    (sub_dir / "bar.md").write_text("Goodbye, world!\n")
+
+    assert render_transclusions(doc, source_file=sub_dir / "main.md") == "Goodbye, world!\n"
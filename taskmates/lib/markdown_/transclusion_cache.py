@@ -0,0 +1,287 @@
+import contextlib
+import contextvars
+import glob
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Generic, Hashable, TypeVar
+
+from taskmates.lib.markdown_.first_sections_with_heading import first_sections_with_heading
+from taskmates.lib.pdf_.read_pdf import read_pdf
+
+# A file's signature is its (mtime, size), or None if it is not a file (missing or a directory).
+# Entries store the signatures they were computed from and are recomputed as soon as one changes.
+Signature = tuple[int, int] | None
+
+# Each of the caches below keeps at most this many characters of text
+MAX_CACHED_TRANSCLUSION_BYTES = int(os.environ.get("TASKMATES_TRANSCLUSION_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class TransclusionLru(Generic[K, V]):
+    """
+    Least recently used entries, bounded by the total size of the text they hold, so that a long-running
+    server doesn't keep every file it ever transcluded.
+    """
+
+    def __init__(self, max_bytes: int = MAX_CACHED_TRANSCLUSION_BYTES):
+        self.max_bytes = max_bytes
+        # key -> (size, value)
+        self._entries: OrderedDict[K, tuple[int, V]] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: K) -> V | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key: K, value: V, size: int) -> None:
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[0]
+            if size > self.max_bytes:
+                return
+            self._entries[key] = (size, value)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (evicted_size, _) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def __contains__(self, key: Any) -> bool:
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+# resolved path -> (signature, text or pdf text)
+transclusion_sources: TransclusionLru[Path, tuple[Signature, str]] = TransclusionLru()
+# (resolved path, heading) -> (signature, sections), sized by the text they were parsed from
+transclusion_sections: TransclusionLru[tuple[Path, str], tuple[Signature, list[dict]]] = TransclusionLru()
+# (resolved path, link) -> (dependencies, rendered embedding)
+transclusion_embeddings: TransclusionLru[tuple[Path, str], tuple["Dependencies", str]] = TransclusionLru()
+
+dependency_recorders: contextvars.ContextVar[tuple["Dependencies", ...]] = \
+    contextvars.ContextVar("dependency_recorders", default=())
+
+
+class Dependencies:
+    """
+    The files and glob results a rendered transclusion was built from.
+    """
+
+    def __init__(self):
+        self.files: dict[Path, Signature] = {}
+        self.globs: dict[tuple[str, Path], list[str]] = {}
+        self.path_globs: dict[tuple[str, Path], list[Path]] = {}
+
+    def update(self, other: "Dependencies"):
+        self.files.update(other.files)
+        self.globs.update(other.globs)
+        self.path_globs.update(other.path_globs)
+
+    def __bool__(self) -> bool:
+        return bool(self.files or self.globs or self.path_globs)
+
+    def is_current(self) -> bool:
+        return (all(file_signature(path) == signature for path, signature in self.files.items())
+                and all(sorted(glob.glob(pattern, root_dir=root_dir)) == filenames
+                        for (pattern, root_dir), filenames in self.globs.items())
+                and all(sorted(root_dir.glob(pattern)) == paths
+                        for (pattern, root_dir), paths in self.path_globs.items()))
+
+
+def file_signature(path: Path) -> Signature:
+    try:
+        stat = path.stat()
+    except (FileNotFoundError, NotADirectoryError):
+        return None
+    if not path.is_file():
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def record_file(path: Path) -> Signature:
+    signature = file_signature(path)
+    for dependencies in dependency_recorders.get():
+        dependencies.files[path] = signature
+    return signature
+
+
+def transclusion_glob(pattern: str, root_dir: Path) -> list[str]:
+    filenames = sorted(glob.glob(pattern, root_dir=root_dir))
+    for dependencies in dependency_recorders.get():
+        dependencies.globs[(pattern, root_dir)] = filenames
+    return filenames
+
+
+def transclusion_path_glob(pattern: str, root_dir: Path) -> list[Path]:
+    """Like `transclusion_glob`, with the matching rules of `Path.glob`, as used by the image transclusions."""
+    paths = sorted(root_dir.glob(pattern))
+    for dependencies in dependency_recorders.get():
+        dependencies.path_globs[(pattern, root_dir)] = paths
+    return paths
+
+
+def read_transclusion_source(resolved_path: Path) -> str:
+    """
+    Returns the text of a transcluded file, or the text extracted from it if it is a pdf.
+    Raises UnicodeDecodeError for binary files, just like reading them.
+    """
+    signature = record_file(resolved_path)
+    cached = transclusion_sources.get(resolved_path)
+    if cached is not None and cached[0] == signature and signature is not None:
+        return cached[1]
+
+    if resolved_path.name.lower().endswith('.pdf'):
+        content = read_pdf(resolved_path)
+    else:
+        with open(resolved_path, 'r') as f:
+            content = f.read()
+
+    transclusion_sources.set(resolved_path, (signature, content), len(content))
+    return content
+
+
+def transclusion_sections_with_heading(resolved_path: Path, content: str, heading: str) -> list[dict]:
+    signature = record_file(resolved_path)
+    key = (resolved_path, heading)
+    cached = transclusion_sections.get(key)
+    if cached is not None and cached[0] == signature and signature is not None:
+        return cached[1]
+
+    sections = first_sections_with_heading(content, heading)
+    transclusion_sections.set(key, (signature, sections), len(content))
+    return sections
+
+
+def render_embedding_cached(resolved_path: Path, link: str, render: Callable[[], str]) -> str:
+    """
+    Returns `render()`, the embedding of `link` (resolved to `resolved_path`), reusing the previous
+    result while none of the files and globs it depends on, including nested transclusions, changed.
+    """
+    key = (resolved_path, link)
+    cached = transclusion_embeddings.get(key)
+    if cached is not None and cached[0].is_current():
+        dependencies, rendered = cached
+    else:
+        with recording_dependencies() as dependencies:
+            rendered = render()
+        transclusion_embeddings.set(key, (dependencies, rendered), len(rendered))
+
+    for recorder in dependency_recorders.get():
+        recorder.update(dependencies)
+    return rendered
+
+
+@contextlib.contextmanager
+def recording_dependencies():
+    dependencies = Dependencies()
+    token = dependency_recorders.set(dependency_recorders.get() + (dependencies,))
+    try:
+        yield dependencies
+    finally:
+        dependency_recorders.reset(token)
+
+
+def clear_transclusion_cache():
+    transclusion_sources.clear()
+    transclusion_sections.clear()
+    transclusion_embeddings.clear()
+
+
+def test_read_transclusion_source_is_cached_until_the_file_changes(tmp_path):
+    path = tmp_path / "foo.md"
+    path.write_text("foo")
+    assert read_transclusion_source(path) == "foo"
+
+    transclusion_sources.set(path, (file_signature(path), "cached"), 6)
+    assert read_transclusion_source(path) == "cached"
+
+    path.write_text("foo changed")
+    assert read_transclusion_source(path) == "foo changed"
+
+
+def test_embeddings_are_invalidated_by_nested_dependencies_only(tmp_path):
+    clear_transclusion_cache()
+    (tmp_path / "a.md").write_text("a")
+    (tmp_path / "b.md").write_text("b")
+    renders = []
+
+    def render(name):
+        def render_nested():
+            renders.append(name)
+            return read_transclusion_source(tmp_path / name)
+
+        return render_embedding_cached(tmp_path / name, name, render_nested)
+
+    def render_parent():
+        renders.append("parent")
+        return render("a.md") + render("b.md")
+
+    assert render_embedding_cached(tmp_path / "parent.md", "parent.md", render_parent) == "ab"
+    assert render_embedding_cached(tmp_path / "parent.md", "parent.md", render_parent) == "ab"
+    assert renders == ["parent", "a.md", "b.md"]
+
+    (tmp_path / "b.md").write_text("b changed")
+
+    assert render_embedding_cached(tmp_path / "parent.md", "parent.md", render_parent) == "ab changed"
+    assert renders == ["parent", "a.md", "b.md", "parent", "b.md"]
+
+
+def test_embeddings_are_invalidated_when_a_glob_matches_new_files(tmp_path):
+    clear_transclusion_cache()
+    (tmp_path / "a.md").write_text("a")
+
+    def render():
+        return "".join(read_transclusion_source(tmp_path / name) for name in transclusion_glob("*.md", tmp_path))
+
+    assert render_embedding_cached(tmp_path / "parent", "parent", render) == "a"
+
+    (tmp_path / "b.md").write_text("b")
+
+    assert render_embedding_cached(tmp_path / "parent", "parent", render) == "ab"
+
+
+def test_dependencies_on_image_globs_are_current_until_they_match_new_files(tmp_path):
+    (tmp_path / "a.png").write_bytes(b"a")
+
+    with recording_dependencies() as dependencies:
+        assert transclusion_path_glob("*.png", tmp_path) == [tmp_path / "a.png"]
+
+    assert dependencies and dependencies.is_current()
+
+    (tmp_path / "b.png").write_bytes(b"b")
+
+    assert not dependencies.is_current()
+
+
+def test_cached_transclusions_are_evicted_least_recently_used_first():
+    cache = TransclusionLru(max_bytes=10)
+
+    cache.set("a", "1234", 4)
+    cache.set("b", "1234", 4)
+    cache.get("a")
+    cache.set("c", "1234", 4)
+    cache.set("d", "x" * 11, 11)
+
+    assert list(cache._entries) == ["a", "c"]
+    assert cache._bytes == 8
+    assert "d" not in cache
+
+    cache.set("a", "12", 2)
+    assert cache._bytes == 6
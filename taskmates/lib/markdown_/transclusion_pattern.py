@@ -8,6 +8,10 @@ def match_transclusion(content):
     return found[1] or found[2]
 
 
+def has_transclusion(content):
+    return PATTERN.search(content) is not None
+
+
 def test_pattern_wikilink_format():
     content = """# user
 Source code:
@@ -3,12 +3,12 @@
 import argparse
 import sys
 
-import tiktoken
+from taskmates.lib.openai_.token_accounting import get_encoding
 
 
 def count_tokens(text: str) -> int:
-    tokenizer = tiktoken.encoding_for_model("gpt-4")
     """count the number of tokens in a string"""
+    tokenizer = get_encoding("gpt-4")
     return len(tokenizer.encode(text))
 
 
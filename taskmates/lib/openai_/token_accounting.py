@@ -0,0 +1,154 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import tiktoken
+
+DEFAULT_TOKENIZER_MODEL = "gpt-4"
+# Rough average for English text and code, used when an exact count isn't needed
+CHARS_PER_TOKEN = 4
+MAX_CACHED_MESSAGE_TOKENS = 10_000
+
+encodings: dict[str, tiktoken.Encoding] = {}
+# (model, digest of the serialized message) -> tokens
+message_tokens: OrderedDict[tuple[str, bytes], int] = OrderedDict()
+message_tokens_lock = threading.Lock()
+
+
+def get_encoding(model: str = DEFAULT_TOKENIZER_MODEL) -> tiktoken.Encoding:
+    """
+    Returns the tiktoken encoding of `model`, looked up once per model. Models of the same family share it.
+    """
+    encoding = encodings.get(model)
+    if encoding is None:
+        encoding = tiktoken.get_encoding(tiktoken.encoding_name_for_model(model))
+        encodings[model] = encoding
+    return encoding
+
+
+def count_text_tokens(text: str, model: str = DEFAULT_TOKENIZER_MODEL, estimate: bool = False) -> int:
+    if estimate:
+        return -(-len(text) // CHARS_PER_TOKEN)
+    return len(get_encoding(model).encode(text, disallowed_special=()))
+
+
+def is_token_estimation_enabled() -> bool:
+    return os.environ.get("TASKMATES_TOKEN_COUNTING", "exact").lower() == "estimate"
+
+
+def without_images(message: dict) -> tuple[dict, int]:
+    """
+    Returns the message without the payload of its image parts, and the number of images.
+    Only the dicts on the path to the images are copied: the (large) strings are shared.
+    """
+    content = message.get("content", None)
+    if not isinstance(content, list):
+        return message, 0
+
+    images = 0
+    parts = []
+    for part in content:
+        if part["type"] != "text":
+            part = {key: value for key, value in part.items() if key != "image_url"}
+            images += 1
+        parts.append(part)
+    return {**message, "content": parts}, images
+
+
+def count_message_tokens(message: dict,
+                         model: str = DEFAULT_TOKENIZER_MODEL,
+                         estimate: bool = False) -> tuple[int, int]:
+    """
+    Returns the tokens of the message serialized as JSON, without its images, and the number of images.
+
+    Exact counts are memoized by the digest of the serialized message, so the unchanged history of a chat
+    isn't tokenized again at every step.
+    """
+    payload, images = without_images(message)
+    serialized = json.dumps(payload, ensure_ascii=False)
+    if estimate:
+        return count_text_tokens(serialized, estimate=True), images
+
+    key = (model, hashlib.blake2b(serialized.encode("utf-8", "surrogatepass"), digest_size=16).digest())
+    with message_tokens_lock:
+        tokens = message_tokens.get(key)
+        if tokens is not None:
+            message_tokens.move_to_end(key)
+            return tokens, images
+
+    tokens = count_text_tokens(serialized, model)
+    with message_tokens_lock:
+        message_tokens[key] = tokens
+        if len(message_tokens) > MAX_CACHED_MESSAGE_TOKENS:
+            message_tokens.popitem(last=False)
+    return tokens, images
+
+
+def count_messages_tokens(messages: list,
+                          model: str = DEFAULT_TOKENIZER_MODEL,
+                          estimate: bool = False) -> tuple[int, int]:
+    """
+    Returns the tokens of `messages` serialized as a JSON list, without images, and the number of images.
+    The count is the sum of the messages' counts plus their separators, so it can differ by a few tokens from
+    tokenizing the whole list at once.
+    """
+    tokens = 1 if messages else 2  # "[" and "]"
+    images = 0
+    for message in messages:
+        message_tokens_count, message_images = count_message_tokens(message, model, estimate)
+        tokens += message_tokens_count + 1  # ", " or "]"
+        images += message_images
+    return tokens, images
+
+
+def test_count_messages_tokens_matches_whole_payload():
+    messages = [{"role": "system", "content": "You are a helpful assistant."},
+                {"role": "user", "content": "Hello, how are you?", "name": "john"},
+                {"role": "assistant", "content": "Fine, thanks! And you?"}]
+
+    tokens, images = count_messages_tokens(messages)
+    expected = count_text_tokens(json.dumps(messages, ensure_ascii=False))
+
+    assert images == 0
+    assert abs(tokens - expected) <= len(messages)
+
+
+def test_count_message_tokens_skips_images_without_copying():
+    image_url = {"url": "data:image/png;base64," + "A" * 100_000}
+    message = {"role": "user", "content": [{"type": "text", "text": "What's in this image?"},
+                                           {"type": "image_url", "image_url": image_url}]}
+
+    tokens, images = count_message_tokens(message)
+
+    assert images == 1
+    assert tokens < 50
+    assert message["content"][1]["image_url"] is image_url
+
+
+def test_count_message_tokens_is_memoized(monkeypatch):
+    message = {"role": "user", "content": "A message that is only tokenized once"}
+    message_tokens.clear()
+    expected = count_message_tokens(message)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("should have been memoized")
+
+    monkeypatch.setattr(f"{__name__}.count_text_tokens", fail)
+
+    assert count_message_tokens(dict(message)) == expected
+
+
+def test_estimated_tokens():
+    messages = [{"role": "user", "content": "Hello, how are you? " * 100}]
+
+    exact, _ = count_messages_tokens(messages)
+    estimated, _ = count_messages_tokens(messages, estimate=True)
+
+    assert exact / 2 < estimated < exact * 2
+
+
+def test_get_encoding_is_cached():
+    assert get_encoding("gpt-4") is get_encoding("gpt-4")
+    assert get_encoding("gpt-3.5-turbo") is get_encoding("gpt-4")
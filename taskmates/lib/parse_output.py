@@ -2,9 +2,9 @@ from langchain.output_parsers import PydanticOutputParser
 from langchain.prompts import PromptTemplate
 from langchain_ollama import ChatOllama
 from pydantic import BaseModel, Field, ValidationError
-from typeguard import typechecked
 from typing import TypeVar, Optional
 
+from taskmates.lib.typeguard_.typechecked import typechecked
 from taskmates.workflows.codebase_rag.constants import DEFAULT_MODEL_NAME
 
 TModel = TypeVar('TModel', bound=BaseModel)
@@ -1,6 +1,27 @@
+import codecs
+import locale
+
+# Only a prefix is decoded: enough to tell text from binary without reading large files in full
+BINARY_DETECTION_PREFIX_SIZE = 8192
+
+
 def is_binary_file(filename):
+    with open(filename, 'rb') as f:
+        prefix = f.read(BINARY_DETECTION_PREFIX_SIZE)
+    # an incremental decoder tolerates a multi-byte character cut at the end of the prefix
+    decoder = codecs.getincrementaldecoder(locale.getpreferredencoding(False))()
     try:
-        with open(filename, 'r') as f:
-            f.read()
+        decoder.decode(prefix, final=len(prefix) < BINARY_DETECTION_PREFIX_SIZE)
     except UnicodeDecodeError:
         return True
+    return False
+
+
+def test_is_binary_file(tmp_path):
+    text_path = tmp_path / "text.txt"
+    text_path.write_text("a" + "é" * BINARY_DETECTION_PREFIX_SIZE, encoding=locale.getpreferredencoding(False))
+    binary_path = tmp_path / "image.png"
+    binary_path.write_bytes(b'\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR')
+
+    assert not is_binary_file(text_path)
+    assert is_binary_file(binary_path)
@@ -0,0 +1,79 @@
+import copy
+import functools
+from typing import Any, Callable, Dict, Tuple, Type, TypeVar
+
+from pydantic import BaseModel
+
+Model = TypeVar("Model", bound=BaseModel)
+
+# Defaults shared by every model rather than copied, as copying them would return them anyway
+IMMUTABLE_TYPES = (type(None), bool, int, float, complex, str, bytes, range, type, frozenset)
+
+
+@functools.cache
+def field_defaults(model_class: Type[BaseModel]) -> Tuple[Dict[str, Any], Dict[str, Callable[[], Any]]]:
+    """The immutable default, or else the default value factory, of each optional field of `model_class`."""
+    immutable_defaults = {}
+    default_factories = {}
+    for name, field in model_class.model_fields.items():
+        if field.default_factory is not None:
+            default_factories[name] = field.default_factory
+        elif field.is_required():
+            continue
+        elif type(field.default) in IMMUTABLE_TYPES:
+            immutable_defaults[name] = field.default
+        else:
+            default_factories[name] = functools.partial(copy.copy, field.default)
+    return immutable_defaults, default_factories
+
+
+@functools.cache
+def is_plain_model(model_class: Type[BaseModel]) -> bool:
+    """Whether `model_class` has no aliases, private attributes, post-init hook or extra fields."""
+    return (not model_class.__private_attributes__
+            and not model_class.__pydantic_post_init__
+            and not model_class.__pydantic_root_model__
+            and model_class.model_config.get('extra') != 'allow'
+            and all(field.alias is None and field.validation_alias is None
+                    for field in model_class.model_fields.values()))
+
+
+def construct(model_class: Type[Model], **values: Any) -> Model:
+    """
+    Like `model_class.model_construct(**values)`, which builds a model without validating its values, but
+    without inspecting each field and default factory on every call.
+    """
+    fields_set = set(values)
+    immutable_defaults, default_factories = field_defaults(model_class)
+    values = {**immutable_defaults, **values}
+    for name, default_factory in default_factories.items():
+        if name not in values:
+            values[name] = default_factory()
+
+    if not is_plain_model(model_class):
+        return model_class.model_construct(fields_set, **values)
+
+    # What model_construct does for such models
+    model = model_class.__new__(model_class)
+    object.__setattr__(model, '__dict__', values)
+    object.__setattr__(model, '__pydantic_fields_set__', fields_set)
+    object.__setattr__(model, '__pydantic_extra__', None)
+    object.__setattr__(model, '__pydantic_private__', None)
+    return model
+
+
+class ExampleModel(BaseModel):
+    name: str
+    tags: list = []
+    settings: Dict[str, Any] = {}
+
+
+def test_construct():
+    model = construct(ExampleModel, name="example")
+    other = construct(ExampleModel, name="other", tags=["a"])
+
+    assert model == ExampleModel(name="example")
+    assert other.tags == ["a"]
+    assert other.model_fields_set == {"name", "tags"}
+    assert model.settings is not other.settings
+    assert model.model_copy(update={"name": "copy"}).name == "copy"
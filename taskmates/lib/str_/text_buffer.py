@@ -0,0 +1,134 @@
+import pytest
+
+
+class TextBuffer:
+    """
+    Append-only text kept as a list of segments, joined only when it is read.
+
+    Growing a `str` with `+=` copies everything accumulated so far, so streaming a long completion one token at a
+    time is quadratic. Appending to a `TextBuffer` costs the length of the appended text; the join is cached until
+    the next append, and the tail can be read without joining at all.
+    """
+
+    __slots__ = ("_segments", "_length", "_joined")
+
+    def __init__(self, text: str = ""):
+        self._segments: list[str] = [text] if text else []
+        self._length = len(text)
+        self._joined: str | None = text
+
+    def append(self, text: str) -> None:
+        if not text:
+            return
+        self._segments.append(text)
+        self._length += len(text)
+        self._joined = None
+
+    def __iadd__(self, text: str) -> "TextBuffer":
+        self.append(text)
+        return self
+
+    def tail(self, length: int) -> str:
+        """Returns the last `length` characters, joining only the segments they span."""
+        if length <= 0:
+            return ""
+        if self._joined is not None:
+            return self._joined[-length:]
+        parts = []
+        remaining = length
+        for segment in reversed(self._segments):
+            parts.append(segment)
+            remaining -= len(segment)
+            if remaining <= 0:
+                break
+        return "".join(reversed(parts))[-length:]
+
+    def consume(self, length: int) -> str:
+        """Removes and returns the first `length` characters."""
+        text = str(self)
+        head, rest = text[:length], text[length:]
+        self._segments = [rest] if rest else []
+        self._length = len(rest)
+        self._joined = rest
+        return head
+
+    def clear(self) -> None:
+        self._segments = []
+        self._length = 0
+        self._joined = ""
+
+    def __str__(self) -> str:
+        if self._joined is None:
+            self._joined = "".join(self._segments)
+            # Keep the join as the only segment, so the next materialization only copies what was appended since
+            self._segments = [self._joined]
+        return self._joined
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __bool__(self) -> bool:
+        return self._length > 0
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, TextBuffer):
+            return len(self) == len(other) and str(self) == str(other)
+        if isinstance(other, str):
+            return len(self) == len(other) and str(self) == other
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return f"TextBuffer({str(self)!r})"
+
+
+def test_append_and_materialize():
+    buffer = TextBuffer("Hello")
+    buffer.append(", ")
+    buffer += "world"
+    buffer.append("")
+
+    assert len(buffer) == 12
+    assert str(buffer) == "Hello, world"
+    assert buffer == "Hello, world"
+    assert buffer == TextBuffer("Hello, world")
+    assert buffer != "Hello"
+
+
+def test_materialization_is_cached_until_the_next_append():
+    buffer = TextBuffer()
+    assert not buffer
+    for token in ["a", "b", "c"]:
+        buffer.append(token)
+
+    assert str(buffer) is str(buffer)
+    buffer.append("d")
+    assert str(buffer) == "abcd"
+
+
+@pytest.mark.parametrize("length", [0, 1, 2, 3, 5, 100])
+def test_tail(length):
+    buffer = TextBuffer()
+    for token in ["ab", "c", "de"]:
+        buffer.append(token)
+
+    expected = "abcde"[-length:] if length else ""
+
+    assert buffer.tail(length) == expected
+    assert str(buffer) == "abcde"
+    assert buffer.tail(length) == expected
+
+
+def test_consume():
+    buffer = TextBuffer()
+    for token in ["ab", "cd", "ef"]:
+        buffer.append(token)
+
+    assert buffer.consume(3) == "abc"
+    assert buffer == "def"
+    buffer.append("g")
+    assert buffer.consume(10) == "defg"
+    assert len(buffer) == 0
+    buffer.clear()
+    assert buffer == ""
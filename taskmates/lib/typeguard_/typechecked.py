@@ -0,0 +1,176 @@
+import functools
+import inspect
+import itertools
+import os
+import warnings
+from typing import Any, Callable, TypeVar
+
+import pytest
+import typeguard
+
+T = TypeVar("T")
+
+TYPECHECK_POLICIES = ("off", "sampled", "full")
+
+
+def _default_policy() -> str:
+    return "off" if os.environ.get("TASKMATES_ENV", "production") == "production" else "full"
+
+
+# Chosen once, when the first decorated module is imported: changing the environment afterwards has no effect
+# on the modules already imported.
+TYPECHECK_POLICY = os.environ.get("TASKMATES_TYPECHECK") or _default_policy()
+TYPECHECK_SAMPLE_INTERVAL = int(os.environ.get("TASKMATES_TYPECHECK_SAMPLE_INTERVAL", 100))
+
+if TYPECHECK_POLICY not in TYPECHECK_POLICIES:
+    raise ValueError(f"Invalid TASKMATES_TYPECHECK {TYPECHECK_POLICY!r}, expected one of {TYPECHECK_POLICIES}")
+
+
+def typechecked(target: T, policy: str | None = None) -> T:
+    """
+    Drop-in replacement for `typeguard.typechecked` that applies the runtime type-check policy:
+
+    - "off": returns `target` itself, so decorated functions cost exactly what undecorated ones do
+    - "sampled": checks the first call and then one in every `TYPECHECK_SAMPLE_INTERVAL` calls of each function
+    - "full": checks every call, like `typeguard.typechecked`
+
+    The policy is read from TASKMATES_TYPECHECK, and defaults to "off" in production and "full" elsewhere.
+    Methods marked with `typeguard.typeguard_ignore` are left unchecked under every policy.
+    """
+    policy = policy or TYPECHECK_POLICY
+    if policy == "off":
+        return target
+    if policy == "full":
+        if inspect.isclass(target):
+            return _checked_class(target)
+        return typeguard.typechecked(target)
+    if inspect.isclass(target):
+        return _sampled_class(target)
+    return _sampled(target)
+
+
+def _is_ignored(attr: Any) -> bool:
+    # typeguard only honors `typeguard_ignore` when instrumenting whole modules, not classes
+    return getattr(getattr(attr, "__func__", attr), "__no_type_check__", False) is True
+
+
+def _checked_class(cls: type) -> type:
+    ignored = {name: attr for name, attr in list(cls.__dict__.items()) if _is_ignored(attr)}
+    checked = typeguard.typechecked(cls)
+    for name, attr in ignored.items():
+        setattr(checked, name, attr)
+    return checked
+
+
+def _sampled_class(cls: type) -> type:
+    for name, attr in list(cls.__dict__.items()):
+        if _is_ignored(attr):
+            continue
+        if _is_method_of(attr, cls):
+            setattr(cls, name, _sampled(attr))
+        elif isinstance(attr, (classmethod, staticmethod)) and _is_method_of(attr.__func__, cls):
+            setattr(cls, name, attr.__class__(_sampled(attr.__func__)))
+        elif isinstance(attr, property):
+            accessors = {accessor: getattr(attr, accessor) for accessor in ("fget", "fset", "fdel")}
+            setattr(cls, name, property(**{accessor: _sampled(function) if _is_method_of(function, cls) else function
+                                           for accessor, function in accessors.items()},
+                                        doc=attr.__doc__))
+    return cls
+
+
+def _is_method_of(attr: Any, cls: type) -> bool:
+    return (inspect.isfunction(attr)
+            and attr.__module__ == cls.__module__
+            and attr.__qualname__.startswith(cls.__qualname__ + "."))
+
+
+def _sampled(function: Callable) -> Callable:
+    # Like the class decorator of typeguard, silently leaves the methods it can't instrument unchecked
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", typeguard.InstrumentationWarning)
+        checked = typeguard.typechecked(function)
+    if checked is function:
+        return function
+
+    calls = itertools.count()
+    interval = TYPECHECK_SAMPLE_INTERVAL
+
+    if inspect.iscoroutinefunction(function):
+        @functools.wraps(function)
+        async def sampled_coroutine(*args, **kwargs):
+            if next(calls) % interval == 0:
+                return await checked(*args, **kwargs)
+            return await function(*args, **kwargs)
+
+        return sampled_coroutine
+
+    @functools.wraps(function)
+    def sampled(*args, **kwargs):
+        if next(calls) % interval == 0:
+            return checked(*args, **kwargs)
+        return function(*args, **kwargs)
+
+    return sampled
+
+
+@pytest.mark.parametrize("policy", TYPECHECK_POLICIES)
+def test_typechecked_policies(policy):
+    def double(value: int) -> int:
+        return value * 2
+
+    decorated = typechecked(double, policy=policy)
+
+    if policy == "off":
+        assert decorated is double
+    else:
+        with pytest.raises(typeguard.TypeCheckError):
+            decorated("2")
+    assert decorated(2) == 4
+
+
+async def test_sampled_policy_checks_one_call_per_interval():
+    class Example:
+        def __init__(self, value: int):
+            self.value = value
+
+        async def add(self, other: int) -> int:
+            return self.value + other
+
+        @property
+        def doubled(self) -> int:
+            return self.value * 2
+
+    Example = typechecked(Example, policy="sampled")
+
+    with pytest.raises(typeguard.TypeCheckError):
+        Example("1")
+    example = Example("2")
+    assert inspect.iscoroutinefunction(Example.add)
+    with pytest.raises(typeguard.TypeCheckError):
+        await example.add("3")
+    with pytest.raises(typeguard.TypeCheckError):
+        example.doubled
+    assert await example.add("3") == "23"
+
+
+@pytest.mark.parametrize("policy", ("sampled", "full"))
+def test_ignored_methods_are_not_checked(policy):
+    class Example:
+        def checked(self, value: int) -> int:
+            return value
+
+        @typeguard.typeguard_ignore
+        def unchecked(self, value: int) -> int:
+            return value
+
+        @classmethod
+        @typeguard.typeguard_ignore
+        def build(cls, value: int) -> "Example":
+            return value
+
+    Example = typechecked(Example, policy=policy)
+
+    with pytest.raises(typeguard.TypeCheckError):
+        Example().checked("1")
+    assert Example().unchecked("1") == "1"
+    assert Example.build("1") == "1"
@@ -5,9 +5,9 @@ import textwrap
 import pytest
 from quart import Quart
 from quart.testing.connections import WebsocketDisconnectError
-from typeguard import typechecked
 
 import taskmates
+from taskmates.lib.typeguard_.typechecked import typechecked
 from taskmates.server.blueprints.api_completions import completions_bp as completions_v2_bp
 from taskmates.types import ApiRequest
 
@@ -5,12 +5,12 @@ from contextlib import asynccontextmanager
 
 from loguru import logger
 from quart import Websocket
-from typeguard import typechecked
 
 from taskmates.core.workflow_engine.transactions.transaction import Transaction
 from taskmates.core.workflows.signals.execution_environment_signals import ExecutionEnvironmentSignals
 from taskmates.lib.contextlib_.stacked_contexts import stacked_contexts
 from taskmates.lib.contextlib_.ensure_async_context_manager import ensure_async_context_manager
+from taskmates.lib.typeguard_.typechecked import typechecked
 from taskmates.runtimes.api.background_task import background_task
 from taskmates.runtimes.api.signals.web_socket_completion_streamer import WebSocketCompletionStreamer
 from taskmates.runtimes.api.signals.web_socket_interrupt_and_kill_controller import \
@@ -1,13 +1,13 @@
 import select
 import sys
 
-from typeguard import typechecked
 
 from taskmates.cli.lib.merge_inputs import merge_inputs
 from taskmates.core.workflow_engine.transaction_manager import runtime
 from taskmates.core.workflow_engine.transactions.transactional import transactional
 from taskmates.core.workflows.markdown_completion.markdown_completion import MarkdownCompletion
 from taskmates.lib.contextlib_.ensure_async_context_manager import ensure_async_context_manager
+from taskmates.lib.typeguard_.typechecked import typechecked
 from taskmates.runtimes.cli.cli_interrupt_signals_bindings import CliInterruptSignalsBindings
 from taskmates.runtimes.cli.get_incoming_markdown import GetIncomingMarkdown
 from taskmates.runtimes.cli.history_sink_bindings import HistorySinkBindings
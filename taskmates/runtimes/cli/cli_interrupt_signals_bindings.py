@@ -1,7 +1,7 @@
-from typeguard import typechecked
 
 from taskmates.core.workflow_engine.transactions.transaction import Transaction
 from taskmates.lib.contextlib_.ensure_async_context_manager import ensure_async_context_manager
+from taskmates.lib.typeguard_.typechecked import typechecked
 from taskmates.runtimes.cli.signals.history_sink import HistorySink
 from taskmates.runtimes.cli.signals.sig_int_and_sig_term_controller import SigIntAndSigTermController
 from taskmates.runtimes.cli.signals.write_markdown_chat_to_stdout import WriteMarkdownChatToStdout
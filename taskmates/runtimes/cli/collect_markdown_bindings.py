@@ -1,9 +1,9 @@
-from typeguard import typechecked
 
 from taskmates.core.workflow_engine.transactions.transaction import Transaction
 from taskmates.core.workflows.daemons.markdown_chat_daemon import MarkdownChatDaemon
 from taskmates.core.workflows.states.markdown_chat import MarkdownChat
 from taskmates.lib.contextlib_.ensure_async_context_manager import ensure_async_context_manager
+from taskmates.lib.typeguard_.typechecked import typechecked
 from taskmates.runtimes.cli.signals.incoming_messages_formatting_processor import \
     IncomingMessagesFormattingProcessor
 
@@ -1,8 +1,8 @@
-from typeguard import typechecked
 
 from taskmates.core.workflows.states.markdown_chat import MarkdownChat
 from taskmates.core.workflow_engine.transaction_manager import runtime
 from taskmates.core.workflow_engine.transactions.transactional import transactional
+from taskmates.lib.typeguard_.typechecked import typechecked
 from taskmates.runtimes.cli.collect_markdown_bindings import CollectMarkdownBindings
 from taskmates.runtimes.cli.read_history import read_history
 
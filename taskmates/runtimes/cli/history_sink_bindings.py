@@ -1,7 +1,7 @@
-from typeguard import typechecked
 
 from taskmates.core.workflow_engine.composite_context_manager import CompositeContextManager
 from taskmates.core.workflow_engine.transactions.transaction import Transaction
+from taskmates.lib.typeguard_.typechecked import typechecked
 from taskmates.runtimes.cli.signals.history_sink import HistorySink
 
 
@@ -1,10 +1,10 @@
 from typing import Unpack
 
 import pytest
-from typeguard import typechecked
 
 from taskmates.core.workflows.markdown_completion.markdown_completion import MarkdownCompletion
 from taskmates.defaults.settings import Settings
+from taskmates.lib.typeguard_.typechecked import typechecked
 from taskmates.types import RunOpts
 
 
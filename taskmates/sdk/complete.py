@@ -1,8 +1,8 @@
 import asyncio
 from typing import Unpack
 
-from typeguard import typechecked
 
+from taskmates.lib.typeguard_.typechecked import typechecked
 from taskmates.types import RunOpts
 from taskmates.sdk.async_complete import async_complete
 
@@ -66,6 +66,12 @@ class TaskmatesRuntime:
 
         EXTENSION_MANAGER.get().initialize()
 
+        if os.environ.get('TASKMATES_WARM_TOOL_SCHEMAS', '1') == '1':
+            from taskmates.core.tools_registry import tools_registry
+            from taskmates.core.workflows.markdown_completion.completions.llm_completion.request.tool_schema_registry import \
+                tool_schema_registry
+            tool_schema_registry.warm(tools_registry)
+
     @staticmethod
     def shutdown():
         SubclassExtensionPoints.cleanup()
@@ -2,9 +2,10 @@ import time
 from pathlib import Path
 from typing import MutableMapping, Dict, Any, Union, List, Callable
 
-from typeguard import typechecked
 from typing_extensions import TypedDict, NotRequired, Literal
 
+from taskmates.lib.typeguard_.typechecked import typechecked
+
 
 class CompletionRequest(TypedDict):
     messages: list[dict]
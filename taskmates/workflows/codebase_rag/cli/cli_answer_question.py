@@ -5,13 +5,16 @@ CLI tool to answer questions about a codebase using RAG.
 import argparse
 import asyncio
 import json
+from pathlib import Path
 
+from taskmates.core.workflow_engine.sqlite_transaction_cache import SqliteCache, SQLITE_CACHE_FILENAME
 from taskmates.core.workflow_engine.transaction_manager import TransactionManager, runtime
 from taskmates.workflows.codebase_rag.sdk.answer_question import answer_question
 
 
 async def async_main(args):
-    transaction_manager = TransactionManager(cache_dir=args.cache_dir)
+    cache = SqliteCache(Path(args.cache_dir) / SQLITE_CACHE_FILENAME) if args.cache_store == "sqlite" else None
+    transaction_manager = TransactionManager(cache_dir=args.cache_dir, cache=cache)
     
     with runtime.transaction_manager_context(transaction_manager):
         answer_result = await answer_question(
@@ -41,6 +44,9 @@ def main():
     parser.add_argument("--project-root", required=True, help="Root directory of the project")
     parser.add_argument("--file-pattern", default="*.py", help="File pattern to match (default: *.py)")
     parser.add_argument("--cache-dir", required=True, help="Cache directory for transaction manager")
+    parser.add_argument("--cache-store", choices=["directory", "sqlite"], default="directory",
+                        help="Where results are cached: a directory per result, or a single SQLite file "
+                             "(default: directory)")
     parser.add_argument("--output-format", choices=["json", "text"], default="text", help="Output format")
 
     args = parser.parse_args()